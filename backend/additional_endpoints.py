@@ -10,6 +10,7 @@ from datetime import datetime, date
 from database import get_mysql_connection
 import auth
 import schemas
+from search_index import search_service
 
 # ============================================================================
 # TIMETABLE ENDPOINTS
@@ -434,9 +435,11 @@ def upload_resource(resource_data: dict, current_user = Depends(auth.get_current
              resource_data.get("file_path"), resource_data.get("file_url"), resource_data.get("subject_id"),
              resource_data.get("target_course"), resource_data.get("target_semester"), current_user["id"])
         )
+        resource_id = cursor.lastrowid
         connection.commit()
+        search_service.touch(cursor, "resources", resource_id)
         
-        return {"message": "Resource uploaded successfully", "resource_id": cursor.lastrowid}
+        return {"message": "Resource uploaded successfully", "resource_id": resource_id}
     except mysql.connector.Error as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     finally:
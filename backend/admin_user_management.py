@@ -13,6 +13,9 @@ import bcrypt
 from datetime import datetime
 from database import get_mysql_connection
 import auth
+import search_index
+from search_index import search_service
+from autocomplete import autocomplete_service
 
 # =============================================================================
 # ADMIN USER MANAGEMENT FUNCTIONS
@@ -144,6 +147,8 @@ async def add_student_manual(student_data: dict, current_user):
         
         user_id = cursor.lastrowid
         connection.commit()
+        search_service.touch(cursor, "users", user_id)
+        autocomplete_service.touch(cursor, "users", user_id)
         
         # Log the manual addition
         cursor.execute(
@@ -217,6 +222,8 @@ async def add_teacher_manual(teacher_data: dict, current_user):
         
         user_id = cursor.lastrowid
         connection.commit()
+        search_service.touch(cursor, "users", user_id)
+        autocomplete_service.touch(cursor, "users", user_id)
         
         # Log the manual addition
         cursor.execute(
@@ -358,6 +365,8 @@ async def bulk_upload_students_csv(file: UploadFile, current_user):
         )
         
         connection.commit()
+        search_service.invalidate("users")
+        autocomplete_service.invalidate("users")
         
         return {
             "success": True,
@@ -499,6 +508,8 @@ async def bulk_upload_teachers_csv(file: UploadFile, current_user):
         )
         
         connection.commit()
+        search_service.invalidate("users")
+        autocomplete_service.invalidate("users")
         
         return {
             "success": True,
@@ -643,9 +654,26 @@ async def search_users(current_user, query: str = "", role: str = "", limit: int
         where_conditions = ["(college_id = %s OR %s IS NULL)"]
         params = [current_user.get('college_id'), current_user.get('college_id')]
         
-        if query:
-            where_conditions.append("(full_name LIKE %s OR email LIKE %s)")
-            params.extend([f"%{query}%", f"%{query}%"])
+        order_by = "created_at DESC"
+        if query and "@" in query:
+            # Email is kept out of the shared search index; admins match it through FULLTEXT
+            where_conditions.append("MATCH(full_name, email) AGAINST (%s IN BOOLEAN MODE)")
+            params.append(search_index.boolean_query(query))
+        elif query:
+            try:
+                # Ranked matches from the in-process search index
+                ids = search_service.search_ids(
+                    cursor, "users", query, college_id=current_user.get('college_id'),
+                    filters={"role": role}, include_inactive=True, limit=limit
+                )
+                if not ids:
+                    return []
+                id_list = ", ".join(str(int(i)) for i in ids)
+                where_conditions.append(f"id IN ({id_list})")
+                order_by = f"FIELD(id, {id_list})"
+            except Exception:
+                where_conditions.append("MATCH(full_name, email) AGAINST (%s IN BOOLEAN MODE)")
+                params.append(search_index.boolean_query(query))
         
         if role:
             where_conditions.append("role = %s")
@@ -659,7 +687,7 @@ async def search_users(current_user, query: str = "", role: str = "", limit: int
                    phone, is_active, created_at
             FROM users
             WHERE {where_clause}
-            ORDER BY created_at DESC
+            ORDER BY {order_by}
             LIMIT %s
             """,
             params + [limit]
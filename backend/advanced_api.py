@@ -5,7 +5,7 @@
 from fastapi import APIRouter, HTTPException, Depends, UploadFile, File
 from fastapi.responses import StreamingResponse, FileResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import text
+from sqlalchemy import bindparam, text
 from typing import List, Optional, Dict, Any
 from datetime import datetime, date, time
 from pydantic import BaseModel
@@ -232,28 +232,43 @@ async def get_user_orders(
     if current_user.id != user_id and current_user.role not in ['admin', 'canteen_staff']:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    query = text("""
-        SELECT 
-            co.*,
-            json_agg(
-                json_build_object(
-                    'item_name', cmi.item_name,
-                    'quantity', coi.quantity,
-                    'unit_price', coi.unit_price,
-                    'total_price', coi.total_price,
-                    'emoji', cmi.emoji
-                ) ORDER BY coi.id
-            ) as items
+    orders_query = text("""
+        SELECT co.*
         FROM canteen_orders co
-        JOIN canteen_order_items coi ON co.id = coi.order_id
-        JOIN canteen_menu_items cmi ON coi.menu_item_id = cmi.id
         WHERE co.user_id = :user_id
-        GROUP BY co.id
         ORDER BY co.created_at DESC
     """)
+    orders = [dict(row) for row in db.execute(orders_query, {"user_id": user_id}).fetchall()]
+    if not orders:
+        return []
     
-    result = db.execute(query, {"user_id": user_id}).fetchall()
-    return [dict(row) for row in result]
+    # Items for every order in one IN (...) query, grouped in memory
+    items_query = text("""
+        SELECT 
+            coi.order_id,
+            cmi.item_name,
+            coi.quantity,
+            coi.unit_price,
+            coi.total_price,
+            cmi.emoji
+        FROM canteen_order_items coi
+        JOIN canteen_menu_items cmi ON coi.menu_item_id = cmi.id
+        WHERE coi.order_id IN :order_ids
+        ORDER BY coi.order_id, coi.id
+    """).bindparams(bindparam("order_ids", expanding=True))
+    
+    items_by_order: Dict[int, List[Dict[str, Any]]] = {order["id"]: [] for order in orders}
+    for row in db.execute(items_query, {"order_ids": list(items_by_order)}).fetchall():
+        item = dict(row)
+        items_by_order[item.pop("order_id")].append(item)
+    
+    # Orders without items were dropped by the old inner join; keep that behaviour
+    result = []
+    for order in orders:
+        if items_by_order[order["id"]]:
+            order["items"] = items_by_order[order["id"]]
+            result.append(order)
+    return result
 
 @router.get("/canteen/qr/{order_id}")
 async def generate_qr_code(
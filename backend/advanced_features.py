@@ -10,6 +10,8 @@ from datetime import datetime, timedelta
 from database import get_mysql_connection
 import auth
 import schemas
+import search_index
+from search_index import search_service
 import os
 import uuid
 
@@ -42,6 +44,7 @@ def create_lost_found_item(item_data: dict, current_user = Depends(auth.get_curr
         
         item_id = cursor.lastrowid
         connection.commit()
+        search_service.touch(cursor, "lost_found", item_id)
         
         # Notify users with matching interests
         if item_data["type"] == "found":
@@ -84,11 +87,20 @@ def get_lost_found_items(item_type: str = None, category: str = None, search: st
             query += " AND lf.category = %s"
             params.append(category)
         
+        order_by = "lf.created_at DESC"
         if search:
-            query += " AND (lf.item_name LIKE %s OR lf.description LIKE %s)"
-            params.extend([f"%{search}%", f"%{search}%"])
-        
-        query += " ORDER BY lf.created_at DESC LIMIT 50"
+            try:
+                # Ranked matches from the in-process search index
+                ids = search_service.search_ids(cursor, "lost_found", search, filters={"type": item_type, "category": category}, limit=50)
+                id_list = ", ".join(str(int(i)) for i in ids) or "NULL"
+                query += f" AND lf.id IN ({id_list})"
+                if ids:
+                    order_by = f"FIELD(lf.id, {id_list})"
+            except Exception:
+                query += " AND MATCH(lf.item_name, lf.description) AGAINST (%s IN BOOLEAN MODE)"
+                params.append(search_index.boolean_query(search))
+        
+        query += f" ORDER BY {order_by} LIMIT 50"
         
         cursor.execute(query, params)
         items = cursor.fetchall()
@@ -136,6 +148,7 @@ def mark_item_resolved(item_id: int, current_user = Depends(auth.get_current_use
         """, (current_user["id"], item_id))
         
         connection.commit()
+        search_service.touch(cursor, "lost_found", item_id)
         
         return {"success": True, "message": "Item marked as resolved"}
         
@@ -4,9 +4,10 @@ API endpoints for AI-powered club recommendations and chatbot
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
-from ai_recommender import club_recommender, club_chatbot, UserProfile
+from ai_recommender import club_recommender, club_chatbot, UserProfile, precompute_recommendations
 from auth import get_current_user
 from database import get_mysql_connection
+import asyncio
 import logging
 
 router = APIRouter(prefix="/ai", tags=["AI Services"])
@@ -47,8 +48,10 @@ async def get_club_recommendations(
             leadership_interest=request.leadership_interest
         )
         
-        # Get recommendations
-        recommendations = club_recommender.recommend_clubs(user_profile, top_k=5)
+        # Get recommendations; a stale index is refit here, so keep it off the event loop
+        recommendations = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: club_recommender.recommend_clubs(user_profile, top_k=5)
+        )
         
         return {
             "success": True,
@@ -116,7 +119,7 @@ async def get_club_suggestions_by_interests(
 async def get_all_clubs_data():
     """Get comprehensive data about all clubs"""
     try:
-        clubs_data = club_recommender.clubs_data
+        clubs_data = await asyncio.get_running_loop().run_in_executor(None, lambda: club_recommender.clubs_data)
         return {
             "success": True,
             "clubs": [club.dict() for club in clubs_data],
@@ -127,6 +130,36 @@ async def get_all_clubs_data():
         logging.error(f"Error getting clubs data: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to get clubs data")
 
+@router.post("/recommender/rebuild")
+async def rebuild_club_recommender(current_user: dict = Depends(get_current_user)):
+    """Refit the club recommender index from the clubs table (admin only)"""
+    if current_user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Admin only")
+    try:
+        # Reloads the clubs table and refits sklearn; seconds of work on large catalogues
+        await asyncio.get_running_loop().run_in_executor(None, club_recommender.rebuild)
+        return {
+            "success": True,
+            "total_clubs": len(club_recommender.clubs_data),
+            "vocabulary_size": len(club_recommender.vectorizer.vocabulary_),
+            "built_at": club_recommender.built_at
+        }
+    except Exception as e:
+        logging.error(f"Error rebuilding club recommender: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to rebuild club recommender")
+
+@router.post("/recommender/precompute")
+async def precompute_club_recommendations(current_user: dict = Depends(get_current_user)):
+    """Recompute stored club recommendations for all students now (admin only)"""
+    if current_user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Admin only")
+    try:
+        stats = await asyncio.get_running_loop().run_in_executor(None, precompute_recommendations)
+        return {"success": True, **stats}
+    except Exception as e:
+        logging.error(f"Error precomputing club recommendations: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to precompute club recommendations")
+
 @router.get("/recommend-from-profile")
 async def recommend_from_profile(current_user: dict = Depends(get_current_user)):
     """Build a user profile from stored preferences and return recommendations"""
@@ -158,7 +191,9 @@ async def recommend_from_profile(current_user: dict = Depends(get_current_user))
             time_commitment="medium",
             leadership_interest=False
         )
-        recommendations = club_recommender.recommend_clubs(user_profile, top_k=5)
+        recommendations = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: club_recommender.recommend_clubs(user_profile, top_k=5)
+        )
         return {"success": True, "recommendations": recommendations, "user_profile": user_profile.dict()}
     except Exception as e:
         logging.error(f"Error in recommend-from-profile: {str(e)}")
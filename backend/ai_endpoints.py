@@ -1,11 +1,15 @@
 # AI API Endpoints for Campus Connect
 # FastAPI routes for AI-powered features
 
+import asyncio
 from fastapi import APIRouter, HTTPException, Depends, Query
 from typing import List, Dict, Optional
 from datetime import datetime, date, time
 from pydantic import BaseModel, Field
 from ai_service import ai_service, RoomSuggestion, AIScheduleOptimization
+from ai_insights import insights_cache
+from auth import get_current_user
+from database import get_mysql_connection
 import logging
 
 # Configure logging
@@ -48,6 +52,8 @@ class AIInsightsResponse(BaseModel):
     conflict_summary: Dict
     prediction_accuracy: Dict
     user_engagement: Dict
+    generated_at: Optional[str] = None
+    sections: Dict = {}
 
 class ConflictResponse(BaseModel):
     type: str
@@ -318,26 +324,26 @@ async def get_optimal_booking_times(
 @ai_router.get("/insights/dashboard", response_model=AIInsightsResponse)
 async def get_ai_insights_dashboard():
     """
-    Get comprehensive AI insights for dashboard
+    Get comprehensive AI insights for dashboard from the precomputed snapshot
     """
     try:
-        logger.info("Generating AI insights dashboard")
+        if not insights_cache.attempted():
+            # Cold start before the background task's first pass; sections that
+            # failed are served empty with last_error and left to the task
+            await asyncio.get_running_loop().run_in_executor(None, insights_cache.refresh)
         
         insights = ai_service.get_ai_insights_dashboard()
         
-        if 'error' in insights:
-            raise HTTPException(status_code=400, detail=insights['error'])
-        
         return AIInsightsResponse(
             room_utilization=insights['room_utilization'],
             popular_times=insights['popular_times'],
             conflict_summary=insights['conflict_summary'],
             prediction_accuracy=insights['prediction_accuracy'],
-            user_engagement=insights['user_engagement']
+            user_engagement=insights['user_engagement'],
+            generated_at=insights['generated_at'],
+            sections=insights['sections']
         )
         
-    except HTTPException:
-        raise
     except Exception as e:
         logger.error(f"Error generating AI insights: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to generate insights: {str(e)}")
@@ -348,11 +354,11 @@ async def get_room_utilization_insights():
     Get detailed room utilization insights
     """
     try:
-        insights = ai_service._get_room_utilization_insights()
+        insights = insights_cache.section("room_utilization")
         
         return {
-            "utilization_data": insights,
-            "generated_at": datetime.now().isoformat(),
+            "utilization_data": insights["data"],
+            "generated_at": insights["generated_at"],
             "status": "success"
         }
         
@@ -366,11 +372,11 @@ async def get_popular_times_insights():
     Get popular booking times insights
     """
     try:
-        insights = ai_service._get_popular_times_insights()
+        insights = insights_cache.section("popular_times")
         
         return {
-            "popular_times_data": insights,
-            "generated_at": datetime.now().isoformat(),
+            "popular_times_data": insights["data"],
+            "generated_at": insights["generated_at"],
             "status": "success"
         }
         
@@ -378,6 +384,31 @@ async def get_popular_times_insights():
         logger.error(f"Error getting popular times insights: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to get insights: {str(e)}")
 
+@ai_router.post("/insights/refresh")
+async def refresh_ai_insights(section: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    """
+    Recompute the insights snapshot now, one section or all of them (admin only)
+    """
+    if current_user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Admin only")
+    try:
+        sections = [section] if section else None
+        refreshed = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: insights_cache.refresh(sections, force=True)
+        )
+        
+        return {
+            "refreshed": refreshed,
+            "sections": insights_cache.snapshot()["sections"],
+            "status": "success"
+        }
+        
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error refreshing AI insights: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to refresh insights: {str(e)}")
+
 # ==========================================
 # AI MODEL MANAGEMENT
 # ==========================================
@@ -390,14 +421,19 @@ async def update_ai_patterns():
     try:
         logger.info("Updating AI patterns")
         
-        ai_service.update_room_patterns()
+        pipeline = await asyncio.get_running_loop().run_in_executor(None, ai_service.update_room_patterns)
+        if pipeline.get("status") == "error":
+            raise HTTPException(status_code=500, detail=f"Failed to update patterns: {pipeline['error']}")
         
         return {
             "message": "AI patterns updated successfully",
             "updated_at": datetime.now().isoformat(),
-            "status": "success"
+            "status": "success",
+            "pipeline": pipeline
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error updating AI patterns: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to update patterns: {str(e)}")
@@ -513,7 +549,14 @@ async def ai_health_check():
     """
     try:
         # Test AI service connection
-        test_insights = ai_service._get_room_utilization_insights()
+        connection = get_mysql_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+            cursor.close()
+        finally:
+            connection.close()
         
         return {
             "ai_service": "healthy",
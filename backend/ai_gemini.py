@@ -5,7 +5,10 @@ import requests
 import time
 import mysql.connector
 
+import asset_store
 import auth
+import ocr_pipeline
+from canteen_menu import menu_cache
 from database import get_mysql_connection
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
@@ -314,6 +317,62 @@ def _gemini_ocr_image_to_json(image_bytes: bytes, prompt: str, mime_type: str =
                 continue
         raise HTTPException(status_code=503, detail=f"Gemini OCR error: {resp.text[:500]}")
 
+def _load_cached_parse(sha: str, kind: str) -> Optional[dict]:
+    try:
+        conn = get_mysql_connection()
+        cur = conn.cursor(dictionary=True)
+        asset_store.ensure_parse_cache_table(cur)
+        return asset_store.get_cached_parse(cur, sha, kind)
+    except mysql.connector.Error as e:
+        print(f"Parse cache lookup failed: {e}")
+        return None
+    finally:
+        if 'cur' in locals():
+            try: cur.close()
+            except Exception: pass
+        if 'conn' in locals():
+            try: conn.close()
+            except Exception: pass
+
+def _save_cached_parse(sha: str, kind: str, result: "ocr_pipeline.OcrResult") -> None:
+    try:
+        conn = get_mysql_connection()
+        cur = conn.cursor(dictionary=True)
+        asset_store.ensure_parse_cache_table(cur)
+        asset_store.store_cached_parse(cur, sha, kind, result.rows, result.tier, result.confidence)
+        conn.commit()
+    except mysql.connector.Error as e:
+        print(f"Parse cache write failed: {e}")
+    finally:
+        if 'cur' in locals():
+            try: cur.close()
+            except Exception: pass
+        if 'conn' in locals():
+            try: conn.close()
+            except Exception: pass
+
+def _run_ocr_with_cache(kind: str, data: bytes, run) -> "ocr_pipeline.OcrResult":
+    """Reuse the stored parse for byte-identical uploads; otherwise run the OCR pipeline.
+
+    Only Gemini results and local parses that met the confidence threshold are
+    cached, so a best-effort local parse from a failed escalation is retried
+    next time instead of being served as the cached answer forever.
+    """
+    started = time.perf_counter()
+    sha = asset_store.content_hash(data)
+    cached = _load_cached_parse(sha, kind)
+    if cached and cached["rows"]:
+        latency_ms = (time.perf_counter() - started) * 1000
+        ocr_pipeline.pipeline_stats.record(kind, ocr_pipeline.TIER_CACHE, latency_ms, accepted=True)
+        return ocr_pipeline.OcrResult(
+            cached["rows"], ocr_pipeline.TIER_CACHE, cached["confidence"] or 0.0, round(latency_ms, 2)
+        )
+    result = run()
+    if result.rows and (result.tier == ocr_pipeline.TIER_GEMINI
+                        or result.confidence >= ocr_pipeline.CONFIDENCE_THRESHOLD):
+        _save_cached_parse(sha, kind, result)
+    return result
+
 @router.post("/ai/chat")
 async def ai_chat(payload: dict, current_user = Depends(auth.get_current_user)):
     """Enhanced chatbot that can answer questions about campus, events, clubs, canteen, and more."""
@@ -530,6 +589,31 @@ async def ai_club_recommendations(payload: dict = {}, current_user = Depends(aut
             interests = [r["category"] for r in cursor.fetchall() or []]
         except Exception:
             interests = []
+        # Nightly batch results, if this student has them
+        try:
+            cursor.execute(
+                """
+                SELECT r.club_id AS id, c.name, r.score, r.reason, r.computed_at
+                FROM club_recommendations_cache r
+                JOIN clubs c ON c.id = r.club_id AND c.is_active = TRUE
+                WHERE r.user_id = %s
+                ORDER BY r.rank_no
+                """,
+                (current_user["id"],)
+            )
+            precomputed = cursor.fetchall() or []
+        except Exception:
+            precomputed = []
+        if precomputed and not payload.get("refresh"):
+            return {
+                "interests": interests,
+                "recommendations": [
+                    {"id": r["id"], "name": r["name"], "score": float(r["score"]), "reason": r["reason"]}
+                    for r in precomputed
+                ],
+                "source": "precomputed",
+                "computed_at": precomputed[0]["computed_at"].isoformat() if precomputed[0].get("computed_at") else None
+            }
         # Get clubs or organizations list for the user's college
         def table_exists(t):
             cursor.execute("SHOW TABLES LIKE %s", (t,))
@@ -638,21 +722,33 @@ async def upload_timetable(file: UploadFile = File(...), current_user = Depends(
         " 9. Only include actual lecture/class subjects, not 'LUNCH', 'BREAK', 'RECESS'"
         " Ensure day_of_week is a valid weekday string. Return ONLY a JSON array (no commentary)."
     )
-    try:
-        raw_text = _gemini_ocr_image_to_json(img, instruction, getattr(file, 'content_type', 'image/png'))
+    raw_text = None
+
+    def gemini_rows(data: bytes, mime_type: Optional[str]) -> List[dict]:
+        nonlocal raw_text
+        raw_text = _gemini_ocr_image_to_json(data, instruction, mime_type or 'image/png')
         # Try direct parse
         try:
-            rows = json.loads(raw_text)
+            parsed = json.loads(raw_text)
         except Exception:
             candidate = _extract_json_from_text(raw_text)
             if not candidate:
                 raise ValueError("model did not return JSON")
-            rows = json.loads(candidate)
-        if not isinstance(rows, list):
+            parsed = json.loads(candidate)
+        if not isinstance(parsed, list):
             raise ValueError("OCR did not return a JSON array")
-            
+        return parsed
+
+    try:
+        # Local Tesseract + heuristic parser first; Gemini only for low-confidence reads
+        ocr_result = _run_ocr_with_cache("timetable", img, lambda: ocr_pipeline.run_timetable_pipeline(
+            img, getattr(file, 'content_type', 'image/png'), gemini_rows if GEMINI_API_KEY else None
+        ))
+        if not ocr_result.rows:
+            raise ValueError("no timetable entries detected")
+
         # Process consecutive lectures and improve data quality
-        rows = process_consecutive_lectures(rows)
+        rows = process_consecutive_lectures(ocr_result.rows)
     except HTTPException:
         # bubble up Gemini error as-is
         raise
@@ -808,7 +904,12 @@ async def upload_timetable(file: UploadFile = File(...), current_user = Depends(
                 continue
                 
         conn.commit()
-        return {"inserted": inserted, "notifications_created": notifications_created}
+        return {
+            "inserted": inserted,
+            "notifications_created": notifications_created,
+            "ocr_tier": ocr_result.tier,
+            "ocr_confidence": ocr_result.confidence,
+        }
     except mysql.connector.Error as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     finally:
@@ -819,6 +920,17 @@ async def upload_timetable(file: UploadFile = File(...), current_user = Depends(
             try: conn.close()
             except Exception: pass
 
+@router.get("/ai/ocr/stats")
+async def ocr_pipeline_stats(current_user = Depends(auth.get_current_user)):
+    """Per-tier hit rates and latency of the local-first OCR pipeline (admin only)."""
+    if current_user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Admin only")
+    return {
+        "confidence_threshold": ocr_pipeline.CONFIDENCE_THRESHOLD,
+        "gemini_configured": bool(GEMINI_API_KEY),
+        "tiers": ocr_pipeline.pipeline_stats.snapshot(),
+    }
+
 @router.post("/timetable/test-time-parsing")
 async def test_time_parsing(time_data: dict, current_user = Depends(auth.get_current_user)):
     """Test endpoint to debug time parsing issues"""
@@ -876,13 +988,22 @@ async def canteen_menu_ocr(file: UploadFile = File(...), replace: bool = True, c
         "Respond ONLY with JSON array, no other text."
     )
     
-    text = _gemini_ocr_image_to_json(file_content, instruction, content_type)
-    try:
-        items = json.loads(text)
-        if not isinstance(items, list):
-            raise ValueError("Expected a list of items")
-    except Exception:
-        raise HTTPException(status_code=400, detail="Failed to parse OCR output as JSON")
+    def gemini_items(data: bytes, mime_type: Optional[str]) -> List[dict]:
+        text = _gemini_ocr_image_to_json(data, instruction, mime_type or content_type)
+        try:
+            parsed = json.loads(text)
+            if not isinstance(parsed, list):
+                raise ValueError("Expected a list of items")
+        except Exception:
+            raise HTTPException(status_code=400, detail="Failed to parse OCR output as JSON")
+        return parsed
+
+    ocr_result = _run_ocr_with_cache("menu", file_content, lambda: ocr_pipeline.run_menu_pipeline(
+        file_content, content_type, gemini_items if GEMINI_API_KEY else None
+    ))
+    items = ocr_result.rows
+    if not items:
+        raise HTTPException(status_code=400, detail="No menu items could be detected in the uploaded file")
 
     # Persist to DB
     try:
@@ -943,10 +1064,13 @@ async def canteen_menu_ocr(file: UploadFile = File(...), replace: bool = True, c
             })
             
         conn.commit()
+        menu_cache.refresh_after_write(cur)
         return {
             "items_inserted": inserted,
             "message": f"Successfully processed {inserted} menu items",
-            "preview": processed_items[:10]  # Return first 10 items as preview
+            "preview": processed_items[:10],  # Return first 10 items as preview
+            "ocr_tier": ocr_result.tier,
+            "ocr_confidence": ocr_result.confidence,
         }
     except mysql.connector.Error as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
@@ -0,0 +1,227 @@
+"""Precomputed AI insights dashboard.
+
+``/ai/insights/dashboard`` used to run five aggregate queries on every
+request: utilization, popular times, conflicts, prediction accuracy and
+engagement. A background task now computes each section into an
+in-memory snapshot, and requests read the snapshot without touching
+MySQL.
+
+Each section has its own staleness budget (second field of ``SECTIONS``, in
+seconds). Every ``TICK_SECONDS`` the task recomputes only the sections
+older than their budget. Utilization follows the room-patterns pipeline
+and is refreshed every few minutes. Prediction accuracy over 30 days is
+refreshed hourly. A section that fails keeps its last good value and is
+retried on the next tick. The response reports every section's age and
+whether it is over budget. Admins can force a refresh of one section or
+all of them.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional
+
+LOGGER = logging.getLogger(__name__)
+
+TICK_SECONDS = float(os.getenv("AI_INSIGHTS_TICK_SECONDS", "15"))
+
+# section -> (CampusAIService method taking a cursor, staleness budget in seconds)
+SECTIONS = {
+    "room_utilization": ("_get_room_utilization_insights", int(os.getenv("AI_INSIGHTS_UTILIZATION_BUDGET", "300"))),
+    "popular_times": ("_get_popular_times_insights", int(os.getenv("AI_INSIGHTS_POPULAR_TIMES_BUDGET", "900"))),
+    "conflict_summary": ("_get_conflict_summary", int(os.getenv("AI_INSIGHTS_CONFLICTS_BUDGET", "120"))),
+    "prediction_accuracy": ("_get_prediction_accuracy", int(os.getenv("AI_INSIGHTS_ACCURACY_BUDGET", "3600"))),
+    "user_engagement": ("_get_user_engagement_metrics", int(os.getenv("AI_INSIGHTS_ENGAGEMENT_BUDGET", "900"))),
+}
+
+
+def _default_connect():
+    from database import get_mysql_connection
+
+    return get_mysql_connection()
+
+
+def _default_service():
+    from ai_service import ai_service
+
+    return ai_service
+
+
+@dataclass
+class SectionState:
+    data: Optional[Dict] = None
+    computed_at: Optional[float] = None
+    duration_ms: Optional[float] = None
+    error: Optional[str] = None
+    failed_at: Optional[float] = None
+
+    def age(self, now: float) -> Optional[float]:
+        return now - self.computed_at if self.computed_at is not None else None
+
+
+class InsightsCache:
+    def __init__(self, connect: Callable = _default_connect, service: Callable = _default_service,
+                 clock: Callable[[], float] = time.time):
+        self._connect = connect
+        self._service = service
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._sections: Dict[str, SectionState] = {name: SectionState() for name in SECTIONS}
+        self.refreshes = 0
+
+    def stale_sections(self, now: Optional[float] = None) -> List[str]:
+        now = self._clock() if now is None else now
+        with self._lock:
+            return [name for name, (_, budget) in SECTIONS.items()
+                    if self._sections[name].computed_at is None or self._sections[name].age(now) >= budget]
+
+    def refresh(self, sections: Optional[Iterable[str]] = None, force: bool = False) -> List[str]:
+        """Recompute ``sections`` (default: the stale ones, or all when ``force``); returns those refreshed."""
+        names = list(sections) if sections is not None else (list(SECTIONS) if force else self.stale_sections())
+        unknown = [name for name in names if name not in SECTIONS]
+        if unknown:
+            raise ValueError(f"Unknown insights section(s): {', '.join(unknown)}")
+        if not names:
+            return []
+        with self._refresh_lock:
+            if not force:
+                # Another thread may have refreshed them while this one waited
+                stale = set(self.stale_sections())
+                names = [name for name in names if name in stale]
+                if not names:
+                    return []
+            service = self._service()
+            connection = self._connect()
+            cursor = connection.cursor(dictionary=True)
+            refreshed = []
+            try:
+                for name in names:
+                    started = time.perf_counter()
+                    try:
+                        data = getattr(service, SECTIONS[name][0])(cursor)
+                    except Exception as e:
+                        LOGGER.error("AI insights section %s failed: %s", name, e)
+                        with self._lock:
+                            state = self._sections[name]
+                            state.error, state.failed_at = str(e), self._clock()
+                        continue
+                    with self._lock:
+                        self._sections[name] = SectionState(
+                            data, self._clock(), round((time.perf_counter() - started) * 1000, 1)
+                        )
+                    refreshed.append(name)
+            finally:
+                cursor.close()
+                connection.close()
+            self.refreshes += 1
+            return refreshed
+
+    def attempted(self) -> bool:
+        """True once every section has been tried at least once, whether or not it succeeded."""
+        with self._lock:
+            return all(state.computed_at is not None or state.failed_at is not None
+                       for state in self._sections.values())
+
+    def snapshot(self) -> Dict:
+        """Section data plus per-section freshness; sections never computed are empty dicts."""
+        now = self._clock()
+        with self._lock:
+            data = {name: dict(state.data or {}) for name, state in self._sections.items()}
+            meta = {}
+            for name, state in self._sections.items():
+                budget = SECTIONS[name][1]
+                age = state.age(now)
+                meta[name] = {
+                    "computed_at": datetime.fromtimestamp(state.computed_at).isoformat() if state.computed_at else None,
+                    "age_seconds": round(age, 1) if age is not None else None,
+                    "budget_seconds": budget,
+                    "stale": age is None or age > budget,
+                    "compute_ms": state.duration_ms,
+                    "last_error": state.error,
+                }
+            computed = [state.computed_at for state in self._sections.values() if state.computed_at]
+        data["generated_at"] = datetime.fromtimestamp(min(computed)).isoformat() if computed else None
+        data["sections"] = meta
+        return data
+
+    def section(self, name: str) -> Dict:
+        with self._lock:
+            state = self._sections[name]
+            return {
+                "data": dict(state.data or {}),
+                "generated_at": datetime.fromtimestamp(state.computed_at).isoformat() if state.computed_at else None,
+            }
+
+
+insights_cache = InsightsCache()
+
+
+class _FakeCursor:
+    def __init__(self, query_ms: float, counter: Dict):
+        self.query_ms = query_ms
+        self.counter = counter
+
+    def close(self):
+        pass
+
+
+class _FakeService:
+    """Each section costs one aggregate query of ``query_ms``."""
+
+    def __getattr__(self, name):
+        def section(cursor):
+            cursor.counter["queries"] += 1
+            time.sleep(cursor.query_ms / 1000)
+            return {"value": 1}
+        return section
+
+
+def benchmark(requests_per_minute: int = 200, query_ms: float = 40.0, minutes: int = 60) -> Dict:
+    """An hour of dashboard traffic: per-request aggregation versus the snapshot.
+
+    Query latency is simulated. The background task ticks every
+    ``TICK_SECONDS`` on a simulated clock, so refreshes follow the section
+    budgets.
+    """
+    counter = {"queries": 0}
+    clock = {"now": 0.0}
+
+    class _Conn:
+        def cursor(self, dictionary=True):
+            return _FakeCursor(query_ms, counter)
+
+        def close(self):
+            pass
+
+    cache = InsightsCache(connect=_Conn, service=_FakeService, clock=lambda: clock["now"])
+    requests = requests_per_minute * minutes
+    per_tick = max(1, int(requests_per_minute * TICK_SECONDS / 60))
+    served = stale = 0
+    snapshot_s = 0.0
+    while clock["now"] < minutes * 60:
+        cache.refresh()
+        for _ in range(per_tick):
+            t0 = time.perf_counter()
+            snap = cache.snapshot()
+            snapshot_s += time.perf_counter() - t0
+            served += 1
+            stale += any(meta["stale"] for meta in snap["sections"].values())
+        clock["now"] += TICK_SECONDS
+    return {
+        "requests": served,
+        "per_request_queries": requests * len(SECTIONS),
+        "per_request_latency_ms": round(len(SECTIONS) * query_ms, 1),
+        "snapshot_queries": counter["queries"],
+        "snapshot_latency_us": round(snapshot_s / served * 1e6, 1),
+        "responses_over_budget": stale,
+    }
+
+
+if __name__ == "__main__":
+    print(benchmark())
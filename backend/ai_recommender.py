@@ -2,17 +2,33 @@
 AI-powered club recommendation system using machine learning
 """
 import os
-from typing import List, Dict, Any
-import pandas as pd
+import json
+import pickle
+import tempfile
+import threading
+import time
+import logging
+from typing import List, Dict, Any, Optional, Tuple
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.preprocessing import StandardScaler
-import google.generativeai as genai
 from pydantic import BaseModel
 
-# Configure Gemini AI
-genai.configure(api_key=os.getenv("GEMINI_API_KEY", ""))
+# sklearn, scipy and google.generativeai are imported on first use; together
+# they account for most of this module's import time and are not needed
+# until a recommendation or chat request arrives.
+
+logger = logging.getLogger(__name__)
+
+_genai = None
+
+
+def _gemini_model(name: str = 'gemini-pro'):
+    """Import and configure Gemini AI on first use."""
+    global _genai
+    if _genai is None:
+        import google.generativeai as genai
+        genai.configure(api_key=os.getenv("GEMINI_API_KEY", ""))
+        _genai = genai
+    return _genai.GenerativeModel(name)
 
 class UserProfile(BaseModel):
     interests: List[str]
@@ -34,15 +50,271 @@ class ClubData(BaseModel):
     time_commitment: str
     leadership_opportunities: bool
 
+# Persisted index (fitted vectorizer/scaler + feature matrices) for fast startup
+INDEX_PATH = os.getenv(
+    "CLUB_RECOMMENDER_INDEX_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "club_recommender.pkl"),
+)
+INDEX_MAX_AGE_SECONDS = float(os.getenv("CLUB_RECOMMENDER_MAX_AGE_HOURS", "24")) * 3600
+INDEX_VERSION = 1
+
+TIME_COMMITMENT_SCORES = {"low": 1, "medium": 2, "high": 3}
+
+# Users scored per sparse multiply in score_batch (bounds the dense users x clubs block)
+BATCH_CHUNK_SIZE = int(os.getenv("CLUB_RECOMMENDER_BATCH_CHUNK", "512"))
+
 class ClubRecommender:
-    def __init__(self):
-        self.clubs_data = self._get_clubs_data()
-        self.vectorizer = TfidfVectorizer(stop_words='english', max_features=1000)
-        self.scaler = StandardScaler()
-        self._prepare_data()
-    
-    def _get_clubs_data(self) -> List[ClubData]:
-        """Get comprehensive club data with enhanced features"""
+    """TF-IDF + numeric-feature club recommender backed by the ``clubs`` table.
+
+    The index is built lazily on first use from active clubs (description,
+    category and activities from ``club_timeline``/``club_events``), persisted
+    to ``INDEX_PATH`` and reloaded on the next start. Single-club changes are
+    applied incrementally with the existing vocabulary; a full refit happens
+    once enough clubs changed or the index is older than the max age.
+    """
+
+    def __init__(self, index_path: Optional[str] = None, use_database: bool = True):
+        self.index_path = index_path or INDEX_PATH
+        self.use_database = use_database
+        self._lock = threading.RLock()
+        self._clubs: List[ClubData] = []
+        self._positions: Dict[str, int] = {}
+        self.vectorizer = None  # TfidfVectorizer
+        self.scaler = None  # StandardScaler
+        self.text_features = None
+        self.numerical_features = None
+        self.built_at = 0.0
+        self._pending_changes = 0
+
+    @property
+    def clubs_data(self) -> List[ClubData]:
+        self._ensure_index()
+        return self._clubs
+
+    # ------------------------------------------------------------------
+    # Index lifecycle
+    # ------------------------------------------------------------------
+
+    def _ensure_index(self):
+        if self.vectorizer is not None and time.time() - self.built_at < INDEX_MAX_AGE_SECONDS:
+            return
+        with self._lock:
+            if self.vectorizer is not None and time.time() - self.built_at < INDEX_MAX_AGE_SECONDS:
+                return
+            if self.vectorizer is None and self._load_persisted():
+                if time.time() - self.built_at < INDEX_MAX_AGE_SECONDS:
+                    return
+            self.rebuild()
+
+    def rebuild(self, clubs: Optional[List[ClubData]] = None):
+        """Refit the vectorizer/scaler on all clubs and persist the result."""
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.preprocessing import StandardScaler
+
+        with self._lock:
+            clubs = clubs if clubs is not None else self._load_clubs()
+            vectorizer = TfidfVectorizer(stop_words='english', max_features=5000)
+            scaler = StandardScaler()
+            text_features = vectorizer.fit_transform([self._club_text(c) for c in clubs]).tocsr()
+            numerical_features = scaler.fit_transform(np.array([self._club_numeric(c) for c in clubs], dtype=float))
+            self.vectorizer, self.scaler = vectorizer, scaler
+            self.text_features, self.numerical_features = text_features, numerical_features
+            self._clubs = list(clubs)
+            self._positions = {c.id: i for i, c in enumerate(self._clubs)}
+            self.built_at = time.time()
+            self._pending_changes = 0
+            self._persist()
+
+    def _load_persisted(self) -> bool:
+        try:
+            with open(self.index_path, "rb") as fh:
+                state = pickle.load(fh)
+            if state.get("version") != INDEX_VERSION:
+                return False
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable club recommender index {self.index_path}: {e}")
+            return False
+        self.vectorizer = state["vectorizer"]
+        self.scaler = state["scaler"]
+        self.text_features = state["text_features"]
+        self.numerical_features = state["numerical_features"]
+        self._clubs = [ClubData(**c) for c in state["clubs"]]
+        self._positions = {c.id: i for i, c in enumerate(self._clubs)}
+        self.built_at = state["built_at"]
+        self._pending_changes = state.get("pending_changes", 0)
+        return True
+
+    def _persist(self):
+        state = {
+            "version": INDEX_VERSION,
+            "built_at": self.built_at,
+            "pending_changes": self._pending_changes,
+            "clubs": [c.dict() for c in self._clubs],
+            "vectorizer": self.vectorizer,
+            "scaler": self.scaler,
+            "text_features": self.text_features,
+            "numerical_features": self.numerical_features,
+        }
+        try:
+            directory = os.path.dirname(self.index_path)
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".club-index-")
+            with os.fdopen(fd, "wb") as fh:
+                pickle.dump(state, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.index_path)
+        except Exception as e:
+            logger.warning(f"Could not persist club recommender index: {e}")
+
+    # ------------------------------------------------------------------
+    # Incremental updates
+    # ------------------------------------------------------------------
+
+    def upsert_club(self, club: ClubData):
+        """Add or replace one club using the already-fitted vocabulary and scaler."""
+        import scipy.sparse as sp
+
+        self._ensure_index()
+        with self._lock:
+            text_row = self.vectorizer.transform([self._club_text(club)]).tocsr()
+            numeric_row = self.scaler.transform(np.array([self._club_numeric(club)], dtype=float))
+            pos = self._positions.get(club.id)
+            # Always build new matrices: score_batch reads the old ones outside the lock
+            if pos is None:
+                self.text_features = sp.vstack([self.text_features, text_row], format="csr")
+                self.numerical_features = np.vstack([self.numerical_features, numeric_row])
+                self._positions[club.id] = len(self._clubs)
+                self._clubs.append(club)
+            else:
+                self.text_features = sp.vstack(
+                    [self.text_features[:pos], text_row, self.text_features[pos + 1:]], format="csr"
+                )
+                self.numerical_features = np.vstack(
+                    [self.numerical_features[:pos], numeric_row, self.numerical_features[pos + 1:]]
+                )
+                self._clubs[pos] = club
+            self._after_change()
+
+    def remove_club(self, club_id):
+        self._ensure_index()
+        with self._lock:
+            pos = self._positions.get(str(club_id))
+            if pos is None:
+                return
+            keep = np.array([i for i in range(len(self._clubs)) if i != pos], dtype=int)
+            self.text_features = self.text_features[keep]
+            self.numerical_features = self.numerical_features[keep]
+            del self._clubs[pos]
+            self._positions = {c.id: i for i, c in enumerate(self._clubs)}
+            self._after_change()
+
+    def refresh_club(self, club_id: int):
+        """Re-read one club from the database after it was created or edited."""
+        if not self.use_database:
+            return
+        rows = self._load_clubs(club_id=club_id)
+        if rows:
+            self.upsert_club(rows[0])
+        else:
+            self.remove_club(club_id)
+
+    def _after_change(self):
+        # New terms are invisible to the old vocabulary; refit once enough clubs changed
+        self._pending_changes += 1
+        if self._pending_changes > max(10, 0.2 * len(self._clubs)):
+            self.rebuild(self._clubs)
+        else:
+            self._persist()
+
+    # ------------------------------------------------------------------
+    # Data loading
+    # ------------------------------------------------------------------
+
+    def _load_clubs(self, club_id: Optional[int] = None) -> List[ClubData]:
+        """Load active clubs from MySQL, falling back to the built-in seed list."""
+        if not self.use_database:
+            return [] if club_id is not None else self._get_clubs_data()
+        try:
+            from database import get_mysql_connection
+            connection = get_mysql_connection()
+            cursor = connection.cursor(dictionary=True)
+            where = "c.is_active = TRUE" + (" AND c.id = %s" if club_id is not None else "")
+            params = (club_id,) if club_id is not None else ()
+            cursor.execute(
+                f"""
+                SELECT c.id, c.name, c.description, c.category, COALESCE(m.cnt, 0) AS member_count
+                FROM clubs c
+                LEFT JOIN (
+                    SELECT club_id, COUNT(*) AS cnt FROM club_memberships
+                    WHERE status = 'approved' GROUP BY club_id
+                ) m ON m.club_id = c.id
+                WHERE {where}
+                """,
+                params
+            )
+            rows = cursor.fetchall()
+            activities: Dict[int, List[str]] = {}
+            weekly: Dict[int, int] = {}
+            filter_sql = " AND club_id = %s" if club_id is not None else ""
+            try:
+                cursor.execute(
+                    f"SELECT club_id, activity_name FROM club_timeline WHERE is_active = TRUE{filter_sql}", params
+                )
+                for r in cursor.fetchall():
+                    activities.setdefault(r["club_id"], []).append(r["activity_name"])
+                    weekly[r["club_id"]] = weekly.get(r["club_id"], 0) + 1
+            except Exception:
+                pass
+            try:
+                cursor.execute(
+                    f"SELECT club_id, title FROM club_events WHERE status IN ('approved', 'completed'){filter_sql}",
+                    params
+                )
+                for r in cursor.fetchall():
+                    activities.setdefault(r["club_id"], []).append(r["title"])
+            except Exception:
+                pass
+        except Exception as e:
+            logger.warning(f"Falling back to built-in clubs for recommender: {e}")
+            return [] if club_id is not None else self._get_clubs_data()
+        finally:
+            if 'cursor' in locals(): cursor.close()
+            if 'connection' in locals(): connection.close()
+
+        clubs = []
+        for r in rows:
+            sessions = weekly.get(r["id"], 0)
+            clubs.append(ClubData(
+                id=str(r["id"]),
+                name=r["name"] or f"Club #{r['id']}",
+                description=r.get("description") or "",
+                tags=[r["category"]] if r.get("category") else [],
+                category=r.get("category") or "General",
+                member_count=int(r.get("member_count") or 0),
+                activities=activities.get(r["id"], [])[:50],
+                time_commitment="high" if sessions >= 4 else "medium" if sessions >= 2 else "low",
+                leadership_opportunities=True
+            ))
+        if not clubs and club_id is None:
+            return self._get_clubs_data()
+        return clubs
+
+    @staticmethod
+    def _club_text(club: ClubData) -> str:
+        # Text features: combine description, category, tags and activities
+        return f"{club.description} {club.category} {' '.join(club.tags)} {' '.join(club.activities)}"
+
+    @staticmethod
+    def _club_numeric(club: ClubData) -> List[float]:
+        time_commitment_score = TIME_COMMITMENT_SCORES.get(club.time_commitment, 2)
+        leadership_score = 1 if club.leadership_opportunities else 0
+        popularity_score = min(club.member_count / 50, 5)  # Normalize member count
+        return [time_commitment_score, leadership_score, popularity_score]
+
+    @staticmethod
+    def _get_clubs_data() -> List[ClubData]:
+        """Built-in seed clubs, used when the database is unavailable or empty"""
         return [
             ClubData(
                 id="1",
@@ -134,60 +406,65 @@ class ClubRecommender:
             )
         ]
     
-    def _prepare_data(self):
-        """Prepare data for machine learning models"""
-        # Create feature matrix
-        club_texts = []
-        numerical_features = []
-        
-        for club in self.clubs_data:
-            # Text features: combine description and tags
-            text_content = f"{club.description} {' '.join(club.tags)} {' '.join(club.activities)}"
-            club_texts.append(text_content)
-            
-            # Numerical features
-            time_commitment_score = {"low": 1, "medium": 2, "high": 3}[club.time_commitment]
-            leadership_score = 1 if club.leadership_opportunities else 0
-            popularity_score = min(club.member_count / 50, 5)  # Normalize member count
-            
-            numerical_features.append([time_commitment_score, leadership_score, popularity_score])
-        
-        # Vectorize text features
-        self.text_features = self.vectorizer.fit_transform(club_texts)
-        
-        # Scale numerical features
-        self.numerical_features = self.scaler.fit_transform(numerical_features)
-    
-    def recommend_clubs(self, user_profile: UserProfile, top_k: int = 5) -> List[Dict[str, Any]]:
-        """Recommend clubs based on user profile using ML"""
-        # Create user vector
-        user_text = f"{' '.join(user_profile.interests)} {' '.join(user_profile.skills)} {' '.join(user_profile.preferred_activities)}"
-        user_text_vector = self.vectorizer.transform([user_text])
-        
-        # User numerical features
-        time_commitment_score = {"low": 1, "medium": 2, "high": 3}[user_profile.time_commitment]
+    @staticmethod
+    def _profile_text(user_profile: UserProfile) -> str:
+        return f"{' '.join(user_profile.interests)} {' '.join(user_profile.skills)} {' '.join(user_profile.preferred_activities)}"
+
+    @staticmethod
+    def _profile_numeric(user_profile: UserProfile) -> List[float]:
+        time_commitment_score = TIME_COMMITMENT_SCORES.get(user_profile.time_commitment, 2)
         leadership_score = 1 if user_profile.leadership_interest else 0
         year_factor = user_profile.year_of_study / 4.0  # Normalize year
-        
-        user_numerical = self.scaler.transform([[time_commitment_score, leadership_score, year_factor]])
-        
-        # Calculate similarities
-        text_similarities = cosine_similarity(user_text_vector, self.text_features)[0]
-        numerical_similarities = cosine_similarity(user_numerical, self.numerical_features)[0]
-        
-        # Combine similarities (weighted)
-        combined_similarities = 0.7 * text_similarities + 0.3 * numerical_similarities
-        
-        # Get top recommendations
-        top_indices = np.argsort(combined_similarities)[::-1][:top_k]
-        
+        return [time_commitment_score, leadership_score, year_factor]
+
+    def score_batch(self, profiles: List[UserProfile], top_k: int = 5,
+                    chunk_size: int = BATCH_CHUNK_SIZE) -> List[List[Tuple[ClubData, float]]]:
+        """Top-k clubs for many profiles at once.
+
+        Builds a user x term matrix and scores every user against every club
+        with one sparse matrix multiply per chunk (cosine similarity on
+        L2-normalised rows), then selects the top k per row with
+        ``argpartition`` instead of a full sort.
+        """
+        from sklearn.preprocessing import normalize
+
+        self._ensure_index()
+        with self._lock:
+            vectorizer, scaler = self.vectorizer, self.scaler
+            text_features, numerical_features = self.text_features, self.numerical_features
+            clubs = list(self._clubs)
+        if not clubs or not profiles:
+            return [[] for _ in profiles]
+
+        club_text = normalize(text_features).T.tocsc()
+        club_numeric = normalize(numerical_features).T
+        k = min(top_k, len(clubs))
+        results: List[List[Tuple[ClubData, float]]] = []
+        for offset in range(0, len(profiles), chunk_size):
+            chunk = profiles[offset:offset + chunk_size]
+            user_text = normalize(vectorizer.transform([self._profile_text(p) for p in chunk]))
+            user_numeric = normalize(scaler.transform(np.array([self._profile_numeric(p) for p in chunk], dtype=float)))
+
+            # Combine similarities (weighted)
+            scores = 0.7 * (user_text @ club_text).toarray() + 0.3 * (user_numeric @ club_numeric)
+
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            rows = np.arange(len(chunk))[:, None]
+            order = np.argsort(-scores[rows, top], axis=1)
+            top = top[rows, order]
+            for i in range(len(chunk)):
+                results.append([(clubs[j], float(scores[i, j])) for j in top[i]])
+        return results
+
+    def recommend_clubs(self, user_profile: UserProfile, top_k: int = 5, explain: bool = True) -> List[Dict[str, Any]]:
+        """Recommend clubs based on user profile using ML"""
         recommendations = []
-        for idx in top_indices:
-            club = self.clubs_data[idx]
-            similarity_score = combined_similarities[idx]
-            
+        for club, similarity_score in self.score_batch([user_profile], top_k)[0]:
             # Generate explanation using AI
-            explanation = self._generate_explanation(user_profile, club, similarity_score)
+            if explain:
+                explanation = self._generate_explanation(user_profile, club, similarity_score)
+            else:
+                explanation = self._fallback_explanation(user_profile)
             
             recommendations.append({
                 "club": club.dict(),
@@ -201,7 +478,7 @@ class ClubRecommender:
     def _generate_explanation(self, user_profile: UserProfile, club: ClubData, score: float) -> str:
         """Generate AI explanation for why this club is recommended"""
         try:
-            model = genai.GenerativeModel('gemini-pro')
+            model = _gemini_model()
             
             prompt = f"""
             As an AI advisor, explain why {club.name} is recommended for this student:
@@ -233,8 +510,11 @@ class ClubRecommender:
             return response.text.strip()
             
         except Exception as e:
-            # Fallback explanation
-            return f"This club aligns well with your interests in {', '.join(user_profile.interests[:2])} and offers activities that match your preferences."
+            return self._fallback_explanation(user_profile)
+
+    @staticmethod
+    def _fallback_explanation(user_profile: UserProfile) -> str:
+        return f"This club aligns well with your interests in {', '.join(user_profile.interests[:2])} and offers activities that match your preferences."
     
     def _get_match_reasons(self, user_profile: UserProfile, club: ClubData) -> List[str]:
         """Get specific reasons why the club matches"""
@@ -269,10 +549,16 @@ class ClubRecommender:
 # Chatbot for club-related queries
 class ClubChatbot:
     def __init__(self):
-        self.model = genai.GenerativeModel('gemini-pro')
-        self.clubs_data = ClubRecommender()._get_clubs_data()
+        self._model = None
+        self.clubs_data = ClubRecommender._get_clubs_data()
         self.context = self._build_context()
     
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = _gemini_model()
+        return self._model
+
     def _build_context(self) -> str:
         """Build context about all clubs for the chatbot"""
         context = "You are CampusBuddy AI, a helpful assistant for students interested in clubs and committees. Here's information about available clubs:\n\n"
@@ -338,3 +624,180 @@ class ClubChatbot:
 # Global instances
 club_recommender = ClubRecommender()
 club_chatbot = ClubChatbot()
+
+
+# === Precomputed recommendations ===
+
+PRECOMPUTE_TOP_K = 6
+
+
+def ensure_recommendation_table(cursor):
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS club_recommendations_cache (
+          user_id INT NOT NULL,
+          rank_no TINYINT NOT NULL,
+          club_id INT NOT NULL,
+          score DECIMAL(5,2) NOT NULL,
+          reason VARCHAR(255) NULL,
+          computed_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+          PRIMARY KEY (user_id, rank_no)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        """
+    )
+
+
+def _load_student_profiles(cursor) -> List[Tuple[int, UserProfile]]:
+    categories: Dict[int, List[str]] = {}
+    try:
+        cursor.execute("SELECT user_id, category FROM user_interest_categories")
+        for r in cursor.fetchall():
+            categories.setdefault(r["user_id"], []).append(r["category"])
+    except Exception:
+        pass
+    try:
+        cursor.execute("SELECT id, department, semester, interests_json, skills_json FROM users WHERE role = 'student'")
+    except Exception:
+        cursor.execute("SELECT id, department FROM users WHERE role = 'student'")
+    profiles = []
+    for r in cursor.fetchall():
+        try:
+            interests = json.loads(r.get("interests_json") or "[]")
+            skills = json.loads(r.get("skills_json") or "[]")
+        except (TypeError, ValueError):
+            interests, skills = [], []
+        interests = [str(i) for i in list(interests) + categories.get(r["id"], []) if i]
+        semester = r.get("semester")
+        profiles.append((r["id"], UserProfile(
+            interests=interests,
+            skills=[str(s) for s in skills if s],
+            year_of_study=max(1, min(4, (int(semester) + 1) // 2)) if semester else 1,
+            department=r.get("department") or "General",
+            preferred_activities=interests,
+            time_commitment="medium",
+            leadership_interest=False
+        )))
+    return profiles
+
+
+def precompute_recommendations(top_k: int = PRECOMPUTE_TOP_K, batch_size: int = BATCH_CHUNK_SIZE) -> Dict[str, Any]:
+    """Score every student in batches and store their top-k clubs in club_recommendations_cache."""
+    from database import get_mysql_connection
+    started = time.perf_counter()
+    club_recommender.rebuild()
+    connection = get_mysql_connection()
+    cursor = connection.cursor(dictionary=True)
+    try:
+        ensure_recommendation_table(cursor)
+        cursor.execute("SELECT id FROM clubs WHERE is_active = TRUE")
+        active_ids = {str(r["id"]) for r in cursor.fetchall()}
+        profiles = _load_student_profiles(cursor)
+        scoring_s = 0.0
+        rows_written = 0
+        for offset in range(0, len(profiles), batch_size):
+            batch = profiles[offset:offset + batch_size]
+            t0 = time.perf_counter()
+            # Over-fetch so clubs missing from MySQL (e.g. seed fallback) can be dropped
+            scored = club_recommender.score_batch([p for _, p in batch], top_k + 4, chunk_size=batch_size)
+            scoring_s += time.perf_counter() - t0
+            rows = []
+            for (user_id, profile), matches in zip(batch, scored):
+                matches = [(c, score) for c, score in matches if c.id in active_ids][:top_k]
+                for rank, (club, score) in enumerate(matches, start=1):
+                    reasons = club_recommender._get_match_reasons(profile, club)
+                    reason = reasons[0] if reasons else f"{club.category} club matching your profile"
+                    rows.append((user_id, rank, int(club.id), round(score * 100, 2), f"{club.name} - {reason}"[:255]))
+            cursor.execute(
+                f"DELETE FROM club_recommendations_cache WHERE user_id IN ({', '.join(['%s'] * len(batch))})",
+                tuple(user_id for user_id, _ in batch)
+            )
+            if rows:
+                cursor.executemany(
+                    """
+                    INSERT INTO club_recommendations_cache (user_id, rank_no, club_id, score, reason)
+                    VALUES (%s, %s, %s, %s, %s)
+                    """,
+                    rows
+                )
+            connection.commit()
+            rows_written += len(rows)
+    finally:
+        cursor.close()
+        connection.close()
+    elapsed = time.perf_counter() - started
+    logger.info(f"Precomputed club recommendations for {len(profiles)} students in {elapsed:.2f}s")
+    return {
+        "students": len(profiles),
+        "rows_written": rows_written,
+        "scoring_seconds": round(scoring_s, 3),
+        "total_seconds": round(elapsed, 3),
+    }
+
+
+def benchmark(n_clubs: int = 5000, iterations: int = 50) -> Dict[str, Any]:
+    """Time index build, reload and ``recommend_clubs`` on ``n_clubs`` synthetic clubs."""
+    import random
+    rng = random.Random(42)
+    seeds = ClubRecommender._get_clubs_data()
+    vocabulary = sorted({w.lower() for c in seeds for w in (c.description + " " + " ".join(c.activities)).split() if w.isalpha()})
+    clubs = []
+    for i in range(n_clubs):
+        seed = seeds[i % len(seeds)]
+        clubs.append(ClubData(
+            id=str(i + 1),
+            name=f"{seed.name} {i + 1}",
+            description=" ".join(rng.sample(vocabulary, 25)),
+            tags=seed.tags,
+            category=seed.category,
+            member_count=rng.randint(5, 400),
+            activities=rng.sample(vocabulary, 5),
+            time_commitment=rng.choice(list(TIME_COMMITMENT_SCORES)),
+            leadership_opportunities=rng.random() < 0.7
+        ))
+    profile = UserProfile(
+        interests=["programming", "music", "photography"], skills=["python", "design"], year_of_study=2,
+        department="Computer Science", preferred_activities=["workshops", "hackathons"],
+        time_commitment="medium", leadership_interest=True
+    )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "index.pkl")
+        recommender = ClubRecommender(index_path=path, use_database=False)
+        started = time.perf_counter()
+        recommender.rebuild(clubs)
+        build_ms = (time.perf_counter() - started) * 1000
+
+        reloaded = ClubRecommender(index_path=path, use_database=False)
+        started = time.perf_counter()
+        reloaded._ensure_index()
+        load_ms = (time.perf_counter() - started) * 1000
+
+        latencies = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            reloaded.recommend_clubs(profile, top_k=5, explain=False)
+            latencies.append((time.perf_counter() - started) * 1000)
+        latencies.sort()
+
+        batch = [profile] * 1000
+        started = time.perf_counter()
+        reloaded.score_batch(batch, top_k=5)
+        batch_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        reloaded.upsert_club(ClubData(**{**clubs[0].dict(), "description": "robotics drones embedded hardware"}))
+        upsert_ms = (time.perf_counter() - started) * 1000
+
+    return {
+        "clubs": n_clubs,
+        "build_ms": round(build_ms, 2),
+        "load_persisted_ms": round(load_ms, 2),
+        "recommend_p50_ms": round(latencies[len(latencies) // 2], 3),
+        "recommend_p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 3),
+        "batch_1000_users_ms": round(batch_ms, 2),
+        "incremental_upsert_ms": round(upsert_ms, 2),
+    }
+
+
+if __name__ == "__main__":
+    print(benchmark())
@@ -2,12 +2,11 @@
 # Intelligent features for room optimization, smart scheduling, and predictive analytics
 
 import json
-import pandas as pd
-import numpy as np
 from datetime import datetime, timedelta, time
 from typing import List, Dict, Optional, Tuple
 from sqlalchemy import text
 from database import get_db_connection
+from ai_telemetry import activity_writer, prediction_writer
 import logging
 from dataclasses import dataclass
 from enum import Enum
@@ -45,12 +44,19 @@ class AIScheduleOptimization:
 
 class CampusAIService:
     def __init__(self):
-        self.db = get_db_connection()
+        self._db = None
         self.model_versions = {
             'room_demand': 'v2.1',
             'schedule_optimizer': 'v1.8',
             'menu_recommender': 'v3.2'
         }
+
+    @property
+    def db(self):
+        # Connect on first use rather than at import time
+        if self._db is None:
+            self._db = get_db_connection()
+        return self._db
     
     # ==========================================
     # SMART ROOM SUGGESTIONS
@@ -285,52 +291,21 @@ class CampusAIService:
     def predict_canteen_demand(self, date: str) -> Dict:
         """Predict canteen order patterns for specific date"""
         try:
-            query = text("""
-                SELECT 
-                    cmi.id, cmi.name, cmi.category,
-                    COUNT(coi.id) as historical_orders,
-                    AVG(coi.quantity) as avg_quantity,
-                    HOUR(co.order_date) as peak_hour
-                FROM canteen_menu_items cmi
-                LEFT JOIN canteen_order_items coi ON cmi.id = coi.menu_item_id
-                LEFT JOIN canteen_orders co ON coi.order_id = co.id
-                    AND DAYOFWEEK(co.order_date) = DAYOFWEEK(:date)
-                    AND co.order_date >= DATE_SUB(:date, INTERVAL 8 WEEK)
-                    AND co.order_status IN ('completed', 'ready')
-                WHERE cmi.is_available = TRUE
-                GROUP BY cmi.id
-                ORDER BY historical_orders DESC
-                LIMIT 20
-            """)
+            # Seasonal per-item/per-hour model; numpy is only imported when a forecast is asked for
+            from canteen_forecast import forecast_service
             
-            result = self.db.execute(query, {'date': date}).fetchall()
-            
-            predictions = []
-            for row in result:
-                predicted_orders = max(1, int(row.historical_orders * 0.85))
-                confidence = min(0.90, row.historical_orders / 50)
-                
-                predictions.append({
-                    'item_id': row.id,
-                    'item_name': row.name,
-                    'category': row.category,
-                    'predicted_orders': predicted_orders,
-                    'avg_quantity': round(row.avg_quantity or 1, 1),
-                    'peak_hour': row.peak_hour or 12,
-                    'confidence': round(confidence, 3),
-                    'popularity': 'High' if predicted_orders > 15 else 'Medium' if predicted_orders > 5 else 'Low'
-                })
+            cursor = self.db.cursor(dictionary=True)
+            try:
+                forecast = forecast_service.forecast(cursor, datetime.strptime(date, "%Y-%m-%d").date())
+            finally:
+                cursor.close()
             
-            # Store predictions
-            for pred in predictions:
-                self._store_prediction('canteen_orders', 'menu_item', pred['item_id'], pred, pred['confidence'], date)
+            # Cached forecasts were stored when they were first computed
+            if not forecast.pop('cached'):
+                for pred in forecast['predictions']:
+                    self._store_prediction('canteen_orders', 'menu_item', pred['item_id'], pred, pred['confidence'], date)
             
-            return {
-                'date': date,
-                'predictions': predictions,
-                'peak_hours': [12, 13, 14],  # Common lunch hours
-                'total_predicted_orders': sum(p['predicted_orders'] for p in predictions)
-            }
+            return forecast
             
         except Exception as e:
             logger.error(f"Error predicting canteen demand: {str(e)}")
@@ -586,81 +561,42 @@ class CampusAIService:
     # ==========================================
     
     def _store_prediction(self, pred_type: str, entity_type: str, entity_id: int, data: Dict, confidence: float, date: str):
-        """Store AI prediction in database"""
+        """Queue an AI prediction for the buffered ai_predictions writer"""
         try:
-            query = text("""
-                INSERT INTO ai_predictions (
-                    prediction_type, target_entity_type, target_entity_id, 
-                    prediction_data, confidence_score, prediction_date
-                ) VALUES (
-                    :pred_type, :entity_type, :entity_id, :data, :confidence, :date
-                )
-            """)
-            
-            self.db.execute(query, {
-                'pred_type': pred_type,
-                'entity_type': entity_type,
-                'entity_id': entity_id,
-                'data': json.dumps(data),
-                'confidence': confidence,
-                'date': date
-            })
-            self.db.commit()
-            
+            prediction_writer.add((pred_type, entity_type, entity_id, json.dumps(data), confidence, date))
         except Exception as e:
             logger.error(f"Error storing prediction: {str(e)}")
     
     def _log_ai_activity(self, activity_type: str, user_id: int, data: Dict):
-        """Log AI activity for learning and improvement"""
+        """Queue AI activity for the buffered ai_learning_data writer"""
         try:
-            query = text("""
-                INSERT INTO ai_learning_data (
-                    data_type, source_table, source_id, feature_vector, model_version
-                ) VALUES (
-                    :activity_type, 'ai_activity', :user_id, :data, :version
-                )
-            """)
-            
-            self.db.execute(query, {
-                'activity_type': activity_type,
-                'user_id': user_id,
-                'data': json.dumps(data),
-                'version': self.model_versions.get(activity_type, 'v1.0')
-            })
-            self.db.commit()
-            
+            activity_writer.add((
+                activity_type, 'ai_activity', user_id, json.dumps(data),
+                self.model_versions.get(activity_type, 'v1.0')
+            ))
         except Exception as e:
             logger.error(f"Error logging AI activity: {str(e)}")
     
-    def update_room_patterns(self):
-        """Update room utilization patterns based on recent data"""
+    def update_room_patterns(self) -> Dict:
+        """Fold room bookings changed since the last run into ai_room_patterns"""
         try:
-            self.db.execute(text("CALL UpdateRoomPatterns()"))
-            self.db.commit()
-            logger.info("Room patterns updated successfully")
+            # Incremental pipeline with its own connection; replaces CALL UpdateRoomPatterns()
+            from room_patterns import room_pattern_pipeline
+            
+            return room_pattern_pipeline.run()
         except Exception as e:
             logger.error(f"Error updating room patterns: {str(e)}")
+            return {'status': 'error', 'error': str(e)}
     
     def get_ai_insights_dashboard(self) -> Dict:
-        """Get comprehensive AI insights for dashboard"""
-        try:
-            insights = {
-                'room_utilization': self._get_room_utilization_insights(),
-                'popular_times': self._get_popular_times_insights(),
-                'conflict_summary': self._get_conflict_summary(),
-                'prediction_accuracy': self._get_prediction_accuracy(),
-                'user_engagement': self._get_user_engagement_metrics()
-            }
-            
-            return insights
-            
-        except Exception as e:
-            logger.error(f"Error generating AI insights: {str(e)}")
-            return {'error': str(e)}
+        """Get comprehensive AI insights for dashboard, served from the precomputed snapshot"""
+        from ai_insights import insights_cache
+
+        return insights_cache.snapshot()
     
-    def _get_room_utilization_insights(self) -> Dict:
+    def _get_room_utilization_insights(self, cursor) -> Dict:
         """Get room utilization insights"""
-        query = text("""
+        cursor.execute("""
             SELECT 
                 AVG(utilization_score) as avg_utilization,
                 MAX(utilization_score) as max_utilization,
@@ -669,17 +605,17 @@ class CampusAIService:
             FROM ai_room_patterns
         """)
         
-        result = self.db.execute(query).fetchone()
+        result = cursor.fetchone()
         
         return {
-            'average_utilization': round(result.avg_utilization or 0, 2),
-            'peak_utilization': round(result.max_utilization or 0, 2),
-            'high_demand_percentage': round((result.high_demand_slots / result.total_slots) * 100, 2) if result.total_slots > 0 else 0
+            'average_utilization': round(float(result['avg_utilization'] or 0), 2),
+            'peak_utilization': round(float(result['max_utilization'] or 0), 2),
+            'high_demand_percentage': round((result['high_demand_slots'] / result['total_slots']) * 100, 2) if result['total_slots'] > 0 else 0
         }
     
-    def _get_popular_times_insights(self) -> Dict:
+    def _get_popular_times_insights(self, cursor) -> Dict:
         """Get popular time insights"""
-        query = text("""
+        cursor.execute("""
             SELECT 
                 hour_of_day,
                 AVG(utilization_score) as avg_utilization,
@@ -690,15 +626,15 @@ class CampusAIService:
             LIMIT 5
         """)
         
-        result = self.db.execute(query).fetchall()
+        result = cursor.fetchall()
         
         return {
-            'peak_hours': [{'hour': row.hour_of_day, 'utilization': round(row.avg_utilization, 2)} for row in result]
+            'peak_hours': [{'hour': row['hour_of_day'], 'utilization': round(float(row['avg_utilization'] or 0), 2)} for row in result]
         }
     
-    def _get_conflict_summary(self) -> Dict:
+    def _get_conflict_summary(self, cursor) -> Dict:
         """Get conflict summary"""
-        query = text("""
+        cursor.execute("""
             SELECT 
                 conflict_type,
                 COUNT(*) as count,
@@ -708,21 +644,21 @@ class CampusAIService:
             GROUP BY conflict_type
         """)
         
-        result = self.db.execute(query).fetchall()
+        result = cursor.fetchall()
         
         return {
             'conflicts_by_type': [
                 {
-                    'type': row.conflict_type,
-                    'count': row.count,
-                    'resolution_rate': round(row.resolution_rate * 100, 2)
+                    'type': row['conflict_type'],
+                    'count': row['count'],
+                    'resolution_rate': round(float(row['resolution_rate'] or 0) * 100, 2)
                 } for row in result
             ]
         }
     
-    def _get_prediction_accuracy(self) -> Dict:
+    def _get_prediction_accuracy(self, cursor) -> Dict:
         """Get prediction accuracy metrics"""
-        query = text("""
+        cursor.execute("""
             SELECT 
                 prediction_type,
                 AVG(accuracy_score) as avg_accuracy,
@@ -733,21 +669,21 @@ class CampusAIService:
             GROUP BY prediction_type
         """)
         
-        result = self.db.execute(query).fetchall()
+        result = cursor.fetchall()
         
         return {
             'accuracy_by_type': [
                 {
-                    'type': row.prediction_type,
-                    'accuracy': round(row.avg_accuracy * 100, 2),
-                    'sample_size': row.prediction_count
+                    'type': row['prediction_type'],
+                    'accuracy': round(float(row['avg_accuracy'] or 0) * 100, 2),
+                    'sample_size': row['prediction_count']
                 } for row in result
             ]
         }
     
-    def _get_user_engagement_metrics(self) -> Dict:
+    def _get_user_engagement_metrics(self, cursor) -> Dict:
         """Get user engagement with AI features"""
-        query = text("""
+        cursor.execute("""
             SELECT 
                 suggestion_type,
                 COUNT(*) as total_suggestions,
@@ -758,15 +694,15 @@ class CampusAIService:
             GROUP BY suggestion_type
         """)
         
-        result = self.db.execute(query).fetchall()
+        result = cursor.fetchall()
         
         return {
             'engagement_by_type': [
                 {
-                    'type': row.suggestion_type,
-                    'acceptance_rate': round((row.accepted_count / row.total_suggestions) * 100, 2) if row.total_suggestions > 0 else 0,
-                    'avg_relevance': round(row.avg_relevance, 2),
-                    'total_suggestions': row.total_suggestions
+                    'type': row['suggestion_type'],
+                    'acceptance_rate': round((float(row['accepted_count'] or 0) / row['total_suggestions']) * 100, 2) if row['total_suggestions'] > 0 else 0,
+                    'avg_relevance': round(float(row['avg_relevance'] or 0), 2),
+                    'total_suggestions': row['total_suggestions']
                 } for row in result
             ]
         }
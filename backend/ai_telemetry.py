@@ -0,0 +1,291 @@
+"""Buffered multi-row writer for AI predictions and activity telemetry.
+
+``CampusAIService._store_prediction`` and ``_log_ai_activity`` used to run
+one INSERT and one COMMIT per row on the request path. A forecast of 20
+items meant 20 commits. Rows are now appended to an in-memory buffer per
+table. A background thread writes the buffer with one multi-row
+``executemany`` whenever it holds ``BATCH_ROWS`` rows, or at the latest
+every ``FLUSH_INTERVAL_SECONDS``.
+
+Load shedding: a buffer never holds more than ``MAX_PENDING_ROWS``. When
+it is full, ``add`` drops the row at once and counts it; callers are never
+slowed down. It is called on the event loop, and telemetry must never
+stall or take down a request. Buffers are flushed on shutdown
+(``flush_all`` from the app's shutdown hook, and ``atexit`` as a backstop).
+
+Rows from a failed flush are kept, and the flusher backs off exponentially
+(up to ``MAX_RETRY_DELAY_SECONDS``) before trying again. After
+``MAX_FLUSH_ATTEMPTS`` failures in a row the batch is written by halves
+instead, so a row the table rejects cannot hold up the rest of the
+buffer: it is logged, counted as ``rejected`` and discarded.
+"""
+
+from __future__ import annotations
+
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+LOGGER = logging.getLogger(__name__)
+
+BATCH_ROWS = int(os.getenv("AI_TELEMETRY_BATCH_ROWS", "200"))
+FLUSH_INTERVAL_SECONDS = float(os.getenv("AI_TELEMETRY_FLUSH_SECONDS", "2"))
+MAX_PENDING_ROWS = int(os.getenv("AI_TELEMETRY_MAX_PENDING", "10000"))
+MAX_RETRY_DELAY_SECONDS = float(os.getenv("AI_TELEMETRY_MAX_RETRY_SECONDS", "60"))
+MAX_FLUSH_ATTEMPTS = int(os.getenv("AI_TELEMETRY_MAX_FLUSH_ATTEMPTS", "5"))
+
+
+def _default_connect():
+    from database import get_mysql_connection
+
+    return get_mysql_connection()
+
+
+class BufferedWriter:
+    def __init__(self, table: str, columns: Sequence[str], connect: Callable = _default_connect):
+        self.table = table
+        self.columns = tuple(columns)
+        self._connect = connect
+        self._sql = (
+            f"INSERT INTO {table} ({', '.join(self.columns)}) "
+            f"VALUES ({', '.join(['%s'] * len(self.columns))})"
+        )
+        self._rows: Deque[Tuple] = deque()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self.written = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.failures = 0
+        self.rejected = 0
+        self._attempts = 0
+        self._retry_at = 0.0
+        self._retry_delay = 0.0
+
+    def add(self, row: Tuple) -> bool:
+        """Queue one row; False if it was dropped because the buffer is full. Never blocks."""
+        with self._cond:
+            if len(self._rows) >= MAX_PENDING_ROWS:
+                self.dropped += 1
+                if self.dropped % 1000 == 1:
+                    LOGGER.warning("%s buffer full; %s rows dropped so far", self.table, self.dropped)
+                return False
+            self._rows.append(row)
+            if len(self._rows) >= BATCH_ROWS:
+                self._cond.notify_all()
+        self._ensure_thread()
+        return True
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._cond:
+            if self._closed or (self._thread is not None and self._thread.is_alive()):
+                return
+            self._thread = threading.Thread(target=self._run, name=f"telemetry-{self.table}", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                backoff = self._retry_at - time.monotonic()
+                if backoff > 0 and not self._closed:
+                    # The last flush failed; a full buffer must not turn this into a busy loop
+                    self._cond.wait(backoff)
+                    continue
+                if len(self._rows) < BATCH_ROWS and not self._closed:
+                    self._cond.wait(FLUSH_INTERVAL_SECONDS)
+                if self._closed and not self._rows:
+                    return
+            if self.flush() == 0 and self._closed:
+                return
+
+    def _take(self) -> List[Tuple]:
+        with self._cond:
+            batch = [self._rows.popleft() for _ in range(min(len(self._rows), BATCH_ROWS))]
+            self._cond.notify_all()
+            return batch
+
+    def _write(self, batch: List[Tuple]) -> int:
+        connection = self._connect()
+        cursor = connection.cursor()
+        try:
+            cursor.executemany(self._sql, batch)
+            connection.commit()
+        finally:
+            cursor.close()
+            connection.close()
+        return len(batch)
+
+    def _write_isolating(self, batch: List[Tuple]) -> int:
+        """Write ``batch`` by halves on one connection, discarding the rows that fail on their own."""
+        connection = self._connect()
+        cursor = connection.cursor()
+        written = 0
+        try:
+            pending = [batch]
+            while pending:
+                rows = pending.pop()
+                try:
+                    cursor.executemany(self._sql, rows)
+                    connection.commit()
+                    written += len(rows)
+                except Exception as e:
+                    if len(rows) > 1:
+                        mid = len(rows) // 2
+                        pending.extend((rows[mid:], rows[:mid]))
+                        continue
+                    self.rejected += 1
+                    LOGGER.error("Discarding %s row after %s failed flushes: %r (%s)",
+                                 self.table, MAX_FLUSH_ATTEMPTS, rows[0], e)
+        finally:
+            cursor.close()
+            connection.close()
+        return written
+
+    def flush(self) -> int:
+        """Write everything buffered so far; returns rows written."""
+        written = 0
+        while True:
+            batch = self._take()
+            if not batch:
+                return written
+            try:
+                if self._attempts + 1 >= MAX_FLUSH_ATTEMPTS:
+                    # Retrying as a whole keeps failing; find and drop the rows at fault
+                    count = self._write_isolating(batch)
+                else:
+                    count = self._write(batch)
+            except Exception as e:
+                self.failures += 1
+                self._attempts += 1
+                with self._cond:
+                    self._retry_delay = min(MAX_RETRY_DELAY_SECONDS, max(FLUSH_INTERVAL_SECONDS, self._retry_delay * 2))
+                    self._retry_at = time.monotonic() + self._retry_delay
+                LOGGER.error("Flushing %s rows to %s failed (retrying in %.0fs): %s",
+                             len(batch), self.table, self._retry_delay, e)
+                with self._cond:
+                    # Keep the batch for the next attempt, without overrunning the cap
+                    room = MAX_PENDING_ROWS - len(self._rows)
+                    self.dropped += max(0, len(batch) - room)
+                    self._rows.extendleft(reversed(batch[:max(0, room)]))
+                return written
+            written += count
+            self.written += count
+            self.flushes += 1
+            self._attempts = 0
+            self._retry_delay = 0.0
+            self._retry_at = 0.0
+
+    def close(self) -> int:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        return self.flush()
+
+    def stats(self) -> Dict:
+        with self._cond:
+            pending = len(self._rows)
+        return {"table": self.table, "pending": pending, "written": self.written, "flushes": self.flushes,
+                "dropped": self.dropped, "failures": self.failures, "rejected": self.rejected}
+
+
+prediction_writer = BufferedWriter(
+    "ai_predictions",
+    ("prediction_type", "target_entity_type", "target_entity_id", "prediction_data", "confidence_score", "prediction_date"),
+)
+activity_writer = BufferedWriter(
+    "ai_learning_data",
+    ("data_type", "source_table", "source_id", "feature_vector", "model_version"),
+)
+WRITERS = (prediction_writer, activity_writer)
+
+
+def flush_all() -> Dict[str, int]:
+    return {writer.table: writer.flush() for writer in WRITERS}
+
+
+def _close_all() -> None:
+    for writer in WRITERS:
+        try:
+            writer.close()
+        except Exception as e:
+            LOGGER.error("Final flush of %s failed: %s", writer.table, e)
+
+
+atexit.register(_close_all)
+
+
+class _FakeConnection:
+    def __init__(self, rtt: float, counter: Dict, poison: Optional[Tuple] = None):
+        self.rtt = rtt
+        self.counter = counter
+        self.poison = poison
+
+    def cursor(self):
+        return self
+
+    def _trip(self):
+        self.counter["round_trips"] += 1
+        time.sleep(self.rtt)
+
+    def execute(self, sql, params=()):
+        self._trip()
+
+    def executemany(self, sql, rows):
+        self._trip()
+        if self.poison in rows:
+            raise ValueError("Incorrect integer value")
+
+    def commit(self):
+        self._trip()
+
+    def close(self):
+        pass
+
+
+def benchmark(rows: int = 2000, rtt_ms: float = 0.5) -> Dict:
+    """Row-at-a-time INSERT+COMMIT versus the buffered writer, with a fake connection of fixed RTT."""
+    rtt = rtt_ms / 1000
+    naive = {"round_trips": 0}
+    connection = _FakeConnection(rtt, naive)
+    t0 = time.perf_counter()
+    for i in range(rows):
+        connection.execute("INSERT ...", (i,))
+        connection.commit()
+    naive_s = time.perf_counter() - t0
+
+    buffered = {"round_trips": 0}
+    writer = BufferedWriter("ai_predictions", ("a",), connect=lambda: _FakeConnection(rtt, buffered))
+    t0 = time.perf_counter()
+    for i in range(rows):
+        writer.add((i,))
+    request_path_s = time.perf_counter() - t0
+    writer.close()
+
+    # One row the table rejects: after MAX_FLUSH_ATTEMPTS the rest of its batch still lands
+    poisoned = BufferedWriter("ai_predictions", ("a",), connect=lambda: _FakeConnection(0, {"round_trips": 0}, ("bad",)))
+    for i in range(BATCH_ROWS):
+        poisoned._rows.append(("bad",) if i == BATCH_ROWS // 3 else (i,))
+    for _ in range(MAX_FLUSH_ATTEMPTS):
+        poisoned.flush()
+    return {
+        "rows": rows,
+        "row_at_a_time_round_trips": naive["round_trips"],
+        "row_at_a_time_request_ms": round(naive_s * 1000, 1),
+        "buffered_round_trips": buffered["round_trips"],
+        "buffered_request_path_ms": round(request_path_s * 1000, 2),
+        "written": writer.written,
+        "dropped": writer.dropped,
+        "poisoned_batch_written": poisoned.written,
+        "poisoned_batch_rejected": poisoned.rejected,
+    }
+
+
+if __name__ == "__main__":
+    print(benchmark())
@@ -0,0 +1,164 @@
+"""Content-addressed local file store for uploaded assets.
+
+Files are stored once under ``ASSET_STORE_DIR/<sha[:2]>/<sha>`` keyed by the
+SHA-256 of their bytes, so re-uploading the same PDF or image never writes a
+second copy. MySQL keeps metadata (hash, size, mime type) and a per-hash
+cache of OCR parse results so identical uploads skip OCR entirely.
+
+Unless ``ASSET_STORE_DURABLE`` says the directory survives redeploys (a
+mounted persistent disk), the bytes are also kept in MySQL. Container disks
+such as Render's are wiped on every deploy, and the store is then only a
+cache in front of the database copy.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from typing import Dict, List, Optional, Tuple
+
+LOGGER = logging.getLogger(__name__)
+
+ASSET_STORE_DIR = os.getenv(
+    "ASSET_STORE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "uploads", "assets"),
+)
+ASSET_STORE_DURABLE = os.getenv("ASSET_STORE_DURABLE", "").lower() in ("1", "true", "yes")
+
+
+def content_hash(data: bytes) -> str:
+    """Return the hex SHA-256 digest used as the asset key."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def asset_path(sha: str) -> str:
+    """Filesystem path for a content hash (fanned out by the first two hex chars)."""
+    return os.path.join(ASSET_STORE_DIR, sha[:2], sha)
+
+
+def has_asset(sha: str) -> bool:
+    return bool(sha) and os.path.isfile(asset_path(sha))
+
+
+def store_bytes(data: bytes) -> str:
+    """Persist ``data`` if not already present and return its content hash.
+
+    Writes go to a temp file in the target directory and are renamed into
+    place, so concurrent uploads of the same file never expose a partial copy.
+    """
+    sha = content_hash(data)
+    path = asset_path(sha)
+    if os.path.isfile(path):
+        return sha
+
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".upload-")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    LOGGER.info("Stored asset %s (%d bytes)", sha, len(data))
+    return sha
+
+
+def read_bytes(sha: str) -> bytes:
+    with open(asset_path(sha), "rb") as fh:
+        return fh.read()
+
+
+# === Streaming helpers ===
+
+STREAM_CHUNK_SIZE = 256 * 1024
+
+
+def parse_byte_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single ``Range: bytes=...`` header into an inclusive ``(start, end)``.
+
+    Returns None when there is no usable range (absent, malformed or
+    multi-range), in which case the full body should be sent. Raises
+    ValueError when the range cannot be satisfied for ``size`` bytes.
+    """
+    if not header or not header.strip().lower().startswith("bytes="):
+        return None
+    spec = header.split("=", 1)[1].strip()
+    if "," in spec or "-" not in spec:
+        return None
+    first, last = (part.strip() for part in spec.split("-", 1))
+    if not (first.isdigit() or first == "") or not (last.isdigit() or last == "") or first == last == "":
+        return None
+    if first == "":
+        # Suffix range: last N bytes
+        start, end = max(0, size - int(last)), size - 1
+        if int(last) == 0:
+            raise ValueError("empty suffix range")
+    else:
+        start = int(first)
+        end = int(last) if last else size - 1
+        if end < start:
+            return None
+    end = min(end, size - 1)
+    if start >= size:
+        raise ValueError(f"range {header!r} not satisfiable for {size} bytes")
+    return start, end
+
+
+# === Parse result cache (MySQL) ===
+
+def ensure_parse_cache_table(cursor) -> None:
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS asset_parse_cache (
+          content_hash CHAR(64) NOT NULL,
+          kind VARCHAR(32) NOT NULL,
+          result LONGTEXT NOT NULL,
+          tier VARCHAR(20) NULL,
+          confidence DECIMAL(5,4) NULL,
+          created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+          PRIMARY KEY (content_hash, kind)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        """
+    )
+
+
+def get_cached_parse(cursor, sha: str, kind: str) -> Optional[Dict]:
+    """Return ``{"rows", "tier", "confidence"}`` for a previously parsed upload, if any."""
+    cursor.execute(
+        "SELECT result, tier, confidence FROM asset_parse_cache WHERE content_hash = %s AND kind = %s",
+        (sha, kind),
+    )
+    row = cursor.fetchone()
+    if not row:
+        return None
+    if not isinstance(row, dict):
+        row = dict(zip(("result", "tier", "confidence"), row))
+    try:
+        rows = json.loads(row["result"])
+    except (TypeError, ValueError):
+        return None
+    return {
+        "rows": rows,
+        "tier": row.get("tier"),
+        "confidence": float(row["confidence"]) if row.get("confidence") is not None else None,
+    }
+
+
+def store_cached_parse(cursor, sha: str, kind: str, rows: List[Dict], tier: str, confidence: float) -> None:
+    cursor.execute(
+        """
+        INSERT INTO asset_parse_cache (content_hash, kind, result, tier, confidence)
+        VALUES (%s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE result = VALUES(result), tier = VALUES(tier),
+                                confidence = VALUES(confidence), created_at = CURRENT_TIMESTAMP
+        """,
+        (sha, kind, json.dumps(rows, default=str), tier, confidence),
+    )
@@ -0,0 +1,388 @@
+"""Typeahead autocomplete for users, rooms, clubs and campus places.
+
+Every (kind, college, group) partition is a sorted array of ``(key, id)``
+pairs. The keys are the normalised label plus each of its word suffixes, so
+"sha" finds "Priya Sharma", along with a few extra terms such as a room
+number. A prefix query bisects to the first key >= prefix and scans forward
+while keys still match. When no group filter is given, the group
+partitions (user role, room type) are merged lazily. Writes re-read one row
+and re-insert its keys with ``insort``. A kind is reloaded wholesale when
+it is older than ``AUTOCOMPLETE_MAX_AGE_SECONDS`` or has been invalidated
+after a bulk import. Rooms have no write path in the API (they are edited
+in the database directly), so they reload on the much shorter
+``AUTOCOMPLETE_ROOMS_MAX_AGE_SECONDS``; the table is small.
+
+Users and clubs are partitioned by ``college_id`` and only ever served to
+callers of that college. Rooms and navigation nodes carry no college and
+live in the shared ``None`` partition.
+"""
+
+from __future__ import annotations
+
+import heapq
+import logging
+import os
+import random
+import re
+import statistics
+import threading
+import time
+from bisect import bisect_left, insort
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+LOGGER = logging.getLogger(__name__)
+
+KINDS = ("users", "rooms", "clubs", "places")
+
+MAX_AGE_SECONDS = float(os.getenv("AUTOCOMPLETE_MAX_AGE_SECONDS", str(6 * 3600)))
+ROOMS_MAX_AGE_SECONDS = float(os.getenv("AUTOCOMPLETE_ROOMS_MAX_AGE_SECONDS", "300"))
+MAX_LIMIT = 50
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_ROOM_CODE_RE = re.compile(r"([A-Z]+)(\d{3})")
+
+ItemId = Union[int, str]
+PartitionKey = Tuple[str, Optional[int], Optional[str]]
+
+
+def normalize(text: Optional[str]) -> str:
+    return " ".join(_WORD_RE.findall((text or "").lower()))
+
+
+def _keys_for(label: str, extra: Iterable[Optional[str]] = ()) -> List[str]:
+    words = normalize(label).split()
+    keys = {" ".join(words[i:]) for i in range(len(words))}
+    keys.update(k for k in (normalize(e) for e in extra) if k)
+    return sorted(keys)
+
+
+@dataclass
+class Suggestion:
+    kind: str
+    id: ItemId
+    label: str
+    college_id: Optional[int] = None
+    group: Optional[str] = None  # user role / room type, filterable
+    extra: Tuple[str, ...] = ()  # additional searchable terms
+    payload: Dict = field(default_factory=dict)
+
+    def to_dict(self) -> Dict:
+        return {"kind": self.kind, "id": self.id, "label": self.label, **self.payload}
+
+
+class _SortedPartition:
+    """Sorted ``(key, id)`` array answering prefix scans with one bisect."""
+
+    __slots__ = ("entries",)
+
+    def __init__(self, entries: Optional[List[Tuple[str, ItemId]]] = None):
+        self.entries: List[Tuple[str, ItemId]] = entries or []
+
+    def insert(self, key: str, item_id: ItemId) -> None:
+        insort(self.entries, (key, item_id))
+
+    def delete(self, key: str, item_id: ItemId) -> None:
+        i = bisect_left(self.entries, (key, item_id))
+        if i < len(self.entries) and self.entries[i] == (key, item_id):
+            del self.entries[i]
+
+    def scan(self, prefix: str) -> Iterator[Tuple[str, ItemId]]:
+        entries = self.entries
+        i = bisect_left(entries, (prefix,))
+        while i < len(entries) and entries[i][0].startswith(prefix):
+            yield entries[i]
+            i += 1
+
+
+# === Sources ===
+
+def _user_item(r: Dict) -> Suggestion:
+    return Suggestion(
+        kind="users",
+        id=r["id"],
+        label=r.get("full_name") or r.get("username") or "",
+        college_id=r.get("college_id"),
+        group=r.get("role"),
+        extra=(r.get("username"), (r.get("email") or "").split("@")[0]),
+        payload={k: r.get(k) for k in ("full_name", "email", "role", "department", "course", "semester")},
+    )
+
+
+def _club_item(r: Dict) -> Suggestion:
+    return Suggestion(
+        kind="clubs",
+        id=r["id"],
+        label=r.get("name") or "",
+        college_id=r.get("college_id"),
+        group=r.get("category"),
+        payload={"category": r.get("category")},
+    )
+
+
+def _room_item(r: Dict) -> Suggestion:
+    # rooms come from two schemas: (room_number, room_name, building) and (name)
+    number = r.get("room_number")
+    label = r.get("room_name") or r.get("name") or number or ""
+    return Suggestion(
+        kind="rooms",
+        id=r["id"],
+        label=label if not number or number in label else f"{number} {label}",
+        group=r.get("room_type"),
+        extra=(number, r.get("building")),
+        payload={k: r.get(k) for k in ("room_number", "building", "room_type", "capacity") if k in r},
+    )
+
+
+_SOURCES: Dict[str, Tuple[str, Callable[[Dict], Suggestion]]] = {
+    "users": (
+        "SELECT id, college_id, full_name, username, email, role, department, course, semester "
+        "FROM users WHERE is_active = TRUE",
+        _user_item,
+    ),
+    "clubs": ("SELECT id, college_id, name, category FROM clubs WHERE is_active = TRUE", _club_item),
+    "rooms": ("SELECT * FROM rooms WHERE is_available = 1", _room_item),
+}
+
+
+def _place_items() -> List[Suggestion]:
+    """Navigation graph nodes and the room codes the route planner resolves."""
+    from navigation import route_table
+
+    items = [Suggestion(kind="places", id=node, label=node, payload={"node": node}) for node in route_table.nodes]
+    node_keys = {normalize(node) for node in route_table.nodes}
+    for code, node in route_table.lookup.items():
+        # The lookup also holds upper-cased node names and unpadded codes (C10); index
+        # only the canonical C010 form and make the unpadded one an extra term
+        match = _ROOM_CODE_RE.fullmatch(code)
+        if not match or normalize(code) in node_keys:
+            continue
+        items.append(Suggestion(
+            kind="places", id=code, label=code,
+            extra=(f"{match.group(1)}{int(match.group(2))}",), payload={"node": node},
+        ))
+    return items
+
+
+class AutocompleteService:
+    """In-memory prefix index shared by the typeahead endpoints."""
+
+    def __init__(self):
+        self._partitions: Dict[PartitionKey, _SortedPartition] = {}
+        self._items: Dict[Tuple[str, ItemId], Tuple[Suggestion, List[str]]] = {}
+        self._loaded_at: Dict[str, float] = {}
+        self._lock = threading.RLock()
+
+    # --- loading ---
+
+    def _ensure_loaded(self, cursor, kinds: Iterable[str]) -> None:
+        for kind in kinds:
+            max_age = ROOMS_MAX_AGE_SECONDS if kind == "rooms" else MAX_AGE_SECONDS
+            loaded_at = self._loaded_at.get(kind)
+            if loaded_at and time.time() - loaded_at < max_age:
+                continue
+            with self._lock:
+                loaded_at = self._loaded_at.get(kind)
+                if loaded_at and time.time() - loaded_at < max_age:
+                    continue
+                self.load_kind(cursor, kind)
+
+    def load_kind(self, cursor, kind: str) -> int:
+        started = time.perf_counter()
+        if kind == "places":
+            items = _place_items()
+        else:
+            sql, to_item = _SOURCES[kind]
+            try:
+                cursor.execute(sql)
+                items = [to_item(r) for r in cursor.fetchall()]
+            except Exception as exc:
+                LOGGER.warning("Autocomplete could not load %s: %s", kind, exc)
+                items = []
+        self.load_items(kind, items)
+        LOGGER.info("Autocomplete loaded %d %s in %.1f ms", len(items), kind, (time.perf_counter() - started) * 1000)
+        return len(items)
+
+    def load_items(self, kind: str, items: Iterable[Suggestion]) -> None:
+        """Replace every partition of ``kind``; built aside and swapped in so readers never see a half load."""
+        entries: Dict[PartitionKey, List[Tuple[str, ItemId]]] = {}
+        records = {}
+        for item in items:
+            keys = _keys_for(item.label, item.extra)
+            records[(kind, item.id)] = (item, keys)
+            entries.setdefault((kind, item.college_id, item.group), []).extend((k, item.id) for k in keys)
+        partitions = {pk: _SortedPartition(sorted(e)) for pk, e in entries.items()}
+        with self._lock:
+            for pk in [pk for pk in self._partitions if pk[0] == kind]:
+                del self._partitions[pk]
+            for key in [key for key in self._items if key[0] == kind]:
+                del self._items[key]
+            self._partitions.update(partitions)
+            self._items.update(records)
+            self._loaded_at[kind] = time.time()
+
+    # --- incremental updates ---
+
+    def upsert(self, item: Suggestion) -> None:
+        with self._lock:
+            self.remove(item.kind, item.id)
+            keys = _keys_for(item.label, item.extra)
+            partition = self._partitions.setdefault((item.kind, item.college_id, item.group), _SortedPartition())
+            for key in keys:
+                partition.insert(key, item.id)
+            self._items[(item.kind, item.id)] = (item, keys)
+
+    def remove(self, kind: str, item_id: ItemId) -> None:
+        with self._lock:
+            record = self._items.pop((kind, item_id), None)
+            if not record:
+                return
+            item, keys = record
+            partition = self._partitions.get((kind, item.college_id, item.group))
+            if partition:
+                for key in keys:
+                    partition.delete(key, item_id)
+
+    def touch(self, cursor, kind: str, item_id: Optional[int]) -> None:
+        """Re-read one row after a write. Never fails the surrounding request."""
+        if item_id is None or kind not in self._loaded_at or kind not in _SOURCES:
+            return  # Not loaded yet; the first query loads current data
+        try:
+            sql, to_item = _SOURCES[kind]
+            joiner = " AND " if " WHERE " in sql else " WHERE "
+            cursor.execute(f"{sql}{joiner}id = %s", (item_id,))
+            row = cursor.fetchone()
+            if row:
+                self.upsert(to_item(row))
+            else:
+                self.remove(kind, item_id)
+        except Exception as exc:
+            LOGGER.warning("Autocomplete refresh failed for %s %s: %s", kind, item_id, exc)
+
+    def invalidate(self, kind: str) -> None:
+        """Force a reload of ``kind`` on the next query (after bulk writes)."""
+        self._loaded_at.pop(kind, None)
+
+    # --- queries ---
+
+    def complete(
+        self,
+        cursor,
+        prefix: str,
+        kinds: Sequence[str] = KINDS,
+        college_id: Optional[int] = None,
+        groups: Optional[Dict[str, Optional[str]]] = None,
+        limit: int = 10,
+    ) -> Dict[str, List[Suggestion]]:
+        """Up to ``limit`` suggestions per kind, in key order, for ``prefix``.
+
+        Users only match ``college_id`` exactly and clubs match it or the
+        shared partition, so a caller without a college gets no users and
+        only college-less clubs. ``groups`` maps a kind to the role or room
+        type to filter it by; kinds not in it are unfiltered.
+        """
+        kinds = [k for k in kinds if k in KINDS]
+        self._ensure_loaded(cursor, kinds)
+        needle = normalize(prefix)
+        limit = max(1, min(limit, MAX_LIMIT))
+        groups = groups or {}
+        results: Dict[str, List[Suggestion]] = {}
+        for kind in kinds:
+            group = groups.get(kind)
+            partitions = [
+                p for (k, college, grp), p in list(self._partitions.items())
+                if k == kind
+                and (college == college_id if kind == "users" else college in (None, college_id))
+                and (not group or grp == group)
+            ]
+            if kind == "users" and college_id is None:
+                partitions = []
+            found: List[Suggestion] = []
+            seen = set()
+            for _, item_id in heapq.merge(*(p.scan(needle) for p in partitions)):
+                if item_id in seen:
+                    continue
+                seen.add(item_id)
+                record = self._items.get((kind, item_id))
+                if record:
+                    found.append(record[0])
+                    if len(found) >= limit:
+                        break
+            results[kind] = found
+        return results
+
+    def complete_ids(self, cursor, kind: str, prefix: str, group: Optional[str] = None, **kwargs) -> List[ItemId]:
+        return [s.id for s in self.complete(cursor, prefix, [kind], groups={kind: group}, **kwargs)[kind]]
+
+    def stats(self) -> Dict:
+        return {
+            "items": len(self._items),
+            "partitions": len(self._partitions),
+            "keys": sum(len(p.entries) for p in self._partitions.values()),
+            "loaded": {k: round(time.time() - t, 1) for k, t in self._loaded_at.items()},
+        }
+
+
+autocomplete_service = AutocompleteService()
+
+
+def benchmark(n_users: int = 100_000, n_colleges: int = 20, n_queries: int = 2000) -> Dict:
+    """Build partitions for synthetic users/clubs/rooms and time 1-4 character prefix queries."""
+    rng = random.Random(7)
+    first = ["aarav", "priya", "rohan", "sneha", "vikram", "ananya", "kabir", "isha", "arjun", "meera",
+             "dev", "kavya", "rahul", "pooja", "sahil", "nisha", "aditya", "riya", "karan", "tanvi"]
+    last = ["sharma", "patel", "iyer", "reddy", "gupta", "nair", "singh", "das", "mehta", "joshi",
+            "kulkarni", "rao", "verma", "shah", "pillai", "bose", "chopra", "menon", "jain", "kapoor"]
+    roles = ["student"] * 8 + ["faculty", "admin"]
+    users = [
+        Suggestion("users", i, f"{rng.choice(first)} {rng.choice(last)}", rng.randrange(n_colleges), rng.choice(roles))
+        for i in range(n_users)
+    ]
+    clubs = [Suggestion("clubs", i, f"{rng.choice(last)} {rng.choice(['robotics', 'drama', 'coding', 'music'])} club",
+                        rng.randrange(n_colleges), "tech") for i in range(n_users // 20)]
+    rooms = [Suggestion("rooms", i, f"C{i:03d} classroom", None, "classroom", (f"c{i:03d}", "block a"))
+             for i in range(2000)]
+
+    service = AutocompleteService()
+    started = time.perf_counter()
+    service.load_items("users", users)
+    service.load_items("clubs", clubs)
+    service.load_items("rooms", rooms)
+    build_s = time.perf_counter() - started
+    service._loaded_at["places"] = time.time()
+
+    words = first + last
+    timings = []
+    for _ in range(n_queries):
+        prefix = rng.choice(words)[: rng.randint(1, 4)]
+        t0 = time.perf_counter()
+        service.complete(None, prefix, ("users", "clubs", "rooms"), college_id=rng.randrange(n_colleges), limit=10)
+        timings.append((time.perf_counter() - t0) * 1000)
+    role_timings = []
+    for _ in range(n_queries):
+        t0 = time.perf_counter()
+        service.complete(None, rng.choice(words)[:2], ("users",), college_id=rng.randrange(n_colleges),
+                         groups={"users": "faculty"}, limit=50)
+        role_timings.append((time.perf_counter() - t0) * 1000)
+    upserts = []
+    for i in range(500):
+        t0 = time.perf_counter()
+        service.upsert(Suggestion("users", n_users + i, f"{rng.choice(first)} {rng.choice(last)}", 0, "student"))
+        upserts.append((time.perf_counter() - t0) * 1000)
+
+    def pct(values, q):
+        return round(sorted(values)[int(len(values) * q) - 1], 3)
+
+    return {
+        "users": n_users,
+        "build_s": round(build_s, 2),
+        **service.stats(),
+        "query_p50_ms": round(statistics.median(timings), 3),
+        "query_p99_ms": pct(timings, 0.99),
+        "role_filtered_p50_ms": round(statistics.median(role_timings), 3),
+        "upsert_p50_ms": round(statistics.median(upserts), 3),
+    }
+
+
+if __name__ == "__main__":
+    print(benchmark())
@@ -0,0 +1,464 @@
+"""iCalendar (RFC 5545) feeds and incremental sync for club calendars.
+
+``/calendar/{club_id}.ics`` publishes one club's approved events.
+``/calendar/subscriptions/{club_id}.ics`` adds the calendars that club
+subscribes to, limited to public events where the subscription says so.
+A recurring series is published as one VEVENT with an RRULE. Cancelled
+occurrences become EXDATEs, and changed occurrences become extra VEVENTs
+carrying a RECURRENCE-ID, so external calendar clients expand them
+natively.
+
+Each club's change marker is what ``_update_calendar_sync`` writes to
+``event_calendar_sync``. Its version is ``(MAX(last_sync),
+SUM(events_synced))``, read with one indexed query, and it is used in
+three ways:
+* A generated feed is cached per worker with that version and is rebuilt
+  only when the version moves.
+* The version gives the ETag and the Last-Modified date, so clients get
+  304 responses.
+* ``changes_since`` serves incremental pulls for the frontend, keyed by
+  an opaque sync token (the database time of the previous pull).
+
+Removals that leave no row behind are reported from ``calendar_tombstones``
+(a restored occurrence whose exception row was deleted). Events that a
+public-only subscriber can no longer see are reported as removed too.
+
+Calendar apps cannot send headers, and a session JWT expires in minutes,
+so private feeds are fetched with a feed token. Each token is random,
+long-lived, stored only as a SHA-256 hash, scoped to one feed (kind and
+club) and revocable by its owner.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import secrets
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from recurrence import RecurrenceRule
+
+LOGGER = logging.getLogger(__name__)
+
+PRODID = "-//Campus Connect//Club Calendar//EN"
+UID_DOMAIN = os.getenv("CALENDAR_UID_DOMAIN", "campus-connect")
+PAST_DAYS = int(os.getenv("CALENDAR_FEED_PAST_DAYS", "180"))
+SYNC_TOKEN_PREFIX = "v1:"
+FEED_KINDS = ("club", "subscriptions")
+
+_ICAL_WEEKDAYS = ("MO", "TU", "WE", "TH", "FR", "SA", "SU")
+
+
+@dataclass
+class Feed:
+    version: Tuple
+    etag: str
+    last_modified: Optional[datetime]
+    body: str
+    generated_at: float
+
+
+_cache: Dict[Tuple[str, int, str], Feed] = {}
+_cache_lock = threading.Lock()
+
+
+# === iCalendar text ===
+
+def _escape(text) -> str:
+    return (
+        str(text or "")
+        .replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+    )
+
+
+def _fold(line: str) -> str:
+    """Fold content lines at 75 octets (RFC 5545 3.1)."""
+    raw = line.encode("utf-8")
+    if len(raw) <= 75:
+        return line
+    parts, current = [], b""
+    for ch in line:
+        encoded = ch.encode("utf-8")
+        if len(current) + len(encoded) > (75 if not parts else 74):
+            parts.append(current.decode("utf-8"))
+            current = b""
+        current += encoded
+    parts.append(current.decode("utf-8"))
+    return "\r\n ".join(parts)
+
+
+def _as_time(value) -> Tuple[int, int, int]:
+    # TIME columns arrive as timedelta; payloads may use "HH:MM[:SS]"
+    if isinstance(value, timedelta):
+        seconds = int(value.total_seconds())
+        return seconds // 3600 % 24, seconds // 60 % 60, seconds % 60
+    if hasattr(value, "hour"):
+        return value.hour, value.minute, value.second
+    parts = [int(p) for p in str(value or "0:0").split(":")] + [0, 0]
+    return parts[0], parts[1], parts[2]
+
+
+def _local_dt(day: date, value) -> str:
+    hour, minute, second = _as_time(value)
+    return f"{day:%Y%m%d}T{hour:02d}{minute:02d}{second:02d}"
+
+
+def _utc_stamp(value: Optional[datetime]) -> str:
+    return (value or datetime.utcnow()).strftime("%Y%m%dT%H%M%SZ")
+
+
+def ical_rrule(rule: RecurrenceRule) -> str:
+    parts = [f"FREQ={rule.freq.upper()}"]
+    if rule.interval > 1:
+        parts.append(f"INTERVAL={rule.interval}")
+    if rule.by_weekday:
+        parts.append("BYDAY=" + ",".join(_ICAL_WEEKDAYS[d] for d in rule.by_weekday))
+    if rule.count:
+        parts.append(f"COUNT={rule.count}")
+    elif rule.until:
+        # DTSTART is a local date-time, so UNTIL must be one too
+        parts.append(f"UNTIL={rule.until:%Y%m%d}T235959")
+    return ";".join(parts)
+
+
+def _vevent(event: Dict, uid: str, day: date, start_time, end_time, extra: Sequence[str] = ()) -> List[str]:
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{uid}",
+        f"DTSTAMP:{_utc_stamp(event.get('updated_at'))}",
+        f"DTSTART:{_local_dt(day, start_time)}",
+        f"DTEND:{_local_dt(day, end_time)}",
+        f"SUMMARY:{_escape(event.get('title'))}",
+    ]
+    if event.get("description"):
+        lines.append(f"DESCRIPTION:{_escape(event['description'])}")
+    if event.get("venue"):
+        lines.append(f"LOCATION:{_escape(event['venue'])}")
+    if event.get("event_type"):
+        lines.append(f"CATEGORIES:{_escape(event['event_type'])}")
+    if event.get("club_name"):
+        lines.append(f"ORGANIZER;CN={_escape(event['club_name'])}:mailto:noreply@{UID_DOMAIN}")
+    if event.get("updated_at"):
+        lines.append(f"LAST-MODIFIED:{_utc_stamp(event['updated_at'])}")
+    lines.extend(extra)
+    lines.append("END:VEVENT")
+    return lines
+
+
+def build_ics(name: str, events: Iterable[Dict], overrides: Dict[int, List[Dict]]) -> str:
+    """Render approved events (series with RRULE/EXDATE/RECURRENCE-ID) as a VCALENDAR."""
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        f"PRODID:{PRODID}",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        f"X-WR-CALNAME:{_escape(name)}",
+    ]
+    for event in events:
+        uid = f"club-event-{event['id']}@{UID_DOMAIN}"
+        rule_text = event.get("recurrence_rule")
+        if not rule_text:
+            lines += _vevent(event, uid, event["event_date"], event["start_time"], event["end_time"])
+            continue
+        try:
+            rule = RecurrenceRule.parse(rule_text)
+        except ValueError:
+            LOGGER.warning("Skipping event %s with invalid recurrence rule in feed", event["id"])
+            continue
+        extra = [f"RRULE:{ical_rrule(rule)}"]
+        changed = []
+        for override in overrides.get(event["id"], []):
+            occurrence = _local_dt(override["occurrence_date"], event["start_time"])
+            if override.get("is_cancelled"):
+                extra.append(f"EXDATE:{occurrence}")
+            else:
+                changed.append((occurrence, override))
+        lines += _vevent(event, uid, event["event_date"], event["start_time"], event["end_time"], extra)
+        for occurrence, override in changed:
+            merged = {**event, **{k: override[k] for k in ("title", "description", "venue") if override.get(k)}}
+            merged["updated_at"] = override.get("updated_at") or event.get("updated_at")
+            lines += _vevent(
+                merged, uid,
+                override.get("override_date") or override["occurrence_date"],
+                override.get("start_time") or event["start_time"],
+                override.get("end_time") or event["end_time"],
+                [f"RECURRENCE-ID:{occurrence}"],
+            )
+    lines.append("END:VCALENDAR")
+    return "\r\n".join(_fold(line) for line in lines) + "\r\n"
+
+
+# === Data access ===
+
+def club_versions(cursor, club_ids: Sequence[int]) -> Tuple[Tuple, Optional[datetime]]:
+    """Change marker per club from ``event_calendar_sync`` plus the latest change time."""
+    if not club_ids:
+        return (), None
+    placeholders = ", ".join(["%s"] * len(club_ids))
+    cursor.execute(
+        f"""
+        SELECT club_id, MAX(last_sync) AS last_sync, COALESCE(SUM(events_synced), 0) AS changes
+        FROM event_calendar_sync
+        WHERE club_id IN ({placeholders})
+        GROUP BY club_id
+        """,
+        tuple(club_ids),
+    )
+    rows = {row["club_id"]: row for row in cursor.fetchall()}
+    version = tuple(
+        (c, str(rows[c]["last_sync"]) if c in rows else None, int(rows[c]["changes"]) if c in rows else 0)
+        for c in sorted(club_ids)
+    )
+    stamps = [row["last_sync"] for row in rows.values() if row["last_sync"]]
+    return version, max(stamps) if stamps else None
+
+
+def load_feed_events(cursor, club_ids: Sequence[int], public_only: Iterable[int] = ()) -> Tuple[List[Dict], Dict[int, List[Dict]]]:
+    """Approved events of ``club_ids`` from ``PAST_DAYS`` ago on (series regardless of start)."""
+    public_only = set(public_only)
+    placeholders = ", ".join(["%s"] * len(club_ids))
+    cursor.execute(
+        f"""
+        SELECT ce.id, ce.club_id, ce.title, ce.description, ce.event_date, ce.start_time, ce.end_time,
+               ce.venue, ce.event_type, ce.is_public, ce.recurrence_rule, ce.updated_at, c.name AS club_name
+        FROM club_events ce
+        JOIN clubs c ON c.id = ce.club_id
+        WHERE ce.club_id IN ({placeholders}) AND ce.status = 'approved'
+        AND (ce.recurrence_rule IS NOT NULL OR ce.event_date >= %s)
+        ORDER BY ce.event_date, ce.start_time
+        """,
+        tuple(club_ids) + (date.today() - timedelta(days=PAST_DAYS),),
+    )
+    events = [e for e in cursor.fetchall() if e["is_public"] or e["club_id"] not in public_only]
+    series_ids = [e["id"] for e in events if e.get("recurrence_rule")]
+    overrides: Dict[int, List[Dict]] = {}
+    if series_ids:
+        cursor.execute(
+            f"SELECT * FROM club_event_exceptions WHERE event_id IN ({', '.join(['%s'] * len(series_ids))})",
+            tuple(series_ids),
+        )
+        for row in cursor.fetchall():
+            overrides.setdefault(row["event_id"], []).append(row)
+    return events, overrides
+
+
+def get_feed(cursor, key: Tuple[str, int, str], name: str, club_ids: Sequence[int], public_only: Iterable[int] = ()) -> Feed:
+    """Cached feed for ``key``; rebuilt only when a club's sync marker has moved.
+
+    ``key`` is ``(kind, club_id, visibility)``. Callers pass a different
+    visibility for each ``public_only`` variant, so a feed built for members
+    is never served to a caller limited to public events.
+    """
+    version, last_modified = club_versions(cursor, club_ids)
+    cached = _cache.get(key)
+    if cached and cached.version == version:
+        return cached
+    started = time.perf_counter()
+    events, overrides = load_feed_events(cursor, club_ids, public_only) if club_ids else ([], {})
+    body = build_ics(name, events, overrides)
+    feed = Feed(
+        version=version,
+        etag='"' + hashlib.sha1(repr((key, version)).encode()).hexdigest() + '"',
+        last_modified=last_modified,
+        body=body,
+        generated_at=time.time(),
+    )
+    with _cache_lock:
+        _cache[key] = feed
+    LOGGER.info("Calendar feed %s regenerated: %d events in %.1f ms", key, len(events), (time.perf_counter() - started) * 1000)
+    return feed
+
+
+def mark_changed(club_id: int) -> None:
+    """Drop this worker's cached feeds containing ``club_id`` (other workers notice the sync marker)."""
+    with _cache_lock:
+        for key in [k for k, feed in _cache.items() if any(v[0] == club_id for v in feed.version) or k[1] == club_id]:
+            _cache.pop(key, None)
+
+
+# === Feed tokens and tombstones ===
+
+_tables_ready = False
+
+
+def ensure_tables(cursor) -> None:
+    global _tables_ready
+    if _tables_ready:
+        return
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS calendar_feed_tokens (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            token_hash CHAR(64) NOT NULL,
+            user_id INT NOT NULL,
+            feed_kind VARCHAR(20) NOT NULL,
+            club_id INT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_used_at TIMESTAMP NULL,
+            revoked_at TIMESTAMP NULL,
+            UNIQUE KEY unique_token_hash (token_hash),
+            INDEX idx_feed_token_user (user_id)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS calendar_tombstones (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            club_id INT NOT NULL,
+            event_id INT NOT NULL,
+            occurrence_date DATE NULL,
+            reason VARCHAR(32) NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_tombstone_club (club_id, created_at)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
+    _tables_ready = True
+
+
+def _token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def issue_feed_token(cursor, user_id: int, kind: str, club_id: int) -> Tuple[int, str]:
+    """Create a token for one feed; only its hash is stored, so the plaintext is returned once."""
+    if kind not in FEED_KINDS:
+        raise ValueError(f"Unknown feed kind {kind!r}")
+    token = secrets.token_urlsafe(32)
+    cursor.execute(
+        "INSERT INTO calendar_feed_tokens (token_hash, user_id, feed_kind, club_id) VALUES (%s, %s, %s, %s)",
+        (_token_hash(token), user_id, kind, club_id),
+    )
+    return cursor.lastrowid, token
+
+
+def resolve_feed_token(cursor, token: str, kind: str, club_id: int) -> Optional[int]:
+    """Owner's user id when ``token`` is live and scoped to this feed, else None."""
+    cursor.execute(
+        """
+        SELECT id, user_id FROM calendar_feed_tokens
+        WHERE token_hash = %s AND feed_kind = %s AND club_id = %s AND revoked_at IS NULL
+        """,
+        (_token_hash(token), kind, club_id),
+    )
+    row = cursor.fetchone()
+    if not row:
+        return None
+    cursor.execute("UPDATE calendar_feed_tokens SET last_used_at = NOW() WHERE id = %s", (row["id"],))
+    return row["user_id"]
+
+
+def list_feed_tokens(cursor, user_id: int) -> List[Dict]:
+    cursor.execute(
+        """
+        SELECT id, feed_kind, club_id, created_at, last_used_at FROM calendar_feed_tokens
+        WHERE user_id = %s AND revoked_at IS NULL ORDER BY id
+        """,
+        (user_id,),
+    )
+    return cursor.fetchall()
+
+
+def revoke_feed_token(cursor, token_id: int, user_id: int) -> bool:
+    cursor.execute(
+        "UPDATE calendar_feed_tokens SET revoked_at = NOW() WHERE id = %s AND user_id = %s AND revoked_at IS NULL",
+        (token_id, user_id),
+    )
+    return cursor.rowcount > 0
+
+
+def record_tombstone(cursor, club_id: int, event_id: int, occurrence_date, reason: str) -> None:
+    """Remember a removal that deletes its row, so incremental pulls can report it."""
+    cursor.execute(
+        "INSERT INTO calendar_tombstones (club_id, event_id, occurrence_date, reason) VALUES (%s, %s, %s, %s)",
+        (club_id, event_id, occurrence_date, reason),
+    )
+
+
+# === Incremental sync ===
+
+def encode_sync_token(moment: datetime) -> str:
+    return f"{SYNC_TOKEN_PREFIX}{moment:%Y%m%d%H%M%S}"
+
+
+def decode_sync_token(token: Optional[str]) -> Optional[datetime]:
+    if not token or not token.startswith(SYNC_TOKEN_PREFIX):
+        return None
+    try:
+        return datetime.strptime(token[len(SYNC_TOKEN_PREFIX):], "%Y%m%d%H%M%S")
+    except ValueError:
+        return None
+
+
+def changes_since(cursor, club_ids: Sequence[int], sync_token: Optional[str], public_only: Iterable[int] = ()) -> Dict:
+    """Events changed since ``sync_token`` (full listing when the token is missing or invalid).
+
+    Changed events include ones that left the calendar (rejected, cancelled),
+    so the client can drop them; ``status`` tells which. ``removed`` lists
+    what left without a row to show for it: restored occurrences (their
+    exception was deleted) and subscribed events that became private.
+    """
+    cursor.execute("SELECT NOW() AS now")
+    now = cursor.fetchone()["now"]
+    since = decode_sync_token(sync_token)
+    if not club_ids:
+        return {"sync_token": encode_sync_token(now), "full": since is None, "events": [], "exceptions": [],
+                "removed": []}
+    removed: List[Dict] = []
+    if since is None:
+        events, overrides = load_feed_events(cursor, club_ids, public_only)
+        exceptions = [row for rows in overrides.values() for row in rows]
+    else:
+        public_only = set(public_only)
+        placeholders = ", ".join(["%s"] * len(club_ids))
+        # >= so writes in the same second as the previous pull are not lost
+        cursor.execute(
+            f"""
+            SELECT ce.id, ce.club_id, ce.title, ce.description, ce.event_date, ce.start_time, ce.end_time,
+                   ce.venue, ce.event_type, ce.is_public, ce.status, ce.recurrence_rule, ce.updated_at
+            FROM club_events ce
+            WHERE ce.club_id IN ({placeholders}) AND ce.updated_at >= %s
+            ORDER BY ce.updated_at
+            """,
+            tuple(club_ids) + (since,),
+        )
+        events = []
+        for e in cursor.fetchall():
+            if e["is_public"] or e["club_id"] not in public_only:
+                events.append(e)
+            else:
+                # Possibly public at the previous pull; tell the client to drop it
+                removed.append({"event_id": e["id"], "club_id": e["club_id"], "occurrence_date": None,
+                                "reason": "private", "removed_at": e["updated_at"]})
+        cursor.execute(
+            f"""
+            SELECT x.* FROM club_event_exceptions x
+            JOIN club_events ce ON ce.id = x.event_id
+            WHERE ce.club_id IN ({placeholders}) AND x.updated_at >= %s
+            """,
+            tuple(club_ids) + (since,),
+        )
+        exceptions = cursor.fetchall()
+        cursor.execute(
+            f"""
+            SELECT event_id, club_id, occurrence_date, reason, created_at AS removed_at
+            FROM calendar_tombstones
+            WHERE club_id IN ({placeholders}) AND created_at >= %s
+            ORDER BY created_at
+            """,
+            tuple(club_ids) + (since,),
+        )
+        removed += cursor.fetchall()
+    for row in events + exceptions + removed:
+        for k, v in list(row.items()):
+            if isinstance(v, (date, datetime, timedelta)):
+                row[k] = str(v)
+    return {"sync_token": encode_sync_token(now), "full": since is None, "events": events, "exceptions": exceptions,
+            "removed": removed}
@@ -0,0 +1,570 @@
+"""Per-worker index of approved club events for calendar views.
+
+Month views and the upcoming-events feed used to run a GROUP BY over
+``club_events`` LEFT JOIN ``club_event_registrations`` on every request. This
+index loads a month once, with one events query and one registration-count
+query, into buckets keyed by (club, month). Writes then keep it current:
+
+* ``adjust_registrations`` bumps the count (of one occurrence, for a
+  series) after ``register_for_event``
+* ``refresh_event`` re-reads one event after approval/rejection or an edit
+* ``refresh_club`` re-reads a club's loaded months after bulk inserts
+  (timeline sync, calendar import)
+* ``refresh_club_meta`` re-reads calendar settings (public, colour)
+* ``refresh_series_overrides`` re-reads a series' per-occurrence exceptions
+
+Recurring series (rows with a ``recurrence_rule``) are not stored per month.
+They are held once, with their exceptions and per-occurrence seat counts,
+and expanded lazily per (series, month) when a window is read (see
+``recurrence``).
+
+Each worker process has its own copy. A month is reloaded after
+``CALENDAR_INDEX_MAX_AGE_SECONDS`` so writes made by other workers show up.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import random
+import statistics
+import threading
+import time
+from dataclasses import dataclass, replace
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from recurrence import OccurrenceOverride, RecurrenceRule, expand
+
+LOGGER = logging.getLogger(__name__)
+
+MAX_AGE_SECONDS = float(os.getenv("CALENDAR_INDEX_MAX_AGE_SECONDS", "600"))
+
+Month = Tuple[int, int]
+
+_EVENT_COLUMNS = """
+    ce.id, ce.club_id, ce.title, ce.description, ce.event_date, ce.start_time, ce.end_time,
+    ce.venue, ce.event_type, ce.calendar_color, ce.is_public, ce.registration_required,
+    ce.max_participants, ce.is_recurring, ce.recurrence_rule, u.full_name AS created_by_name
+"""
+
+
+@dataclass
+class CalendarEvent:
+    id: int
+    club_id: int
+    title: str
+    description: Optional[str]
+    event_date: date
+    start_time: object  # TIME columns arrive as timedelta
+    end_time: object
+    venue: Optional[str] = None
+    event_type: Optional[str] = None
+    calendar_color: Optional[str] = None
+    is_public: bool = True
+    registration_required: bool = False
+    max_participants: Optional[int] = None
+    is_recurring: bool = False
+    created_by_name: Optional[str] = None
+    registration_count: int = 0
+    recurrence_rule: Optional[str] = None
+    series_id: Optional[int] = None  # set on expanded occurrences of a recurring series
+    occurrence_date: Optional[date] = None  # the rule's date, before any move override
+
+    @property
+    def month(self) -> Month:
+        return (self.event_date.year, self.event_date.month)
+
+    @property
+    def sort_key(self):
+        return (self.event_date, self.start_time, self.id)
+
+    def to_dict(self) -> Dict:
+        """Fields shared by every calendar response."""
+        data = {
+            "id": self.id,
+            "title": self.title,
+            "description": self.description,
+            "date": self.event_date.strftime("%Y-%m-%d"),
+            "start_time": str(self.start_time),
+            "end_time": str(self.end_time),
+            "venue": self.venue,
+            "event_type": self.event_type,
+            "registration_required": self.registration_required,
+            "registration_count": self.registration_count,
+            "max_participants": self.max_participants,
+            "created_by": self.created_by_name,
+        }
+        if self.series_id:
+            data["series_id"] = self.series_id
+            data["occurrence_date"] = self.occurrence_date.strftime("%Y-%m-%d")
+        return data
+
+
+@dataclass
+class ClubCalendarMeta:
+    id: int
+    name: str
+    college_id: Optional[int] = None
+    is_active: bool = True
+    calendar_public: bool = True
+    calendar_color: Optional[str] = None
+    calendar_description: Optional[str] = None
+
+
+def _event_from_row(row: Dict) -> CalendarEvent:
+    return CalendarEvent(
+        id=row["id"],
+        club_id=row["club_id"],
+        title=row["title"],
+        description=row.get("description"),
+        event_date=row["event_date"],
+        start_time=row["start_time"],
+        end_time=row["end_time"],
+        venue=row.get("venue"),
+        event_type=row.get("event_type"),
+        calendar_color=row.get("calendar_color"),
+        is_public=bool(row.get("is_public", True)),
+        registration_required=bool(row.get("registration_required")),
+        max_participants=row.get("max_participants"),
+        is_recurring=bool(row.get("is_recurring")),
+        created_by_name=row.get("created_by_name"),
+        registration_count=int(row.get("registration_count") or 0),
+        recurrence_rule=row.get("recurrence_rule"),
+    )
+
+
+def _occurrence(series: CalendarEvent, day: date, override: Optional[OccurrenceOverride],
+                registrations: int = 0) -> CalendarEvent:
+    changes = {"event_date": day, "occurrence_date": day, "series_id": series.id, "registration_count": registrations}
+    if override:
+        if override.override_date:
+            changes["event_date"] = override.override_date
+        for name in ("start_time", "end_time", "venue", "title", "description"):
+            value = getattr(override, name)
+            if value is not None:
+                changes[name] = value
+    return replace(series, **changes)
+
+
+def _meta_from_row(row: Dict) -> ClubCalendarMeta:
+    return ClubCalendarMeta(
+        id=row["id"],
+        name=row["name"],
+        college_id=row.get("college_id"),
+        is_active=bool(row.get("is_active", True)),
+        calendar_public=bool(row.get("calendar_public", True)),
+        calendar_color=row.get("calendar_color"),
+        calendar_description=row.get("calendar_description"),
+    )
+
+
+def month_bounds(month: Month) -> Tuple[date, date]:
+    year, mon = month
+    start = date(year, mon, 1)
+    end = (date(year + 1, 1, 1) if mon == 12 else date(year, mon + 1, 1)) - timedelta(days=1)
+    return start, end
+
+
+def months_between(start: date, end: date) -> List[Month]:
+    months = []
+    year, mon = start.year, start.month
+    while (year, mon) <= (end.year, end.month):
+        months.append((year, mon))
+        year, mon = (year + 1, 1) if mon == 12 else (year, mon + 1)
+    return months
+
+
+class CalendarIndex:
+    def __init__(self):
+        self._events: Dict[int, CalendarEvent] = {}
+        self._buckets: Dict[Month, Dict[int, Set[int]]] = {}  # month -> club -> event ids
+        self._month_loaded_at: Dict[Month, float] = {}
+        self._clubs: Dict[int, ClubCalendarMeta] = {}
+        self._clubs_loaded_at = 0.0
+        self._series: Dict[int, Tuple[CalendarEvent, RecurrenceRule]] = {}
+        self._overrides: Dict[int, Dict[date, OccurrenceOverride]] = {}
+        self._occurrence_counts: Dict[int, Dict[date, int]] = {}  # series -> occurrence -> seats taken
+        self._expansions: Dict[Tuple[int, Month], List[CalendarEvent]] = {}
+        self._series_loaded_at = 0.0
+        self._tables_ready = False
+        self._lock = threading.RLock()
+
+    def _ensure_tables(self, cursor) -> None:
+        # calendar_color / is_recurring / calendar_public are added by the calendar module
+        if self._tables_ready:
+            return
+        from club_events_api import _ensure_club_events_tables
+        from club_events_calendar import _ensure_calendar_tables
+
+        _ensure_club_events_tables(cursor)
+        _ensure_calendar_tables(cursor)
+        self._tables_ready = True
+
+    # --- loading ---
+
+    def _ensure_clubs(self, cursor, club_ids: Iterable[int] = ()) -> None:
+        missing = [c for c in club_ids if c not in self._clubs]
+        if time.time() - self._clubs_loaded_at >= MAX_AGE_SECONDS:
+            self._ensure_tables(cursor)
+            cursor.execute(
+                "SELECT id, name, college_id, is_active, calendar_public, calendar_color, calendar_description FROM clubs"
+            )
+            clubs = {row["id"]: _meta_from_row(row) for row in cursor.fetchall()}
+            with self._lock:
+                self._clubs = clubs
+                self._clubs_loaded_at = time.time()
+        elif missing:
+            for club_id in missing:
+                self.refresh_club_meta(cursor, club_id)
+
+    def _ensure_month(self, cursor, month: Month) -> None:
+        loaded_at = self._month_loaded_at.get(month)
+        if loaded_at and time.time() - loaded_at < MAX_AGE_SECONDS:
+            return
+        with self._lock:
+            loaded_at = self._month_loaded_at.get(month)
+            if loaded_at and time.time() - loaded_at < MAX_AGE_SECONDS:
+                return
+            self.load_month(cursor, month)
+
+    def load_month(self, cursor, month: Month) -> int:
+        """Load every approved event of ``month`` with its registration count (two queries)."""
+        self._ensure_tables(cursor)
+        start, end = month_bounds(month)
+        started = time.perf_counter()
+        cursor.execute(
+            f"""
+            SELECT {_EVENT_COLUMNS}
+            FROM club_events ce
+            LEFT JOIN users u ON ce.created_by = u.id
+            WHERE ce.status = 'approved' AND ce.recurrence_rule IS NULL
+            AND ce.event_date >= %s AND ce.event_date <= %s
+            """,
+            (start, end),
+        )
+        events = [_event_from_row(row) for row in cursor.fetchall()]
+        cursor.execute(
+            """
+            SELECT cer.event_id, COUNT(*) AS registration_count
+            FROM club_event_registrations cer
+            JOIN club_events ce ON ce.id = cer.event_id
+            WHERE cer.status = 'registered' AND ce.status = 'approved'
+            AND ce.event_date >= %s AND ce.event_date <= %s
+            GROUP BY cer.event_id
+            """,
+            (start, end),
+        )
+        counts = {row["event_id"]: int(row["registration_count"]) for row in cursor.fetchall()}
+        for event in events:
+            event.registration_count = counts.get(event.id, 0)
+        self.load_events(month, events)
+        LOGGER.info("Calendar index loaded %d events for %d-%02d in %.1f ms",
+                    len(events), month[0], month[1], (time.perf_counter() - started) * 1000)
+        return len(events)
+
+    def load_events(self, month: Month, events: Iterable[CalendarEvent]) -> None:
+        buckets: Dict[int, Set[int]] = {}
+        records = {}
+        for event in events:
+            buckets.setdefault(event.club_id, set()).add(event.id)
+            records[event.id] = event
+        with self._lock:
+            for ids in self._buckets.get(month, {}).values():
+                for event_id in ids:
+                    self._events.pop(event_id, None)
+            self._buckets[month] = buckets
+            self._events.update(records)
+            self._month_loaded_at[month] = time.time()
+
+    def _ensure_series(self, cursor) -> None:
+        if time.time() - self._series_loaded_at < MAX_AGE_SECONDS:
+            return
+        with self._lock:
+            if time.time() - self._series_loaded_at < MAX_AGE_SECONDS:
+                return
+            self.load_series(cursor)
+
+    def load_series(self, cursor) -> int:
+        """Load every approved recurring series with its occurrence exceptions and seat counts."""
+        self._ensure_tables(cursor)
+        cursor.execute(
+            f"""
+            SELECT {_EVENT_COLUMNS}
+            FROM club_events ce
+            LEFT JOIN users u ON ce.created_by = u.id
+            WHERE ce.status = 'approved' AND ce.recurrence_rule IS NOT NULL
+            """
+        )
+        series = {}
+        for row in cursor.fetchall():
+            try:
+                series[row["id"]] = (_event_from_row(row), RecurrenceRule.parse(row["recurrence_rule"]))
+            except ValueError as exc:
+                LOGGER.warning("Skipping event %s with invalid recurrence rule: %s", row["id"], exc)
+        overrides: Dict[int, Dict[date, OccurrenceOverride]] = {}
+        counts: Dict[int, Dict[date, int]] = {}
+        if series:
+            placeholders = ", ".join(["%s"] * len(series))
+            cursor.execute(f"SELECT * FROM club_event_exceptions WHERE event_id IN ({placeholders})", tuple(series))
+            for row in cursor.fetchall():
+                overrides.setdefault(row["event_id"], {})[row["occurrence_date"]] = OccurrenceOverride.from_row(row)
+            cursor.execute(
+                f"SELECT event_id, occurrence_date, seats_taken FROM club_event_occurrence_seats WHERE event_id IN ({placeholders})",
+                tuple(series),
+            )
+            for row in cursor.fetchall():
+                counts.setdefault(row["event_id"], {})[row["occurrence_date"]] = int(row["seats_taken"])
+        with self._lock:
+            self._series = series
+            self._overrides = overrides
+            self._occurrence_counts = counts
+            self._expansions = {}
+            self._series_loaded_at = time.time()
+        return len(series)
+
+    def _series_occurrences(self, series_id: int, month: Month) -> List[CalendarEvent]:
+        key = (series_id, month)
+        cached = self._expansions.get(key)
+        if cached is None:
+            # Expand and store under the lock so a concurrent reload or series
+            # update cannot drop the cache between our read and our write
+            with self._lock:
+                cached = self._expansions.get(key)
+                if cached is None:
+                    if series_id not in self._series:
+                        return []  # Removed since the caller listed it
+                    parent, rule = self._series[series_id]
+                    start, end = month_bounds(month)
+                    counts = self._occurrence_counts.get(series_id, {})
+                    cached = [
+                        _occurrence(parent, day, override, counts.get(day, 0))
+                        for day, override in expand(rule, parent.event_date, start, end, self._overrides.get(series_id))
+                    ]
+                    self._expansions[key] = cached
+        return cached
+
+    def _drop_expansions(self, series_id: int) -> None:
+        for key in [key for key in self._expansions if key[0] == series_id]:
+            self._expansions.pop(key, None)
+
+    # --- incremental updates ---
+
+    def _place(self, event: Optional[CalendarEvent], event_id: int) -> None:
+        with self._lock:
+            if self._series.pop(event_id, None):
+                self._drop_expansions(event_id)
+            if event and event.recurrence_rule:
+                try:
+                    self._series[event_id] = (event, RecurrenceRule.parse(event.recurrence_rule))
+                except ValueError as exc:
+                    LOGGER.warning("Ignoring invalid recurrence rule on event %s: %s", event_id, exc)
+                event = None
+            old = self._events.pop(event_id, None)
+            if old:
+                self._buckets.get(old.month, {}).get(old.club_id, set()).discard(event_id)
+            if event and event.month in self._month_loaded_at:
+                self._events[event_id] = event
+                self._buckets.setdefault(event.month, {}).setdefault(event.club_id, set()).add(event_id)
+
+    def adjust_registrations(self, event_id: int, delta: int, occurrence_date: Optional[date] = None) -> None:
+        with self._lock:
+            event = self._events.get(event_id)
+            if event:
+                event.registration_count = max(0, event.registration_count + delta)
+            elif event_id in self._series and occurrence_date is not None:
+                # Registrations are per occurrence; expansions are copies, so re-expand them
+                counts = self._occurrence_counts.setdefault(event_id, {})
+                counts[occurrence_date] = max(0, counts.get(occurrence_date, 0) + delta)
+                self._drop_expansions(event_id)
+
+    def refresh_event(self, cursor, event_id: int) -> None:
+        """Re-read one event (approval, rejection, edit). Never fails the surrounding request."""
+        try:
+            self._ensure_tables(cursor)
+            cursor.execute(
+                f"""
+                SELECT {_EVENT_COLUMNS},
+                       (SELECT COUNT(*) FROM club_event_registrations cer
+                        WHERE cer.event_id = ce.id AND cer.status = 'registered') AS registration_count
+                FROM club_events ce
+                LEFT JOIN users u ON ce.created_by = u.id
+                WHERE ce.id = %s AND ce.status = 'approved'
+                """,
+                (event_id,),
+            )
+            row = cursor.fetchone()
+            self._place(_event_from_row(row) if row else None, event_id)
+        except Exception as exc:
+            LOGGER.warning("Calendar index refresh failed for event %s: %s", event_id, exc)
+
+    def refresh_club(self, cursor, club_id: int) -> None:
+        """Re-read a club's events in every loaded month (after bulk inserts)."""
+        try:
+            for month in list(self._month_loaded_at):
+                start, end = month_bounds(month)
+                cursor.execute(
+                    f"""
+                    SELECT {_EVENT_COLUMNS},
+                           (SELECT COUNT(*) FROM club_event_registrations cer
+                            WHERE cer.event_id = ce.id AND cer.status = 'registered') AS registration_count
+                    FROM club_events ce
+                    LEFT JOIN users u ON ce.created_by = u.id
+                    WHERE ce.club_id = %s AND ce.status = 'approved'
+                    AND ce.event_date >= %s AND ce.event_date <= %s
+                    """,
+                    (club_id, start, end),
+                )
+                events = {row["id"]: _event_from_row(row) for row in cursor.fetchall()}
+                with self._lock:
+                    for event_id in list(self._buckets.get(month, {}).get(club_id, ())):
+                        if event_id not in events:
+                            self._place(None, event_id)
+                    for event_id, event in events.items():
+                        self._place(event, event_id)
+            # Series are club-independent in memory; reload them on next read
+            self._series_loaded_at = 0.0
+        except Exception as exc:
+            LOGGER.warning("Calendar index refresh failed for club %s: %s", club_id, exc)
+
+    def refresh_series_overrides(self, cursor, event_id: int) -> None:
+        """Re-read the occurrence exceptions of one series after an override is set or cleared."""
+        try:
+            cursor.execute("SELECT * FROM club_event_exceptions WHERE event_id = %s", (event_id,))
+            overrides = {row["occurrence_date"]: OccurrenceOverride.from_row(row) for row in cursor.fetchall()}
+            with self._lock:
+                self._overrides[event_id] = overrides
+                self._drop_expansions(event_id)
+        except Exception as exc:
+            LOGGER.warning("Calendar index refresh failed for series %s: %s", event_id, exc)
+
+    def refresh_club_meta(self, cursor, club_id: int) -> None:
+        try:
+            self._ensure_tables(cursor)
+            cursor.execute(
+                "SELECT id, name, college_id, is_active, calendar_public, calendar_color, calendar_description "
+                "FROM clubs WHERE id = %s",
+                (club_id,),
+            )
+            row = cursor.fetchone()
+            with self._lock:
+                if row:
+                    self._clubs[club_id] = _meta_from_row(row)
+                else:
+                    self._clubs.pop(club_id, None)
+        except Exception as exc:
+            LOGGER.warning("Calendar index refresh failed for club settings %s: %s", club_id, exc)
+
+    # --- queries ---
+
+    def club(self, cursor, club_id: int) -> Optional[ClubCalendarMeta]:
+        self._ensure_clubs(cursor, [club_id])
+        return self._clubs.get(club_id)
+
+    def clubs(self, cursor, club_ids: Iterable[int] = ()) -> Dict[int, ClubCalendarMeta]:
+        self._ensure_clubs(cursor, club_ids)
+        return self._clubs
+
+    def events_between(
+        self, cursor, start: date, end: date, club_ids: Optional[Iterable[int]] = None
+    ) -> List[CalendarEvent]:
+        """Approved events with ``start <= event_date <= end``, in calendar order."""
+        wanted = set(club_ids) if club_ids is not None else None
+        self._ensure_series(cursor)
+        series_ids = [
+            series_id for series_id, (parent, _) in list(self._series.items())
+            if wanted is None or parent.club_id in wanted
+        ]
+        found = []
+        for month in months_between(start, end):
+            self._ensure_month(cursor, month)
+            buckets = self._buckets.get(month, {})
+            clubs = buckets.keys() if wanted is None else wanted.intersection(buckets)
+            for club_id in clubs:
+                for event_id in list(buckets.get(club_id, ())):
+                    event = self._events.get(event_id)
+                    if event and start <= event.event_date <= end:
+                        found.append(event)
+            for series_id in series_ids:
+                if series_id in self._series:
+                    found.extend(e for e in self._series_occurrences(series_id, month) if start <= e.event_date <= end)
+        found.sort(key=lambda e: e.sort_key)
+        return found
+
+    def month_events(self, cursor, year: int, month: int, club_ids: Optional[Iterable[int]] = None) -> List[CalendarEvent]:
+        start, end = month_bounds((year, month))
+        return self.events_between(cursor, start, end, club_ids)
+
+    def stats(self) -> Dict:
+        return {
+            "events": len(self._events),
+            "months_loaded": len(self._month_loaded_at),
+            "series": len(self._series),
+            "clubs": len(self._clubs),
+        }
+
+
+calendar_index = CalendarIndex()
+
+
+def benchmark(n_clubs: int = 500, events_per_club_month: int = 20, n_queries: int = 500) -> Dict:
+    """Month views over a synthetic year of events (no database)."""
+    rng = random.Random(11)
+    index = CalendarIndex()
+    year = date.today().year
+    started = time.perf_counter()
+    event_id = 0
+    for mon in range(1, 13):
+        start, end = month_bounds((year, mon))
+        events = []
+        for club_id in range(n_clubs):
+            for _ in range(events_per_club_month):
+                event_id += 1
+                day = start + timedelta(days=rng.randrange((end - start).days + 1))
+                events.append(CalendarEvent(
+                    event_id, club_id, f"Event {event_id}", "", day,
+                    timedelta(hours=rng.randrange(8, 18)), timedelta(hours=19),
+                    registration_count=rng.randrange(50),
+                ))
+        index.load_events((year, mon), events)
+    index._clubs = {c: ClubCalendarMeta(c, f"Club {c}", college_id=c % 5) for c in range(n_clubs)}
+    index._clubs_loaded_at = time.time()
+    # One weekly series per club, expanded on read
+    for club_id in range(n_clubs):
+        event_id += 1
+        parent = CalendarEvent(event_id, club_id, "Weekly meetup", "", date(year, 1, 1) + timedelta(days=club_id % 7),
+                               timedelta(hours=17), timedelta(hours=18), recurrence_rule="FREQ=WEEKLY")
+        index._series[event_id] = (parent, RecurrenceRule.parse(parent.recurrence_rule))
+    index._series_loaded_at = time.time()
+    build_s = time.perf_counter() - started
+
+    single, college, upcoming = [], [], []
+    for _ in range(n_queries):
+        mon = rng.randrange(1, 13)
+        t0 = time.perf_counter()
+        index.month_events(None, year, mon, [rng.randrange(n_clubs)])
+        single.append((time.perf_counter() - t0) * 1000)
+        t0 = time.perf_counter()
+        index.month_events(None, year, mon, [c for c in range(n_clubs) if c % 5 == 0])
+        college.append((time.perf_counter() - t0) * 1000)
+        day = date(year, mon, 1)
+        t0 = time.perf_counter()
+        index.events_between(None, day, day + timedelta(days=7))
+        upcoming.append((time.perf_counter() - t0) * 1000)
+    t0 = time.perf_counter()
+    for _ in range(10_000):
+        index.adjust_registrations(rng.randrange(1, event_id + 1), 1)
+    register_us = (time.perf_counter() - t0) / 10_000 * 1e6
+
+    return {
+        "events": event_id,
+        "build_s": round(build_s, 2),
+        "club_month_p50_ms": round(statistics.median(single), 3),
+        "college_month_p50_ms": round(statistics.median(college), 2),
+        "all_clubs_week_p50_ms": round(statistics.median(upcoming), 2),
+        "register_update_us": round(register_us, 2),
+    }
+
+
+if __name__ == "__main__":
+    print(benchmark())
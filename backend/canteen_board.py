@@ -0,0 +1,418 @@
+"""In-memory kitchen order board.
+
+Active canteen orders (``queued``, ``preparing``, ``ready``) are held in
+process memory and updated by order placement, counter scans and staff
+status changes. Every change becomes a numbered event that is pushed to
+kitchen displays and students over Server-Sent Events, so nobody has to
+poll ``/canteen/staff/orders`` or ``/canteen/order/{id}/status``.
+
+MySQL remains the durable store. Kitchen progress (``queued`` ->
+``preparing`` -> ``ready``) is written behind: changes are queued and
+flushed by a background task in one ``executemany`` every
+``FLUSH_INTERVAL_SECONDS``, and again on shutdown. Losing one of those in a
+crash only shows an order a step behind. Terminal transitions (``served``,
+``cancelled``) are written through with a conditional UPDATE before the
+board changes, so a pickup acknowledged to the counter can never reload as
+``ready`` and be served twice. Payments are written through by the caller
+the same way. Each worker also syncs
+rows changed in MySQL since its last watermark, which brings in orders
+placed or updated by other workers and by code paths outside the hooks.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import AsyncIterator, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+LOGGER = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("queued", "preparing", "ready")
+# Written through, and only while the order has not already reached one of them
+TERMINAL_STATUSES = ("served", "cancelled", "completed")
+
+FLUSH_INTERVAL_SECONDS = float(os.getenv("ORDER_BOARD_FLUSH_SECONDS", "1"))
+SYNC_INTERVAL_SECONDS = float(os.getenv("ORDER_BOARD_SYNC_SECONDS", "3"))
+# Events kept for clients reconnecting with Last-Event-ID
+EVENT_BUFFER = int(os.getenv("ORDER_BOARD_EVENT_BUFFER", "2000"))
+# A subscriber this far behind is dropped; it reconnects and resumes from its last id
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("ORDER_BOARD_SUBSCRIBER_QUEUE", "500"))
+HEARTBEAT_SECONDS = float(os.getenv("ORDER_BOARD_HEARTBEAT_SECONDS", "15"))
+
+_ORDER_FIELDS = ("id", "user_id", "status", "payment_status", "payment_method", "total_amount", "qr_token", "student_name")
+
+
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+@dataclass
+class BoardOrder:
+    id: int
+    user_id: int
+    status: str
+    payment_status: Optional[str] = None
+    payment_method: Optional[str] = None
+    total_amount: float = 0.0
+    qr_token: Optional[str] = None
+    student_name: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    items: Optional[List[Dict]] = None
+
+    @classmethod
+    def from_row(cls, row: Dict, items: Optional[List[Dict]] = None) -> "BoardOrder":
+        values = {name: row.get(name) for name in _ORDER_FIELDS}
+        values["total_amount"] = float(values["total_amount"] or 0)
+        return cls(**values, created_at=row.get("created_at"), updated_at=row.get("updated_at"), items=items)
+
+    def to_dict(self) -> Dict:
+        data = {name: _json_value(getattr(self, name)) for name in _ORDER_FIELDS}
+        data["created_at"] = _json_value(self.created_at)
+        data["updated_at"] = _json_value(self.updated_at)
+        data["items"] = [{k: _json_value(v) for k, v in item.items()} for item in (self.items or [])]
+        return data
+
+
+@dataclass
+class BoardEvent:
+    seq: int
+    kind: str  # added, updated, removed
+    order: Dict
+
+    def to_sse(self) -> str:
+        return f"id: {self.seq}\nevent: {self.kind}\ndata: {json.dumps(self.order)}\n\n"
+
+
+@dataclass
+class Subscription:
+    loop: asyncio.AbstractEventLoop
+    user_id: Optional[int] = None
+    order_id: Optional[int] = None
+    queue: asyncio.Queue = field(default_factory=lambda: asyncio.Queue(SUBSCRIBER_QUEUE_SIZE))
+    dropped: bool = False
+
+    def wants(self, order: Dict) -> bool:
+        if self.order_id is not None:
+            return order.get("id") == self.order_id
+        return self.user_id is None or order.get("user_id") == self.user_id
+
+
+class OrderBoard:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._orders: Dict[int, BoardOrder] = {}
+        self._by_qr: Dict[str, int] = {}
+        self._events: Deque[BoardEvent] = deque(maxlen=EVENT_BUFFER)
+        self._seq = 0
+        self._subscribers: List[Subscription] = []
+        # order id -> (status, payment_status) still to be written to MySQL
+        self._pending: Dict[int, Tuple[str, Optional[str]]] = {}
+        self._watermark: Optional[datetime] = None
+        self.flushed = 0
+
+    # --- reads ---
+
+    def get(self, order_id: int) -> Optional[BoardOrder]:
+        with self._lock:
+            return self._orders.get(order_id)
+
+    def by_qr(self, qr_token: str) -> Optional[BoardOrder]:
+        with self._lock:
+            order_id = self._by_qr.get(qr_token)
+            return self._orders.get(order_id) if order_id is not None else None
+
+    def snapshot(self, user_id: Optional[int] = None) -> Dict:
+        with self._lock:
+            orders = [o.to_dict() for o in self._orders.values() if user_id is None or o.user_id == user_id]
+            seq = self._seq
+        orders.sort(key=lambda o: o["id"])
+        board = {status: [o for o in orders if o["status"] == status] for status in ACTIVE_STATUSES}
+        return {"seq": seq, "board": board, "total": len(orders)}
+
+    def overlay(self, rows: Iterable[Dict]) -> None:
+        """Patch DB rows with board state that may not have been flushed yet."""
+        with self._lock:
+            for row in rows:
+                pending = self._pending.get(row.get("id"))
+                if pending:
+                    row["status"], payment_status = pending
+                    if payment_status:
+                        row["payment_status"] = payment_status
+
+    def events_since(self, seq: int) -> Optional[List[BoardEvent]]:
+        """Buffered events after ``seq``, or None if some have already been evicted."""
+        with self._lock:
+            if seq >= self._seq:
+                return []
+            if not self._events or self._events[0].seq > seq + 1:
+                return None
+            return [event for event in self._events if event.seq > seq]
+
+    # --- writes ---
+
+    def add_order(self, row: Dict, items: Optional[List[Dict]] = None) -> None:
+        """Put a newly placed (already committed) order on the board."""
+        row = dict(row)
+        row.setdefault("created_at", datetime.now())
+        row.setdefault("updated_at", row["created_at"])
+        self._apply(BoardOrder.from_row(row, items))
+
+    def transition(self, order_id: int, status: str, payment_status: Optional[str] = None,
+                   durable: bool = False) -> Optional[BoardOrder]:
+        """Move an order on the board; None if this worker is not tracking it.
+
+        Unless ``durable`` (the caller already wrote MySQL), the change is
+        queued for the write-behind flush. Terminal statuses must go through
+        ``write_terminal``.
+        """
+        if status in TERMINAL_STATUSES and not durable:
+            raise ValueError(f"{status!r} must be written through with write_terminal")
+        with self._lock:
+            order = self._orders.get(order_id)
+            if order is None:
+                return None
+            order.status = status
+            if payment_status:
+                order.payment_status = payment_status
+            order.updated_at = datetime.now()
+            if not durable:
+                previous = self._pending.get(order_id)
+                self._pending[order_id] = (status, payment_status or (previous[1] if previous else None))
+            else:
+                self._pending.pop(order_id, None)
+            if status not in ACTIVE_STATUSES:
+                self._remove(order_id)
+                self._publish("removed", order.to_dict())
+            else:
+                self._publish("updated", order.to_dict())
+            return order
+
+    def _apply(self, order: BoardOrder) -> None:
+        with self._lock:
+            if order.id in self._pending:
+                return  # local change not flushed yet; it is newer than any DB row
+            current = self._orders.get(order.id)
+            if order.status not in ACTIVE_STATUSES:
+                if current is not None:
+                    self._remove(order.id)
+                    self._publish("removed", order.to_dict())
+                return
+            if order.items is None and current is not None:
+                order.items = current.items
+            self._orders[order.id] = order
+            if order.qr_token:
+                self._by_qr[order.qr_token] = order.id
+            if current is None:
+                self._publish("added", order.to_dict())
+            elif (current.status, current.payment_status) != (order.status, order.payment_status):
+                self._publish("updated", order.to_dict())
+
+    def _remove(self, order_id: int) -> None:
+        order = self._orders.pop(order_id, None)
+        if order and order.qr_token:
+            self._by_qr.pop(order.qr_token, None)
+
+    # --- push ---
+
+    def subscribe(self, user_id: Optional[int] = None, order_id: Optional[int] = None) -> Subscription:
+        subscription = Subscription(asyncio.get_running_loop(), user_id=user_id, order_id=order_id)
+        with self._lock:
+            self._subscribers.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+
+    def _publish(self, kind: str, order: Dict) -> None:
+        self._seq += 1
+        event = BoardEvent(self._seq, kind, order)
+        self._events.append(event)
+        for subscription in list(self._subscribers):
+            if subscription.wants(order):
+                subscription.loop.call_soon_threadsafe(self._deliver, subscription, event)
+
+    def _deliver(self, subscription: Subscription, event: BoardEvent) -> None:
+        if subscription.dropped:
+            return
+        try:
+            subscription.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            subscription.dropped = True
+            self.unsubscribe(subscription)
+            LOGGER.info("Dropped slow order board subscriber at seq %s", event.seq)
+
+    # --- durability ---
+
+    def write_terminal(self, cursor, order_id: int, status: str, payment_status: Optional[str] = None) -> bool:
+        """Write a terminal status to MySQL, then move the board; False if the order was already finished.
+
+        The UPDATE only matches orders not yet in a terminal status, so two
+        counters scanning the same pickup QR cannot both serve it. The caller
+        commits (connections are autocommit).
+        """
+        cursor.execute(
+            f"""
+            UPDATE canteen_orders
+            SET status = %s, payment_status = COALESCE(%s, payment_status), updated_at = NOW()
+            WHERE id = %s AND status NOT IN ({', '.join(['%s'] * len(TERMINAL_STATUSES))})
+            """,
+            (status, payment_status, order_id, *TERMINAL_STATUSES),
+        )
+        if cursor.rowcount == 0:
+            return False
+        self.transition(order_id, status, payment_status, durable=True)
+        return True
+
+    def flush(self, cursor) -> int:
+        """Write queued status changes to MySQL in one batch."""
+        with self._lock:
+            batch = self._pending
+            self._pending = {}
+        if not batch:
+            return 0
+        rows = [(status, payment_status, order_id) for order_id, (status, payment_status) in batch.items()]
+        try:
+            # Never overwrite a terminal status written through in the meantime
+            cursor.executemany(
+                f"""
+                UPDATE canteen_orders
+                SET status = %s, payment_status = COALESCE(%s, payment_status), updated_at = NOW()
+                WHERE id = %s AND status NOT IN ({', '.join(repr(s) for s in TERMINAL_STATUSES)})
+                """,
+                rows,
+            )
+        except Exception:
+            with self._lock:
+                # Keep anything newer that arrived while the batch was in flight
+                for order_id, change in batch.items():
+                    self._pending.setdefault(order_id, change)
+            raise
+        self.flushed += len(rows)
+        return len(rows)
+
+    def sync(self, cursor, items_loader: Optional[Callable] = None) -> int:
+        """Merge orders changed in MySQL since the last sync (all active orders on the first run)."""
+        cursor.execute("SELECT NOW() AS now")
+        now = cursor.fetchone()["now"]
+        sql = """
+            SELECT co.*, u.full_name AS student_name
+            FROM canteen_orders co
+            LEFT JOIN users u ON u.id = co.user_id
+        """
+        if self._watermark is None:
+            cursor.execute(sql + f" WHERE co.status IN ({', '.join(['%s'] * len(ACTIVE_STATUSES))})", ACTIVE_STATUSES)
+        else:
+            # DATETIME has second precision, so re-read the watermark second
+            cursor.execute(sql + " WHERE co.updated_at >= %s", (self._watermark - timedelta(seconds=1),))
+        rows = cursor.fetchall()
+        with self._lock:
+            missing = [row for row in rows if row.get("status") in ACTIVE_STATUSES
+                       and (row["id"] not in self._orders or self._orders[row["id"]].items is None)]
+        if missing and items_loader is not None:
+            items_loader(cursor, missing)
+        for row in rows:
+            self._apply(BoardOrder.from_row(row, row.get("items")))
+        self._watermark = now
+        return len(rows)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "active": len(self._orders),
+                "pending_writes": len(self._pending),
+                "subscribers": len(self._subscribers),
+                "seq": self._seq,
+                "flushed": self.flushed,
+            }
+
+
+async def event_stream(board: OrderBoard, subscription: Subscription, last_event_id: Optional[int],
+                       snapshot: Callable[[], Dict]) -> AsyncIterator[str]:
+    """SSE body: a snapshot (or the missed events), then live events and heartbeats."""
+    try:
+        missed = board.events_since(last_event_id) if last_event_id is not None else None
+        if missed is None:
+            state = snapshot()
+            yield f"id: {state['seq']}\nevent: snapshot\ndata: {json.dumps(state)}\n\n"
+        else:
+            for event in missed:
+                if subscription.wants(event.order):
+                    yield event.to_sse()
+        while not subscription.dropped:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield event.to_sse()
+    finally:
+        board.unsubscribe(subscription)
+
+
+order_board = OrderBoard()
+
+
+class _BatchCursor:
+    def __init__(self):
+        self.round_trips = 0
+
+    def executemany(self, sql, rows):
+        self.round_trips += 1
+
+    def execute(self, sql, params=()):
+        self.round_trips += 1
+
+
+def benchmark(orders: int = 2000, kitchen_displays: int = 4, students_listening: int = 500) -> Dict:
+    """Place and move ``orders`` through the board with SSE subscribers attached."""
+    import statistics
+
+    async def run():
+        board = OrderBoard()
+        kitchens = [board.subscribe() for _ in range(kitchen_displays)]
+        students = [board.subscribe(user_id=u) for u in range(students_listening)]
+        timings = []
+        for i in range(1, orders + 1):
+            t0 = time.perf_counter()
+            board.add_order({"id": i, "user_id": i % 1000, "status": "queued", "qr_token": f"qr{i}",
+                             "total_amount": 80}, items=[{"item_name": "Dosa", "quantity": 1}])
+            board.transition(i, "preparing")
+            board.transition(i, "ready")
+            timings.append((time.perf_counter() - t0) * 1e6 / 3)
+        await asyncio.sleep(0)
+        delivered = sum(s.queue.qsize() for s in kitchens + students)
+        cursor = _BatchCursor()
+        t0 = time.perf_counter()
+        written = board.flush(cursor)
+        flush_ms = (time.perf_counter() - t0) * 1000
+        return {
+            "orders": orders,
+            "transition_p50_us": round(statistics.median(timings), 1),
+            "transition_p99_us": round(sorted(timings)[int(len(timings) * 0.99)], 1),
+            "events_delivered": delivered,
+            "status_writes": written,
+            "write_round_trips": cursor.round_trips,
+            "write_through_round_trips": orders * 2,
+            "flush_ms": round(flush_ms, 2),
+        }
+
+    return asyncio.run(run())
+
+
+if __name__ == "__main__":
+    print(benchmark())
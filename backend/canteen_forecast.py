@@ -0,0 +1,408 @@
+"""Canteen demand forecasting.
+
+Order history for the last ``HISTORY_DAYS`` is pulled with one grouped
+query into a ``(days, items, 24)`` NumPy array of quantities. A
+multiplicative seasonal model is then fitted to the whole menu at once:
+
+    demand[item, day, hour] = level[item]
+                              * dow_factor[item, weekday]
+                              * period_factor[term period of day]
+                              * hour_profile[item, weekday, hour]
+
+``level`` is an exponentially weighted mean (half-life
+``HALF_LIFE_DAYS``) of period-adjusted daily demand. Per-item weekday
+factors and hour profiles are shrunk toward the canteen-wide pattern, so
+that items with little history borrow strength from the rest of the
+menu. Term periods (``term``, ``exam``, ``break``) come from
+``CANTEEN_TERM_CALENDAR``, e.g. ``exam:2025-04-21..2025-05-09;
+break:2025-05-10..2025-07-14``. Their factors are learned from the
+history.
+
+Forecasting a date is a single broadcast over all items. Results are
+cached per date until the model is refitted, which happens at most
+every ``REFIT_SECONDS`` and whenever the day changes.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+LOGGER = logging.getLogger(__name__)
+
+HISTORY_DAYS = int(os.getenv("CANTEEN_FORECAST_HISTORY_DAYS", "182"))
+HALF_LIFE_DAYS = float(os.getenv("CANTEEN_FORECAST_HALF_LIFE_DAYS", "28"))
+REFIT_SECONDS = int(os.getenv("CANTEEN_FORECAST_REFIT_SECONDS", "3600"))
+TERM_CALENDAR = os.getenv("CANTEEN_TERM_CALENDAR", "")
+
+PERIODS = ("term", "exam", "break")
+# Prior strength, in (recency-weighted) units sold, pulling item weekday
+# factors and hour profiles toward the canteen-wide pattern
+DOW_SHRINK_UNITS = 20.0
+HOUR_SHRINK_UNITS = 30.0
+# Window for the in-sample error that confidence is derived from
+CONFIDENCE_DAYS = 28
+
+
+def parse_term_calendar(spec: str) -> List[Tuple[str, date, date]]:
+    """``"exam:2025-04-21..2025-05-09;break:..."`` -> ``[(period, start, end), ...]``"""
+    ranges = []
+    for part in filter(None, (p.strip() for p in (spec or "").split(";"))):
+        try:
+            period, span = part.split(":", 1)
+            start, end = span.split("..", 1)
+            period = period.strip().lower()
+            if period not in PERIODS:
+                raise ValueError(period)
+            ranges.append((period, date.fromisoformat(start.strip()), date.fromisoformat(end.strip())))
+        except ValueError:
+            LOGGER.warning("Ignoring bad CANTEEN_TERM_CALENDAR entry %r", part)
+    return ranges
+
+
+def period_codes(days: Sequence[date], calendar: Sequence[Tuple[str, date, date]]) -> np.ndarray:
+    codes = np.zeros(len(days), dtype=np.int64)
+    for period, start, end in calendar:
+        code = PERIODS.index(period)
+        for index, day in enumerate(days):
+            if start <= day <= end:
+                codes[index] = code
+    return codes
+
+
+def _safe_divide(num: np.ndarray, den: np.ndarray, fill: float = 0.0) -> np.ndarray:
+    out = np.full(np.broadcast(num, den).shape, fill, dtype=np.float64)
+    np.divide(num, den, out=out, where=den > 0)
+    return out
+
+
+@dataclass
+class DemandHistory:
+    start: date
+    item_ids: List[str]
+    quantities: np.ndarray  # (days, items, 24) units sold
+    lines: np.ndarray  # (items,) order lines, for average quantity per line
+
+    @property
+    def days(self) -> List[date]:
+        return [self.start + timedelta(days=d) for d in range(self.quantities.shape[0])]
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict], start: date, end: date) -> "DemandHistory":
+        """Rows of ``(day, hour, item_id, qty, line_count)`` as returned by ``HISTORY_SQL``."""
+        rows = list(rows)
+        item_ids = sorted({str(r["item_id"]) for r in rows})
+        index = {item_id: i for i, item_id in enumerate(item_ids)}
+        n_days = (end - start).days + 1
+        quantities = np.zeros((n_days, len(item_ids), 24))
+        lines = np.zeros(len(item_ids))
+        if rows:
+            day_idx = np.array([((r["day"].date() if isinstance(r["day"], datetime) else r["day"]) - start).days for r in rows])
+            item_idx = np.array([index[str(r["item_id"])] for r in rows])
+            hours = np.array([int(r["hour"]) for r in rows])
+            qty = np.array([float(r["qty"]) for r in rows])
+            keep = (day_idx >= 0) & (day_idx < n_days)
+            np.add.at(quantities, (day_idx[keep], item_idx[keep], hours[keep]), qty[keep])
+            np.add.at(lines, item_idx[keep], np.array([float(r["line_count"]) for r in rows])[keep])
+        return cls(start, item_ids, quantities, lines)
+
+
+@dataclass
+class DemandModel:
+    fitted_through: date
+    item_ids: List[str]
+    level: np.ndarray  # (items,)
+    dow_factor: np.ndarray  # (items, 7)
+    period_factor: np.ndarray  # (periods,)
+    hour_profile: np.ndarray  # (items, 7, 24)
+    confidence: np.ndarray  # (items,)
+    avg_quantity: np.ndarray  # (items,)
+    calendar: List[Tuple[str, date, date]] = field(default_factory=list)
+
+    @classmethod
+    def fit(cls, history: DemandHistory, calendar: Sequence[Tuple[str, date, date]] = ()) -> "DemandModel":
+        Y = history.quantities
+        days = history.days
+        # Days before the first sale (a new canteen, or history shorter than the window) are not zeros
+        sold = np.flatnonzero(Y.sum(axis=(1, 2)))
+        if sold.size:
+            Y, days = Y[sold[0]:], days[sold[0]:]
+        n_days, n_items, _ = Y.shape
+        dow = np.array([d.weekday() for d in days])
+        onehot = np.eye(7)[dow]  # (days, 7)
+        periods = period_codes(days, calendar)
+        weights = 0.5 ** ((n_days - 1 - np.arange(n_days)) / HALF_LIFE_DAYS)
+
+        daily = Y.sum(axis=2)  # (days, items)
+        total = daily.sum(axis=1)  # (days,)
+
+        # Canteen-wide weekday pattern
+        dow_weight = onehot.T @ weights
+        dow_mean = _safe_divide(onehot.T @ (weights * total), dow_weight)
+        overall = _safe_divide(np.array(weights @ total), np.array(weights.sum()))
+        global_dow = _safe_divide(dow_mean, overall, fill=1.0)
+        global_dow[dow_weight == 0] = 1.0
+
+        # Term-period factors relative to normal teaching days
+        dow_adjusted = _safe_divide(total, global_dow[dow], fill=0.0)
+        base = dow_adjusted[periods == 0].mean() if np.any(periods == 0) else dow_adjusted.mean() if n_days else 0.0
+        period_factor = np.ones(len(PERIODS))
+        for code in range(1, len(PERIODS)):
+            mask = periods == code
+            if mask.any() and base > 0:
+                # Floor keeps closed periods (no sales at all) from zeroing the adjustment below
+                period_factor[code] = max(dow_adjusted[mask].mean() / base, 0.02)
+
+        # Item levels and weekday factors on period-adjusted demand
+        adjusted = daily / period_factor[periods][:, None]
+        item_dow_mean = _safe_divide(onehot.T @ (weights[:, None] * adjusted), dow_weight[:, None])  # (7, items)
+        seen = dow_weight > 0
+        level = item_dow_mean[seen].mean(axis=0) if seen.any() else np.zeros(n_items)
+        raw_dow = _safe_divide(item_dow_mean.T, level[:, None], fill=1.0)  # (items, 7)
+        dow_units = (onehot.T @ (weights[:, None] * daily)).T  # (items, 7)
+        alpha = dow_units / (dow_units + DOW_SHRINK_UNITS)
+        dow_factor = alpha * raw_dow + (1 - alpha) * global_dow
+        dow_factor[level == 0] = global_dow
+
+        # Hour profiles: item x weekday, shrunk to item-all-week, shrunk to canteen-wide
+        by_dow = np.einsum("dk,dih->ikh", onehot * weights[:, None], Y)  # (items, 7, 24)
+        canteen = by_dow.sum(axis=(0, 1))
+        canteen_profile = _safe_divide(canteen, np.array(canteen.sum()))
+        if canteen.sum() == 0:
+            canteen_profile[:] = 1 / 24
+        item_all = by_dow.sum(axis=1)  # (items, 24)
+        item_units = item_all.sum(axis=1, keepdims=True)
+        beta = item_units / (item_units + HOUR_SHRINK_UNITS)
+        item_profile = beta * _safe_divide(item_all, item_units) + (1 - beta) * canteen_profile
+        cell_units = by_dow.sum(axis=2, keepdims=True)
+        gamma = cell_units / (cell_units + HOUR_SHRINK_UNITS)
+        hour_profile = gamma * _safe_divide(by_dow, cell_units) + (1 - gamma) * item_profile[:, None, :]
+
+        # Confidence from recent in-sample daily error
+        recent = slice(max(0, n_days - CONFIDENCE_DAYS), n_days)
+        fitted = level[None, :] * dow_factor.T[dow[recent]] * period_factor[periods[recent]][:, None]
+        actual = daily[recent]
+        wape = _safe_divide(np.abs(actual - fitted).sum(axis=0), actual.sum(axis=0), fill=1.0)
+        confidence = np.clip(1 - wape, 0.05, 0.95)
+
+        return cls(
+            fitted_through=days[-1] if days else date.today(),
+            item_ids=list(history.item_ids),
+            level=level,
+            dow_factor=dow_factor,
+            period_factor=period_factor,
+            hour_profile=hour_profile,
+            confidence=confidence,
+            avg_quantity=_safe_divide(history.quantities.sum(axis=(0, 2)), history.lines, fill=1.0),
+            calendar=list(calendar),
+        )
+
+    def predict_days(self, days: Sequence[date]) -> np.ndarray:
+        """``(len(days), items, 24)`` expected units, all items and days in one broadcast."""
+        dow = np.array([d.weekday() for d in days])
+        periods = period_codes(days, self.calendar)
+        daily = self.level[None, :] * self.dow_factor.T[dow] * self.period_factor[periods][:, None]
+        profile = np.transpose(self.hour_profile[:, dow, :], (1, 0, 2))
+        return daily[:, :, None] * profile
+
+    def predict(self, day: date) -> np.ndarray:
+        return self.predict_days([day])[0]
+
+
+HISTORY_SQL = """
+    SELECT DATE(co.created_at) AS day, HOUR(co.created_at) AS hour, coi.item_id,
+           SUM(coi.quantity) AS qty, COUNT(*) AS line_count
+    FROM canteen_orders co
+    JOIN canteen_order_items coi ON coi.order_id = co.id
+    WHERE co.created_at >= %s AND co.created_at < %s AND co.status <> 'cancelled'
+    GROUP BY DATE(co.created_at), HOUR(co.created_at), coi.item_id
+"""
+
+
+class ForecastService:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._model: Optional[DemandModel] = None
+        self._fitted_at = 0.0
+        self._version = 0
+        self._menu: Dict[str, Dict] = {}
+        self._cache: Dict[date, Dict] = {}
+
+    def _stale(self) -> bool:
+        return (
+            self._model is None
+            or time.time() - self._fitted_at > REFIT_SECONDS
+            or self._model.fitted_through < date.today() - timedelta(days=1)
+        )
+
+    def refit(self, cursor) -> DemandModel:
+        end = date.today() - timedelta(days=1)
+        start = end - timedelta(days=HISTORY_DAYS - 1)
+        t0 = time.perf_counter()
+        cursor.execute(HISTORY_SQL, (start, end + timedelta(days=1)))
+        history = DemandHistory.from_rows(cursor.fetchall(), start, end)
+        cursor.execute("SELECT id, name, category, is_available FROM canteen_menu_items")
+        menu = {str(r["id"]): r for r in cursor.fetchall()}
+        model = DemandModel.fit(history, parse_term_calendar(TERM_CALENDAR))
+        with self._lock:
+            self._model, self._menu = model, menu
+            self._fitted_at = time.time()
+            self._version += 1
+            self._cache.clear()
+        LOGGER.info("Canteen forecast refitted: %s items, %s days in %.0f ms",
+                    len(model.item_ids), HISTORY_DAYS, (time.perf_counter() - t0) * 1000)
+        return model
+
+    def forecast(self, cursor, day: date, limit: int = 20) -> Dict:
+        if self._stale():
+            self.refit(cursor)
+        with self._lock:
+            cached = self._cache.get(day)
+            model, menu, version = self._model, self._menu, self._version
+        if cached is not None:
+            return {**cached, "cached": True}
+
+        hourly = model.predict(day)  # (items, 24)
+        daily = hourly.sum(axis=1)
+        predictions = []
+        for i in np.argsort(-daily):
+            item_id = model.item_ids[i]
+            item = menu.get(item_id)
+            if menu and (item is None or not item.get("is_available")):
+                continue
+            predicted = float(daily[i])
+            predictions.append({
+                "item_id": int(item_id) if item_id.isdigit() else item_id,
+                "item_name": item["name"] if item else item_id,
+                "category": item.get("category") if item else None,
+                "predicted_orders": int(round(predicted)),
+                "avg_quantity": round(float(model.avg_quantity[i]), 1),
+                "peak_hour": int(np.argmax(hourly[i])),
+                "hourly": [round(float(v), 2) for v in hourly[i]],
+                "confidence": round(float(model.confidence[i]), 3),
+                "popularity": "High" if predicted > 15 else "Medium" if predicted > 5 else "Low",
+            })
+            if len(predictions) >= limit:
+                break
+        canteen_hourly = hourly.sum(axis=0)
+        result = {
+            "date": day.isoformat(),
+            "predictions": predictions,
+            "peak_hours": sorted(int(h) for h in np.argsort(-canteen_hourly)[:3] if canteen_hourly[h] > 0),
+            "total_predicted_orders": sum(p["predicted_orders"] for p in predictions),
+            "term_period": PERIODS[int(period_codes([day], model.calendar)[0])],
+            "model": {"version": version, "fitted_through": model.fitted_through.isoformat(),
+                      "history_days": HISTORY_DAYS, "items": len(model.item_ids)},
+        }
+        with self._lock:
+            if self._version == version:
+                self._cache[day] = result
+        return {**result, "cached": False}
+
+
+forecast_service = ForecastService()
+
+
+def synthetic_history(n_items: int = 40, n_days: int = 364, seed: int = 11,
+                      calendar: Sequence[Tuple[str, date, date]] = ()) -> DemandHistory:
+    """Poisson demand with item popularity, weekday, term-period and lunch/breakfast hour effects."""
+    rng = np.random.default_rng(seed)
+    start = date(2024, 7, 1)
+    days = [start + timedelta(days=d) for d in range(n_days)]
+    popularity = rng.gamma(1.5, 6.0, n_items)
+    weekday = np.array([1.0, 1.05, 1.1, 1.05, 0.95, 0.45, 0.25])
+    item_weekday = weekday * rng.lognormal(0, 0.15, (n_items, 7))
+    period_effect = np.array([1.0, 0.7, 0.2])[period_codes(days, calendar)]
+    hours = np.arange(24)
+    lunch = np.exp(-0.5 * ((hours - 13) / 1.0) ** 2)
+    breakfast = np.exp(-0.5 * ((hours - 8.5) / 0.8) ** 2)
+    snack = np.exp(-0.5 * ((hours - 16.5) / 1.2) ** 2)
+    mix = rng.dirichlet([4, 1, 1.5], n_items)
+    profile = mix @ np.stack([lunch, breakfast, snack])
+    profile /= profile.sum(axis=1, keepdims=True)
+    trend = np.linspace(0.9, 1.1, n_days)
+    dow = np.array([d.weekday() for d in days])
+    mean = (popularity[None, :] * item_weekday.T[dow] * (period_effect * trend)[:, None])[:, :, None] * profile[None]
+    quantities = rng.poisson(mean).astype(np.float64)
+    return DemandHistory(start, [str(i + 1) for i in range(n_items)], quantities,
+                         np.maximum(quantities.sum(axis=(0, 2)) / 1.3, 1))
+
+
+def history_rows(history: DemandHistory) -> List[Dict]:
+    """``history`` as ``HISTORY_SQL`` result rows, one order line per unit sold."""
+    rows = []
+    for d, i, h in zip(*np.nonzero(history.quantities)):
+        qty = float(history.quantities[d, i, h])
+        rows.append({"day": history.start + timedelta(days=int(d)), "hour": int(h),
+                     "item_id": history.item_ids[i], "qty": qty, "line_count": int(qty)})
+    return rows
+
+
+def check_history_rows(history: DemandHistory) -> None:
+    """Rows named like the ``HISTORY_SQL`` aliases must rebuild ``history`` through ``from_rows``."""
+    select_list = re.search(r"SELECT(.*?)\bFROM\b", HISTORY_SQL, re.S).group(1)
+    columns = {re.split(r"\bAS\b|\.", column)[-1].strip() for column in select_list.split(",")}
+    rows = history_rows(history)
+    missing = columns ^ set(rows[0])
+    assert not missing, f"HISTORY_SQL aliases and from_rows keys differ: {sorted(missing)}"
+    end = history.start + timedelta(days=history.quantities.shape[0] - 1)
+    rebuilt = DemandHistory.from_rows(rows, history.start, end)
+    order = [rebuilt.item_ids.index(item_id) for item_id in history.item_ids]
+    assert np.array_equal(rebuilt.quantities[:, order, :], history.quantities), "from_rows lost quantities"
+    assert np.array_equal(rebuilt.lines[order], history.quantities.sum(axis=(0, 2))), "from_rows lost line counts"
+
+
+def benchmark(n_items: int = 40, test_days: int = 28) -> Dict:
+    """Rolling-origin backtest on synthetic history against the old and a seasonal-naive forecast."""
+    start = date(2024, 7, 1)
+    calendar = [("exam", start + timedelta(days=140), start + timedelta(days=153)),
+                ("break", start + timedelta(days=154), start + timedelta(days=190)),
+                ("exam", start + timedelta(days=336), start + timedelta(days=349))]
+    full = synthetic_history(n_items, calendar=calendar)
+    check_history_rows(full)
+    n_days = full.quantities.shape[0]
+    errors = {"model_daily": [0.0, 0.0], "old_daily": [0.0, 0.0], "naive_daily": [0.0, 0.0], "model_hourly": [0.0, 0.0]}
+    fit_ms, predict_ms = [], []
+    for cutoff in range(n_days - test_days, n_days):
+        window = max(0, cutoff - HISTORY_DAYS)
+        history = DemandHistory(full.start + timedelta(days=window), full.item_ids,
+                                full.quantities[window:cutoff], full.lines)
+        target = full.start + timedelta(days=cutoff)
+        t0 = time.perf_counter()
+        model = DemandModel.fit(history, calendar)
+        fit_ms.append((time.perf_counter() - t0) * 1000)
+        t0 = time.perf_counter()
+        hourly = model.predict(target)
+        predict_ms.append((time.perf_counter() - t0) * 1000)
+        actual_hourly = full.quantities[cutoff]
+        actual = actual_hourly.sum(axis=1)
+        daily = full.quantities.sum(axis=2)
+        # Old method: same-weekday total over the previous 8 weeks x 0.85
+        old = 0.85 * daily[[cutoff - 7 * k for k in range(1, 9)]].sum(axis=0)
+        naive = daily[cutoff - 7]
+        for key, forecast in (("model_daily", hourly.sum(axis=1)), ("old_daily", old), ("naive_daily", naive)):
+            errors[key][0] += np.abs(forecast - actual).sum()
+            errors[key][1] += actual.sum()
+        errors["model_hourly"][0] += np.abs(hourly - actual_hourly).sum()
+        errors["model_hourly"][1] += actual_hourly.sum()
+    result = {f"wape_{key}": round(float(err / max(total, 1e-9)), 3) for key, (err, total) in errors.items()}
+    result.update({
+        "items": n_items,
+        "history_days": min(HISTORY_DAYS, n_days - test_days),
+        "test_days": test_days,
+        "fit_ms_p50": round(float(np.median(fit_ms)), 2),
+        "whole_menu_forecast_ms_p50": round(float(np.median(predict_ms)), 3),
+    })
+    return result
+
+
+if __name__ == "__main__":
+    print(benchmark())
@@ -0,0 +1,374 @@
+"""Peak-hour canteen order ingestion.
+
+At lunch ``POST /canteen/order`` gets a burst of orders. Each one used to
+run its own transaction with one INSERT per item. Now orders are admitted,
+queued and written by a single writer that groups whatever is waiting
+into one transaction:
+
+* one multi-row INSERT for the orders (``executemany``),
+* one SELECT to map ``order_token`` back to the new ids,
+* one multi-row INSERT for all their items, and
+* one COMMIT.
+
+Admission control happens before anything is queued. Each student may
+place ``USER_MAX_ORDERS`` orders per ``USER_WINDOW_SECONDS``, and the
+queue never holds more than ``MAX_QUEUE_DEPTH`` orders. A rejected order
+gets an ``OrderAdmissionError`` carrying a ``retry_after`` in seconds,
+which main turns into a 429/503 with a ``Retry-After`` header.
+
+If the writer task dies, the next ``submit`` starts a new one. Orders left
+in the dead writer's queue were never written. They fail with a 503 so the
+client can retry, and they are taken off the queue depth.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+LOGGER = logging.getLogger(__name__)
+
+USER_MAX_ORDERS = int(os.getenv("CANTEEN_USER_MAX_ORDERS", "5"))
+USER_WINDOW_SECONDS = float(os.getenv("CANTEEN_USER_WINDOW_SECONDS", "60"))
+MAX_QUEUE_DEPTH = int(os.getenv("CANTEEN_MAX_QUEUE_DEPTH", "400"))
+BATCH_MAX_ORDERS = int(os.getenv("CANTEEN_BATCH_MAX_ORDERS", "50"))
+# How long the writer waits for more orders to join a batch that is not full
+BATCH_WAIT_SECONDS = float(os.getenv("CANTEEN_BATCH_WAIT_MS", "5")) / 1000
+
+_ORDER_SQL = """
+    INSERT INTO canteen_orders (user_id, total_amount, payment_method, payment_status, status, qr_token, order_token)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+"""
+_ITEM_SQL = """
+    INSERT INTO canteen_order_items (order_id, item_id, item_name, price, quantity)
+    VALUES (%s, %s, %s, %s, %s)
+"""
+
+
+class OrderAdmissionError(RuntimeError):
+    """Order refused before queuing; ``retry_after`` seconds is a fair time to wait."""
+
+    def __init__(self, message: str, retry_after: int, status_code: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+
+@dataclass
+class PendingOrder:
+    user_id: int
+    total_amount: float
+    payment_method: str
+    payment_status: str
+    status: str
+    qr_token: str
+    order_token: str
+    # (item_id, item_name, price, quantity)
+    items: List[Tuple[str, str, float, int]] = field(default_factory=list)
+
+    def order_row(self) -> Tuple:
+        return (self.user_id, self.total_amount, self.payment_method, self.payment_status,
+                self.status, self.qr_token, self.order_token)
+
+
+class OrderIngestPipeline:
+    def __init__(self):
+        self._connect: Optional[Callable] = None
+        self._prepare: Optional[Callable] = None
+        self._prepared = False
+        self._connection = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._lock = threading.Lock()
+        self._user_windows: Dict[int, Deque[float]] = {}
+        self._depth = 0
+        # Sustained writer throughput (orders/s), used to size Retry-After
+        self._throughput = 100.0
+        self.written = 0
+        self.batches = 0
+        self.rejected = 0
+
+    def configure(self, connect: Callable, prepare: Optional[Callable] = None) -> None:
+        """``connect()`` returns a MySQL connection; ``prepare(cursor)`` runs once before the first write."""
+        self._connect = connect
+        self._prepare = prepare
+
+    # --- admission ---
+
+    def admit(self, user_id: int) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if self._depth >= MAX_QUEUE_DEPTH:
+                self.rejected += 1
+                wait = max(1, math.ceil(self._depth / max(self._throughput, 1.0)))
+                raise OrderAdmissionError(
+                    f"The canteen is very busy right now, try again in {wait} seconds", wait, 503
+                )
+            window = self._user_windows.setdefault(user_id, deque())
+            while window and now - window[0] >= USER_WINDOW_SECONDS:
+                window.popleft()
+            if len(window) >= USER_MAX_ORDERS:
+                self.rejected += 1
+                wait = max(1, math.ceil(USER_WINDOW_SECONDS - (now - window[0])))
+                raise OrderAdmissionError(
+                    f"Too many orders placed recently, try again in {wait} seconds", wait, 429
+                )
+            window.append(now)
+            self._depth += 1
+            if len(self._user_windows) > 10000:
+                self._user_windows = {u: w for u, w in self._user_windows.items()
+                                      if w and now - w[-1] < USER_WINDOW_SECONDS}
+
+    async def submit(self, order: PendingOrder) -> int:
+        """Admit, queue and wait for the batch holding ``order`` to commit; returns the new order id."""
+        self.admit(order.user_id)
+        if self._worker is None or self._worker.done():
+            self._start_writer()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((order, future))
+        return await future
+
+    # --- writer ---
+
+    def _start_writer(self) -> None:
+        """Start a writer task, failing whatever a dead predecessor left queued."""
+        if self._worker is not None and not self._worker.cancelled() and self._worker.exception() is not None:
+            LOGGER.error("Canteen order writer died: %s", self._worker.exception())
+        stranded = []
+        while self._queue is not None and not self._queue.empty():
+            stranded.append(self._queue.get_nowait())
+        if stranded:
+            LOGGER.warning("Failing %s canteen orders queued on a dead writer", len(stranded))
+            self._fail(stranded, OrderAdmissionError("The order could not be queued, please try again", 1, 503))
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    def _fail(self, entries: List[Tuple[PendingOrder, asyncio.Future]], error: Exception) -> None:
+        with self._lock:
+            self._depth = max(0, self._depth - len(entries))
+        for _, future in entries:
+            if not future.done():
+                future.set_exception(error)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        batch = []
+        try:
+            while True:
+                batch = [await self._queue.get()]
+                deadline = loop.time() + BATCH_WAIT_SECONDS
+                while len(batch) < BATCH_MAX_ORDERS:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                        continue
+                    except asyncio.QueueEmpty:
+                        pass
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+                started = time.perf_counter()
+                try:
+                    results = await loop.run_in_executor(None, self._write, [order for order, _ in batch])
+                except Exception as e:
+                    LOGGER.error("Canteen order batch of %s failed: %s", len(batch), e)
+                    results = [e] * len(batch)
+                elapsed = max(time.perf_counter() - started, 1e-6)
+                with self._lock:
+                    self._depth -= len(batch)
+                    self._throughput = 0.8 * self._throughput + 0.2 * (len(batch) / elapsed)
+                done, batch = batch, []
+                for (_, future), result in zip(done, results):
+                    if future.done():
+                        continue
+                    if isinstance(result, Exception):
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result)
+        finally:
+            # Cancelled mid-batch: the write may or may not have committed, so don't invite a retry
+            if batch:
+                self._fail(batch, RuntimeError("The canteen order writer stopped before confirming this order"))
+
+    def _ensure_connection(self):
+        if self._connection is None or not self._connection.is_connected():
+            self._connection = self._connect()
+        if not self._prepared and self._prepare is not None:
+            cursor = self._connection.cursor(dictionary=True)
+            try:
+                self._prepare(cursor)
+            finally:
+                cursor.close()
+            self._prepared = True
+        return self._connection
+
+    def _write(self, orders: List[PendingOrder]) -> List:
+        """Ids (or the exception) for each order; a failed batch is retried order by order."""
+        try:
+            ids = write_batch(self._ensure_connection(), orders)
+            self.written += len(orders)
+            self.batches += 1
+            return ids
+        except Exception as e:
+            self._rollback()
+            if len(orders) == 1:
+                LOGGER.error("Canteen order write failed: %s", e)
+                return [e]
+            LOGGER.warning("Canteen order batch of %s failed (%s); retrying individually", len(orders), e)
+        results = []
+        for order in orders:
+            try:
+                results.extend(write_batch(self._ensure_connection(), [order]))
+                self.written += 1
+                self.batches += 1
+            except Exception as e:
+                self._rollback()
+                results.append(e)
+        return results
+
+    def _rollback(self) -> None:
+        try:
+            if self._connection is not None:
+                self._connection.rollback()
+        except Exception:
+            self._connection = None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "queue_depth": self._depth,
+                "throughput_per_s": round(self._throughput, 1),
+                "written": self.written,
+                "batches": self.batches,
+                "rejected": self.rejected,
+            }
+
+
+def write_batch(connection, orders: List[PendingOrder]) -> List[int]:
+    """Insert ``orders`` and their items in one transaction; returns ids in input order."""
+    cursor = connection.cursor(dictionary=True)
+    try:
+        connection.start_transaction()
+        cursor.executemany(_ORDER_SQL, [order.order_row() for order in orders])
+        tokens = [order.order_token for order in orders]
+        cursor.execute(
+            f"SELECT id, order_token FROM canteen_orders WHERE order_token IN ({', '.join(['%s'] * len(tokens))})",
+            tuple(tokens),
+        )
+        ids = {row["order_token"]: row["id"] for row in cursor.fetchall()}
+        item_rows = [(ids[order.order_token], *item) for order in orders for item in order.items]
+        if item_rows:
+            cursor.executemany(_ITEM_SQL, item_rows)
+        connection.commit()
+    finally:
+        cursor.close()
+    return [ids[order.order_token] for order in orders]
+
+
+order_ingest = OrderIngestPipeline()
+
+
+class _FakeConnection:
+    """Stands in for MySQL in the benchmark: counts round trips and sleeps a fixed RTT each."""
+
+    def __init__(self, rtt: float):
+        self.rtt = rtt
+        self.round_trips = 0
+        self._next_id = 1
+        self._tokens: Dict[str, int] = {}
+        self._result: List[Dict] = []
+
+    def is_connected(self):
+        return True
+
+    def cursor(self, dictionary=True):
+        return self
+
+    def close(self):
+        pass
+
+    def _trip(self):
+        self.round_trips += 1
+        time.sleep(self.rtt)
+
+    def start_transaction(self):
+        self._trip()
+
+    def commit(self):
+        self._trip()
+
+    def rollback(self):
+        self._trip()
+
+    def execute(self, sql, params=()):
+        self._trip()
+        self._result = [{"id": self._tokens[t], "order_token": t} for t in params if t in self._tokens]
+
+    def executemany(self, sql, rows):
+        self._trip()
+        if "canteen_orders" in sql:
+            for row in rows:
+                self._tokens[row[-1]] = self._next_id
+                self._next_id += 1
+
+    def fetchall(self):
+        return self._result
+
+
+def benchmark(orders: int = 2000, items_per_order: int = 3, rtt_ms: float = 0.5) -> Dict:
+    """Ingest a lunch burst through the pipeline versus one transaction per order with per-item INSERTs."""
+    from secrets import token_hex
+
+    def make(i):
+        return PendingOrder(i, 120.0, "cash", "pending_at_counter", "queued", token_hex(8), token_hex(8),
+                            [(str(n), f"item-{n}", 40.0, 1) for n in range(items_per_order)])
+
+    rtt = rtt_ms / 1000
+    naive = _FakeConnection(rtt)
+    t0 = time.perf_counter()
+    for i in range(orders):
+        order = make(i)
+        naive.execute(_ORDER_SQL, order.order_row())
+        for item in order.items:
+            naive.execute(_ITEM_SQL, (0, *item))
+        naive.commit()
+    naive_s = time.perf_counter() - t0
+
+    async def burst():
+        pipeline = OrderIngestPipeline()
+        connection = _FakeConnection(rtt)
+        pipeline.configure(lambda: connection)
+        global USER_MAX_ORDERS, MAX_QUEUE_DEPTH
+        saved = USER_MAX_ORDERS, MAX_QUEUE_DEPTH
+        USER_MAX_ORDERS, MAX_QUEUE_DEPTH = orders, orders
+        try:
+            t0 = time.perf_counter()
+            ids = await asyncio.gather(*(pipeline.submit(make(i)) for i in range(orders)))
+            elapsed = time.perf_counter() - t0
+        finally:
+            USER_MAX_ORDERS, MAX_QUEUE_DEPTH = saved
+        return elapsed, connection.round_trips, len(set(ids))
+
+    batched_s, batched_trips, distinct = asyncio.run(burst())
+    return {
+        "orders": orders,
+        "per_order_round_trips": naive.round_trips,
+        "batched_round_trips": batched_trips,
+        "distinct_ids": distinct,
+        "per_order_orders_per_s": round(orders / naive_s),
+        "batched_orders_per_s": round(orders / batched_s),
+    }
+
+
+if __name__ == "__main__":
+    print(benchmark())
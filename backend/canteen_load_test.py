@@ -0,0 +1,154 @@
+"""Lunch-rush load test for ``POST /canteen/order``.
+
+Replays ``--orders`` orders (2,000 by default) against a running API over
+``--duration`` seconds (5 minutes by default). Arrivals follow a Poisson
+process whose rate peaks in the first fifth of the run, the way the
+1 PM rush does. Orders are built from the items ``GET /canteen/menu``
+returns at startup, and each is sent with one of the student bearer
+tokens in ``--tokens`` (one per line, used round-robin). The script
+reports accepted and rejected counts by status code, the Retry-After
+values it was given, and latency percentiles. ``--honour-retry`` re-sends a
+rejected order once after its Retry-After.
+
+    python canteen_load_test.py --tokens tokens.txt
+    python canteen_load_test.py --tokens tokens.txt --base-url http://localhost:8000 --orders 500 --duration 60
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import statistics
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import requests
+
+def arrival_times(orders: int, duration: float, peak_share: float = 0.5, seed: int = 13) -> List[float]:
+    """Offsets in seconds; ``peak_share`` of the orders land in the first fifth of the run."""
+    rng = random.Random(seed)
+    peak_orders = int(orders * peak_share)
+    times = []
+    for count, start, length in ((peak_orders, 0.0, duration / 5), (orders - peak_orders, duration / 5, duration * 4 / 5)):
+        t = start
+        rate = count / length if length else 0
+        for _ in range(count):
+            t += rng.expovariate(rate) if rate else 0
+            times.append(min(t, start + length))
+    return sorted(times)
+
+
+def fetch_menu(base_url: str, token: str, timeout: float) -> List[Dict]:
+    """Orderable items from the live menu, in the shape ``POST /canteen/order`` takes."""
+    response = requests.get(
+        base_url.rstrip("/") + "/canteen/menu", headers={"Authorization": f"Bearer {token}"}, timeout=timeout
+    )
+    response.raise_for_status()
+    return [
+        {"menu_item_id": item["id"], "name": item["name"], "price": float(item["price"])}
+        for item in response.json().get("items", [])
+    ]
+
+
+def random_order(rng: random.Random, menu: List[Dict]) -> Dict:
+    picks = rng.sample(menu, rng.randint(1, min(3, len(menu))))
+    return {"items": [dict(item, quantity=rng.randint(1, 2)) for item in picks], "special_instructions": ""}
+
+
+class LoadTest:
+    def __init__(self, base_url: str, tokens: List[str], menu: List[Dict], honour_retry: bool, timeout: float):
+        self.url = base_url.rstrip("/") + "/canteen/order"
+        self.tokens = tokens
+        self.menu = menu
+        self.honour_retry = honour_retry
+        self.timeout = timeout
+        self.statuses: Counter = Counter()
+        self.retry_after: Counter = Counter()
+        self.latencies: List[float] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def send(self, index: int, payload: Dict, retried: bool = False) -> None:
+        headers = {"Authorization": f"Bearer {self.tokens[index % len(self.tokens)]}"}
+        started = time.perf_counter()
+        try:
+            response = self._session().post(self.url, json=payload, headers=headers, timeout=self.timeout)
+            status: object = response.status_code
+        except requests.RequestException as e:
+            response, status = None, type(e).__name__
+        elapsed = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.statuses[status] += 1
+            self.latencies.append(elapsed)
+            wait = response.headers.get("Retry-After") if response is not None else None
+            if wait:
+                self.retry_after[int(wait)] += 1
+        if wait and self.honour_retry and not retried:
+            time.sleep(int(wait))
+            self.send(index, payload, retried=True)
+
+    def run(self, orders: int, duration: float, concurrency: int) -> Dict:
+        rng = random.Random(7)
+        schedule = arrival_times(orders, duration)
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for index, offset in enumerate(schedule):
+                delay = started + offset - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(self.send, index, random_order(rng, self.menu))
+        wall = time.monotonic() - started
+        return self.report(orders, wall)
+
+    def report(self, orders: int, wall: float) -> Dict:
+        ordered = sorted(self.latencies)
+
+        def pct(p: float) -> Optional[float]:
+            return round(ordered[min(len(ordered) - 1, int(len(ordered) * p))], 1) if ordered else None
+
+        accepted = self.statuses.get(200, 0)
+        return {
+            "orders": orders,
+            "wall_seconds": round(wall, 1),
+            "accepted": accepted,
+            "accepted_per_s": round(accepted / wall, 1) if wall else None,
+            "status_counts": {str(k): v for k, v in self.statuses.most_common()},
+            "retry_after_seconds": dict(sorted(self.retry_after.items())),
+            "latency_ms": {"p50": round(statistics.median(ordered), 1) if ordered else None,
+                           "p95": pct(0.95), "p99": pct(0.99), "max": pct(1.0)},
+        }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--tokens", required=True, help="file with one student bearer token per line")
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--duration", type=float, default=300.0, help="seconds")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--honour-retry", action="store_true")
+    args = parser.parse_args()
+
+    with open(args.tokens) as f:
+        tokens = [line.strip() for line in f if line.strip()]
+    if not tokens:
+        parser.error("no tokens in --tokens file")
+    menu = fetch_menu(args.base_url, tokens[0], args.timeout)
+    if not menu:
+        parser.error(f"{args.base_url}/canteen/menu has no available items to order")
+    test = LoadTest(args.base_url, tokens, menu, args.honour_retry, args.timeout)
+    print(json.dumps(test.run(args.orders, args.duration, args.concurrency), indent=2))
+
+
+if __name__ == "__main__":
+    main()
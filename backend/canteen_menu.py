@@ -0,0 +1,184 @@
+"""Versioned in-memory snapshot of the canteen menu.
+
+Order placement prices and validates every line against this snapshot
+instead of trusting the client's ``price``/``total_amount``, and it does
+so without touching MySQL. The snapshot is rebuilt from
+``canteen_menu_items`` by the request that changes the menu (add, update,
+patch, delete, clear and the OCR import), so the writing worker sees its
+own change immediately. Every worker also checks a cheap checksum of the
+table every ``CHECK_INTERVAL_SECONDS`` and reloads when it differs,
+which picks up changes made on other workers.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+LOGGER = logging.getLogger(__name__)
+
+CHECK_INTERVAL_SECONDS = float(os.getenv("CANTEEN_MENU_CHECK_SECONDS", "10"))
+MAX_QUANTITY = int(os.getenv("CANTEEN_MAX_ITEM_QUANTITY", "20"))
+
+_FINGERPRINT_SQL = """
+    SELECT COUNT(*) AS n,
+           COALESCE(SUM(CRC32(CONCAT_WS('|', id, name, price, category, is_available))), 0) AS checksum
+    FROM canteen_menu_items
+"""
+
+
+class MenuValidationError(ValueError):
+    """An order line that does not match the current menu."""
+
+
+@dataclass(frozen=True)
+class MenuItem:
+    id: int
+    name: str
+    price: float
+    category: str
+    is_available: bool
+
+
+@dataclass
+class MenuSnapshot:
+    version: int
+    fingerprint: Tuple[int, int]
+    items: Dict[int, MenuItem] = field(default_factory=dict)
+    by_name: Dict[str, int] = field(default_factory=dict)
+    loaded_at: float = field(default_factory=time.time)
+
+    def lookup(self, line: Dict) -> MenuItem:
+        raw_id = line.get("menu_item_id", line.get("id"))
+        item = None
+        try:
+            item = self.items.get(int(raw_id))
+        except (TypeError, ValueError):
+            pass
+        if item is None and line.get("name"):
+            # Some clients send a synthetic id; fall back to the dish name
+            item_id = self.by_name.get(str(line["name"]).strip().lower())
+            item = self.items.get(item_id) if item_id is not None else None
+        if item is None:
+            raise MenuValidationError(f"{line.get('name') or raw_id!r} is not on the menu")
+        if not item.is_available:
+            raise MenuValidationError(f"{item.name} is not available right now")
+        return item
+
+    def price_order(self, lines: List[Dict]) -> Tuple[List[Tuple[str, str, float, int]], float]:
+        """``(item_id, item_name, price, quantity)`` rows and the total, priced from the menu."""
+        if not lines:
+            raise MenuValidationError("No items in order")
+        rows = []
+        for line in lines:
+            item = self.lookup(line)
+            try:
+                quantity = int(line.get("quantity", 1))
+            except (TypeError, ValueError):
+                raise MenuValidationError(f"Invalid quantity for {item.name}")
+            if not 1 <= quantity <= MAX_QUANTITY:
+                raise MenuValidationError(f"Quantity for {item.name} must be between 1 and {MAX_QUANTITY}")
+            rows.append((str(item.id), item.name, item.price, quantity))
+        return rows, round(sum(price * quantity for _, _, price, quantity in rows), 2)
+
+
+class MenuCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot: Optional[MenuSnapshot] = None
+        self._version = 0
+        self._connect: Optional[Callable] = None
+
+    def configure(self, connect: Callable) -> None:
+        """``connect()`` returns a MySQL connection, used only when no snapshot has been loaded yet."""
+        self._connect = connect
+
+    def reload(self, cursor) -> MenuSnapshot:
+        cursor.execute(_FINGERPRINT_SQL)
+        row = cursor.fetchone()
+        fingerprint = (int(row["n"]), int(row["checksum"]))
+        cursor.execute("SELECT id, name, price, category, is_available FROM canteen_menu_items")
+        rows = cursor.fetchall()
+        with self._lock:
+            self._version += 1
+            snapshot = MenuSnapshot(self._version, fingerprint)
+            for r in rows:
+                item = MenuItem(int(r["id"]), r["name"], float(r["price"] or 0), r.get("category") or "",
+                                bool(r["is_available"]))
+                snapshot.items[item.id] = item
+                snapshot.by_name.setdefault(item.name.strip().lower(), item.id)
+            self._snapshot = snapshot
+        return snapshot
+
+    def changed(self, cursor) -> bool:
+        """Reload if the table checksum differs from the snapshot's; True when it did."""
+        cursor.execute(_FINGERPRINT_SQL)
+        row = cursor.fetchone()
+        current = self._snapshot
+        if current is not None and (int(row["n"]), int(row["checksum"])) == current.fingerprint:
+            return False
+        self.reload(cursor)
+        return True
+
+    def refresh_after_write(self, cursor) -> None:
+        """Called by menu writers after commit; never fails the request."""
+        try:
+            self.reload(cursor)
+        except Exception as e:
+            LOGGER.warning("Canteen menu snapshot reload failed: %s", e)
+            with self._lock:
+                self._snapshot = None
+
+    def snapshot(self) -> MenuSnapshot:
+        current = self._snapshot
+        if current is not None:
+            return current
+        connection = self._connect()
+        cursor = connection.cursor(dictionary=True)
+        try:
+            return self.reload(cursor)
+        finally:
+            cursor.close()
+            connection.close()
+
+    @property
+    def version(self) -> int:
+        return self._snapshot.version if self._snapshot else 0
+
+
+menu_cache = MenuCache()
+
+
+def benchmark(menu_size: int = 300, orders: int = 20000, lines_per_order: int = 3, rtt_ms: float = 0.5) -> Dict:
+    """Price orders from the snapshot versus one SELECT per line (simulated RTT)."""
+    import random
+    import statistics
+
+    rng = random.Random(3)
+    snapshot = MenuSnapshot(1, (menu_size, 0))
+    for i in range(1, menu_size + 1):
+        snapshot.items[i] = MenuItem(i, f"Dish {i}", float(rng.randint(10, 150)), "main", i % 17 != 0)
+        snapshot.by_name[f"dish {i}"] = i
+    available = [i for i, item in snapshot.items.items() if item.is_available]
+    timings = []
+    for _ in range(orders):
+        lines = [{"id": rng.choice(available), "quantity": rng.randint(1, 3), "price": 1} for _ in range(lines_per_order)]
+        t0 = time.perf_counter()
+        snapshot.price_order(lines)
+        timings.append((time.perf_counter() - t0) * 1e6)
+    per_line_ms = lines_per_order * rtt_ms
+    return {
+        "orders": orders,
+        "snapshot_price_p50_us": round(statistics.median(timings), 2),
+        "snapshot_db_round_trips_per_order": 0,
+        "per_line_query_round_trips_per_order": lines_per_order,
+        "per_line_query_added_latency_ms": per_line_ms,
+    }
+
+
+if __name__ == "__main__":
+    print(benchmark())
@@ -0,0 +1,125 @@
+"""Batched item loading for canteen order listings.
+
+The order list endpoints used to fetch ``canteen_order_items`` once per
+order (N+1 round trips, up to 501 for a 500-row staff page). This module
+loads the items for a whole page with one ``WHERE order_id IN (...)``
+query and groups them in memory, so a listing costs a fixed number of
+queries however many orders it returns.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+from typing import Dict, Iterable, List, Optional
+
+LOGGER = logging.getLogger(__name__)
+
+# Large pages are split so the IN list stays well under max_allowed_packet
+ITEM_BATCH_SIZE = int(os.getenv("CANTEEN_ITEM_BATCH_SIZE", "1000"))
+
+_ITEMS_SQL = "SELECT * FROM canteen_order_items WHERE order_id IN ({placeholders}) ORDER BY order_id, id"
+
+# item_id is a VARCHAR holding the menu item id; the menu row may have been deleted since
+_ITEMS_WITH_MENU_SQL = """
+    SELECT coi.*, cmi.name AS name, cmi.category AS category
+    FROM canteen_order_items coi
+    LEFT JOIN canteen_menu_items cmi ON cmi.id = coi.item_id
+    WHERE coi.order_id IN ({placeholders})
+    ORDER BY coi.order_id, coi.id
+"""
+
+
+def _chunks(values: List, size: int) -> Iterable[List]:
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def load_order_items(cursor, order_ids: Iterable[int], with_menu: bool = False) -> Dict[int, List[Dict]]:
+    """Items keyed by order id, fetched with one IN query per ``ITEM_BATCH_SIZE`` orders."""
+    ids = list(dict.fromkeys(order_ids))
+    grouped: Dict[int, List[Dict]] = {order_id: [] for order_id in ids}
+    template = _ITEMS_WITH_MENU_SQL if with_menu else _ITEMS_SQL
+    for chunk in _chunks(ids, max(1, ITEM_BATCH_SIZE)):
+        cursor.execute(template.format(placeholders=", ".join(["%s"] * len(chunk))), tuple(chunk))
+        for row in cursor.fetchall():
+            if with_menu and not row.get("name"):
+                row["name"] = row.get("item_name")
+            grouped.setdefault(row["order_id"], []).append(row)
+    return grouped
+
+
+def attach_order_items(cursor, orders: List[Dict], with_menu: bool = False, summary: bool = False) -> List[Dict]:
+    """Set ``order["items"]`` (and optionally ``items_summary``) on every order in place."""
+    if not orders:
+        return orders
+    grouped = load_order_items(cursor, (order["id"] for order in orders), with_menu=with_menu)
+    for order in orders:
+        order["items"] = grouped.get(order["id"], [])
+        if summary:
+            order["items_summary"] = items_summary(order["items"])
+    return orders
+
+
+def items_summary(items: List[Dict]) -> Optional[str]:
+    """``"Dosa x2, Tea x1"``, the string the GROUP_CONCAT listings used to return."""
+    if not items:
+        return None
+    return ", ".join(f"{item.get('name') or item.get('item_name')} x{item.get('quantity')}" for item in items)
+
+
+class _CountingCursor:
+    """Minimal dictionary cursor over in-memory item rows that counts round trips."""
+
+    def __init__(self, items: List[Dict]):
+        self._by_order: Dict[int, List[Dict]] = {}
+        for row in items:
+            self._by_order.setdefault(row["order_id"], []).append(row)
+        self.queries = 0
+        self._result: List[Dict] = []
+
+    def execute(self, sql, params=()):
+        self.queries += 1
+        self._result = [dict(row) for order_id in params for row in self._by_order.get(order_id, [])]
+
+    def fetchall(self):
+        return self._result
+
+
+def benchmark(page_sizes=(10, 100, 500, 2500), items_per_order: int = 3) -> Dict:
+    """Round trips per listing page: per-order loop versus the batched loader."""
+    import time
+
+    results = {}
+    for size in page_sizes:
+        orders = [{"id": i} for i in range(1, size + 1)]
+        items = [
+            {"id": i * 10 + n, "order_id": i, "item_id": str(n), "item_name": f"item-{n}", "price": 40, "quantity": 1}
+            for i in range(1, size + 1) for n in range(items_per_order)
+        ]
+
+        naive = _CountingCursor(items)
+        naive.execute("SELECT * FROM canteen_orders")
+        t0 = time.perf_counter()
+        for order in orders:
+            naive.execute("SELECT * FROM canteen_order_items WHERE order_id = %s", (order["id"],))
+            order["items"] = naive.fetchall()
+        naive_ms = (time.perf_counter() - t0) * 1000
+
+        batched = _CountingCursor(items)
+        batched.execute("SELECT * FROM canteen_orders")
+        t0 = time.perf_counter()
+        attach_order_items(batched, [dict(order) for order in orders])
+        batched_ms = (time.perf_counter() - t0) * 1000
+
+        results[size] = {
+            "per_order_queries": naive.queries,
+            "batched_queries": batched.queries,
+            "per_order_ms": round(naive_ms, 2),
+            "batched_ms": round(batched_ms, 2),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    print(benchmark())
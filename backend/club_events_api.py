@@ -7,10 +7,16 @@ Student Council has oversight over all club events
 
 from fastapi import HTTPException, Depends
 from typing import Optional, List
-from datetime import datetime, date, time
+from datetime import datetime, date, time, timedelta
 import mysql.connector
 from database import get_mysql_connection
 import auth
+import club_stats
+from calendar_index import calendar_index
+from club_events_calendar import _ensure_calendar_tables, _update_calendar_sync
+import event_registration
+from event_drop import DropAdmissionError, ticket_drop
+from recurrence import LISTING_HORIZON_DAYS, OccurrenceOverride, RecurrenceRule, expand
 
 # =============================================================================
 # CLUB EVENT TIMELINE MANAGEMENT
@@ -32,6 +38,7 @@ def _ensure_club_events_tables(cursor):
             venue VARCHAR(255),
             event_type ENUM('meeting', 'workshop', 'competition', 'seminar', 'social', 'recruitment', 'other') DEFAULT 'other',
             max_participants INT,
+            seats_taken INT NOT NULL DEFAULT 0,
             registration_required BOOLEAN DEFAULT FALSE,
             registration_deadline DATETIME,
             status ENUM('draft', 'pending_approval', 'approved', 'rejected', 'cancelled', 'completed') DEFAULT 'draft',
@@ -59,16 +66,65 @@ def _ensure_club_events_tables(cursor):
         CREATE TABLE IF NOT EXISTS club_event_registrations (
             id INT AUTO_INCREMENT PRIMARY KEY,
             event_id INT NOT NULL,
+            occurrence_date DATE NULL,
+            occurrence_key DATE AS (COALESCE(occurrence_date, '1000-01-01')) STORED,
             user_id INT NOT NULL,
             registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            status ENUM('registered', 'attended', 'cancelled') DEFAULT 'registered',
+            status ENUM('registered', 'attended', 'cancelled', 'waitlisted') DEFAULT 'registered',
             attendance_marked_by INT,
             attendance_marked_at DATETIME,
             FOREIGN KEY (event_id) REFERENCES club_events(id) ON DELETE CASCADE,
             FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
             FOREIGN KEY (attendance_marked_by) REFERENCES users(id) ON DELETE SET NULL,
-            UNIQUE KEY unique_event_user (event_id, user_id),
-            INDEX idx_user_events (user_id, status)
+            UNIQUE KEY unique_event_occurrence_user (event_id, occurrence_key, user_id),
+            INDEX idx_user_events (user_id, status),
+            INDEX idx_event_waitlist (event_id, status, registration_date)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
+    
+    # Seat counter and waitlist for atomic registration (see event_registration).
+    # ADD COLUMN fails once migrated, which skips the rest of the block.
+    try:
+        cursor.execute("ALTER TABLE club_events ADD COLUMN seats_taken INT NOT NULL DEFAULT 0")
+        cursor.execute("""
+            UPDATE club_events ce SET seats_taken = (
+                SELECT COUNT(*) FROM club_event_registrations cer
+                WHERE cer.event_id = ce.id AND cer.status IN ('registered', 'attended')
+            )
+        """)
+        cursor.execute("""
+            ALTER TABLE club_event_registrations
+            MODIFY COLUMN status ENUM('registered', 'attended', 'cancelled', 'waitlisted') DEFAULT 'registered',
+            ADD INDEX idx_event_waitlist (event_id, status, registration_date)
+        """)
+    except:
+        pass  # Already migrated
+    
+    # Recurring series register per occurrence: occurrence_date is NULL for a
+    # one-off event, and occurrence_key stands in for it in the unique key
+    # because MySQL treats NULLs in a unique key as distinct.
+    try:
+        cursor.execute("""
+            ALTER TABLE club_event_registrations
+            ADD COLUMN occurrence_date DATE NULL AFTER event_id,
+            ADD COLUMN occurrence_key DATE AS (COALESCE(occurrence_date, '1000-01-01')) STORED AFTER occurrence_date
+        """)
+        cursor.execute("""
+            ALTER TABLE club_event_registrations
+            ADD UNIQUE KEY unique_event_occurrence_user (event_id, occurrence_key, user_id),
+            DROP INDEX unique_event_user
+        """)
+    except:
+        pass  # Already migrated
+    
+    # Seat counter per occurrence of a recurring series (see event_registration)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS club_event_occurrence_seats (
+            event_id INT NOT NULL,
+            occurrence_date DATE NOT NULL,
+            seats_taken INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (event_id, occurrence_date),
+            FOREIGN KEY (event_id) REFERENCES club_events(id) ON DELETE CASCADE
         ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
     """)
     
@@ -193,6 +249,9 @@ async def create_club_event(club_id: int, event_data: dict, current_user):
         
         event_id = cursor.lastrowid
         connection.commit()
+        club_stats.touch(cursor, club_id)
+        calendar_index.refresh_event(cursor, event_id)
+        _update_calendar_sync(cursor, connection, club_id)
         
         # Send notification to Student Council if not auto-approved
         if status == "pending_approval":
@@ -213,12 +272,92 @@ async def create_club_event(club_id: int, event_data: dict, current_user):
         if 'connection' in locals():
             connection.close()
 
+def _expand_series_rows(cursor, events: List[dict], start: Optional[date], end: date) -> List[dict]:
+    """Replace each recurring series row with one row per occurrence in ``[start, end]``
+
+    Occurrence rows keep the series ``id`` and add ``series_id`` and
+    ``occurrence_date``; their ``registration_count`` is that occurrence's
+    seats. ``start=None`` expands from each series' first occurrence.
+    """
+    series_ids = [event["id"] for event in events if event.get("recurrence_rule")]
+    if not series_ids:
+        return events
+    placeholders = ", ".join(["%s"] * len(series_ids))
+    cursor.execute(f"SELECT * FROM club_event_exceptions WHERE event_id IN ({placeholders})", series_ids)
+    overrides = {}
+    for row in cursor.fetchall():
+        overrides.setdefault(row["event_id"], {})[row["occurrence_date"]] = OccurrenceOverride.from_row(row)
+    cursor.execute(
+        f"SELECT event_id, occurrence_date, seats_taken FROM club_event_occurrence_seats WHERE event_id IN ({placeholders})",
+        series_ids
+    )
+    seats = {(row["event_id"], row["occurrence_date"]): row["seats_taken"] for row in cursor.fetchall()}
+    
+    expanded = []
+    for event in events:
+        if not event.get("recurrence_rule"):
+            expanded.append(event)
+            continue
+        try:
+            rule = RecurrenceRule.parse(event["recurrence_rule"])
+        except ValueError:
+            expanded.append(event)
+            continue
+        occurrences = expand(rule, event["event_date"], start or event["event_date"], end, overrides.get(event["id"]))
+        for day, override in occurrences:
+            taken = seats.get((event["id"], day), 0)
+            occurrence = {
+                **event,
+                "series_id": event["id"],
+                "occurrence_date": day,
+                "event_date": day,
+                "seats_taken": taken,
+                "registration_count": taken
+            }
+            if override:
+                if override.override_date:
+                    occurrence["event_date"] = override.override_date
+                for name in ("start_time", "end_time", "venue", "title", "description"):
+                    value = getattr(override, name)
+                    if value is not None:
+                        occurrence[name] = value
+            expanded.append(occurrence)
+    return expanded
+
+def _registration_occurrence(cursor, event: dict, occurrence_date: Optional[str], check_schedule: bool = True) -> Optional[date]:
+    """The occurrence a registration is for: required for a recurring series, None for a one-off event"""
+    if not event.get("recurrence_rule"):
+        return None
+    if not occurrence_date:
+        raise HTTPException(status_code=400, detail="This is a recurring series; pass occurrence_date (YYYY-MM-DD)")
+    try:
+        occurrence = datetime.strptime(occurrence_date, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid occurrence date format. Use YYYY-MM-DD")
+    if not check_schedule:
+        return occurrence
+    
+    rule = RecurrenceRule.parse(event["recurrence_rule"])
+    if not rule.occurs_on(event["event_date"], occurrence):
+        raise HTTPException(status_code=404, detail="The series has no occurrence on that date")
+    cursor.execute(
+        "SELECT is_cancelled, override_date FROM club_event_exceptions WHERE event_id = %s AND occurrence_date = %s",
+        (event["id"], occurrence)
+    )
+    override = cursor.fetchone()
+    if override and override["is_cancelled"]:
+        raise HTTPException(status_code=400, detail="This occurrence has been cancelled")
+    if ((override or {}).get("override_date") or occurrence) < date.today():
+        raise HTTPException(status_code=400, detail="This occurrence has already taken place")
+    return occurrence
+
 async def get_club_events(club_id: int, status: Optional[str] = None, current_user=None):
     """Get all events for a specific club"""
     try:
         connection = get_mysql_connection()
         cursor = connection.cursor(dictionary=True)
         _ensure_club_events_tables(cursor)
+        _ensure_calendar_tables(cursor)
         
         # Build query
         where_clause = "ce.club_id = %s"
@@ -254,7 +393,7 @@ async def get_club_events(club_id: int, status: Optional[str] = None, current_us
         cursor.execute(
             f"""
             SELECT ce.*, c.name as club_name, u.full_name as created_by_name,
-                   (SELECT COUNT(*) FROM club_event_registrations WHERE event_id = ce.id) as registration_count
+                   ce.seats_taken as registration_count
             FROM club_events ce
             JOIN clubs c ON c.id = ce.club_id
             LEFT JOIN users u ON u.id = ce.created_by
@@ -265,6 +404,10 @@ async def get_club_events(club_id: int, status: Optional[str] = None, current_us
         )
         
         events = cursor.fetchall()
+        if any(event.get("recurrence_rule") for event in events):
+            horizon = date.today() + timedelta(days=LISTING_HORIZON_DAYS)
+            events = _expand_series_rows(cursor, events, None, horizon)
+            events.sort(key=lambda e: (e["event_date"], e["start_time"]), reverse=True)
         return events
         
     except mysql.connector.Error as e:
@@ -281,6 +424,7 @@ async def get_all_club_events(status: Optional[str] = None, from_date: Optional[
         connection = get_mysql_connection()
         cursor = connection.cursor(dictionary=True)
         _ensure_club_events_tables(cursor)
+        _ensure_calendar_tables(cursor)
         
         where_conditions = []
         params = []
@@ -289,12 +433,13 @@ async def get_all_club_events(status: Optional[str] = None, from_date: Optional[
             where_conditions.append("ce.status = %s")
             params.append(status)
         
-        if from_date:
-            where_conditions.append("ce.event_date >= %s")
-            params.append(from_date)
-        else:
-            # Default to upcoming events
-            where_conditions.append("ce.event_date >= CURDATE()")
+        # Default to upcoming events; a series that started earlier can still have occurrences after the start
+        try:
+            start = datetime.strptime(from_date, "%Y-%m-%d").date() if from_date else date.today()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid from_date format. Use YYYY-MM-DD")
+        where_conditions.append("(ce.event_date >= %s OR ce.recurrence_rule IS NOT NULL)")
+        params.append(start)
         
         # Only show approved events to regular users
         if current_user:
@@ -319,7 +464,7 @@ async def get_all_club_events(status: Optional[str] = None, from_date: Optional[
             f"""
             SELECT ce.*, c.name as club_name, c.category as club_category,
                    u.full_name as created_by_name,
-                   (SELECT COUNT(*) FROM club_event_registrations WHERE event_id = ce.id) as registration_count
+                   ce.seats_taken as registration_count
             FROM club_events ce
             JOIN clubs c ON c.id = ce.club_id
             LEFT JOIN users u ON u.id = ce.created_by
@@ -330,6 +475,10 @@ async def get_all_club_events(status: Optional[str] = None, from_date: Optional[
         )
         
         events = cursor.fetchall()
+        if any(event.get("recurrence_rule") for event in events):
+            horizon = max(start, date.today()) + timedelta(days=LISTING_HORIZON_DAYS)
+            events = _expand_series_rows(cursor, events, start, horizon)
+            events.sort(key=lambda e: (e["event_date"], e["start_time"]))
         return events
         
     except mysql.connector.Error as e:
@@ -436,6 +585,9 @@ async def approve_club_event(event_id: int, approval_data: dict, current_user):
             raise HTTPException(status_code=400, detail="Invalid action. Use 'approve' or 'reject'")
         
         connection.commit()
+        club_stats.touch(cursor, event["club_id"])
+        calendar_index.refresh_event(cursor, event_id)
+        _update_calendar_sync(cursor, connection, event["club_id"])
         return {"message": message, "event_id": event_id, "status": action}
         
     except mysql.connector.Error as e:
@@ -547,12 +699,16 @@ async def get_club_timeline(club_id: int, current_user=None):
         if 'connection' in locals():
             connection.close()
 
-async def register_for_event(event_id: int, current_user):
-    """Register for a club event"""
+async def register_for_event(event_id: int, current_user, occurrence_date: Optional[str] = None):
+    """Register for a club event, or for one occurrence (``occurrence_date``) of a recurring series"""
+    drop = ticket_drop.get("club_event", event_id)
+    if drop is not None:
+        return _queue_drop_registration(drop, current_user)
     try:
         connection = get_mysql_connection()
         cursor = connection.cursor(dictionary=True)
         _ensure_club_events_tables(cursor)
+        _ensure_calendar_tables(cursor)
         
         # Get event details
         cursor.execute(
@@ -579,39 +735,176 @@ async def register_for_event(event_id: int, current_user):
             if datetime.now() > deadline:
                 raise HTTPException(status_code=400, detail="Registration deadline has passed")
         
-        # Check if already registered
+        occurrence = _registration_occurrence(cursor, event, occurrence_date)
+        
+        # Seat (or waitlist place) and duplicate check in one transaction
+        try:
+            result = event_registration.register(connection, event_id, current_user["id"], occurrence)
+        except event_registration.RegistrationError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        if not result.registered:
+            return {
+                "message": f"{event['title']} is full; you are number {result.waitlist_position} on the waitlist",
+                "event_title": event["title"],
+                "club_name": event["club_name"],
+                "registration_status": result.status,
+                "waitlist_position": result.waitlist_position,
+                "occurrence_date": occurrence_date if occurrence else None
+            }
+        
+        club_stats.touch(cursor, event["club_id"])
+        calendar_index.adjust_registrations(event_id, 1, occurrence)
+        
+        return {
+            "message": f"Successfully registered for {event['title']}",
+            "event_title": event["title"],
+            "club_name": event["club_name"],
+            "registration_status": result.status,
+            "occurrence_date": occurrence_date if occurrence else None
+        }
+        
+    except mysql.connector.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'connection' in locals():
+            connection.close()
+
+def _queue_drop_registration(drop, current_user):
+    """Ticket-drop mode: queue the registration without touching MySQL"""
+    deadline = drop.info.get("registration_deadline")
+    if deadline and datetime.now() > deadline:
+        raise HTTPException(status_code=400, detail="Registration deadline has passed")
+    try:
+        ticket = ticket_drop.enqueue(drop, current_user["id"])
+    except DropAdmissionError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    return {
+        "message": f"You are in the queue for {drop.info.get('title')}",
+        "event_title": drop.info.get("title"),
+        "club_name": drop.info.get("club_name"),
+        "registration_status": ticket.status,
+        **ticket_drop.describe(drop, ticket),
+        "poll_url": f"/event-drops/tickets/{ticket.id}",
+        "stream_url": f"/event-drops/tickets/{ticket.id}/stream"
+    }
+
+def _drop_registration_handler(club_id: int):
+    """Ticket-drop consumer for a club event: one register_batch transaction per batch"""
+    def handle(connection, event_id, tickets):
+        results = event_registration.register_batch(connection, event_id, [t.user_id for t in tickets])
+        registered = 0
+        for ticket, result in zip(tickets, results):
+            if isinstance(result, event_registration.RegistrationError):
+                ticket.decide("rejected", str(result))
+            elif result.registered:
+                registered += 1
+                ticket.decide(result.status)
+            else:
+                ticket.decide(result.status, waitlist_position=result.waitlist_position)
+        if registered:
+            cursor = connection.cursor(dictionary=True)
+            try:
+                club_stats.touch(cursor, club_id)
+            finally:
+                cursor.close()
+            calendar_index.adjust_registrations(event_id, registered)
+    return handle
+
+async def set_event_drop_mode(event_id: int, drop_data: dict, current_user):
+    """Open or close ticket-drop registration for a club event (club admin, Student Council, admin/faculty)"""
+    try:
+        connection = get_mysql_connection()
+        cursor = connection.cursor(dictionary=True)
+        _ensure_club_events_tables(cursor)
+        
         cursor.execute(
-            "SELECT id FROM club_event_registrations WHERE event_id = %s AND user_id = %s",
-            (event_id, current_user["id"])
+            """
+            SELECT ce.*, c.name as club_name, c.created_by as club_admin_id
+            FROM club_events ce
+            JOIN clubs c ON c.id = ce.club_id
+            WHERE ce.id = %s
+            """,
+            (event_id,)
         )
-        if cursor.fetchone():
-            raise HTTPException(status_code=400, detail="Already registered for this event")
-        
-        # Check max participants
-        if event["max_participants"]:
-            cursor.execute(
-                "SELECT COUNT(*) as count FROM club_event_registrations WHERE event_id = %s",
-                (event_id,)
-            )
-            current_count = cursor.fetchone()["count"]
-            if current_count >= event["max_participants"]:
-                raise HTTPException(status_code=400, detail="Event is full")
+        event = cursor.fetchone()
+        if not event:
+            raise HTTPException(status_code=404, detail="Event not found")
         
-        # Register user
         cursor.execute(
             """
-            INSERT INTO club_event_registrations (event_id, user_id)
-            VALUES (%s, %s)
+            SELECT cm.id FROM club_memberships cm
+            JOIN clubs c ON c.id = cm.club_id
+            WHERE cm.user_id = %s AND cm.status = 'approved' AND c.is_student_council = TRUE
             """,
-            (event_id, current_user["id"])
+            (current_user["id"],)
         )
+        is_student_council = cursor.fetchone() is not None
+        if not (is_student_council or event["club_admin_id"] == current_user["id"]
+                or current_user.get("role") in ["admin", "faculty"]):
+            raise HTTPException(status_code=403, detail="Only the club admin or Student Council can manage drop mode")
+        
+        if drop_data.get("enabled", True):
+            if event["status"] != "approved" or not event["registration_required"]:
+                raise HTTPException(status_code=400, detail="Drop mode needs an approved event that requires registration")
+            if event.get("recurrence_rule"):
+                # Drops queue per event; a series takes registrations per occurrence
+                raise HTTPException(status_code=400, detail="Drop mode is not available for recurring series")
+            ticket_drop.open(
+                "club_event", event_id, _drop_registration_handler(event["club_id"]),
+                info={
+                    "title": event["title"],
+                    "club_name": event["club_name"],
+                    "registration_deadline": event["registration_deadline"]
+                }
+            )
+            message = f"Drop mode opened for {event['title']}"
+        else:
+            ticket_drop.close("club_event", event_id)
+            message = f"Drop mode closed for {event['title']}; queued registrations are still being processed"
         
-        connection.commit()
+        return {"message": message, "drop": ticket_drop.drop_stats("club_event", event_id)}
+        
+    except mysql.connector.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'connection' in locals():
+            connection.close()
+
+async def cancel_event_registration(event_id: int, current_user, occurrence_date: Optional[str] = None):
+    """Cancel a club event registration or waitlist place; the freed seat goes to the waitlist"""
+    try:
+        connection = get_mysql_connection()
+        cursor = connection.cursor(dictionary=True)
+        _ensure_club_events_tables(cursor)
+        _ensure_calendar_tables(cursor)
+        
+        cursor.execute("SELECT id, club_id, title, event_date, recurrence_rule FROM club_events WHERE id = %s", (event_id,))
+        event = cursor.fetchone()
+        if not event:
+            raise HTTPException(status_code=404, detail="Event not found")
+        
+        occurrence = _registration_occurrence(cursor, event, occurrence_date, check_schedule=False)
+        
+        try:
+            result = event_registration.cancel(connection, event_id, current_user["id"], occurrence)
+        except event_registration.RegistrationError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        club_stats.touch(cursor, event["club_id"])
+        if result.seats_released:
+            calendar_index.adjust_registrations(event_id, result.seats_released, occurrence)
         
         return {
-            "message": f"Successfully registered for {event['title']}",
+            "message": f"Registration for {event['title']} cancelled",
             "event_title": event["title"],
-            "club_name": event["club_name"]
+            "occurrence_date": occurrence_date if occurrence else None,
+            "previous_status": result.previous_status,
+            "waitlist_promoted": result.promoted_user_id is not None
         }
         
     except mysql.connector.Error as e:
@@ -1007,6 +1300,9 @@ async def sync_timeline_to_events(club_id: int, sync_data: dict, current_user):
                 events_created += 1
         
         connection.commit()
+        club_stats.touch(cursor, club_id)
+        calendar_index.refresh_club(cursor, club_id)
+        _update_calendar_sync(cursor, connection, club_id)
         
         # Send notification to Student Council if not auto-approved
         if status == "pending_approval" and events_created > 0:
@@ -1140,6 +1436,9 @@ def bulk_import_calendar_events(club_id: int, events_data: dict, current_user):
                 continue
         
         connection.commit()
+        club_stats.touch(cursor, club_id)
+        calendar_index.refresh_club(cursor, club_id)
+        _update_calendar_sync(cursor, connection, club_id)
         
         # Send notification to Student Council if not auto-approved
         if status == "pending_approval" and events_imported > 0:
@@ -8,10 +8,13 @@ Provides monthly calendar view with all club events
 from fastapi import HTTPException, Depends
 from typing import Optional, List, Dict, Any
 import mysql.connector
-from datetime import datetime, date, time, timedelta
-from calendar import monthrange
+from datetime import datetime, time, timedelta
 from database import get_mysql_connection
 import auth
+import club_stats
+from calendar_index import calendar_index
+import calendar_feed
+from recurrence import RecurrenceRule
 
 # =============================================================================
 # CLUB EVENTS CALENDAR FUNCTIONS
@@ -33,6 +36,32 @@ def _ensure_calendar_tables(cursor):
     except:
         pass  # Columns already exist
     
+    # Recurring series are stored as one row with an RRULE-style rule
+    try:
+        cursor.execute("ALTER TABLE club_events ADD COLUMN recurrence_rule VARCHAR(255) NULL")
+    except:
+        pass  # Column already exists
+    
+    # Per-occurrence exceptions for recurring series (cancel, move, retime)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS club_event_exceptions (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            event_id INT NOT NULL,
+            occurrence_date DATE NOT NULL,
+            is_cancelled BOOLEAN DEFAULT FALSE,
+            override_date DATE NULL,
+            start_time TIME NULL,
+            end_time TIME NULL,
+            venue VARCHAR(255) NULL,
+            title VARCHAR(255) NULL,
+            description TEXT NULL,
+            updated_by INT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            FOREIGN KEY (event_id) REFERENCES club_events(id) ON DELETE CASCADE,
+            UNIQUE KEY unique_occurrence (event_id, occurrence_date)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
+    
     # Create calendar_subscriptions table for clubs to follow other clubs' calendars
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS calendar_subscriptions (
@@ -76,6 +105,9 @@ def _ensure_calendar_tables(cursor):
         """)
     except:
         pass  # Columns already exist
+    
+    # Feed tokens for calendar apps and tombstones for the change feed
+    calendar_feed.ensure_tables(cursor)
 
 async def create_club_event_calendar(club_id: int, event_data: dict, current_user):
     """Create a club event with calendar integration"""
@@ -124,14 +156,21 @@ async def create_club_event_calendar(club_id: int, event_data: dict, current_use
         calendar_color = event_data.get("calendar_color", "#3B82F6")
         
         # Recurring event fields
-        is_recurring = event_data.get("is_recurring", False)
         recurrence_type = event_data.get("recurrence_type")  # daily, weekly, monthly, yearly
         recurrence_end_date = event_data.get("recurrence_end_date")
-        recurrence_days = event_data.get("recurrence_days")  # For weekly: "1,3,5" (Mon, Wed, Fri)
+        recurrence_days = event_data.get("recurrence_days")  # For weekly: "0,2,4" (Mon, Wed, Fri)
         
         if not all([title, event_date, start_time, end_time]):
             raise HTTPException(status_code=400, detail="Missing required fields: title, event_date, start_time, end_time")
         
+        # The series is one row with a rule; occurrences are expanded when calendars are read
+        try:
+            rule = RecurrenceRule.from_event_data(event_data)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid recurrence: {str(e)}")
+        is_recurring = rule is not None
+        recurrence_rule = rule.to_rrule() if rule else None
+        
         # Insert main event
         cursor.execute(
             """
@@ -139,24 +178,22 @@ async def create_club_event_calendar(club_id: int, event_data: dict, current_use
                 club_id, title, description, event_date, start_time, end_time,
                 venue, event_type, max_participants, registration_required,
                 status, created_by, is_public, calendar_color,
-                is_recurring, recurrence_type, recurrence_end_date, recurrence_days
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, 'approved', %s, %s, %s, %s, %s, %s, %s)
+                is_recurring, recurrence_type, recurrence_end_date, recurrence_days, recurrence_rule
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, 'approved', %s, %s, %s, %s, %s, %s, %s, %s)
             """,
             (
                 club_id, title, description, event_date, start_time, end_time,
                 venue, event_type, max_participants, registration_required,
                 current_user["id"], is_public, calendar_color,
-                is_recurring, recurrence_type, recurrence_end_date, recurrence_days
+                is_recurring, recurrence_type, recurrence_end_date, recurrence_days, recurrence_rule
             )
         )
         
         event_id = cursor.lastrowid
         
-        # If recurring, create recurring instances
-        if is_recurring and recurrence_type and recurrence_end_date:
-            _create_recurring_events(cursor, event_id, event_data, recurrence_end_date)
-        
         connection.commit()
+        club_stats.touch(cursor, club_id)
+        calendar_index.refresh_event(cursor, event_id)
         
         # Update sync status
         _update_calendar_sync(cursor, connection, club_id)
@@ -165,7 +202,8 @@ async def create_club_event_calendar(club_id: int, event_data: dict, current_use
             "success": True,
             "message": "Event created successfully",
             "event_id": event_id,
-            "is_recurring": is_recurring
+            "is_recurring": is_recurring,
+            "recurrence_rule": recurrence_rule
         }
         
     except mysql.connector.Error as e:
@@ -176,86 +214,134 @@ async def create_club_event_calendar(club_id: int, event_data: dict, current_use
         if 'connection' in locals():
             connection.close()
 
-def _create_recurring_events(cursor, main_event_id: int, event_data: dict, end_date: str):
-    """Create recurring event instances"""
-    start_date = datetime.strptime(event_data["event_date"], "%Y-%m-%d").date()
-    end_date_obj = datetime.strptime(end_date, "%Y-%m-%d").date()
-    recurrence_type = event_data.get("recurrence_type")
-    recurrence_days = event_data.get("recurrence_days", "").split(",") if event_data.get("recurrence_days") else []
+def _get_series_for_update(cursor, club_id: int, event_id: int, current_user) -> dict:
+    """Load a recurring series of ``club_id`` and check the user may edit it"""
+    cursor.execute(
+        """
+        SELECT ce.id, ce.event_date, ce.recurrence_rule, ce.created_by, c.created_by AS club_admin_id
+        FROM club_events ce
+        JOIN clubs c ON c.id = ce.club_id
+        WHERE ce.id = %s AND ce.club_id = %s
+        """,
+        (event_id, club_id)
+    )
+    event = cursor.fetchone()
     
-    current_date = start_date
-    instances_created = 0
-    
-    while current_date <= end_date_obj and instances_created < 100:  # Limit to 100 instances
-        next_date = None
-        
-        if recurrence_type == "daily":
-            next_date = current_date + timedelta(days=1)
-        elif recurrence_type == "weekly":
-            if recurrence_days:
-                # Find next occurrence based on specified days
-                for i in range(1, 8):
-                    check_date = current_date + timedelta(days=i)
-                    if str(check_date.weekday()) in recurrence_days:
-                        next_date = check_date
-                        break
-            else:
-                next_date = current_date + timedelta(weeks=1)
-        elif recurrence_type == "monthly":
-            next_month = current_date.replace(day=1) + timedelta(days=32)
-            next_date = next_month.replace(day=min(current_date.day, monthrange(next_month.year, next_month.month)[1]))
-        elif recurrence_type == "yearly":
-            try:
-                next_date = current_date.replace(year=current_date.year + 1)
-            except ValueError:  # Handle leap year edge case
-                next_date = current_date.replace(year=current_date.year + 1, month=2, day=28)
-        
-        if next_date and next_date <= end_date_obj:
-            # Create recurring instance
-            cursor.execute(
-                """
-                INSERT INTO club_events (
-                    club_id, title, description, event_date, start_time, end_time,
-                    venue, event_type, max_participants, registration_required,
-                    status, created_by, is_public, calendar_color,
-                    is_recurring, parent_event_id
-                ) 
-                SELECT club_id, title, description, %s, start_time, end_time,
-                       venue, event_type, max_participants, registration_required,
-                       status, created_by, is_public, calendar_color,
-                       FALSE, %s
-                FROM club_events WHERE id = %s
-                """,
-                (next_date.strftime("%Y-%m-%d"), main_event_id, main_event_id)
-            )
-            
-            current_date = next_date
-            instances_created += 1
-        else:
-            break
+    if not event:
+        raise HTTPException(status_code=404, detail="Event not found")
+    if not event["recurrence_rule"]:
+        raise HTTPException(status_code=400, detail="Event is not a recurring series")
+    if current_user["id"] not in (event["created_by"], event["club_admin_id"]) and current_user.get("role") not in ["admin", "faculty"]:
+        raise HTTPException(status_code=403, detail="Not authorized to edit this event")
+    return event
 
-async def get_club_calendar(club_id: int, year: int, month: int, current_user):
-    """Get club calendar for a specific month"""
+async def set_event_occurrence_override(club_id: int, event_id: int, occurrence_date: str, override_data: dict, current_user):
+    """Cancel, move or change one occurrence of a recurring series"""
     try:
         connection = get_mysql_connection()
         cursor = connection.cursor(dictionary=True)
+        _ensure_calendar_tables(cursor)
+        
+        event = _get_series_for_update(cursor, club_id, event_id, current_user)
+        
+        try:
+            occurrence = datetime.strptime(occurrence_date, "%Y-%m-%d").date()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid occurrence date format. Use YYYY-MM-DD")
+        
+        rule = RecurrenceRule.parse(event["recurrence_rule"])
+        if not rule.occurs_on(event["event_date"], occurrence):
+            raise HTTPException(status_code=404, detail="The series has no occurrence on that date")
         
-        # Check if user has access to view this club's calendar
         cursor.execute(
             """
-            SELECT c.id, c.name, c.calendar_public, c.calendar_color, c.calendar_description
-            FROM clubs c
-            WHERE c.id = %s AND c.is_active = TRUE
+            INSERT INTO club_event_exceptions (
+                event_id, occurrence_date, is_cancelled, override_date,
+                start_time, end_time, venue, title, description, updated_by
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+            is_cancelled = VALUES(is_cancelled), override_date = VALUES(override_date),
+            start_time = VALUES(start_time), end_time = VALUES(end_time), venue = VALUES(venue),
+            title = VALUES(title), description = VALUES(description), updated_by = VALUES(updated_by)
             """,
-            (club_id,)
+            (
+                event_id, occurrence, bool(override_data.get("cancelled", False)),
+                override_data.get("event_date"), override_data.get("start_time"), override_data.get("end_time"),
+                override_data.get("venue"), override_data.get("title"), override_data.get("description"),
+                current_user["id"]
+            )
         )
-        club = cursor.fetchone()
         
-        if not club:
+        connection.commit()
+        calendar_index.refresh_series_overrides(cursor, event_id)
+        # Cancelled or restored occurrences change the club's event counts
+        club_stats.touch(cursor, club_id)
+        
+        _update_calendar_sync(cursor, connection, club_id)
+        
+        return {
+            "success": True,
+            "message": "Occurrence cancelled" if override_data.get("cancelled") else "Occurrence updated",
+            "event_id": event_id,
+            "occurrence_date": occurrence_date
+        }
+        
+    except mysql.connector.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'connection' in locals():
+            connection.close()
+
+async def clear_event_occurrence_override(club_id: int, event_id: int, occurrence_date: str, current_user):
+    """Restore one occurrence of a recurring series to the rule's defaults"""
+    try:
+        connection = get_mysql_connection()
+        cursor = connection.cursor(dictionary=True)
+        _ensure_calendar_tables(cursor)
+        
+        _get_series_for_update(cursor, club_id, event_id, current_user)
+        
+        cursor.execute(
+            "DELETE FROM club_event_exceptions WHERE event_id = %s AND occurrence_date = %s",
+            (event_id, occurrence_date)
+        )
+        if cursor.rowcount:
+            # The row is gone, so the change feed needs a tombstone to report the restore
+            calendar_feed.record_tombstone(cursor, club_id, event_id, occurrence_date, "exception_cleared")
+        
+        connection.commit()
+        calendar_index.refresh_series_overrides(cursor, event_id)
+        # Cancelled or restored occurrences change the club's event counts
+        club_stats.touch(cursor, club_id)
+        
+        _update_calendar_sync(cursor, connection, club_id)
+        
+        return {"success": True, "message": "Occurrence restored", "event_id": event_id, "occurrence_date": occurrence_date}
+        
+    except mysql.connector.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'connection' in locals():
+            connection.close()
+
+async def get_club_calendar(club_id: int, year: int, month: int, current_user):
+    """Get club calendar for a specific month"""
+    try:
+        connection = get_mysql_connection()
+        cursor = connection.cursor(dictionary=True)
+        
+        # Check if user has access to view this club's calendar
+        club = calendar_index.club(cursor, club_id)
+        
+        if not club or not club.is_active:
             raise HTTPException(status_code=404, detail="Club not found")
         
         # Check access permissions
-        can_view = club["calendar_public"]
+        can_view = club.calendar_public
         
         if not can_view:
             # Check if user is member or admin
@@ -268,56 +354,25 @@ async def get_club_calendar(club_id: int, year: int, month: int, current_user):
         if not can_view:
             raise HTTPException(status_code=403, detail="Access denied to this club's calendar")
         
-        # Get events for the month
-        start_date = date(year, month, 1)
-        end_date = date(year, month, monthrange(year, month)[1])
-        
-        cursor.execute(
-            """
-            SELECT ce.*, u.full_name as created_by_name,
-                   COUNT(cer.id) as registration_count
-            FROM club_events ce
-            LEFT JOIN users u ON ce.created_by = u.id
-            LEFT JOIN club_event_registrations cer ON ce.id = cer.event_id AND cer.status = 'registered'
-            WHERE ce.club_id = %s 
-            AND ce.event_date >= %s 
-            AND ce.event_date <= %s
-            AND ce.status = 'approved'
-            GROUP BY ce.id
-            ORDER BY ce.event_date, ce.start_time
-            """,
-            (club_id, start_date, end_date)
-        )
-        
-        events = cursor.fetchall()
+        # Get events for the month from the calendar index
+        events = calendar_index.month_events(cursor, year, month, [club_id])
         
         # Format events for calendar display
         calendar_events = []
         for event in events:
             calendar_events.append({
-                "id": event["id"],
-                "title": event["title"],
-                "description": event["description"],
-                "date": event["event_date"].strftime("%Y-%m-%d"),
-                "start_time": str(event["start_time"]),
-                "end_time": str(event["end_time"]),
-                "venue": event["venue"],
-                "event_type": event["event_type"],
-                "color": event["calendar_color"],
-                "is_public": event["is_public"],
-                "registration_required": event["registration_required"],
-                "registration_count": event["registration_count"],
-                "max_participants": event["max_participants"],
-                "created_by": event["created_by_name"],
-                "is_recurring": event.get("is_recurring", False)
+                **event.to_dict(),
+                "color": event.calendar_color,
+                "is_public": event.is_public,
+                "is_recurring": event.is_recurring
             })
         
         return {
             "club": {
-                "id": club["id"],
-                "name": club["name"],
-                "calendar_color": club["calendar_color"],
-                "description": club["calendar_description"]
+                "id": club.id,
+                "name": club.name,
+                "calendar_color": club.calendar_color,
+                "description": club.calendar_description
             },
             "month": f"{year}-{month:02d}",
             "events": calendar_events
@@ -337,79 +392,41 @@ async def get_all_clubs_calendar(year: int, month: int, current_user, club_filte
         connection = get_mysql_connection()
         cursor = connection.cursor(dictionary=True)
         
-        # Get date range
-        start_date = date(year, month, 1)
-        end_date = date(year, month, monthrange(year, month)[1])
-        
-        # Build club filter
-        club_where = ""
-        params = [start_date, end_date]
-        
-        if club_filter:
-            placeholders = ",".join(["%s"] * len(club_filter))
-            club_where = f"AND ce.club_id IN ({placeholders})"
-            params.extend(club_filter)
-        
-        # Add college filter if user is not admin
-        if current_user.get("role") != "admin":
-            club_where += " AND c.college_id = %s"
-            params.append(current_user.get("college_id"))
+        # Visible clubs: active, public calendar, same college unless admin
+        clubs = calendar_index.clubs(cursor, club_filter or ())
+        is_admin = current_user.get("role") == "admin"
+        visible = {
+            club_id: club for club_id, club in clubs.items()
+            if club.is_active and club.calendar_public
+            and (not club_filter or club_id in club_filter)
+            and (is_admin or club.college_id == current_user.get("college_id"))
+        }
         
         # Get all club events for the month
-        cursor.execute(
-            f"""
-            SELECT ce.*, c.name as club_name, c.calendar_color as club_color,
-                   u.full_name as created_by_name,
-                   COUNT(cer.id) as registration_count
-            FROM club_events ce
-            JOIN clubs c ON ce.club_id = c.id
-            LEFT JOIN users u ON ce.created_by = u.id
-            LEFT JOIN club_event_registrations cer ON ce.id = cer.event_id AND cer.status = 'registered'
-            WHERE ce.event_date >= %s 
-            AND ce.event_date <= %s
-            AND ce.status = 'approved'
-            AND ce.is_public = TRUE
-            AND c.is_active = TRUE
-            AND c.calendar_public = TRUE
-            {club_where}
-            GROUP BY ce.id
-            ORDER BY ce.event_date, ce.start_time
-            """,
-            params
-        )
-        
-        events = cursor.fetchall()
+        events = calendar_index.month_events(cursor, year, month, visible)
         
         # Group events by club
         clubs_calendar = {}
         all_events = []
         
         for event in events:
-            club_id = event["club_id"]
+            if not event.is_public:
+                continue
+            club_id = event.club_id
+            club = visible[club_id]
             
             if club_id not in clubs_calendar:
                 clubs_calendar[club_id] = {
-                    "club_name": event["club_name"],
-                    "club_color": event["club_color"] or "#3B82F6",
+                    "club_name": club.name,
+                    "club_color": club.calendar_color or "#3B82F6",
                     "events": []
                 }
             
             event_data = {
-                "id": event["id"],
-                "title": event["title"],
-                "description": event["description"],
-                "date": event["event_date"].strftime("%Y-%m-%d"),
-                "start_time": str(event["start_time"]),
-                "end_time": str(event["end_time"]),
-                "venue": event["venue"],
-                "event_type": event["event_type"],
-                "color": event["calendar_color"] or event["club_color"],
-                "registration_required": event["registration_required"],
-                "registration_count": event["registration_count"],
-                "max_participants": event["max_participants"],
-                "created_by": event["created_by_name"],
+                **event.to_dict(),
+                "color": event.calendar_color or club.calendar_color,
                 "club_id": club_id,
-                "club_name": event["club_name"]
+                "club_name": club.name
             }
             
             clubs_calendar[club_id]["events"].append(event_data)
@@ -576,6 +593,8 @@ async def update_club_calendar_settings(club_id: int, settings: dict, current_us
         )
         
         connection.commit()
+        calendar_index.refresh_club_meta(cursor, club_id)
+        _update_calendar_sync(cursor, connection, club_id)
         
         return {
             "success": True,
@@ -606,80 +625,56 @@ async def get_upcoming_events_all_clubs(current_user, days_ahead: int = 7, limit
             (current_user["id"],)
         )
         
-        member_clubs = [row["club_id"] for row in cursor.fetchall()]
+        member_clubs = {row["club_id"] for row in cursor.fetchall()}
         
-        # Build access condition
-        access_condition = "ce.is_public = TRUE AND c.calendar_public = TRUE"
-        params = [datetime.now().date(), datetime.now().date() + timedelta(days=days_ahead)]
+        today = datetime.now().date()
+        clubs = calendar_index.clubs(cursor, member_clubs)
+        is_admin = current_user.get("role") == "admin"
         
-        if member_clubs:
-            placeholders = ",".join(["%s"] * len(member_clubs))
-            access_condition += f" OR ce.club_id IN ({placeholders})"
-            params.extend(member_clubs)
-        
-        # Add college filter
-        if current_user.get("role") != "admin":
-            college_condition = "AND c.college_id = %s"
-            params.append(current_user.get("college_id"))
-        else:
-            college_condition = ""
-        
-        # Get upcoming events
-        cursor.execute(
-            f"""
-            SELECT ce.*, c.name as club_name, c.calendar_color as club_color,
-                   u.full_name as created_by_name,
-                   COUNT(cer.id) as registration_count,
-                   CASE WHEN cer_user.id IS NOT NULL THEN TRUE ELSE FALSE END as user_registered
-            FROM club_events ce
-            JOIN clubs c ON ce.club_id = c.id
-            LEFT JOIN users u ON ce.created_by = u.id
-            LEFT JOIN club_event_registrations cer ON ce.id = cer.event_id AND cer.status = 'registered'
-            LEFT JOIN club_event_registrations cer_user ON ce.id = cer_user.event_id 
-                AND cer_user.user_id = %s AND cer_user.status = 'registered'
-            WHERE ce.event_date >= %s 
-            AND ce.event_date <= %s
-            AND ce.status = 'approved'
-            AND c.is_active = TRUE
-            AND ({access_condition})
-            {college_condition}
-            GROUP BY ce.id
-            ORDER BY ce.event_date, ce.start_time
-            LIMIT %s
-            """,
-            [current_user["id"]] + params + [limit]
-        )
-        
-        events = cursor.fetchall()
-        
-        # Format events
+        # Public events of public calendars, plus every event of the user's own clubs
         formatted_events = []
-        for event in events:
+        for event in calendar_index.events_between(cursor, today, today + timedelta(days=days_ahead)):
+            club = clubs.get(event.club_id)
+            if not club or not club.is_active:
+                continue
+            if not ((event.is_public and club.calendar_public) or event.club_id in member_clubs):
+                continue
+            if not is_admin and club.college_id != current_user.get("college_id"):
+                continue
             formatted_events.append({
-                "id": event["id"],
-                "title": event["title"],
-                "description": event["description"],
-                "date": event["event_date"].strftime("%Y-%m-%d"),
-                "start_time": str(event["start_time"]),
-                "end_time": str(event["end_time"]),
-                "venue": event["venue"],
-                "event_type": event["event_type"],
-                "color": event["calendar_color"] or event["club_color"],
-                "club_id": event["club_id"],
-                "club_name": event["club_name"],
-                "registration_required": event["registration_required"],
-                "registration_count": event["registration_count"],
-                "max_participants": event["max_participants"],
-                "user_registered": bool(event["user_registered"]),
-                "created_by": event["created_by_name"]
+                **event.to_dict(),
+                "color": event.calendar_color or club.calendar_color,
+                "club_id": event.club_id,
+                "club_name": club.name,
+                "user_registered": False
             })
+            if len(formatted_events) >= limit:
+                break
+        
+        # The user's own registrations for just the listed events
+        if formatted_events:
+            placeholders = ",".join(["%s"] * len(formatted_events))
+            cursor.execute(
+                f"""
+                SELECT event_id, occurrence_date FROM club_event_registrations
+                WHERE user_id = %s AND status = 'registered' AND event_id IN ({placeholders})
+                """,
+                [current_user["id"]] + [event["id"] for event in formatted_events]
+            )
+            # Series registrations are per occurrence, matched on the occurrence's rule date
+            registered = {
+                (row["event_id"], row["occurrence_date"].strftime("%Y-%m-%d") if row["occurrence_date"] else None)
+                for row in cursor.fetchall()
+            }
+            for event in formatted_events:
+                event["user_registered"] = (event["id"], event.get("occurrence_date")) in registered
         
         return {
             "events": formatted_events,
             "total_events": len(formatted_events),
             "date_range": {
-                "from": datetime.now().date().strftime("%Y-%m-%d"),
-                "to": (datetime.now().date() + timedelta(days=days_ahead)).strftime("%Y-%m-%d")
+                "from": today.strftime("%Y-%m-%d"),
+                "to": (today + timedelta(days=days_ahead)).strftime("%Y-%m-%d")
             }
         }
         
@@ -707,4 +702,5 @@ def _update_calendar_sync(cursor, connection, club_id: int):
         )
         connection.commit()
     except:
-        pass  # Ignore sync update errors
\ No newline at end of file
+        pass  # Ignore sync update errors
+    calendar_feed.mark_changed(club_id)
\ No newline at end of file
@@ -10,7 +10,7 @@ Copy these endpoints to the end of main.py file
 # Import at the top of main.py (already added):
 # from club_events_api import (
 #     create_club_event, get_club_events, get_all_club_events, approve_club_event,
-#     create_club_timeline, get_club_timeline, register_for_event,
+#     create_club_timeline, get_club_timeline, register_for_event, cancel_event_registration, set_event_drop_mode,
 #     get_student_council_dashboard, mark_student_council
 # )
 
@@ -55,9 +55,27 @@ async def get_club_timeline_endpoint(club_id: int, current_user = Depends(auth.g
     return await get_club_timeline(club_id, current_user)
 
 @app.post("/clubs/events/{event_id}/register")
-async def register_for_event_endpoint(event_id: int, current_user = Depends(auth.get_current_user)):
-    """Register for a club event"""
-    return await register_for_event(event_id, current_user)
+async def register_for_event_endpoint(
+    event_id: int,
+    occurrence_date: Optional[str] = Query(None, description="Occurrence of a recurring series (YYYY-MM-DD)"),
+    current_user = Depends(auth.get_current_user)
+):
+    """Register for a club event, or for one occurrence of a recurring series"""
+    return await register_for_event(event_id, current_user, occurrence_date)
+
+@app.delete("/clubs/events/{event_id}/register")
+async def cancel_event_registration_endpoint(
+    event_id: int,
+    occurrence_date: Optional[str] = Query(None, description="Occurrence of a recurring series (YYYY-MM-DD)"),
+    current_user = Depends(auth.get_current_user)
+):
+    """Cancel a club event registration or waitlist place"""
+    return await cancel_event_registration(event_id, current_user, occurrence_date)
+
+@app.post("/clubs/events/{event_id}/drop")
+async def set_event_drop_mode_endpoint(event_id: int, drop_data: dict, current_user = Depends(auth.get_current_user)):
+    """Open ({"enabled": true}) or close ticket-drop registration for a club event"""
+    return await set_event_drop_mode(event_id, drop_data, current_user)
 
 @app.get("/student-council/dashboard")
 async def get_student_council_dashboard_endpoint(current_user = Depends(auth.get_current_user)):
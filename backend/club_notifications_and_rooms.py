@@ -6,6 +6,7 @@ import mysql.connector
 
 from database import get_mysql_connection
 import auth
+from autocomplete import autocomplete_service
 
 router = APIRouter()
 
@@ -300,6 +301,7 @@ async def get_rooms(
     booking_date: Optional[date] = None,
     start_time: Optional[time] = None,
     end_time: Optional[time] = None,
+    q: Optional[str] = None,
     current_user = Depends(auth.get_current_user)
 ):
     try:
@@ -310,10 +312,19 @@ async def get_rooms(
         # Basic room list
         params: List = []
         sql = "SELECT * FROM rooms WHERE is_available = 1"
+        order_by = "building, room_number"
+        if q:
+            # Room picker typeahead: prefix matches on number, name or building from memory
+            ids = autocomplete_service.complete_ids(cursor, "rooms", q, group=room_type, limit=50)
+            if not ids:
+                return []
+            id_list = ", ".join(str(int(i)) for i in ids)
+            sql += f" AND id IN ({id_list})"
+            order_by = f"FIELD(id, {id_list})"
         if room_type:
             sql += " AND room_type = %s"
             params.append(room_type)
-        sql += " ORDER BY building, room_number"
+        sql += f" ORDER BY {order_by}"
         cursor.execute(sql, tuple(params))
         rooms = cursor.fetchall()
 
@@ -0,0 +1,226 @@
+"""Materialized per-club statistics.
+
+``club_stats`` holds one row per club with member counts by status, event
+counts and registration counts so club lists and dashboards read a single
+indexed row instead of running COUNT queries per club. Rows are recomputed
+for the affected club after every membership, event or registration write
+(one grouped query per club, so counts never drift), and all clubs are
+reconciled periodically to pick up date-dependent values such as
+``upcoming_events`` and writes made outside the hooked code paths.
+
+A recurring series is one ``club_events`` row, so its occurrences are
+counted in Python after the grouped query. The window is the series start
+through ``LISTING_HORIZON_DAYS`` ahead, the same window the event listings
+expand. ``pending_events`` still counts the series once, because a series
+is approved as a whole.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from recurrence import LISTING_HORIZON_DAYS, OccurrenceOverride, RecurrenceRule, expand
+
+LOGGER = logging.getLogger(__name__)
+
+RECONCILE_INTERVAL_SECONDS = int(os.getenv("CLUB_STATS_RECONCILE_SECONDS", "900"))
+
+STAT_COLUMNS = (
+    "approved_members",
+    "pending_members",
+    "rejected_members",
+    "total_events",
+    "upcoming_events",
+    "pending_events",
+    "total_registrations",
+    "upcoming_registrations",
+)
+
+_table_ready = False
+_table_lock = threading.Lock()
+
+
+def ensure_club_stats_table(cursor) -> None:
+    """Create ``club_stats`` (and the club event tables it aggregates) once per process."""
+    global _table_ready
+    if _table_ready:
+        return
+    with _table_lock:
+        if _table_ready:
+            return
+        from club_events_api import _ensure_club_events_tables
+        from club_events_calendar import _ensure_calendar_tables
+
+        _ensure_club_events_tables(cursor)
+        _ensure_calendar_tables(cursor)
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS club_stats (
+              club_id INT NOT NULL PRIMARY KEY,
+              approved_members INT NOT NULL DEFAULT 0,
+              pending_members INT NOT NULL DEFAULT 0,
+              rejected_members INT NOT NULL DEFAULT 0,
+              total_events INT NOT NULL DEFAULT 0,
+              upcoming_events INT NOT NULL DEFAULT 0,
+              pending_events INT NOT NULL DEFAULT 0,
+              total_registrations INT NOT NULL DEFAULT 0,
+              upcoming_registrations INT NOT NULL DEFAULT 0,
+              refreshed_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+            """
+        )
+        _table_ready = True
+
+
+def _refresh_sql(filtered: bool, count: int = 0) -> str:
+    club_filter = f" AND club_id IN ({', '.join(['%s'] * count)})" if filtered else ""
+    event_filter = f" AND ce.club_id IN ({', '.join(['%s'] * count)})" if filtered else ""
+    outer_filter = f" WHERE c.id IN ({', '.join(['%s'] * count)})" if filtered else ""
+    return f"""
+        INSERT INTO club_stats (club_id, {', '.join(STAT_COLUMNS)}, refreshed_at)
+        SELECT c.id,
+               COALESCE(m.approved, 0), COALESCE(m.pending, 0), COALESCE(m.rejected, 0),
+               COALESCE(e.total, 0), COALESCE(e.upcoming, 0), COALESCE(e.pending, 0),
+               COALESCE(r.total, 0), COALESCE(r.upcoming, 0),
+               NOW()
+        FROM clubs c
+        LEFT JOIN (
+            SELECT club_id,
+                   SUM(status = 'approved') AS approved,
+                   SUM(status = 'pending') AS pending,
+                   SUM(status = 'rejected') AS rejected
+            FROM club_memberships WHERE 1 = 1{club_filter}
+            GROUP BY club_id
+        ) m ON m.club_id = c.id
+        LEFT JOIN (
+            SELECT club_id,
+                   SUM(recurrence_rule IS NULL) AS total,
+                   SUM(recurrence_rule IS NULL AND status = 'approved' AND event_date >= CURDATE()) AS upcoming,
+                   SUM(status = 'pending_approval') AS pending
+            FROM club_events WHERE 1 = 1{club_filter}
+            GROUP BY club_id
+        ) e ON e.club_id = c.id
+        LEFT JOIN (
+            SELECT ce.club_id,
+                   COUNT(*) AS total,
+                   SUM(COALESCE(cer.occurrence_date, ce.event_date) >= CURDATE()) AS upcoming
+            FROM club_event_registrations cer
+            JOIN club_events ce ON ce.id = cer.event_id
+            WHERE cer.status = 'registered'{event_filter}
+            GROUP BY ce.club_id
+        ) r ON r.club_id = c.id{outer_filter}
+        ON DUPLICATE KEY UPDATE
+            {', '.join(f'{col} = VALUES({col})' for col in STAT_COLUMNS)},
+            refreshed_at = VALUES(refreshed_at)
+    """
+
+
+def _series_event_counts(cursor, club_ids: Optional[List[int]]) -> Dict[int, Tuple[int, int]]:
+    """``{club_id: (occurrences, upcoming approved occurrences)}`` over the clubs' recurring series."""
+    club_filter = f" AND club_id IN ({', '.join(['%s'] * len(club_ids))})" if club_ids else ""
+    cursor.execute(
+        f"""
+        SELECT id, club_id, status, event_date, recurrence_rule FROM club_events
+        WHERE recurrence_rule IS NOT NULL{club_filter}
+        """,
+        tuple(club_ids or ()),
+    )
+    series = cursor.fetchall()
+    if not series:
+        return {}
+    placeholders = ", ".join(["%s"] * len(series))
+    cursor.execute(
+        f"SELECT * FROM club_event_exceptions WHERE event_id IN ({placeholders})",
+        tuple(row["id"] for row in series),
+    )
+    overrides: Dict[int, Dict] = {}
+    for row in cursor.fetchall():
+        overrides.setdefault(row["event_id"], {})[row["occurrence_date"]] = OccurrenceOverride.from_row(row)
+
+    today = date.today()
+    horizon = today + timedelta(days=LISTING_HORIZON_DAYS)
+    counts: Dict[int, Tuple[int, int]] = {}
+    for row in series:
+        try:
+            rule = RecurrenceRule.parse(row["recurrence_rule"])
+        except ValueError:
+            continue
+        finals = [
+            override.override_date if override and override.override_date else day
+            for day, override in expand(rule, row["event_date"], row["event_date"], horizon, overrides.get(row["id"]))
+        ]
+        upcoming = sum(1 for day in finals if day >= today) if row["status"] == "approved" else 0
+        total, upcoming_total = counts.get(row["club_id"], (0, 0))
+        counts[row["club_id"]] = (total + len(finals), upcoming_total + upcoming)
+    return counts
+
+
+def _add_series_counts(cursor, club_ids: Optional[List[int]]) -> None:
+    counts = _series_event_counts(cursor, club_ids)
+    if counts:
+        cursor.executemany(
+            "UPDATE club_stats SET total_events = total_events + %s, upcoming_events = upcoming_events + %s "
+            "WHERE club_id = %s",
+            [(total, upcoming, club_id) for club_id, (total, upcoming) in counts.items()],
+        )
+
+
+def refresh_club_stats(cursor, club_ids: Iterable[int]) -> None:
+    """Recompute the stats rows for ``club_ids`` (call after a write touching those clubs)."""
+    ids = sorted({int(c) for c in club_ids if c is not None})
+    if not ids:
+        return
+    ensure_club_stats_table(cursor)
+    # Same id list for each of the four filtered subqueries
+    cursor.execute(_refresh_sql(True, len(ids)), tuple(ids) * 4)
+    _add_series_counts(cursor, ids)
+
+
+def touch(cursor, club_id: Optional[int]) -> None:
+    """Best-effort refresh used by write paths; never fails the surrounding request."""
+    try:
+        refresh_club_stats(cursor, [club_id])
+    except Exception as exc:
+        LOGGER.warning("club_stats refresh failed for club %s: %s", club_id, exc)
+
+
+def reconcile_all(cursor) -> int:
+    """Recompute every club's row; returns the number of clubs processed."""
+    ensure_club_stats_table(cursor)
+    cursor.execute(_refresh_sql(False))
+    _add_series_counts(cursor, None)
+    cursor.execute("DELETE cs FROM club_stats cs LEFT JOIN clubs c ON c.id = cs.club_id WHERE c.id IS NULL")
+    cursor.execute("SELECT COUNT(*) AS count FROM club_stats")
+    row = cursor.fetchone()
+    return row["count"] if isinstance(row, dict) else row[0]
+
+
+def load_club_stats(cursor, club_ids: Iterable[int]) -> Dict[int, Dict]:
+    """Return ``{club_id: stats}``; clubs without a row yet are materialized on the spot."""
+    ids = sorted({int(c) for c in club_ids})
+    if not ids:
+        return {}
+    ensure_club_stats_table(cursor)
+    placeholders = ", ".join(["%s"] * len(ids))
+    query = f"SELECT club_id, {', '.join(STAT_COLUMNS)} FROM club_stats WHERE club_id IN ({placeholders})"
+    cursor.execute(query, tuple(ids))
+    stats = {row["club_id"]: row for row in cursor.fetchall()}
+    missing = [c for c in ids if c not in stats]
+    if missing:
+        refresh_club_stats(cursor, missing)
+        cursor.execute(
+            f"SELECT club_id, {', '.join(STAT_COLUMNS)} FROM club_stats WHERE club_id IN ({', '.join(['%s'] * len(missing))})",
+            tuple(missing),
+        )
+        stats.update({row["club_id"]: row for row in cursor.fetchall()})
+    empty = {col: 0 for col in STAT_COLUMNS}
+    return {c: {k: int(v or 0) for k, v in stats.get(c, empty).items() if k != "club_id"} for c in ids}
+
+
+def totals(stats: Dict[int, Dict], columns: Iterable[str] = STAT_COLUMNS) -> Dict[str, int]:
+    """Sum stat columns across clubs (e.g. for a manager's dashboard)."""
+    return {col: sum(s.get(col, 0) for s in stats.values()) for col in columns}
@@ -9,6 +9,9 @@ from typing import Optional, List
 import mysql.connector
 from database import get_mysql_connection
 import auth
+import club_stats
+import search_index
+from search_index import search_service
 
 # =============================================================================
 # CLUBS ENDPOINTS (Replacing Organizations)
@@ -36,24 +39,14 @@ async def get_all_clubs(current_user):
             (college_id, college_id)
         )
         clubs = cursor.fetchall()
+        stats = club_stats.load_club_stats(cursor, [club["id"] for club in clubs])
+        memberships = _user_membership_statuses(cursor, user_id)
         
         # Add member count and membership status for each club
         for club in clubs:
-            # Get member count
-            cursor.execute(
-                "SELECT COUNT(*) as member_count FROM club_memberships WHERE club_id = %s AND status = 'approved'",
-                (club["id"],)
-            )
-            count_result = cursor.fetchone()
-            club["member_count"] = count_result["member_count"] if count_result else 0
-            
-            # Get membership status for current user
-            cursor.execute(
-                "SELECT status FROM club_memberships WHERE club_id = %s AND user_id = %s",
-                (club["id"], user_id)
-            )
-            membership = cursor.fetchone()
-            club["membership_status"] = membership.get("status") if membership else None
+            club["member_count"] = stats[club["id"]]["approved_members"]
+            club["stats"] = stats[club["id"]]
+            club["membership_status"] = memberships.get(club["id"])
             club["is_member"] = club["membership_status"] in ("approved", "member")
             
             # Set organization_name for frontend compatibility
@@ -91,6 +84,24 @@ async def get_detailed_clubs(current_user):
             """
         )
         clubs = cursor.fetchall()
+        stats = club_stats.load_club_stats(cursor, [club["id"] for club in clubs])
+        memberships = _user_membership_statuses(cursor, user_id) if user_id else {}
+        
+        # Get departments of members for all clubs at once
+        departments = {}
+        if clubs:
+            cursor.execute(
+                """
+                SELECT DISTINCT cm.club_id, u.department as dept
+                FROM club_memberships cm
+                JOIN users u ON u.id = cm.user_id
+                WHERE cm.status = 'approved'
+                AND u.department IS NOT NULL AND u.department != ''
+                ORDER BY dept
+                """
+            )
+            for row in cursor.fetchall():
+                departments.setdefault(row["club_id"], []).append(row["dept"])
         
         for club in clubs:
             # Add head info
@@ -100,38 +111,10 @@ async def get_detailed_clubs(current_user):
                 "phone": club.get("head_phone")
             }
             
-            # Get member count
-            cursor.execute(
-                "SELECT COUNT(*) as count FROM club_memberships WHERE club_id = %s AND status = 'approved'",
-                (club["id"],)
-            )
-            count_result = cursor.fetchone()
-            club["member_count"] = count_result["count"] if count_result else 0
-            
-            # Get membership status for current user
-            if user_id:
-                cursor.execute(
-                    "SELECT status FROM club_memberships WHERE club_id = %s AND user_id = %s",
-                    (club["id"], user_id)
-                )
-                membership = cursor.fetchone()
-                club["membership_status"] = membership.get("status") if membership else None
-            else:
-                club["membership_status"] = None
-            
-            # Get departments of members
-            cursor.execute(
-                """
-                SELECT DISTINCT COALESCE(u.department, 'General') as dept
-                FROM club_memberships cm
-                JOIN users u ON u.id = cm.user_id
-                WHERE cm.club_id = %s AND cm.status = 'approved'
-                AND u.department IS NOT NULL AND u.department != ''
-                ORDER BY dept
-                """,
-                (club["id"],)
-            )
-            club["departments"] = [row["dept"] for row in cursor.fetchall()]
+            club["member_count"] = stats[club["id"]]["approved_members"]
+            club["stats"] = stats[club["id"]]
+            club["membership_status"] = memberships.get(club["id"])
+            club["departments"] = departments.get(club["id"], [])
             
             # Set organization_name for compatibility
             club["organization_name"] = club["name"]
@@ -146,6 +129,11 @@ async def get_detailed_clubs(current_user):
         if 'connection' in locals():
             connection.close()
 
+def _user_membership_statuses(cursor, user_id) -> dict:
+    """Map club_id -> membership status for one user (single indexed read)."""
+    cursor.execute("SELECT club_id, status FROM club_memberships WHERE user_id = %s", (user_id,))
+    return {row["club_id"]: row["status"] for row in cursor.fetchall()}
+
 async def apply_to_club(club_id: int, application_data: dict, current_user):
     """Apply to join a club (replaces /organizations/{org_id}/apply)"""
     if current_user.get("role") != "student":
@@ -176,11 +164,7 @@ async def apply_to_club(club_id: int, application_data: dict, current_user):
         
         # Check if club is full
         if club.get("max_members"):
-            cursor.execute(
-                "SELECT COUNT(*) as count FROM club_memberships WHERE club_id = %s AND status = 'approved'",
-                (club_id,)
-            )
-            current_members = cursor.fetchone()["count"]
+            current_members = club_stats.load_club_stats(cursor, [club_id])[club_id]["approved_members"]
             if current_members >= club["max_members"]:
                 raise HTTPException(status_code=400, detail="Club is full")
         
@@ -208,6 +192,7 @@ async def apply_to_club(club_id: int, application_data: dict, current_user):
             )
         
         connection.commit()
+        club_stats.touch(cursor, club_id)
         return {"message": f"Successfully applied to join {club['name']}", "status": "pending"}
         
     except mysql.connector.Error as e:
@@ -266,9 +251,7 @@ async def get_my_managed_clubs(current_user):
         
         cursor.execute(
             """
-            SELECT c.*, 
-                   (SELECT COUNT(*) FROM club_memberships WHERE club_id = c.id AND status = 'approved') as member_count,
-                   (SELECT COUNT(*) FROM club_memberships WHERE club_id = c.id AND status = 'pending') as pending_count
+            SELECT c.*
             FROM clubs c
             WHERE c.created_by = %s AND c.is_active = TRUE
             ORDER BY c.name
@@ -276,9 +259,12 @@ async def get_my_managed_clubs(current_user):
             (current_user["id"],)
         )
         clubs = cursor.fetchall()
+        stats = club_stats.load_club_stats(cursor, [club["id"] for club in clubs])
         
         # Add organization_name for compatibility
         for club in clubs:
+            club["member_count"] = stats[club["id"]]["approved_members"]
+            club["pending_count"] = stats[club["id"]]["pending_members"]
             club["organization_name"] = club["name"]
             
         return clubs
@@ -428,6 +414,7 @@ async def update_member_status(user_id: int, payload: dict, current_user):
                 """,
                 (backend_status, current_user["id"], membership["id"])
             )
+            club_stats.touch(cursor, membership["club_id"])
         
         # Send notification based on the action
         org_name = membership['club_name']
@@ -504,48 +491,16 @@ async def get_my_club_stats(current_user):
         if not clubs:
             return {"members": 0, "events": 0, "upcoming_events": 0, "applications": 0}
         
-        club_ids = [club["id"] for club in clubs]
-        placeholders = ",".join(["%s"] * len(club_ids))
-        
-        # Get total members
-        cursor.execute(
-            f"SELECT COUNT(*) as count FROM club_memberships WHERE club_id IN ({placeholders}) AND status = 'approved'",
-            club_ids
-        )
-        members_count = cursor.fetchone()["count"]
-        
-        # Get pending applications
-        cursor.execute(
-            f"SELECT COUNT(*) as count FROM club_memberships WHERE club_id IN ({placeholders}) AND status = 'pending'",
-            club_ids
-        )
-        applications_count = cursor.fetchone()["count"]
-        
-        # Get events (if events table exists and has club_id)
-        events_count = 0
-        upcoming_events = 0
-        try:
-            cursor.execute("SHOW COLUMNS FROM events LIKE 'club_id'")
-            if cursor.fetchone():
-                cursor.execute(
-                    f"SELECT COUNT(*) as count FROM events WHERE club_id IN ({placeholders})",
-                    club_ids
-                )
-                events_count = cursor.fetchone()["count"]
-                
-                cursor.execute(
-                    f"SELECT COUNT(*) as count FROM events WHERE club_id IN ({placeholders}) AND date >= CURDATE()",
-                    club_ids
-                )
-                upcoming_events = cursor.fetchone()["count"]
-        except:
-            pass
+        stats = club_stats.totals(club_stats.load_club_stats(cursor, [club["id"] for club in clubs]))
         
         return {
-            "members": members_count,
-            "events": events_count,
-            "upcoming_events": upcoming_events,
-            "applications": applications_count,
+            "members": stats["approved_members"],
+            "events": stats["total_events"],
+            "upcoming_events": stats["upcoming_events"],
+            "applications": stats["pending_members"],
+            "registrations": stats["total_registrations"],
+            "upcoming_registrations": stats["upcoming_registrations"],
+            "pending_event_approvals": stats["pending_events"],
             "clubs_managed": len(clubs)
         }
         
@@ -619,14 +574,24 @@ async def search_clubs(current_user, query: str = "", category: str = ""):
         
         where_conditions = ["c.is_active = TRUE"]
         params = []
+        order_by = "c.featured DESC, c.name ASC"
         
         if current_user.get("college_id"):
             where_conditions.append("c.college_id = %s")
             params.append(current_user["college_id"])
         
         if query:
-            where_conditions.append("(c.name LIKE %s OR c.description LIKE %s)")
-            params.extend([f"%{query}%", f"%{query}%"])
+            try:
+                # Ranked matches from the in-process search index
+                ids = search_service.search_ids(cursor, "clubs", query, college_id=current_user.get("college_id"))
+                if not ids:
+                    return []
+                id_list = ", ".join(str(int(i)) for i in ids)
+                where_conditions.append(f"c.id IN ({id_list})")
+                order_by = f"FIELD(c.id, {id_list})"
+            except Exception:
+                where_conditions.append("MATCH(c.name, c.description) AGAINST (%s IN BOOLEAN MODE)")
+                params.append(search_index.boolean_query(query))
         
         if category:
             where_conditions.append("c.category = %s")
@@ -636,20 +601,23 @@ async def search_clubs(current_user, query: str = "", category: str = ""):
         
         cursor.execute(
             f"""
-            SELECT c.*, 
-                   (SELECT COUNT(*) FROM club_memberships WHERE club_id = c.id AND status = 'approved') as member_count
+            SELECT c.*
             FROM clubs c
             WHERE {where_clause}
-            ORDER BY c.featured DESC, member_count DESC, c.name ASC
+            ORDER BY {order_by}
             """,
             params
         )
         
         clubs = cursor.fetchall()
+        stats = club_stats.load_club_stats(cursor, [club["id"] for club in clubs])
         
         # Add organization_name for compatibility
         for club in clubs:
+            club["member_count"] = stats[club["id"]]["approved_members"]
             club["organization_name"] = club["name"]
+        if not query:
+            clubs.sort(key=lambda club: (not club.get("featured"), -club["member_count"], club["name"] or ""))
             
         return clubs
         
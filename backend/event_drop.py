@@ -0,0 +1,438 @@
+"""Ticket-drop mode for high-demand event registration.
+
+When a fest event opens registration, thousands of students register in
+the same second. Each request used to run its own transaction against
+the same hot event row. In drop mode a registration is never written by
+the request. It is accepted into an in-memory FIFO queue for that event
+and answered at once with a ticket and a queue position, without
+touching MySQL. A single consumer task drains the queues in arrival
+order:
+
+* at most ``DROP_BATCH_SIZE`` tickets per transaction, and
+* at most ``DROP_MAX_BATCHES_PER_SECOND`` transactions per second.
+
+The MySQL write rate is therefore bounded however big the burst is. The
+handler registered with the drop writes each batch. Club events take
+seats in one transaction through ``event_registration.register_batch``.
+Campus event RSVPs are upserted. Clients follow their ticket by polling
+(``ticket_drop.find``) or through the SSE stream (``ticket_stream``).
+Every processed batch wakes the streams, which send the new position and
+then the final result.
+
+Drops are opened and closed explicitly by organisers. The queue lives in
+this worker's memory, which matches the single-worker deployment.
+Closing a drop stops new tickets. Tickets already queued are still
+processed, and the shutdown hook drains queues before the worker exits.
+A crash or restart still loses queued and decided tickets. Ticket ids
+carry the run id of the worker that issued them, so a ticket from an
+earlier run is answered with status ``lost`` and the owner is told to
+check their registration and register again. Registering again is safe,
+because a registration that was written is reported as a duplicate.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, Deque, Dict, List, Optional, Tuple
+
+LOGGER = logging.getLogger(__name__)
+
+DROP_BATCH_SIZE = int(os.getenv("EVENT_DROP_BATCH_SIZE", "100"))
+DROP_MAX_BATCHES_PER_SECOND = float(os.getenv("EVENT_DROP_MAX_BATCHES_PER_SECOND", "5"))
+DROP_MAX_QUEUE = int(os.getenv("EVENT_DROP_MAX_QUEUE", "20000"))
+# Decided tickets stay pollable this long
+TICKET_TTL_SECONDS = float(os.getenv("EVENT_DROP_TICKET_TTL_SECONDS", "3600"))
+HEARTBEAT_SECONDS = float(os.getenv("EVENT_DROP_HEARTBEAT_SECONDS", "15"))
+
+FINAL_FAILED = "failed"
+# A ticket issued before this worker restarted; its outcome is unknown here
+FINAL_LOST = "lost"
+
+
+class DropAdmissionError(RuntimeError):
+    """Ticket refused because the queue is full; ``retry_after`` seconds is a fair wait."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@dataclass
+class DropTicket:
+    id: str
+    kind: str
+    event_id: int
+    user_id: int
+    seq: int
+    payload: Dict = field(default_factory=dict)
+    status: str = "queued"
+    detail: Optional[str] = None
+    result: Dict = field(default_factory=dict)
+    created_at: float = field(default_factory=time.time)
+    decided_at: Optional[float] = None
+
+    @property
+    def queued(self) -> bool:
+        return self.status == "queued"
+
+    def decide(self, status: str, detail: Optional[str] = None, **result) -> None:
+        self.status = status
+        self.detail = detail
+        self.result = result
+        self.decided_at = time.time()
+
+
+# handler(connection, event_id, tickets) decides every ticket in the batch
+DropHandler = Callable[[object, int, List[DropTicket]], None]
+
+
+@dataclass
+class Drop:
+    kind: str
+    event_id: int
+    handler: DropHandler
+    info: Dict = field(default_factory=dict)
+    # A decided ticket may be superseded by a new one (e.g. an RSVP changing its answer)
+    repeatable: bool = False
+    is_open: bool = True
+    opened_at: float = field(default_factory=time.time)
+    queue: Deque[DropTicket] = field(default_factory=deque)
+    by_user: Dict[int, DropTicket] = field(default_factory=dict)
+    next_seq: int = 0
+    processed_seq: int = 0
+    decided: Dict[str, int] = field(default_factory=dict)
+    progress: Optional[asyncio.Event] = None
+
+    @property
+    def key(self) -> Tuple[str, int]:
+        return self.kind, self.event_id
+
+    def position(self, ticket: DropTicket) -> Optional[int]:
+        """1-based place in the queue, or None once decided."""
+        return ticket.seq - self.processed_seq if ticket.queued else None
+
+    def stats(self) -> Dict:
+        return {
+            "kind": self.kind,
+            "event_id": self.event_id,
+            "open": self.is_open,
+            "queued": len(self.queue),
+            "accepted": self.next_seq,
+            "processed": self.processed_seq,
+            "decided": dict(self.decided),
+        }
+
+
+class TicketDrop:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._drops: Dict[Tuple[str, int], Drop] = {}
+        self._tickets: Dict[str, DropTicket] = {}
+        self._connect: Optional[Callable] = None
+        self._prepare: Optional[Callable] = None
+        self._prepared = False
+        self._connection = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self.batches = 0
+        # Prefix of every ticket id issued by this run (see ``find``)
+        self.run_id = secrets.token_hex(4)
+
+    def configure(self, connect: Callable, prepare: Optional[Callable] = None) -> None:
+        """``connect()`` returns a MySQL connection; ``prepare(cursor)`` runs once before the first batch."""
+        self._connect = connect
+        self._prepare = prepare
+
+    # --- drops ---
+
+    def open(self, kind: str, event_id: int, handler: DropHandler, info: Optional[Dict] = None,
+             repeatable: bool = False) -> Drop:
+        with self._lock:
+            drop = self._drops.get((kind, event_id))
+            if drop is None:
+                drop = Drop(kind, event_id, handler, dict(info or {}), repeatable)
+                self._drops[drop.key] = drop
+            else:
+                drop.handler, drop.info, drop.is_open = handler, dict(info or {}), True
+            LOGGER.info("Ticket drop opened for %s %s", kind, event_id)
+            return drop
+
+    def close(self, kind: str, event_id: int) -> Optional[Drop]:
+        """Stop accepting tickets; the ones already queued are still processed."""
+        with self._lock:
+            drop = self._drops.get((kind, event_id))
+            if drop is not None:
+                drop.is_open = False
+                LOGGER.info("Ticket drop closed for %s %s with %s queued", kind, event_id, len(drop.queue))
+            return drop
+
+    def get(self, kind: str, event_id: int) -> Optional[Drop]:
+        """The drop for the event if it is accepting tickets."""
+        drop = self._drops.get((kind, event_id))
+        return drop if drop is not None and drop.is_open else None
+
+    def drop_stats(self, kind: str, event_id: int) -> Optional[Dict]:
+        drop = self._drops.get((kind, event_id))
+        return drop.stats() if drop is not None else None
+
+    # --- tickets ---
+
+    def enqueue(self, drop: Drop, user_id: int, payload: Optional[Dict] = None) -> DropTicket:
+        """Queue a ticket for ``user_id``; a user already queued gets their ticket back."""
+        with self._lock:
+            existing = drop.by_user.get(user_id)
+            if existing is not None:
+                if existing.queued:
+                    if payload:
+                        existing.payload = dict(payload)
+                    return existing
+                if existing.status != FINAL_FAILED and not drop.repeatable:
+                    return existing
+            if len(drop.queue) >= DROP_MAX_QUEUE:
+                rate = max(DROP_BATCH_SIZE * DROP_MAX_BATCHES_PER_SECOND, 1.0)
+                wait = max(1, int(len(drop.queue) / rate) + 1)
+                raise DropAdmissionError(f"Registration queue is full, try again in {wait} seconds", wait)
+            drop.next_seq += 1
+            ticket_id = f"{self.run_id}.{drop.kind}.{drop.event_id}.{user_id}.{secrets.token_urlsafe(9)}"
+            ticket = DropTicket(ticket_id, drop.kind, drop.event_id, user_id, drop.next_seq, dict(payload or {}))
+            drop.queue.append(ticket)
+            drop.by_user[user_id] = ticket
+            self._tickets[ticket.id] = ticket
+        self._ensure_worker()
+        self._wakeup.set()
+        return ticket
+
+    def find(self, ticket_id: str) -> Optional[Tuple[Optional[Drop], DropTicket]]:
+        """The ticket and its drop; a ticket from an earlier run comes back ``lost`` with no drop."""
+        ticket = self._tickets.get(ticket_id)
+        if ticket is not None:
+            return self._drops[(ticket.kind, ticket.event_id)], ticket
+        parts = ticket_id.split(".")
+        if len(parts) != 5 or parts[0] == self.run_id:
+            return None  # Unknown, or decided and pruned after TICKET_TTL_SECONDS
+        try:
+            event_id, user_id = int(parts[2]), int(parts[3])
+        except ValueError:
+            return None
+        ticket = DropTicket(ticket_id, parts[1], event_id, user_id, seq=0, status=FINAL_LOST,
+                            detail="The registration queue restarted before this ticket was confirmed. "
+                                   "Check your registration and register again if it is missing.")
+        ticket.decided_at = time.time()
+        return None, ticket
+
+    def describe(self, drop: Optional[Drop], ticket: DropTicket) -> Dict:
+        """What polling and push clients see for a ticket."""
+        position = drop.position(ticket) if drop is not None else None
+        body = {
+            "ticket_id": ticket.id,
+            "event_id": ticket.event_id,
+            "status": ticket.status,
+            "queue_position": position,
+        }
+        if position is not None:
+            per_second = max(DROP_BATCH_SIZE * DROP_MAX_BATCHES_PER_SECOND, 1.0)
+            body["estimated_wait_seconds"] = round(position / per_second, 1)
+        if ticket.detail:
+            body["detail"] = ticket.detail
+        body.update(ticket.result)
+        return body
+
+    def estimated_wait(self, drop: Drop, ticket: DropTicket) -> int:
+        """Seconds a client should wait before its first poll."""
+        position = drop.position(ticket) or 0
+        return max(1, int(position / max(DROP_BATCH_SIZE * DROP_MAX_BATCHES_PER_SECOND, 1.0)))
+
+    # --- consumer ---
+
+    def _ensure_worker(self) -> None:
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        interval = 1.0 / DROP_MAX_BATCHES_PER_SECOND
+        while True:
+            await self._wakeup.wait()
+            with self._lock:
+                busy = [drop for drop in self._drops.values() if drop.queue]
+                if not busy:
+                    self._wakeup.clear()
+            for drop in busy:
+                with self._lock:
+                    batch = [drop.queue.popleft() for _ in range(min(len(drop.queue), DROP_BATCH_SIZE))]
+                if not batch:
+                    continue
+                started = loop.time()
+                try:
+                    await loop.run_in_executor(None, self._apply, drop, batch)
+                except Exception as e:
+                    LOGGER.error("Ticket drop batch for %s %s failed: %s", drop.kind, drop.event_id, e)
+                    for ticket in batch:
+                        if ticket.queued:
+                            ticket.decide(FINAL_FAILED, "Registration could not be saved, please try again")
+                with self._lock:
+                    drop.processed_seq = batch[-1].seq
+                    for ticket in batch:
+                        drop.decided[ticket.status] = drop.decided.get(ticket.status, 0) + 1
+                    self.batches += 1
+                self._notify(drop)
+                await asyncio.sleep(max(0.0, interval - (loop.time() - started)))
+            self._prune()
+
+    def _apply(self, drop: Drop, batch: List[DropTicket]) -> None:
+        try:
+            drop.handler(self._ensure_connection(), drop.event_id, batch)
+        except Exception:
+            self._connection = None
+            raise
+
+    def _ensure_connection(self):
+        if self._connection is None or not self._connection.is_connected():
+            self._connection = self._connect()
+        if not self._prepared and self._prepare is not None:
+            cursor = self._connection.cursor(dictionary=True)
+            try:
+                self._prepare(cursor)
+            finally:
+                cursor.close()
+            self._prepared = True
+        return self._connection
+
+    def _notify(self, drop: Drop) -> None:
+        if drop.progress is not None:
+            drop.progress.set()
+            drop.progress = None
+
+    def _prune(self) -> None:
+        cutoff = time.time() - TICKET_TTL_SECONDS
+        with self._lock:
+            stale = [t for t in self._tickets.values() if t.decided_at is not None and t.decided_at < cutoff]
+            for ticket in stale:
+                del self._tickets[ticket.id]
+                drop = self._drops.get((ticket.kind, ticket.event_id))
+                if drop is not None and drop.by_user.get(ticket.user_id) is ticket:
+                    del drop.by_user[ticket.user_id]
+            for key, drop in list(self._drops.items()):
+                if not drop.is_open and not drop.queue and not drop.by_user:
+                    del self._drops[key]
+
+    async def wait_for_progress(self, drop: Drop, timeout: float) -> None:
+        """Return after the drop's next processed batch, or after ``timeout``."""
+        if drop.progress is None:
+            drop.progress = asyncio.Event()
+        try:
+            await asyncio.wait_for(drop.progress.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def drain(self, timeout: float) -> int:
+        """Wait up to ``timeout`` for every queue to empty; returns tickets still queued."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            remaining = sum(len(drop.queue) for drop in list(self._drops.values()))
+            if not remaining or self._worker is None or self._worker.done():
+                return remaining
+            await asyncio.sleep(0.05)
+        return sum(len(drop.queue) for drop in list(self._drops.values()))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "drops": [drop.stats() for drop in self._drops.values()],
+                "tickets": len(self._tickets),
+                "batches": self.batches,
+            }
+
+
+async def ticket_stream(service: TicketDrop, drop: Optional[Drop], ticket: DropTicket) -> AsyncIterator[str]:
+    """SSE body: the ticket now, a ``position`` event whenever it moves, then one ``result`` event."""
+    last = None
+    while True:
+        state = service.describe(drop, ticket)
+        if not ticket.queued:
+            yield f"event: result\ndata: {json.dumps(state)}\n\n"
+            return
+        if state["queue_position"] != last:
+            last = state["queue_position"]
+            yield f"event: position\ndata: {json.dumps(state)}\n\n"
+        before = drop.processed_seq
+        await service.wait_for_progress(drop, HEARTBEAT_SECONDS)
+        if drop.processed_seq == before and ticket.queued:
+            yield ": keep-alive\n\n"
+
+
+ticket_drop = TicketDrop()
+
+
+class _FakeConnection:
+    def __init__(self, rtt: float, counter: Dict):
+        self.rtt = rtt
+        self.counter = counter
+
+    def is_connected(self):
+        return True
+
+    def trip(self):
+        self.counter["round_trips"] += 1
+        time.sleep(self.rtt)
+
+
+def benchmark(students: int = 5000, capacity: int = 300, rtt_ms: float = 0.5) -> Dict:
+    """A drop of ``students`` registrations in one burst, allocated by the consumer.
+
+    The fake handler costs five round trips per batch, like
+    ``register_batch``. The report shows the request-path latency, the MySQL
+    transaction rate and whether seats went out in arrival order.
+    """
+    counter = {"round_trips": 0}
+    seats = {"taken": 0}
+
+    def handler(connection, event_id, tickets):
+        for _ in range(5):
+            connection.trip()
+        for ticket in tickets:
+            if seats["taken"] < capacity:
+                seats["taken"] += 1
+                ticket.decide("registered")
+            else:
+                ticket.decide("waitlisted")
+
+    async def burst():
+        service = TicketDrop()
+        service.configure(lambda: _FakeConnection(rtt_ms / 1000, counter))
+        drop = service.open("club_event", 1, handler)
+        t0 = time.perf_counter()
+        tickets = [service.enqueue(drop, user_id) for user_id in range(1, students + 1)]
+        accept_s = time.perf_counter() - t0
+        watcher = ticket_stream(service, drop, tickets[-1])
+        pushes = [message async for message in watcher if not message.startswith(":")]
+        drain_s = time.perf_counter() - t0
+        return service, tickets, accept_s, drain_s, len(pushes)
+
+    service, tickets, accept_s, drain_s, pushes = asyncio.run(burst())
+    registered = [t.seq for t in tickets if t.status == "registered"]
+    return {
+        "students": students,
+        "capacity": capacity,
+        "accept_us_per_request": round(accept_s / students * 1e6, 1),
+        "drain_seconds": round(drain_s, 2),
+        "mysql_transactions": service.batches,
+        "mysql_transactions_per_s": round(service.batches / drain_s, 1),
+        "round_trips": counter["round_trips"],
+        "registered": len(registered),
+        "seats_in_arrival_order": registered == list(range(1, capacity + 1)),
+        "pushes_to_last_ticket": pushes,
+    }
+
+
+if __name__ == "__main__":
+    print(benchmark())
@@ -0,0 +1,590 @@
+"""Contention-safe club event registration.
+
+``register_for_event`` used to check "already registered", COUNT the
+registrations against ``max_participants``, then INSERT. Two requests
+could both see a free seat and both insert. Popular events were
+oversubscribed, and every registration cost two extra reads.
+
+Each event now carries a seat counter, ``club_events.seats_taken``. A
+registration is one short transaction:
+
+1. Take a seat with a conditional
+   ``UPDATE ... SET seats_taken = seats_taken + 1 WHERE seats_taken < max_participants``.
+   InnoDB row-locks the event row and re-checks the condition, so exactly
+   ``max_participants`` of these updates can succeed. If none is left,
+   the registration goes on the waitlist. With
+   ``EVENT_WAITLIST_ENABLED=0`` it is refused instead.
+2. INSERT the registration row as ``registered`` or ``waitlisted``. The
+   ``(event_id, user_id)`` unique key rejects duplicates, which rolls the
+   seat back. A previously cancelled row is reactivated instead.
+
+The event row lock is taken first because the INSERT's foreign-key check
+takes a shared lock on the same row. Taking the shared lock first and
+upgrading it later would deadlock concurrent registrants. Cancelling
+locks the event row first too. It then releases the seat and hands it to
+the earliest waitlisted registration in the same transaction.
+
+A recurring series is one ``club_events`` row, but each occurrence is
+registered for separately. Registrations carry ``occurrence_date`` (NULL
+for a one-off event), the unique key is ``(event_id, occurrence, user_id)``,
+and each occurrence has its own counter row in
+``club_event_occurrence_seats`` capped by the series' ``max_participants``.
+That counter row is upserted first, which takes its exclusive lock in one
+step, and the seat is then taken with the same conditional UPDATE. Ticket
+drops stay per event and are not offered for a series.
+
+``stress_test`` fires concurrent registrations at one event and checks
+that no event ends up oversubscribed. ``benchmark`` runs it at 500
+simultaneous registrations against an SQLite stand-in, next to the old
+check-then-insert path. ``python event_registration.py --mysql --event-id N``
+runs it against the configured MySQL database.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date
+from typing import Callable, Dict, List, Optional, Tuple
+
+LOGGER = logging.getLogger(__name__)
+
+WAITLIST_ENABLED = os.getenv("EVENT_WAITLIST_ENABLED", "1") != "0"
+# InnoDB deadlock (1213) and lock wait timeout (1205) are retried this many times
+LOCK_RETRIES = int(os.getenv("EVENT_REGISTRATION_LOCK_RETRIES", "3"))
+
+_DUPLICATE_KEY = 1062
+_RETRYABLE = (1205, 1213)
+
+_INSERT_SQL = """
+    INSERT INTO club_event_registrations (event_id, occurrence_date, user_id, status)
+    VALUES (%s, %s, %s, %s)
+"""
+_REACTIVATE_SQL = """
+    UPDATE club_event_registrations
+    SET status = %s, registration_date = CURRENT_TIMESTAMP
+    WHERE event_id = %s AND {occurrence} AND user_id = %s AND status = 'cancelled'
+"""
+_TAKE_SEAT_SQL = """
+    UPDATE club_events SET seats_taken = seats_taken + 1
+    WHERE id = %s AND (max_participants IS NULL OR max_participants <= 0 OR seats_taken < max_participants)
+"""
+_RELEASE_SEAT_SQL = "UPDATE club_events SET seats_taken = seats_taken - 1 WHERE id = %s AND seats_taken > 0"
+# Creates the occurrence's counter on first use; on a duplicate it takes the row's exclusive lock
+_LOCK_OCCURRENCE_SQL = """
+    INSERT INTO club_event_occurrence_seats (event_id, occurrence_date, seats_taken)
+    VALUES (%s, %s, 0)
+    ON DUPLICATE KEY UPDATE seats_taken = seats_taken
+"""
+_TAKE_OCCURRENCE_SEAT_SQL = """
+    UPDATE club_event_occurrence_seats SET seats_taken = seats_taken + 1
+    WHERE event_id = %s AND occurrence_date = %s
+      AND EXISTS (
+          SELECT 1 FROM club_events ce
+          WHERE ce.id = %s AND (ce.max_participants IS NULL OR ce.max_participants <= 0
+                                OR club_event_occurrence_seats.seats_taken < ce.max_participants)
+      )
+"""
+_RELEASE_OCCURRENCE_SEAT_SQL = """
+    UPDATE club_event_occurrence_seats SET seats_taken = seats_taken - 1
+    WHERE event_id = %s AND occurrence_date = %s AND seats_taken > 0
+"""
+_SET_STATUS_SQL = "UPDATE club_event_registrations SET status = %s WHERE id = %s"
+_POSITION_SQL = """
+    SELECT COUNT(*) AS position
+    FROM club_event_registrations w
+    JOIN club_event_registrations me
+      ON me.event_id = w.event_id AND me.user_id = %s AND {me_occurrence}
+    WHERE w.event_id = %s AND {w_occurrence} AND w.status = 'waitlisted'
+      AND (w.registration_date, w.id) <= (me.registration_date, me.id)
+"""
+
+
+class RegistrationError(ValueError):
+    """A registration that cannot be made; the message is safe to show to the user."""
+
+
+@dataclass
+class RegistrationResult:
+    status: str  # 'registered' or 'waitlisted'
+    waitlist_position: Optional[int] = None
+
+    @property
+    def registered(self) -> bool:
+        return self.status == "registered"
+
+
+@dataclass
+class CancelResult:
+    previous_status: str  # 'registered' or 'waitlisted'
+    promoted_user_id: Optional[int] = None
+
+    @property
+    def seats_released(self) -> int:
+        """Net change in seats taken: -1 unless the seat went straight to the waitlist."""
+        return -1 if self.previous_status == "registered" and self.promoted_user_id is None else 0
+
+
+def _errno(exc: Exception) -> Optional[int]:
+    return getattr(exc, "errno", None)
+
+
+def _occurrence_clause(occurrence_date: Optional[date], alias: str = "") -> Tuple[str, tuple]:
+    """WHERE fragment for one occurrence of a series, or for a one-off event's registrations."""
+    if occurrence_date is None:
+        return f"{alias}occurrence_date IS NULL", ()
+    return f"{alias}occurrence_date = %s", (occurrence_date,)
+
+
+def _take_seat(cursor, event_id: int, occurrence_date: Optional[date]) -> bool:
+    if occurrence_date is None:
+        cursor.execute(_TAKE_SEAT_SQL, (event_id,))
+    else:
+        cursor.execute(_LOCK_OCCURRENCE_SQL, (event_id, occurrence_date))
+        cursor.execute(_TAKE_OCCURRENCE_SEAT_SQL, (event_id, occurrence_date, event_id))
+    return cursor.rowcount == 1
+
+
+def _with_lock_retry(connection, work: Callable):
+    for attempt in range(LOCK_RETRIES + 1):
+        try:
+            connection.start_transaction()
+            result = work()
+            connection.commit()
+            return result
+        except Exception as e:
+            connection.rollback()
+            if _errno(e) not in _RETRYABLE or attempt == LOCK_RETRIES:
+                raise
+            LOGGER.info("Event registration lock conflict (%s); retrying", e)
+            time.sleep(0.01 * (attempt + 1))
+
+
+def register(connection, event_id: int, user_id: int,
+             occurrence_date: Optional[date] = None) -> RegistrationResult:
+    """Register ``user_id`` for ``event_id`` (one occurrence of it, for a series) atomically."""
+    cursor = connection.cursor(dictionary=True)
+    clause, occurrence = _occurrence_clause(occurrence_date)
+
+    def work() -> str:
+        if _take_seat(cursor, event_id, occurrence_date):
+            status = "registered"
+        elif WAITLIST_ENABLED:
+            status = "waitlisted"
+        else:
+            raise RegistrationError("Event is full")
+        try:
+            cursor.execute(_INSERT_SQL, (event_id, occurrence_date, user_id, status))
+        except Exception as e:
+            if _errno(e) != _DUPLICATE_KEY:
+                raise
+            cursor.execute(_REACTIVATE_SQL.format(occurrence=clause), (status, event_id, *occurrence, user_id))
+            if cursor.rowcount != 1:
+                raise RegistrationError("Already registered for this event")
+        return status
+
+    try:
+        status = _with_lock_retry(connection, work)
+        if status == "registered":
+            return RegistrationResult(status)
+        return RegistrationResult(status, waitlist_position(cursor, event_id, user_id, occurrence_date))
+    finally:
+        cursor.close()
+
+
+def register_batch(connection, event_id: int, user_ids: List[int]) -> List:
+    """Register ``user_ids`` in order in one transaction (ticket-drop consumer).
+
+    Returns one ``RegistrationResult`` or ``RegistrationError`` per user.
+    The event row is locked first, as in ``register``, so direct
+    registrations still racing the drop are counted correctly. Drops are
+    per event, so this only handles one-off events (``occurrence_date`` NULL).
+    """
+    cursor = connection.cursor(dictionary=True)
+
+    def work() -> List:
+        cursor.execute(
+            """
+            SELECT max_participants, seats_taken,
+                   (SELECT COUNT(*) FROM club_event_registrations
+                    WHERE event_id = %s AND occurrence_date IS NULL AND status = 'waitlisted') AS waitlisted
+            FROM club_events WHERE id = %s FOR UPDATE
+            """,
+            (event_id, event_id),
+        )
+        event = cursor.fetchone()
+        if not event:
+            return [RegistrationError("Event not found")] * len(user_ids)
+        placeholders = ", ".join(["%s"] * len(user_ids))
+        cursor.execute(
+            f"""
+            SELECT user_id, status FROM club_event_registrations
+            WHERE event_id = %s AND occurrence_date IS NULL AND user_id IN ({placeholders})
+            """,
+            (event_id, *user_ids),
+        )
+        existing = {row["user_id"]: row["status"] for row in cursor.fetchall()}
+        capacity = event["max_participants"]
+        free = capacity - event["seats_taken"] if capacity and capacity > 0 else None
+        waiting = int(event["waitlisted"] or 0)
+        taken = 0
+        results, inserts, reactivations = [], [], []
+        for user_id in user_ids:
+            previous = existing.get(user_id)
+            if previous is not None and previous != "cancelled":
+                results.append(RegistrationError("Already registered for this event"))
+                continue
+            if free is None or taken < free:
+                taken += 1
+                result = RegistrationResult("registered")
+            elif WAITLIST_ENABLED:
+                waiting += 1
+                result = RegistrationResult("waitlisted", waiting)
+            else:
+                results.append(RegistrationError("Event is full"))
+                continue
+            existing[user_id] = result.status
+            results.append(result)
+            if previous == "cancelled":
+                reactivations.append((result.status, event_id, user_id))
+            else:
+                inserts.append((event_id, None, user_id, result.status))
+        if inserts:
+            cursor.executemany(_INSERT_SQL, inserts)
+        for row in reactivations:
+            cursor.execute(_REACTIVATE_SQL.format(occurrence="occurrence_date IS NULL"), row)
+        if taken:
+            cursor.execute("UPDATE club_events SET seats_taken = seats_taken + %s WHERE id = %s", (taken, event_id))
+        return results
+
+    if not user_ids:
+        return []
+    try:
+        return _with_lock_retry(connection, work)
+    finally:
+        cursor.close()
+
+
+def cancel(connection, event_id: int, user_id: int, occurrence_date: Optional[date] = None) -> CancelResult:
+    """Cancel a registration or waitlist place; raises ``RegistrationError`` if there is none."""
+    cursor = connection.cursor(dictionary=True)
+    clause, occurrence = _occurrence_clause(occurrence_date)
+
+    def work() -> CancelResult:
+        if occurrence_date is None:
+            cursor.execute("SELECT id FROM club_events WHERE id = %s FOR UPDATE", (event_id,))
+            cursor.fetchone()
+        else:
+            cursor.execute(_LOCK_OCCURRENCE_SQL, (event_id, occurrence_date))
+        cursor.execute(
+            f"""
+            SELECT id, status FROM club_event_registrations
+            WHERE event_id = %s AND {clause} AND user_id = %s FOR UPDATE
+            """,
+            (event_id, *occurrence, user_id),
+        )
+        row = cursor.fetchone()
+        if not row or row["status"] not in ("registered", "waitlisted"):
+            raise RegistrationError("Not registered for this event")
+        cursor.execute(_SET_STATUS_SQL, ("cancelled", row["id"]))
+        result = CancelResult(row["status"])
+        if row["status"] == "waitlisted":
+            return result
+        if occurrence_date is None:
+            cursor.execute(_RELEASE_SEAT_SQL, (event_id,))
+        else:
+            cursor.execute(_RELEASE_OCCURRENCE_SEAT_SQL, (event_id, occurrence_date))
+        cursor.execute(
+            f"""
+            SELECT id, user_id FROM club_event_registrations
+            WHERE event_id = %s AND {clause} AND status = 'waitlisted'
+            ORDER BY registration_date, id LIMIT 1 FOR UPDATE
+            """,
+            (event_id, *occurrence),
+        )
+        head = cursor.fetchone()
+        if not head:
+            return result
+        # Re-take the seat through the same guard; a lowered cap keeps the waitlist waiting
+        if _take_seat(cursor, event_id, occurrence_date):
+            cursor.execute(_SET_STATUS_SQL, ("registered", head["id"]))
+            result.promoted_user_id = head["user_id"]
+        return result
+
+    try:
+        return _with_lock_retry(connection, work)
+    finally:
+        cursor.close()
+
+
+def waitlist_position(cursor, event_id: int, user_id: int, occurrence_date: Optional[date] = None) -> Optional[int]:
+    """1-based waitlist position of ``user_id``, or None if they are not waitlisted."""
+    me_clause, occurrence = _occurrence_clause(occurrence_date, "me.")
+    w_clause, _ = _occurrence_clause(occurrence_date, "w.")
+    cursor.execute(_POSITION_SQL.format(me_occurrence=me_clause, w_occurrence=w_clause),
+                   (user_id, *occurrence, event_id, *occurrence))
+    row = cursor.fetchone()
+    return int(row["position"]) if row and row["position"] else None
+
+
+# --- stress test ---
+
+def stress_test(connect: Callable, event_id: int, user_ids: List[int],
+                register_fn: Callable = register) -> Dict:
+    """Register every user in ``user_ids`` at once, one connection per user, then check the counters."""
+    barrier = threading.Barrier(len(user_ids))
+    outcomes: Dict[str, int] = {}
+    lock = threading.Lock()
+
+    def one(user_id: int) -> None:
+        connection = connect()
+        try:
+            barrier.wait()
+            try:
+                outcome = register_fn(connection, event_id, user_id).status
+            except RegistrationError as e:
+                outcome = str(e)
+            except Exception as e:
+                LOGGER.error("Stress registration for user %s failed: %s", user_id, e)
+                outcome = type(e).__name__
+        finally:
+            connection.close()
+        with lock:
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(user_ids)) as pool:
+        list(pool.map(one, user_ids))
+    elapsed = time.perf_counter() - started
+
+    connection = connect()
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute("SELECT max_participants, seats_taken FROM club_events WHERE id = %s", (event_id,))
+        event = cursor.fetchone()
+        cursor.execute(
+            """
+            SELECT SUM(status IN ('registered', 'attended')) AS seated, SUM(status = 'waitlisted') AS waitlisted
+            FROM club_event_registrations WHERE event_id = %s
+            """,
+            (event_id,),
+        )
+        counts = cursor.fetchone()
+    finally:
+        cursor.close()
+        connection.close()
+    seated = int(counts["seated"] or 0)
+    capacity = event["max_participants"]
+    return {
+        "registrations": len(user_ids),
+        "capacity": capacity,
+        "outcomes": outcomes,
+        "seated": seated,
+        "waitlisted": int(counts["waitlisted"] or 0),
+        "seats_taken": event["seats_taken"],
+        "oversubscribed_by": max(0, seated - capacity) if capacity else 0,
+        "counter_consistent": event["seats_taken"] == seated,
+        "seconds": round(elapsed, 2),
+    }
+
+
+class _SqliteDuplicateKey(Exception):
+    errno = _DUPLICATE_KEY
+
+
+class _SqliteCursor:
+    def __init__(self, connection: "_SqliteConnection"):
+        self._connection = connection
+        self._cursor = connection.db.cursor()
+        self.rowcount = -1
+        self.lastrowid = None
+
+    def execute(self, sql: str, params=()):
+        import sqlite3
+
+        self._connection.trip()
+        sql = (sql.replace("%s", "?").replace("FOR UPDATE", "")
+               .replace("ON DUPLICATE KEY UPDATE", "ON CONFLICT DO UPDATE SET"))
+        try:
+            self._cursor.execute(sql, params)
+        except sqlite3.IntegrityError as e:
+            raise _SqliteDuplicateKey(str(e))
+        self.rowcount = self._cursor.rowcount
+        self.lastrowid = self._cursor.lastrowid
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is None:
+            return None
+        return dict(zip([d[0] for d in self._cursor.description], row))
+
+    def fetchall(self):
+        columns = [d[0] for d in self._cursor.description]
+        return [dict(zip(columns, row)) for row in self._cursor.fetchall()]
+
+    def executemany(self, sql: str, rows):
+        self._connection.trip()
+        self._cursor.executemany(sql.replace("%s", "?"), rows)
+
+    def close(self):
+        self._cursor.close()
+
+
+class _SqliteConnection:
+    """SQLite behind the mysql.connector calls used here, with a fixed RTT per statement.
+
+    ``BEGIN IMMEDIATE`` serialises writers the way InnoDB's row lock on the
+    event row does, which is all the conditional UPDATE relies on.
+    """
+
+    def __init__(self, path: str, rtt: float, counter: Dict):
+        import sqlite3
+
+        self.db = sqlite3.connect(path, isolation_level=None, timeout=60, check_same_thread=False)
+        self.rtt = rtt
+        self.counter = counter
+
+    def trip(self):
+        self.counter["round_trips"] = self.counter.get("round_trips", 0) + 1
+        time.sleep(self.rtt)
+
+    def cursor(self, dictionary=True):
+        return _SqliteCursor(self)
+
+    def start_transaction(self):
+        self.trip()
+        self.db.execute("BEGIN IMMEDIATE")
+
+    def commit(self):
+        self.trip()
+        self.db.execute("COMMIT")
+
+    def rollback(self):
+        if self.db.in_transaction:
+            self.db.execute("ROLLBACK")
+
+    def close(self):
+        self.db.close()
+
+
+def _check_then_insert(connection, event_id: int, user_id: int) -> RegistrationResult:
+    """The old path: dedupe SELECT, COUNT against the cap, then INSERT, each autocommitted."""
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute("SELECT max_participants FROM club_events WHERE id = %s", (event_id,))
+        capacity = cursor.fetchone()["max_participants"]
+        cursor.execute(
+            "SELECT id FROM club_event_registrations WHERE event_id = %s AND user_id = %s", (event_id, user_id)
+        )
+        if cursor.fetchone():
+            raise RegistrationError("Already registered for this event")
+        cursor.execute("SELECT COUNT(*) AS count FROM club_event_registrations WHERE event_id = %s", (event_id,))
+        if cursor.fetchone()["count"] >= capacity:
+            raise RegistrationError("Event is full")
+        cursor.execute(_INSERT_SQL, (event_id, None, user_id, "registered"))
+        return RegistrationResult("registered")
+    finally:
+        cursor.close()
+
+
+def benchmark(registrations: int = 500, capacity: int = 100, rtt_ms: float = 0.5) -> Dict:
+    """500 simultaneous registrations for a 100-seat event: check-then-insert versus the seat counter."""
+    import sqlite3
+    import tempfile
+
+    results = {}
+    for name, fn in (("check_then_insert", _check_then_insert), ("seat_counter", register)):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "events.db")
+            db = sqlite3.connect(path)
+            db.executescript(
+                """
+                PRAGMA journal_mode=WAL;
+                CREATE TABLE club_events (id INTEGER PRIMARY KEY, max_participants INT, seats_taken INT NOT NULL DEFAULT 0);
+                CREATE TABLE club_event_registrations (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT, event_id INT NOT NULL, occurrence_date DATE, user_id INT NOT NULL,
+                    registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP, status TEXT DEFAULT 'registered',
+                    UNIQUE (event_id, user_id)
+                );
+                """
+            )
+            db.execute("INSERT INTO club_events (id, max_participants) VALUES (1, ?)", (capacity,))
+            db.commit()
+            db.close()
+            counter: Dict = {}
+            report = stress_test(lambda: _SqliteConnection(path, rtt_ms / 1000, counter), 1,
+                                 list(range(1, registrations + 1)), register_fn=fn)
+            report["round_trips_per_registration"] = round(counter["round_trips"] / registrations, 2)
+            results[name] = report
+    return results
+
+
+def _mysql_stress(event_id: int, users: int, cleanup: bool) -> Dict:
+    from database import get_mysql_connection
+
+    connection = get_mysql_connection()
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute(
+            """
+            SELECT id FROM users
+            WHERE id NOT IN (SELECT user_id FROM club_event_registrations WHERE event_id = %s)
+            ORDER BY id LIMIT %s
+            """,
+            (event_id, users),
+        )
+        user_ids = [row["id"] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+        connection.close()
+    if len(user_ids) < users:
+        LOGGER.warning("Only %s users are free to register for event %s", len(user_ids), event_id)
+    report = stress_test(get_mysql_connection, event_id, user_ids)
+    if cleanup and user_ids:
+        connection = get_mysql_connection()
+        cursor = connection.cursor(dictionary=True)
+        try:
+            placeholders = ", ".join(["%s"] * len(user_ids))
+            cursor.execute(
+                f"""
+                DELETE FROM club_event_registrations
+                WHERE event_id = %s AND user_id IN ({placeholders})
+                """,
+                (event_id, *user_ids),
+            )
+            cursor.execute(
+                """
+                UPDATE club_events SET seats_taken = (
+                    SELECT COUNT(*) FROM club_event_registrations
+                    WHERE event_id = %s AND status IN ('registered', 'attended')
+                ) WHERE id = %s
+                """,
+                (event_id, event_id),
+            )
+            connection.commit()
+        finally:
+            cursor.close()
+            connection.close()
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Concurrent event registration stress test")
+    parser.add_argument("--mysql", action="store_true", help="run against the configured MySQL database")
+    parser.add_argument("--event-id", type=int, help="approved club event with max_participants set")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--keep", action="store_true", help="keep the test registrations afterwards")
+    args = parser.parse_args()
+    if args.mysql:
+        if not args.event_id:
+            parser.error("--mysql needs --event-id")
+        print(json.dumps(_mysql_stress(args.event_id, args.users, cleanup=not args.keep), indent=2))
+    else:
+        print(json.dumps(benchmark(args.users), indent=2))
@@ -5,9 +5,10 @@ Main application file with MySQL database integration
 
 import os
 import sys
+import asyncio
 import uuid
 from datetime import timedelta, datetime, time
-from typing import Optional, List
+from typing import Optional, List, Set
 import traceback
 import logging
 from secrets import token_hex
@@ -32,7 +33,7 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from fastapi import FastAPI, HTTPException, Depends, status, Query, Request, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.security import HTTPBearer
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import time as time_module
 import mysql.connector
 from mysql.connector import Error
@@ -69,13 +70,18 @@ from clubs_api import (
     get_my_clubs, get_my_managed_clubs, get_club_members, update_member_status,
     get_my_club_stats, create_recruitment_post, search_clubs, get_club_categories
 )
+import club_stats
+import search_index
+from search_index import search_service
+import autocomplete
+from autocomplete import autocomplete_service
 
 # Import club events API
 from club_events_api import (
     create_club_event, get_club_events, get_all_club_events, approve_club_event,
     create_club_timeline, get_club_timeline, update_club_timeline, delete_club_timeline,
-    sync_timeline_to_events, register_for_event, bulk_import_calendar_events,
-    get_student_council_dashboard, mark_student_council
+    sync_timeline_to_events, register_for_event, cancel_event_registration, set_event_drop_mode,
+    bulk_import_calendar_events, get_student_council_dashboard, mark_student_council, _ensure_club_events_tables
 )
 
 # Import admin user management
@@ -88,8 +94,25 @@ from admin_user_management import (
 from club_events_calendar import (
     create_club_event_calendar, get_club_calendar, get_all_clubs_calendar,
     subscribe_to_club_calendar, get_club_calendar_subscriptions,
-    update_club_calendar_settings, get_upcoming_events_all_clubs
+    update_club_calendar_settings, get_upcoming_events_all_clubs,
+    set_event_occurrence_override, clear_event_occurrence_override
 )
+import calendar_feed
+from calendar_index import calendar_index
+from canteen_orders import attach_order_items
+import canteen_board
+from canteen_board import order_board
+import canteen_ingest
+from canteen_ingest import order_ingest
+import canteen_menu
+from canteen_menu import menu_cache
+import ai_telemetry
+import event_drop
+from event_drop import DropAdmissionError, ticket_drop
+import room_patterns
+from room_patterns import room_pattern_pipeline
+import ai_insights
+from ai_insights import insights_cache
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -155,13 +178,155 @@ async def log_requests(request: Request, call_next):
     
     return response
 
+# Hour (server local time) at which club recommendations are recomputed for all students
+RECOMMENDATION_PRECOMPUTE_HOUR = int(os.getenv("RECOMMENDATION_PRECOMPUTE_HOUR", "3"))
+
+async def _nightly_recommendation_precompute():
+    while True:
+        now = datetime.now()
+        next_run = now.replace(hour=RECOMMENDATION_PRECOMPUTE_HOUR, minute=0, second=0, microsecond=0)
+        if next_run <= now:
+            next_run += timedelta(days=1)
+        await asyncio.sleep((next_run - now).total_seconds())
+        try:
+            from ai_recommender import precompute_recommendations
+            stats = await asyncio.get_running_loop().run_in_executor(None, precompute_recommendations)
+            logger.info(f"Nightly club recommendations: {stats}")
+        except Exception as e:
+            logger.error(f"Nightly club recommendation precompute failed: {e}")
+
+async def _club_stats_reconcile_loop():
+    def reconcile():
+        connection = get_mysql_connection()
+        cursor = connection.cursor(dictionary=True)
+        try:
+            return club_stats.reconcile_all(cursor)
+        finally:
+            cursor.close()
+            connection.close()
+
+    while True:
+        try:
+            clubs = await asyncio.get_running_loop().run_in_executor(None, reconcile)
+            logger.info(f"Reconciled club_stats for {clubs} clubs")
+        except Exception as e:
+            logger.error(f"club_stats reconciliation failed: {e}")
+        await asyncio.sleep(club_stats.RECONCILE_INTERVAL_SECONDS)
+
+async def _search_index_warmup():
+    def warm():
+        connection = get_mysql_connection()
+        cursor = connection.cursor(dictionary=True)
+        try:
+            search_index.ensure_fulltext_indexes(cursor)
+            counts = {entity: search_service.load_entity(cursor, entity) for entity in search_index.ENTITIES}
+            counts["autocomplete"] = {kind: autocomplete_service.load_kind(cursor, kind) for kind in autocomplete.KINDS}
+            return counts
+        finally:
+            cursor.close()
+            connection.close()
+
+    try:
+        counts = await asyncio.get_running_loop().run_in_executor(None, warm)
+        logger.info(f"Search index warmed: {counts}")
+    except Exception as e:
+        logger.error(f"Search index warmup failed: {e}")
+
+def _order_board_write(action):
+    connection = get_mysql_connection()
+    cursor = connection.cursor(dictionary=True)
+    try:
+        return action(cursor)
+    finally:
+        cursor.close()
+        connection.close()
+
+async def _order_board_loop():
+    loop = asyncio.get_running_loop()
+    last_sync = 0.0
+    while True:
+        try:
+            await loop.run_in_executor(None, _order_board_write, order_board.flush)
+        except Exception as e:
+            logger.error(f"Order board flush failed: {e}")
+        if time_module.monotonic() - last_sync >= canteen_board.SYNC_INTERVAL_SECONDS:
+            last_sync = time_module.monotonic()
+            try:
+                await loop.run_in_executor(
+                    None, _order_board_write, lambda cursor: order_board.sync(cursor, attach_order_items)
+                )
+            except Exception as e:
+                logger.error(f"Order board sync failed: {e}")
+        await asyncio.sleep(canteen_board.FLUSH_INTERVAL_SECONDS)
+
+async def _menu_snapshot():
+    # The first load reads MySQL; keep it off the event loop
+    if menu_cache.version:
+        return menu_cache.snapshot()
+    return await asyncio.get_running_loop().run_in_executor(None, menu_cache.snapshot)
+
+async def _canteen_menu_check_loop():
+    # Picks up menu changes made on other workers; local writers reload the snapshot themselves
+    while True:
+        try:
+            if await asyncio.get_running_loop().run_in_executor(None, _order_board_write, menu_cache.changed):
+                logger.info(f"Canteen menu snapshot reloaded (version {menu_cache.version})")
+        except Exception as e:
+            logger.error(f"Canteen menu snapshot check failed: {e}")
+        await asyncio.sleep(canteen_menu.CHECK_INTERVAL_SECONDS)
+
+async def _room_patterns_loop():
+    # Incremental ai_room_patterns aggregation (replaces the UpdateRoomPatterns procedure)
+    while True:
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, room_pattern_pipeline.run)
+        except Exception as e:
+            logger.error(f"Room patterns aggregation failed: {e}")
+        await asyncio.sleep(room_patterns.INTERVAL_SECONDS)
+
+async def _ai_insights_loop():
+    # Recompute AI insights dashboard sections that are past their staleness budget
+    while True:
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, insights_cache.refresh)
+        except Exception as e:
+            logger.error(f"AI insights refresh failed: {e}")
+        await asyncio.sleep(ai_insights.TICK_SECONDS)
+
 # Startup event
 @app.on_event("startup")
 async def startup_event():
+    asyncio.create_task(_nightly_recommendation_precompute())
+    asyncio.create_task(_club_stats_reconcile_loop())
+    asyncio.create_task(_search_index_warmup())
+    asyncio.create_task(_order_board_loop())
+    order_ingest.configure(get_mysql_connection, prepare=_ensure_canteen_tables)
+    menu_cache.configure(get_mysql_connection)
+    asyncio.create_task(_canteen_menu_check_loop())
+    ticket_drop.configure(get_mysql_connection, prepare=_ensure_club_events_tables)
+    asyncio.create_task(_room_patterns_loop())
+    asyncio.create_task(_ai_insights_loop())
     logger.info("Campus Connect API is ready!")
     logger.info("API calls will now be logged in the terminal")
     logger.info("Access API docs at: http://localhost:8000/docs")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Write-behind buffers must reach MySQL before the worker exits
+    try:
+        written = await asyncio.get_running_loop().run_in_executor(None, _order_board_write, order_board.flush)
+        logger.info(f"Flushed {written} order board changes on shutdown")
+    except Exception as e:
+        logger.error(f"Order board shutdown flush failed: {e}")
+    try:
+        flushed = await asyncio.get_running_loop().run_in_executor(None, ai_telemetry.flush_all)
+        logger.info(f"Flushed AI telemetry on shutdown: {flushed}")
+    except Exception as e:
+        logger.error(f"AI telemetry shutdown flush failed: {e}")
+    remaining = await ticket_drop.drain(timeout=10)
+    if remaining:
+        logger.error(f"Shutting down with {remaining} ticket-drop registrations still queued")
+
 # Simple health endpoint to verify service and DB connectivity
 @app.get("/health")
 async def health():
@@ -243,7 +408,9 @@ async def test_ai_recommendations(current_user = Depends(auth.get_current_user))
             leadership_interest=True
         )
         
-        recommendations = club_recommender.recommend_clubs(user_profile, top_k=5)
+        recommendations = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: club_recommender.recommend_clubs(user_profile, top_k=5)
+        )
         
         return {
             "message": "AI recommendations test successful!",
@@ -352,12 +519,8 @@ async def place_canteen_order(order_data: dict, current_user=Depends(auth.get_cu
         raise HTTPException(status_code=400, detail="No items in order")
 
     try:
-        connection = get_mysql_connection()
-        cursor = connection.cursor(dictionary=True)
-        _ensure_canteen_tables(cursor)
-
-        # Calculate total
-        total_amount = sum(float(item.get("price", 0)) * int(item.get("quantity", 1)) for item in items)
+        # Price and validate against the menu snapshot; client prices are ignored
+        item_rows, total_amount = (await _menu_snapshot()).price_order(items)
 
         # Generate tokens
         import uuid
@@ -365,23 +528,17 @@ async def place_canteen_order(order_data: dict, current_user=Depends(auth.get_cu
         order_token = str(uuid.uuid4())
         qr_token = token_hex(16)
 
-        # Create order
-        cursor.execute("""
-            INSERT INTO canteen_orders (user_id, total_amount, payment_method, payment_status, status, qr_token, order_token)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-        """, (current_user["id"], total_amount, "cash", "pending_at_counter", "queued", qr_token, order_token))
-
-        order_id = cursor.lastrowid
-
-        # Insert order items
-        for item in items:
-            cursor.execute("""
-                INSERT INTO canteen_order_items (order_id, item_id, item_name, price, quantity)
-                VALUES (%s, %s, %s, %s, %s)
-            """, (order_id, str(item.get("menu_item_id", "")), item.get("name", ""),
-                  float(item.get("price", 0)), int(item.get("quantity", 1))))
-
-        connection.commit()
+        # Admitted orders are written in grouped transactions by the ingest pipeline
+        order_id = await order_ingest.submit(canteen_ingest.PendingOrder(
+            current_user["id"], total_amount, "cash", "pending_at_counter", "queued", qr_token, order_token, item_rows
+        ))
+        order_board.add_order(
+            {"id": order_id, "user_id": current_user["id"], "status": "queued", "payment_status": "pending_at_counter",
+             "payment_method": "cash", "total_amount": total_amount, "qr_token": qr_token,
+             "student_name": current_user.get("full_name")},
+            items=[{"order_id": order_id, "item_id": row[0], "item_name": row[1], "price": row[2], "quantity": row[3]}
+                   for row in item_rows],
+        )
 
         return {
             "order_id": order_id,
@@ -392,11 +549,12 @@ async def place_canteen_order(order_data: dict, current_user=Depends(auth.get_cu
             "message": "Order placed successfully. Show QR code at counter to pay."
         }
 
+    except canteen_menu.MenuValidationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except canteen_ingest.OrderAdmissionError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except mysql.connector.Error as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-    finally:
-        if 'cursor' in locals(): cursor.close()
-        if 'connection' in locals(): connection.close()
 
 @app.post("/canteen/payment/initiate")
 async def initiate_payment(payload: dict, current_user = Depends(auth.get_current_user)):
@@ -405,13 +563,15 @@ async def initiate_payment(payload: dict, current_user = Depends(auth.get_curren
         raise HTTPException(status_code=403, detail="Students only")
     
     items = payload.get("items", [])
-    total_amount = payload.get("total_amount", 0)
     payment_method = payload.get("payment_method", "pay_later")  # pay_now or pay_later
     
-    if not items or total_amount <= 0:
+    if not items:
         raise HTTPException(status_code=400, detail="Invalid order data")
     
     try:
+        # Price and validate against the menu snapshot; client prices and total are ignored
+        item_rows, total_amount = (await _menu_snapshot()).price_order(items)
+        
         connection = get_mysql_connection()
         cursor = connection.cursor(dictionary=True)
         _ensure_canteen_tables(cursor)
@@ -432,14 +592,21 @@ async def initiate_payment(payload: dict, current_user = Depends(auth.get_curren
         order_id = cursor.lastrowid
         
         # Insert order items
-        for item in items:
-            cursor.execute("""
-                INSERT INTO canteen_order_items (order_id, item_id, item_name, price, quantity)
-                VALUES (%s, %s, %s, %s, %s)
-            """, (order_id, str(item.get("id", "")), item.get("name", ""), 
-                  float(item.get("price", 0)), int(item.get("quantity", 1))))
+        cursor.executemany("""
+            INSERT INTO canteen_order_items (order_id, item_id, item_name, price, quantity)
+            VALUES (%s, %s, %s, %s, %s)
+        """, [(order_id, *row) for row in item_rows])
         
         connection.commit()
+        priced_items = [{"order_id": order_id, "item_id": row[0], "item_name": row[1], "price": row[2], "quantity": row[3]}
+                        for row in item_rows]
+        if order_status == "queued":
+            order_board.add_order(
+                {"id": order_id, "user_id": current_user["id"], "status": order_status, "payment_status": payment_status,
+                 "payment_method": payment_method, "total_amount": total_amount, "qr_token": qr_token,
+                 "student_name": current_user.get("full_name")},
+                items=priced_items,
+            )
         
         # Generate QR code data
         qr_data = f"CANTEEN_ORDER_{qr_token}_{order_id}"
@@ -454,7 +621,7 @@ async def initiate_payment(payload: dict, current_user = Depends(auth.get_curren
             "payment_method": payment_method,
             "payment_status": payment_status,
             "total_amount": total_amount,
-            "items": items
+            "items": priced_items
         }
         
         if payment_method == "pay_now":
@@ -467,6 +634,8 @@ async def initiate_payment(payload: dict, current_user = Depends(auth.get_curren
         
         return response_data
         
+    except canteen_menu.MenuValidationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except mysql.connector.Error as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     finally:
@@ -518,9 +687,14 @@ async def process_payment(payload: dict, current_user = Depends(auth.get_current
             cursor.execute("""
                 UPDATE canteen_orders 
                 SET payment_status = 'paid', status = 'queued', payment_details = %s, transaction_id = %s
-                WHERE id = %s
+                WHERE id = %s AND payment_status <> 'paid'
             """, (str(payment_details), transaction_id, order["id"]))
+            if cursor.rowcount == 0:
+                raise HTTPException(status_code=400, detail="Order already paid")
             connection.commit()
+            # Paid online orders join the kitchen queue
+            attach_order_items(cursor, [order])
+            order_board.add_order({**order, "payment_status": "paid", "status": "queued"}, items=order["items"])
             
             # Generate pickup QR code
             qr_data = f"CANTEEN_PICKUP_{order['qr_token']}_{order['id']}"
@@ -566,6 +740,7 @@ async def get_order_status(order_id: int, current_user = Depends(auth.get_curren
         order = cursor.fetchone()
         if not order:
             raise HTTPException(status_code=404, detail="Order not found")
+        order_board.overlay([order])
         
         # Get order items
         cursor.execute("SELECT * FROM canteen_order_items WHERE order_id = %s", (order_id,))
@@ -951,6 +1126,10 @@ async def register_user(user: schemas.UserRegister, db = Depends(get_db)):
             connection.commit()
         except Exception:
             pass
+        if user.role == "student":
+            _refresh_peer_index(user_id)
+        search_service.touch(cursor, "users", user_id)
+        autocomplete_service.touch(cursor, "users", user_id)
 
         # Get the created user
         cursor.execute("SELECT * FROM users WHERE id = %s", (user_id,))
@@ -988,7 +1167,9 @@ async def register_user(user: schemas.UserRegister, db = Depends(get_db)):
                     time_commitment="medium",
                     leadership_interest=False
                 )
-                recommendations = club_recommender.recommend_clubs(user_profile, top_k=5)
+                recommendations = await asyncio.get_running_loop().run_in_executor(
+                    None, lambda: club_recommender.recommend_clubs(user_profile, top_k=5)
+                )
                 logger.info(f"✨ Generated {len(recommendations)} AI club recommendations for new user {user.username}")
             except Exception as e:
                 logger.warning(f"⚠️ Failed to generate AI recommendations for new user: {e}")
@@ -1460,7 +1641,9 @@ async def join_organization_alias(org_id: int, current_user = Depends(auth.get_c
 @app.post("/clubs/{club_id}/join")
 async def join_club(club_id: int, current_user = Depends(auth.get_current_user)):
     """Join a club - primary endpoint"""
-    return await join_club_simple(club_id, current_user)
+    result = await join_club_simple(club_id, current_user)
+    _refresh_peer_index(current_user["id"])
+    return result
 
 @app.get("/organizations/mine")
 async def my_organization_alias(current_user = Depends(auth.get_current_user)):
@@ -1598,12 +1781,16 @@ async def club_members(
 @app.post("/organizations/members/{user_id}/status")
 async def update_member_status_alias(user_id: int, payload: dict, current_user = Depends(auth.get_current_user)):
     """Alias: update club member status through organizations endpoint"""
-    return await update_member_status(user_id, payload, current_user)
+    result = await update_member_status(user_id, payload, current_user)
+    _refresh_peer_index(user_id)
+    return result
 
 @app.post("/clubs/members/{user_id}/status")
 async def update_club_member_status(user_id: int, payload: dict, current_user = Depends(auth.get_current_user)):
     """Update a member's status in clubs"""
-    return await update_member_status(user_id, payload, current_user)
+    result = await update_member_status(user_id, payload, current_user)
+    _refresh_peer_index(user_id)
+    return result
 
 @app.get("/organizations/mine/stats")
 async def my_org_stats_alias(current_user = Depends(auth.get_current_user)):
@@ -1740,6 +1927,36 @@ async def get_club_categories_endpoint():
     """Get all available club categories"""
     return get_club_categories()
 
+# Clubs waiting for a recommender refresh; one drain task applies them in turn
+_club_recommender_pending: Set[int] = set()
+_club_recommender_task: Optional[asyncio.Task] = None
+
+def _apply_club_recommender_refresh(club_id: int):
+    """Apply a club create/edit to the recommender index without a full refit (blocking)."""
+    try:
+        from ai_recommender import club_recommender
+        club_recommender.refresh_club(club_id)
+    except Exception as e:
+        logging.warning(f"Club recommender refresh failed for club {club_id}: {e}")
+
+async def _drain_club_recommender_refreshes():
+    loop = asyncio.get_running_loop()
+    while _club_recommender_pending:
+        club_id = _club_recommender_pending.pop()
+        await loop.run_in_executor(None, _apply_club_recommender_refresh, club_id)
+
+def _refresh_club_recommender(club_id: int):
+    """Queue a club create/edit for the recommender index.
+
+    The DB read, transform, pickling and the occasional refit run on the
+    executor, one club at a time, so repeated edits of one club coalesce
+    and never apply out of order.
+    """
+    global _club_recommender_task
+    _club_recommender_pending.add(club_id)
+    if _club_recommender_task is None or _club_recommender_task.done():
+        _club_recommender_task = asyncio.create_task(_drain_club_recommender_refreshes())
+
 @app.post("/clubs", response_model=schemas.ClubResponse)
 async def create_club(club_data: schemas.ClubCreate, current_user = Depends(auth.get_current_user), db = Depends(get_db)):
     """Create a new club (Faculty/Admin only)"""
@@ -1760,6 +1977,9 @@ async def create_club(club_data: schemas.ClubCreate, current_user = Depends(auth
         )
         connection.commit()
         club_id = cursor.lastrowid
+        _refresh_club_recommender(club_id)
+        search_service.touch(cursor, "clubs", club_id)
+        autocomplete_service.touch(cursor, "clubs", club_id)
         
         # Get the created club
         cursor.execute("SELECT * FROM clubs WHERE id = %s", (club_id,))
@@ -1804,6 +2024,7 @@ async def apply_to_club(application: schemas.ClubApplicationCreate, current_user
             (application.club_id, current_user["id"], application.application_message)
         )
         connection.commit()
+        club_stats.touch(cursor, application.club_id)
         
         return {"message": "Application submitted successfully", "status": "pending"}
     except mysql.connector.Error as e:
@@ -1892,6 +2113,7 @@ async def review_club_application(action: schemas.ClubApplicationAction, current
             (new_status, current_user["id"], action.application_id)
         )
         connection.commit()
+        club_stats.touch(cursor, application["club_id"])
         
         return {
             "message": f"Application {new_status} successfully",
@@ -2129,6 +2351,24 @@ async def create_event(event_data: schemas.EventCreate, current_user = Depends(a
 @app.post("/events/rsvp")
 async def rsvp_event(rsvp_data: schemas.EventRSVP, current_user = Depends(auth.get_current_user), db = Depends(get_db)):
     """RSVP to an event"""
+    drop = ticket_drop.get("rsvp", rsvp_data.event_id)
+    if drop is not None:
+        # Ticket-drop mode: queue the RSVP; the drop consumer writes it in order
+        deadline = drop.info.get("registration_deadline")
+        if deadline and datetime.now() > deadline:
+            raise HTTPException(status_code=400, detail="Registration deadline has passed")
+        try:
+            ticket = ticket_drop.enqueue(drop, current_user["id"], {"response": rsvp_data.response})
+        except DropAdmissionError as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+        return {
+            "message": f"RSVP queued for {drop.info.get('title')}",
+            "event_id": rsvp_data.event_id,
+            "response": rsvp_data.response,
+            **ticket_drop.describe(drop, ticket),
+            "poll_url": f"/event-drops/tickets/{ticket.id}",
+            "stream_url": f"/event-drops/tickets/{ticket.id}/stream"
+        }
     try:
         connection = get_mysql_connection()
         cursor = connection.cursor(dictionary=True)
@@ -2178,6 +2418,90 @@ async def rsvp_event(rsvp_data: schemas.EventRSVP, current_user = Depends(auth.g
         if 'connection' in locals():
             connection.close()
 
+def _drop_rsvp_handler(connection, event_id, tickets):
+    """Ticket-drop consumer for /events/rsvp: one transaction per batch of RSVPs"""
+    cursor = connection.cursor(dictionary=True)
+    try:
+        connection.start_transaction()
+        # Upsert: an RSVP written by /events/rsvp since the batch was queued is an existing
+        # RSVP to update, not an IntegrityError that fails every ticket in the batch
+        cursor.executemany(
+            """
+            INSERT INTO event_rsvps (event_id, user_id, response, rsvp_date) VALUES (%s, %s, %s, NOW())
+            ON DUPLICATE KEY UPDATE response = VALUES(response), rsvp_date = NOW()
+            """,
+            [(event_id, t.user_id, t.payload["response"]) for t in tickets]
+        )
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+    for ticket in tickets:
+        ticket.decide("confirmed", response=ticket.payload["response"])
+
+@app.post("/events/{event_id}/drop")
+async def set_rsvp_drop_mode(event_id: int, drop_data: dict, current_user = Depends(auth.get_current_user)):
+    """Open or close ticket-drop mode for RSVPs to an event (Organizer/Faculty/Admin only)"""
+    try:
+        connection = get_mysql_connection()
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute("SELECT title, organizer_id, registration_deadline FROM events WHERE id = %s", (event_id,))
+        event = cursor.fetchone()
+        if not event:
+            raise HTTPException(status_code=404, detail="Event not found")
+        if current_user.get("role") not in ["faculty", "admin"] and event["organizer_id"] != current_user["id"]:
+            raise HTTPException(status_code=403, detail="Not authorized to manage this event")
+        if drop_data.get("enabled", True):
+            ticket_drop.open(
+                "rsvp", event_id, _drop_rsvp_handler, repeatable=True,
+                info={"title": event["title"], "registration_deadline": event["registration_deadline"]}
+            )
+            message = f"Drop mode opened for {event['title']}"
+        else:
+            ticket_drop.close("rsvp", event_id)
+            message = f"Drop mode closed for {event['title']}; queued RSVPs are still being processed"
+        return {"message": message, "drop": ticket_drop.drop_stats("rsvp", event_id)}
+    except mysql.connector.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'connection' in locals():
+            connection.close()
+
+def _drop_ticket_for(ticket_id: str, user):
+    found = ticket_drop.find(ticket_id)
+    if not found or (found[1].user_id != user["id"] and user.get("role") not in ["admin", "faculty"]):
+        raise HTTPException(status_code=404, detail="Ticket not found")
+    return found
+
+@app.get("/event-drops/tickets/{ticket_id}")
+async def get_drop_ticket(ticket_id: str, wait: float = Query(0, ge=0, le=30, description="Long-poll up to this many seconds for the next batch"),
+                          current_user = Depends(auth.get_current_user)):
+    """Queue position and, once processed, the result of a ticket-drop registration or RSVP.
+
+    A ticket issued before the worker restarted reports status ``lost``; the client should register again.
+    """
+    drop, ticket = _drop_ticket_for(ticket_id, current_user)
+    if wait and ticket.queued:
+        await ticket_drop.wait_for_progress(drop, wait)
+    return ticket_drop.describe(drop, ticket)
+
+@app.get("/event-drops/tickets/{ticket_id}/stream")
+async def stream_drop_ticket(ticket_id: str, request: Request, token: Optional[str] = None):
+    """Server-Sent Events for a ticket: position updates, then the result. Accepts ``?token=`` like the other streams"""
+    user = _stream_user(request, token)
+    if user is None:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    drop, ticket = _drop_ticket_for(ticket_id, user)
+    return StreamingResponse(
+        event_drop.ticket_stream(ticket_drop, drop, ticket),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.get("/events/{event_id}")
 async def get_event_details(event_id: int, current_user = Depends(auth.get_current_user)):
     """Get event details by id"""
@@ -2334,24 +2658,51 @@ async def get_my_events(current_user = Depends(auth.get_current_user), db = Depe
         if 'connection' in locals():
             connection.close()
 
+def _refresh_peer_index(user_id: int):
+    """Re-embed one student in the people-you-may-know index after a profile change."""
+    try:
+        from peer_recommender import peer_index
+        connection = get_mysql_connection()
+        cursor = connection.cursor(dictionary=True)
+        peer_index.refresh_user(cursor, user_id)
+    except Exception as e:
+        logging.warning(f"Peer index refresh failed for user {user_id}: {e}")
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'connection' in locals():
+            connection.close()
+
 @app.get("/networking/recommendations")
-async def get_networking_recommendations(current_user = Depends(auth.get_current_user), db = Depends(get_db)):
-    """Get networking recommendations for the current user"""
+async def get_networking_recommendations(current_user = Depends(auth.get_current_user), db = Depends(get_db), limit: int = 10):
+    """Get networking recommendations: students in the same college with the most similar
+    course, department, skills, interests and clubs"""
+    from peer_recommender import peer_index
     try:
         college_id = current_user.get("college_id")
         user_id = current_user.get("id")
         connection = get_mysql_connection()
         cursor = connection.cursor(dictionary=True)
+
+        def query():
+            # Loading and the first build of a college's partition block; keep them off the event loop
+            if peer_index.is_stale():
+                peer_index.load_from_db(cursor)
+            return peer_index.recommend(user_id, max(1, min(limit, 50)))
+
+        recommendations = await asyncio.get_running_loop().run_in_executor(None, query)
+        if recommendations:
+            return recommendations
         
-        # Get students from the same college (excluding current user)
+        # Not an indexed student (e.g. faculty): fall back to students from the same college
         cursor.execute(
             """
             SELECT id, full_name, username, course, department, bio 
             FROM users 
             WHERE college_id = %s AND role = 'student' AND id != %s 
-            LIMIT 10
+            LIMIT %s
             """,
-            (college_id, user_id)
+            (college_id, user_id, limit)
         )
         recommendations = cursor.fetchall()
         
@@ -2726,15 +3077,44 @@ def _ensure_canteen_tables(cursor):
               id INT AUTO_INCREMENT PRIMARY KEY,
               file_name VARCHAR(255) NOT NULL,
               mime_type VARCHAR(100) NOT NULL,
-              content LONGBLOB NOT NULL,
+              content LONGBLOB NULL, -- legacy uploads only; new files live in asset_store
+              content_hash CHAR(64) NULL,
+              size_bytes BIGINT NULL,
               uploaded_by INT NOT NULL,
               active TINYINT(1) NOT NULL DEFAULT 1,
-              created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+              created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+              INDEX idx_content_hash (content_hash)
             ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
             """
         )
     except Exception:
         pass
+    _migrate_menu_assets_schema(cursor)
+
+_menu_assets_schema_migrated = False
+
+def _migrate_menu_assets_schema(cursor):
+    # ALTERs take a metadata lock and commit implicitly; run them once per process
+    global _menu_assets_schema_migrated
+    if _menu_assets_schema_migrated:
+        return
+    try:
+        cursor.execute("ALTER TABLE canteen_menu_assets MODIFY content LONGBLOB NULL")
+    except Exception:
+        pass
+    try:
+        cursor.execute("ALTER TABLE canteen_menu_assets ADD COLUMN content_hash CHAR(64) NULL")
+    except Exception:
+        pass
+    try:
+        cursor.execute("ALTER TABLE canteen_menu_assets ADD COLUMN size_bytes BIGINT NULL")
+    except Exception:
+        pass
+    try:
+        cursor.execute("ALTER TABLE canteen_menu_assets ADD INDEX idx_content_hash (content_hash)")
+    except Exception:
+        pass
+    _menu_assets_schema_migrated = True
 
 from secrets import token_hex
 
@@ -2743,33 +3123,24 @@ async def canteen_place_order(payload: dict, current_user = Depends(auth.get_cur
     if current_user.get("role") != "student":
         raise HTTPException(status_code=403, detail="Students only")
     items = payload.get("items") or []
-    total_amount = payload.get("total_amount") or 0
     payment_method = payload.get("payment_method") or "pay_now"
     payment_status = payload.get("payment_status") or ("paid" if payment_method == "pay_now" else "pending")
     try:
-        connection = get_mysql_connection()
-        cursor = connection.cursor(dictionary=True)
-        _ensure_canteen_tables(cursor)
         qr = token_hex(16)
         order_token = token_hex(16)  # Generate order token for payment processing
-        cursor.execute(
-            """
-            INSERT INTO canteen_orders (user_id, total_amount, payment_method, payment_status, status, qr_token, order_token)
-            VALUES (%s, %s, %s, %s, 'queued', %s, %s)
-            """,
-            (current_user["id"], total_amount, payment_method, payment_status, qr, order_token)
+        # Lines are priced from the menu snapshot (payload total_amount is not trusted) and
+        # written with the order in the ingest pipeline's grouped transaction
+        item_rows, total_amount = (await _menu_snapshot()).price_order(items)
+        order_id = await order_ingest.submit(canteen_ingest.PendingOrder(
+            current_user["id"], total_amount, payment_method, payment_status, "queued", qr, order_token, item_rows
+        ))
+        order_board.add_order(
+            {"id": order_id, "user_id": current_user["id"], "status": "queued", "payment_status": payment_status,
+             "payment_method": payment_method, "total_amount": total_amount, "qr_token": qr,
+             "student_name": current_user.get("full_name")},
+            items=[{"order_id": order_id, "item_id": row[0], "item_name": row[1], "price": row[2], "quantity": row[3]}
+                   for row in item_rows],
         )
-        order_id = cursor.lastrowid
-        # items
-        for it in items:
-            cursor.execute(
-                """
-                INSERT INTO canteen_order_items (order_id, item_id, item_name, price, quantity)
-                VALUES (%s, %s, %s, %s, %s)
-                """,
-                (order_id, str(it.get("id")), it.get("name"), float(it.get("price", 0)), int(it.get("quantity", 1)))
-            )
-        connection.commit()
         qr_url = f"https://api.qrserver.com/v1/create-qr-code/?size=240x240&data=CANTEEN_{qr}"
         return {
             "order_id": order_id, 
@@ -2779,11 +3150,12 @@ async def canteen_place_order(payload: dict, current_user = Depends(auth.get_cur
             "status": "queued", 
             "payment_status": payment_status
         }
+    except canteen_menu.MenuValidationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except canteen_ingest.OrderAdmissionError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except mysql.connector.Error as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-    finally:
-        if 'cursor' in locals(): cursor.close()
-        if 'connection' in locals(): connection.close()
 
 @app.get("/canteen/orders")
 async def list_canteen_orders(status: Optional[str] = None, current_user = Depends(auth.get_current_user)):
@@ -2798,7 +3170,9 @@ async def list_canteen_orders(status: Optional[str] = None, current_user = Depen
             params.append(status)
         sql += " ORDER BY created_at DESC LIMIT 500"
         cursor.execute(sql, tuple(params))
-        return cursor.fetchall()
+        orders = cursor.fetchall()
+        order_board.overlay(orders)
+        return attach_order_items(cursor, orders)
     finally:
         if 'cursor' in locals(): cursor.close()
         if 'connection' in locals(): connection.close()
@@ -2844,22 +3218,75 @@ async def get_staff_canteen_orders(
         cursor.execute(sql, tuple(params))
         orders = cursor.fetchall()
         
-        # Get order items for each order
-        for order in orders:
-            cursor.execute(
-                """
-                SELECT * FROM canteen_order_items 
-                WHERE order_id = %s
-                """,
-                (order['id'],)
-            )
-            order['items'] = cursor.fetchall()
+        # Items for the whole page in one batched query
+        attach_order_items(cursor, orders)
+        order_board.overlay(orders)
         
         return {"orders": orders, "total": len(orders)}
     finally:
         if 'cursor' in locals(): cursor.close()
         if 'connection' in locals(): connection.close()
 
+CANTEEN_STAFF_ROLES = ["admin", "faculty", "organization", "staff", "canteen_staff"]
+
+def _order_stream_response(request: Request, subscription, snapshot):
+    last_event_id = request.headers.get("last-event-id")
+    return StreamingResponse(
+        canteen_board.event_stream(order_board, subscription, int(last_event_id) if last_event_id and last_event_id.isdigit() else None, snapshot),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/canteen/board")
+async def get_canteen_order_board(current_user = Depends(auth.get_current_user)):
+    """Active orders grouped by kitchen status, served from the in-memory order board"""
+    if current_user.get("role") not in CANTEEN_STAFF_ROLES:
+        raise HTTPException(status_code=403, detail="Staff access required")
+    return {**order_board.snapshot(), "stats": order_board.stats()}
+
+@app.get("/canteen/board/stream")
+async def stream_canteen_order_board(request: Request, token: Optional[str] = None):
+    """Server-Sent Events for kitchen displays: a snapshot, then added/updated/removed orders.
+
+    EventSource cannot send headers, so the bearer token may be passed as ``?token=``.
+    """
+    user = _stream_user(request, token)
+    if user is None:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    if user.get("role") not in CANTEEN_STAFF_ROLES:
+        raise HTTPException(status_code=403, detail="Staff access required")
+    return _order_stream_response(request, order_board.subscribe(), order_board.snapshot)
+
+@app.get("/canteen/order/{order_id}/stream")
+async def stream_canteen_order(order_id: int, request: Request, token: Optional[str] = None):
+    """Server-Sent Events for one order, replacing polling of /canteen/order/{order_id}/status"""
+    user = _stream_user(request, token)
+    if user is None:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    board_order = order_board.get(order_id)
+    owner_id = board_order.user_id if board_order else None
+    if owner_id is None:
+        try:
+            connection = get_mysql_connection()
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute("SELECT user_id FROM canteen_orders WHERE id = %s", (order_id,))
+            row = cursor.fetchone()
+        finally:
+            if 'cursor' in locals(): cursor.close()
+            if 'connection' in locals(): connection.close()
+        if not row:
+            raise HTTPException(status_code=404, detail="Order not found")
+        owner_id = row["user_id"]
+    if owner_id != user["id"] and user.get("role") not in CANTEEN_STAFF_ROLES:
+        raise HTTPException(status_code=404, detail="Order not found")
+
+    def snapshot():
+        state = order_board.snapshot(user_id=owner_id)
+        orders = [o for group in state["board"].values() for o in group if o["id"] == order_id]
+        return {"seq": state["seq"], "order": orders[0] if orders else None}
+
+    return _order_stream_response(request, order_board.subscribe(order_id=order_id), snapshot)
+
 @app.post("/canteen/orders/{order_id}/status")
 async def canteen_update_status(order_id: int, payload: dict, current_user = Depends(auth.get_current_user)):
     # Allow staff to update order status
@@ -2872,11 +3299,26 @@ async def canteen_update_status(order_id: int, payload: dict, current_user = Dep
         connection = get_mysql_connection()
         cursor = connection.cursor(dictionary=True)
         _ensure_canteen_tables(cursor)
-        cursor.execute("UPDATE canteen_orders SET status = %s WHERE id = %s", (new_status, order_id))
+        board_order = order_board.get(order_id)
+        if new_status in canteen_board.TERMINAL_STATUSES:
+            # Served/cancelled are written through, and only once
+            if not order_board.write_terminal(cursor, order_id, new_status):
+                cursor.execute("SELECT id FROM canteen_orders WHERE id = %s", (order_id,))
+                if not cursor.fetchone():
+                    raise HTTPException(status_code=404, detail="Order not found")
+                raise HTTPException(status_code=409, detail="Order is already served or cancelled")
+        elif board_order is not None:
+            # Kitchen progress on this worker's board is written behind
+            order_board.transition(order_id, new_status)
+        else:
+            cursor.execute("UPDATE canteen_orders SET status = %s WHERE id = %s", (new_status, order_id))
         # Notify the student owner
         try:
-            cursor.execute("SELECT user_id FROM canteen_orders WHERE id = %s", (order_id,))
-            row = cursor.fetchone()
+            if board_order is not None:
+                row = {"user_id": board_order.user_id}
+            else:
+                cursor.execute("SELECT user_id FROM canteen_orders WHERE id = %s", (order_id,))
+                row = cursor.fetchone()
             if row:
                 title = "Canteen Order Update"
                 msg = f"Your order #{order_id} status is now '{new_status}'."
@@ -2889,6 +3331,22 @@ async def canteen_update_status(order_id: int, payload: dict, current_user = Dep
         if 'cursor' in locals(): cursor.close()
         if 'connection' in locals(): connection.close()
 
+def _canteen_order_by_qr(cursor, qr_token: str):
+    """Active orders come from the order board; anything else from MySQL"""
+    board_order = order_board.by_qr(qr_token)
+    if board_order is not None:
+        return board_order.to_dict()
+    cursor.execute("SELECT * FROM canteen_orders WHERE qr_token = %s", (qr_token,))
+    order = cursor.fetchone()
+    if order:
+        order_board.overlay([order])
+    return order
+
+def _canteen_board_written(order: dict, new_status: str, payment_status: str):
+    """Tell the order board about a change already committed to MySQL (payments are written through)"""
+    if order_board.transition(order["id"], new_status, payment_status, durable=True) is None:
+        order_board.add_order({**order, "status": new_status, "payment_status": payment_status})
+
 @app.post("/canteen/scan")
 async def canteen_scan(payload: dict, current_user = Depends(auth.get_current_user)):
     """Enhanced canteen QR scanning for payment and pickup"""
@@ -2909,8 +3367,7 @@ async def canteen_scan(payload: dict, current_user = Depends(auth.get_current_us
         if qr_data.startswith("CANTEEN_PAY_"):
             # Pay Later - Process payment at counter
             qr_token = qr_data.replace("CANTEEN_PAY_", "").split("_")[0]
-            cursor.execute("SELECT * FROM canteen_orders WHERE qr_token = %s", (qr_token,))
-            order = cursor.fetchone()
+            order = _canteen_order_by_qr(cursor, qr_token)
             
             if not order:
                 raise HTTPException(status_code=404, detail="Order not found")
@@ -2922,9 +3379,12 @@ async def canteen_scan(payload: dict, current_user = Depends(auth.get_current_us
             cursor.execute("""
                 UPDATE canteen_orders 
                 SET payment_status = 'paid', status = 'preparing', updated_at = NOW()
-                WHERE id = %s
+                WHERE id = %s AND payment_status <> 'paid'
             """, (order["id"],))
+            if cursor.rowcount == 0:
+                return {"valid": False, "message": "Order already paid", "order": order}
             connection.commit()
+            _canteen_board_written(order, "preparing", "paid")
             
             return {
                 "valid": True, 
@@ -2937,8 +3397,7 @@ async def canteen_scan(payload: dict, current_user = Depends(auth.get_current_us
         elif qr_data.startswith("CANTEEN_PICKUP_"):
             # Pickup - Order already paid online
             qr_token = qr_data.replace("CANTEEN_PICKUP_", "").split("_")[0]
-            cursor.execute("SELECT * FROM canteen_orders WHERE qr_token = %s", (qr_token,))
-            order = cursor.fetchone()
+            order = _canteen_order_by_qr(cursor, qr_token)
             
             if not order:
                 raise HTTPException(status_code=404, detail="Order not found")
@@ -2949,12 +3408,9 @@ async def canteen_scan(payload: dict, current_user = Depends(auth.get_current_us
             if order["status"] == "served":
                 return {"valid": False, "message": "Order already served", "order": order}
             
-            # Mark as served
-            cursor.execute("""
-                UPDATE canteen_orders 
-                SET status = 'served', updated_at = NOW()
-                WHERE id = %s
-            """, (order["id"],))
+            # Mark as served, written through and only once
+            if not order_board.write_terminal(cursor, order["id"], "served"):
+                return {"valid": False, "message": "Order already served", "order": order}
             connection.commit()
             
             return {
@@ -2967,8 +3423,7 @@ async def canteen_scan(payload: dict, current_user = Depends(auth.get_current_us
         elif qr_data.startswith("CANTEEN_ORDER_"):
             # Legacy format - handle both payment and pickup
             qr_token = qr_data.replace("CANTEEN_ORDER_", "").split("_")[0]
-            cursor.execute("SELECT * FROM canteen_orders WHERE qr_token = %s", (qr_token,))
-            order = cursor.fetchone()
+            order = _canteen_order_by_qr(cursor, qr_token)
             
             if not order:
                 raise HTTPException(status_code=404, detail="Order not found")
@@ -2982,9 +3437,12 @@ async def canteen_scan(payload: dict, current_user = Depends(auth.get_current_us
                 cursor.execute("""
                     UPDATE canteen_orders 
                     SET payment_status = 'paid', status = 'preparing', updated_at = NOW()
-                    WHERE id = %s
+                    WHERE id = %s AND payment_status <> 'paid'
                 """, (order["id"],))
+                if cursor.rowcount == 0:
+                    return {"valid": False, "message": "Order already paid", "order": order}
                 connection.commit()
+                _canteen_board_written(order, "preparing", "paid")
                 
                 return {
                     "valid": True,
@@ -2995,11 +3453,8 @@ async def canteen_scan(payload: dict, current_user = Depends(auth.get_current_us
                 }
             else:
                 # Mark as served
-                cursor.execute("""
-                    UPDATE canteen_orders 
-                    SET status = 'served', payment_status = 'paid', updated_at = NOW()
-                    WHERE id = %s
-                """, (order["id"],))
+                if not order_board.write_terminal(cursor, order["id"], "served", "paid"):
+                    return {"valid": False, "message": "Order already served", "order": order}
                 connection.commit()
                 
                 return {
@@ -3010,18 +3465,14 @@ async def canteen_scan(payload: dict, current_user = Depends(auth.get_current_us
                 }
         else:
             # Try to find by qr_token directly (fallback)
-            cursor.execute("SELECT * FROM canteen_orders WHERE qr_token = %s", (qr_data,))
-            order = cursor.fetchone()
+            order = _canteen_order_by_qr(cursor, qr_data)
             
             if not order:
                 raise HTTPException(status_code=404, detail="Invalid QR code")
             
             # Legacy handling
-            cursor.execute("""
-                UPDATE canteen_orders 
-                SET status = 'served', payment_status = 'paid', updated_at = NOW()
-                WHERE id = %s
-            """, (order["id"],))
+            if not order_board.write_terminal(cursor, order["id"], "served", "paid"):
+                return {"valid": False, "message": "Order already served", "order": order}
             connection.commit()
             
             return {
@@ -3043,10 +3494,12 @@ async def canteen_scan(payload: dict, current_user = Depends(auth.get_current_us
 
 from fastapi import UploadFile, File
 from fastapi.responses import StreamingResponse
+import asset_store
 
 @app.post("/canteen/menu/upload")
 async def upload_canteen_menu(file: UploadFile = File(...), current_user = Depends(auth.get_current_user)):
-    """Upload canteen menu (image/pdf). Store content in DB and mark latest."""
+    """Upload canteen menu (image/pdf). Store content in the asset store and mark latest.
+    Re-uploads of identical bytes reuse the existing asset row."""
     if current_user.get("role") not in ["admin", "faculty"]:
         raise HTTPException(status_code=403, detail="Only admin/faculty can upload menu")
     content = await file.read()
@@ -3056,53 +3509,242 @@ async def upload_canteen_menu(file: UploadFile = File(...), current_user = Depen
         connection = get_mysql_connection()
         cursor = connection.cursor(dictionary=True)
         _ensure_canteen_tables(cursor)
+        sha = asset_store.store_bytes(content)
+        cursor.execute(
+            "SELECT id, file_name, mime_type FROM canteen_menu_assets WHERE content_hash = %s ORDER BY id DESC LIMIT 1",
+            (sha,)
+        )
+        existing = cursor.fetchone()
         # Deactivate previous assets
         try:
             cursor.execute("UPDATE canteen_menu_assets SET active = 0 WHERE active = 1")
         except Exception:
             pass
+        if existing:
+            cursor.execute("UPDATE canteen_menu_assets SET active = 1 WHERE id = %s", (existing["id"],))
+            connection.commit()
+            return {
+                "id": existing["id"],
+                "file_name": existing["file_name"],
+                "mime_type": existing["mime_type"],
+                "content_hash": sha,
+                "content_url": f"/canteen/menu/assets/by-hash/{sha}",
+                "deduplicated": True,
+            }
+        # Keep a database copy unless the asset store survives redeploys
         cursor.execute(
             """
-            INSERT INTO canteen_menu_assets (file_name, mime_type, content, uploaded_by, active)
-            VALUES (%s, %s, %s, %s, 1)
+            INSERT INTO canteen_menu_assets (file_name, mime_type, content, content_hash, size_bytes, uploaded_by, active)
+            VALUES (%s, %s, %s, %s, %s, %s, 1)
             """,
-            (file.filename or 'menu', file.content_type or 'application/octet-stream', content, current_user["id"])
+            (file.filename or 'menu', file.content_type or 'application/octet-stream',
+             None if asset_store.ASSET_STORE_DURABLE else content, sha, len(content), current_user["id"])
         )
         connection.commit()
-        return {"id": cursor.lastrowid, "file_name": file.filename, "mime_type": file.content_type}
+        return {
+            "id": cursor.lastrowid,
+            "file_name": file.filename,
+            "mime_type": file.content_type,
+            "content_hash": sha,
+            "content_url": f"/canteen/menu/assets/by-hash/{sha}",
+            "deduplicated": False,
+        }
     finally:
         if 'cursor' in locals(): cursor.close()
         if 'connection' in locals(): connection.close()
 
+@app.post("/admin/migrate-menu-assets")
+async def migrate_menu_assets_to_store(current_user = Depends(auth.get_current_user)):
+    """Move legacy BLOB menu uploads into the content-addressed asset store, one row at a time."""
+    if current_user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Admin only")
+    if not asset_store.ASSET_STORE_DURABLE:
+        # Dropping the BLOBs is only safe when the store survives redeploys
+        raise HTTPException(status_code=409, detail="ASSET_STORE_DURABLE is not set; the asset store is not persistent")
+    try:
+        connection = get_mysql_connection()
+        cursor = connection.cursor(dictionary=True)
+        _ensure_canteen_tables(cursor)
+        cursor.execute("SELECT id FROM canteen_menu_assets WHERE content IS NOT NULL")
+        ids = [r["id"] for r in cursor.fetchall()]
+        migrated = 0
+        for asset_id in ids:
+            cursor.execute("SELECT content FROM canteen_menu_assets WHERE id = %s", (asset_id,))
+            row = cursor.fetchone()
+            if not row or row["content"] is None:
+                continue
+            content = bytes(row["content"])
+            sha = asset_store.store_bytes(content)
+            cursor.execute(
+                "UPDATE canteen_menu_assets SET content_hash = %s, size_bytes = %s, content = NULL WHERE id = %s",
+                (sha, len(content), asset_id)
+            )
+            connection.commit()
+            migrated += 1
+        return {"success": True, "migrated": migrated}
+    except mysql.connector.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    finally:
+        if 'cursor' in locals(): cursor.close()
+        if 'connection' in locals(): connection.close()
+
+def _menu_asset_content_url(asset: Optional[dict]) -> Optional[str]:
+    if not asset:
+        return None
+    if asset.get("content_hash"):
+        return f"/canteen/menu/assets/by-hash/{asset['content_hash']}"
+    return f"/canteen/menu/assets/{asset['id']}/content"
+
 @app.get("/canteen/menu/latest-asset")
 async def get_latest_canteen_menu_asset(current_user = Depends(auth.get_current_user)):
     try:
         connection = get_mysql_connection()
         cursor = connection.cursor(dictionary=True)
         _ensure_canteen_tables(cursor)
-        cursor.execute("SELECT id, file_name, mime_type, created_at FROM canteen_menu_assets WHERE active = 1 ORDER BY created_at DESC LIMIT 1")
+        cursor.execute("SELECT id, file_name, mime_type, content_hash, size_bytes, created_at FROM canteen_menu_assets WHERE active = 1 ORDER BY created_at DESC LIMIT 1")
         row = cursor.fetchone()
+        if row:
+            row["content_url"] = _menu_asset_content_url(row)
         return {"asset": row}
     finally:
         if 'cursor' in locals(): cursor.close()
         if 'connection' in locals(): connection.close()
 
-@app.get("/canteen/menu/assets/{asset_id}/content")
-async def stream_canteen_menu_asset(asset_id: int, current_user = Depends(auth.get_current_user)):
+def _iter_menu_asset_blob(asset_id: int, start: int, end: int):
+    """Stream a legacy BLOB asset with SUBSTRING reads so it is never fully loaded in memory."""
+    connection = get_mysql_connection()
+    cursor = connection.cursor()
+    try:
+        pos = start
+        while pos <= end:
+            length = min(asset_store.STREAM_CHUNK_SIZE, end - pos + 1)
+            cursor.execute(
+                "SELECT SUBSTRING(content, %s, %s) FROM canteen_menu_assets WHERE id = %s",
+                (pos + 1, length, asset_id)  # SUBSTRING is 1-based
+            )
+            row = cursor.fetchone()
+            chunk = row[0] if row else None
+            if not chunk:
+                break
+            pos += len(chunk)
+            yield bytes(chunk)
+    finally:
+        cursor.close()
+        connection.close()
+
+def _load_menu_asset_meta(where_sql: str, value) -> dict:
     try:
         connection = get_mysql_connection()
-        cursor = connection.cursor()
+        cursor = connection.cursor(dictionary=True)
         _ensure_canteen_tables(cursor)
-        cursor.execute("SELECT mime_type, content FROM canteen_menu_assets WHERE id = %s", (asset_id,))
-        row = cursor.fetchone()
-        if not row:
+        cursor.execute(
+            f"""
+            SELECT id, file_name, mime_type, content_hash, created_at,
+                   COALESCE(size_bytes, LENGTH(content)) AS size_bytes, content IS NOT NULL AS has_blob
+            FROM canteen_menu_assets WHERE {where_sql}
+            ORDER BY id DESC LIMIT 1
+            """,
+            (value,)
+        )
+        asset = cursor.fetchone()
+        if not asset:
             raise HTTPException(status_code=404, detail="Asset not found")
-        mime, content = row
-        return StreamingResponse(iter([content]), media_type=mime)
+        return asset
     finally:
         if 'cursor' in locals(): cursor.close()
         if 'connection' in locals(): connection.close()
 
+def _inline_disposition(filename: str) -> str:
+    """``Content-Disposition: inline`` value that survives any user-supplied file name.
+
+    Header values must be latin-1 and a quote would end ``filename``, so the
+    plain parameter gets an ASCII-only fallback and the real name goes in the
+    RFC 5987 ``filename*`` parameter.
+    """
+    from urllib.parse import quote
+
+    fallback = "".join(c if " " <= c <= "~" and c not in '"\\' else "_" for c in filename)
+    return f"inline; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename, safe='')}"
+
+def _menu_asset_response(request: Request, asset: dict, immutable: bool):
+    """Build a conditional, range-aware response for a menu asset.
+
+    Files in the asset store are served with FileResponse, which handles
+    Range and If-Range itself; legacy BLOB rows are streamed in chunks from
+    MySQL. Supports If-None-Match / If-Modified-Since (304) and single byte
+    ranges (206/416) for BLOBs. 404 when neither the file nor the BLOB exists.
+    """
+    from email.utils import formatdate, parsedate_to_datetime
+    from fastapi.responses import FileResponse, Response
+
+    sha = asset.get("content_hash")
+    on_disk = bool(sha) and asset_store.has_asset(sha)
+    if not on_disk and not asset.get("has_blob"):
+        if sha:
+            logger.error(f"Menu asset {asset['id']} ({sha}) is missing from the asset store")
+        raise HTTPException(status_code=404, detail="Asset content missing")
+    size = os.path.getsize(asset_store.asset_path(sha)) if on_disk else int(asset.get("size_bytes") or 0)
+    created_at = asset.get("created_at")
+    last_modified_ts = int(created_at.timestamp()) if isinstance(created_at, datetime) else None
+    etag = f'"{sha}"' if sha else f'"asset-{asset["id"]}-{size}-{last_modified_ts or 0}"'
+
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, max-age=31536000, immutable" if immutable else "private, no-cache",
+        "Content-Disposition": _inline_disposition(asset.get("file_name") or "menu"),
+    }
+    if last_modified_ts is not None:
+        headers["Last-Modified"] = formatdate(last_modified_ts, usegmt=True)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        if etag in [t.strip() for t in if_none_match.split(",")] or if_none_match.strip() == "*":
+            return Response(status_code=304, headers=headers)
+    elif last_modified_ts is not None and request.headers.get("if-modified-since"):
+        try:
+            since = parsedate_to_datetime(request.headers["if-modified-since"]).timestamp()
+            if last_modified_ts <= since:
+                return Response(status_code=304, headers=headers)
+        except (TypeError, ValueError):
+            pass
+
+    if on_disk:
+        return FileResponse(asset_store.asset_path(sha), media_type=asset.get("mime_type"), headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if if_range and if_range.strip() != etag:
+        range_header = None
+    try:
+        byte_range = asset_store.parse_byte_range(range_header, size)
+    except ValueError:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+    status_code = 200
+    start, end = 0, size - 1
+    if byte_range:
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(max(0, end - start + 1))
+
+    body = _iter_menu_asset_blob(asset["id"], start, end) if size else iter([])
+    return StreamingResponse(body, status_code=status_code, media_type=asset.get("mime_type"), headers=headers)
+
+@app.get("/canteen/menu/assets/{asset_id}/content")
+async def stream_canteen_menu_asset(asset_id: int, request: Request, current_user = Depends(auth.get_current_user)):
+    asset = _load_menu_asset_meta("id = %s", asset_id)
+    return _menu_asset_response(request, asset, immutable=False)
+
+@app.get("/canteen/menu/assets/by-hash/{content_hash}")
+async def stream_canteen_menu_asset_by_hash(content_hash: str, request: Request, current_user = Depends(auth.get_current_user)):
+    """Content-addressed asset URL; the bytes behind it never change, so it is cached as immutable."""
+    if len(content_hash) != 64 or any(c not in "0123456789abcdef" for c in content_hash):
+        raise HTTPException(status_code=400, detail="Invalid content hash")
+    asset = _load_menu_asset_meta("content_hash = %s", content_hash)
+    return _menu_asset_response(request, asset, immutable=True)
+
 @app.get("/canteen/menu")
 async def get_canteen_menu(db = Depends(get_db)):
     """Get canteen menu and include latest uploaded asset metadata if present"""
@@ -3195,6 +3837,7 @@ async def add_menu_item(item_data: schemas.MenuItemCreate, current_user = Depend
         )
         connection.commit()
         item_id = cursor.lastrowid
+        menu_cache.refresh_after_write(cursor)
         
         # Get the created item
         cursor.execute("SELECT * FROM canteen_menu_items WHERE id = %s", (item_id,))
@@ -3242,6 +3885,7 @@ async def update_menu_item(item_id: int, item_data: dict, current_user = Depends
         
         if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail="Menu item not found")
+        menu_cache.refresh_after_write(cursor)
         
         # Return updated item
         cursor.execute("SELECT * FROM canteen_menu_items WHERE id = %s", (item_id,))
@@ -3272,6 +3916,7 @@ async def delete_menu_item(item_id: int, current_user = Depends(auth.get_current
         
         if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail="Menu item not found")
+        menu_cache.refresh_after_write(cursor)
         
         return {"message": "Menu item deleted successfully"}
     except mysql.connector.Error as e:
@@ -3315,6 +3960,7 @@ async def patch_menu_item(item_id: int, update_data: dict, current_user = Depend
         
         if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail="Menu item not found")
+        menu_cache.refresh_after_write(cursor)
         
         # Return updated item
         cursor.execute("SELECT * FROM canteen_menu_items WHERE id = %s", (item_id,))
@@ -3346,6 +3992,7 @@ async def clear_all_menu_items(current_user = Depends(auth.get_current_user)):
         
         cursor.execute("DELETE FROM canteen_menu_items")
         connection.commit()
+        menu_cache.refresh_after_write(cursor)
         
         return {
             "message": f"Successfully cleared {count_before} menu items",
@@ -3495,34 +4142,13 @@ async def get_my_orders(current_user = Depends(auth.get_current_user), db = Depe
         cursor = connection.cursor(dictionary=True)
         
         cursor.execute(
-            """
-            SELECT co.*, 
-                   GROUP_CONCAT(CONCAT(cmi.name, ' x', coi.quantity) SEPARATOR ', ') as items_summary
-            FROM canteen_orders co
-            LEFT JOIN canteen_order_items coi ON co.id = coi.order_id
-            LEFT JOIN canteen_menu_items cmi ON coi.menu_item_id = cmi.id
-            WHERE co.user_id = %s
-            GROUP BY co.id
-            ORDER BY co.order_date DESC
-            """,
+            "SELECT * FROM canteen_orders WHERE user_id = %s ORDER BY created_at DESC",
             (current_user["id"],)
         )
         orders = cursor.fetchall()
         
-        # Get detailed items for each order
-        for order in orders:
-            cursor.execute(
-                """
-                SELECT coi.*, cmi.name, cmi.category
-                FROM canteen_order_items coi
-                JOIN canteen_menu_items cmi ON coi.menu_item_id = cmi.id
-                WHERE coi.order_id = %s
-                """,
-                (order["id"],)
-            )
-            order["items"] = cursor.fetchall()
-        
-        return orders
+        # Detailed items and the summary string for every order in one batched query
+        return attach_order_items(cursor, orders, with_menu=True, summary=True)
     except mysql.connector.Error as e:
         return {"orders": [], "error": str(e)}
     finally:
@@ -3545,14 +4171,23 @@ async def update_order_status(order_id: int, status: str, current_user = Depends
         connection = get_mysql_connection()
         cursor = connection.cursor(dictionary=True)
         
-        cursor.execute(
-            "UPDATE canteen_orders SET status = %s WHERE id = %s",
-            (status, order_id)
-        )
+        if status in canteen_board.TERMINAL_STATUSES:
+            written = order_board.write_terminal(cursor, order_id, status)
+        else:
+            cursor.execute(
+                "UPDATE canteen_orders SET status = %s WHERE id = %s",
+                (status, order_id)
+            )
+            written = cursor.rowcount > 0
         connection.commit()
         
-        if cursor.rowcount == 0:
+        if not written:
+            cursor.execute("SELECT id FROM canteen_orders WHERE id = %s", (order_id,))
+            if cursor.fetchone():
+                raise HTTPException(status_code=409, detail="Order is already completed or cancelled")
             raise HTTPException(status_code=404, detail="Order not found")
+        if status not in canteen_board.TERMINAL_STATUSES:
+            order_board.transition(order_id, status, durable=True)
         
         return {"message": f"Order status updated to {status}", "order_id": order_id, "status": status}
     except mysql.connector.Error as e:
@@ -3575,19 +4210,15 @@ async def get_all_orders(current_user = Depends(auth.get_current_user), db = Dep
         
         cursor.execute(
             """
-            SELECT co.*, u.full_name, u.email,
-                   GROUP_CONCAT(CONCAT(cmi.name, ' x', coi.quantity) SEPARATOR ', ') as items_summary
+            SELECT co.*, u.full_name, u.email
             FROM canteen_orders co
             JOIN users u ON co.user_id = u.id
-            LEFT JOIN canteen_order_items coi ON co.id = coi.order_id
-            LEFT JOIN canteen_menu_items cmi ON coi.menu_item_id = cmi.id
-            GROUP BY co.id
-            ORDER BY co.order_date DESC
+            ORDER BY co.created_at DESC
             """,
         )
         orders = cursor.fetchall()
         
-        return orders
+        return attach_order_items(cursor, orders, with_menu=True, summary=True)
     except mysql.connector.Error as e:
         return {"orders": [], "error": str(e)}
     finally:
@@ -5231,11 +5862,19 @@ async def create_club_recruitment_post(club_id: int, data: dict, current_user =
 # Users listing (basic) for faculty dashboard
 # ---------------------------------------------------------------------------
 @app.get("/users")
-async def list_users(role: Optional[str] = None, limit: int = 50, current_user = Depends(auth.get_current_user)):
-    """List users, optionally filtered by role. Limited for dashboard views."""
+async def list_users(role: Optional[str] = None, limit: int = 50, q: Optional[str] = None, current_user = Depends(auth.get_current_user)):
+    """List users, optionally filtered by role. Limited for dashboard views.
+
+    With ``q`` the list is a typeahead: name/username prefix matches from the in-memory index.
+    """
     try:
         connection = get_mysql_connection()
         cursor = connection.cursor(dictionary=True)
+        if q:
+            matches = autocomplete_service.complete(
+                cursor, q, ["users"], college_id=current_user.get("college_id"), groups={"users": role}, limit=limit
+            )["users"]
+            return [{"id": s.id, **s.payload} for s in matches]
         if role:
             cursor.execute(
                 "SELECT id, full_name, email, role, course, semester, department FROM users WHERE role = %s LIMIT %s",
@@ -5391,7 +6030,7 @@ async def alias_connections(current_user = Depends(auth.get_current_user)):
 @app.get("/connections/recommendations")
 async def alias_connections_recommendations(current_user = Depends(auth.get_current_user)):
     """Alias: return networking recommendations"""
-    return await get_networking_recommendations(current_user)
+    return await get_networking_recommendations(current_user, None)
 
 # ---------------------------------------------------------------------------
 # Notifications stats alias and PUT /notifications/{id}/read compatibility
@@ -5844,7 +6483,9 @@ async def my_skills_endpoint(current_user = Depends(auth.get_current_user)):
 @app.post("/skills/add")
 async def add_skill_endpoint(skill_data: dict, current_user = Depends(auth.get_current_user)):
     """Add or update student skill"""
-    return add_student_skill(skill_data, current_user)
+    result = add_student_skill(skill_data, current_user)
+    _refresh_peer_index(current_user["id"])
+    return result
 
 @app.post("/skills/certification")
 async def add_certification_endpoint(cert_data: dict, current_user = Depends(auth.get_current_user)):
@@ -6022,7 +6663,9 @@ async def rsvp_event_endpoint(event_id: int, rsvp_data: dict, current_user = Dep
 @app.put("/user/interests")
 async def update_interests_endpoint(interests_data: dict, current_user = Depends(auth.get_current_user)):
     """Update user's interest categories for better event recommendations"""
-    return update_user_interests(interests_data, current_user)
+    result = update_user_interests(interests_data, current_user)
+    _refresh_peer_index(current_user["id"])
+    return result
 
 # Alias expected by some frontend code
 @app.put("/interests/update")
@@ -6030,7 +6673,9 @@ async def update_interests_alias(interests: dict, current_user = Depends(auth.ge
     """Alias for updating interests"""
     # Some frontends send { interests: {...} }
     payload = interests if "interests" in interests else {"interests": interests}
-    return update_user_interests(payload, current_user)
+    result = update_user_interests(payload, current_user)
+    _refresh_peer_index(current_user["id"])
+    return result
 
 # ============================================================================
 # RESOURCE BOOKING ENDPOINTS
@@ -6367,7 +7012,9 @@ async def approve_club_event_endpoint(event_id: int, approval_data: dict, curren
 @app.post("/clubs/{club_id}/timeline")
 async def create_club_timeline_endpoint(club_id: int, timeline_data: dict, current_user = Depends(auth.get_current_user)):
     """Create a recurring activity in club timeline"""
-    return await create_club_timeline(club_id, timeline_data, current_user)
+    result = await create_club_timeline(club_id, timeline_data, current_user)
+    _refresh_club_recommender(club_id)
+    return result
 
 @app.get("/clubs/{club_id}/timeline")
 async def get_club_timeline_endpoint(club_id: int, current_user = Depends(auth.get_current_user)):
@@ -6377,12 +7024,16 @@ async def get_club_timeline_endpoint(club_id: int, current_user = Depends(auth.g
 @app.put("/clubs/{club_id}/timeline/{timeline_id}")
 async def update_club_timeline_endpoint(club_id: int, timeline_id: int, timeline_data: dict, current_user = Depends(auth.get_current_user)):
     """Update a recurring activity in club timeline"""
-    return await update_club_timeline(club_id, timeline_id, timeline_data, current_user)
+    result = await update_club_timeline(club_id, timeline_id, timeline_data, current_user)
+    _refresh_club_recommender(club_id)
+    return result
 
 @app.delete("/clubs/{club_id}/timeline/{timeline_id}")
 async def delete_club_timeline_endpoint(club_id: int, timeline_id: int, current_user = Depends(auth.get_current_user)):
     """Delete a recurring activity from club timeline"""
-    return await delete_club_timeline(club_id, timeline_id, current_user)
+    result = await delete_club_timeline(club_id, timeline_id, current_user)
+    _refresh_club_recommender(club_id)
+    return result
 
 @app.post("/clubs/{club_id}/timeline/sync-events")
 async def sync_timeline_to_events_endpoint(club_id: int, sync_data: dict, current_user = Depends(auth.get_current_user)):
@@ -6395,9 +7046,27 @@ async def bulk_import_calendar_events_endpoint(club_id: int, events_data: dict,
     return bulk_import_calendar_events(club_id, events_data, current_user)
 
 @app.post("/clubs/events/{event_id}/register")
-async def register_for_event_endpoint(event_id: int, current_user = Depends(auth.get_current_user)):
-    """Register for a club event"""
-    return await register_for_event(event_id, current_user)
+async def register_for_event_endpoint(
+    event_id: int,
+    occurrence_date: Optional[str] = Query(None, description="Occurrence of a recurring series (YYYY-MM-DD)"),
+    current_user = Depends(auth.get_current_user)
+):
+    """Register for a club event, or for one occurrence of a recurring series"""
+    return await register_for_event(event_id, current_user, occurrence_date)
+
+@app.delete("/clubs/events/{event_id}/register")
+async def cancel_event_registration_endpoint(
+    event_id: int,
+    occurrence_date: Optional[str] = Query(None, description="Occurrence of a recurring series (YYYY-MM-DD)"),
+    current_user = Depends(auth.get_current_user)
+):
+    """Cancel a club event registration or waitlist place"""
+    return await cancel_event_registration(event_id, current_user, occurrence_date)
+
+@app.post("/clubs/events/{event_id}/drop")
+async def set_event_drop_mode_endpoint(event_id: int, drop_data: dict, current_user = Depends(auth.get_current_user)):
+    """Open ({"enabled": true}) or close ticket-drop registration for a club event"""
+    return await set_event_drop_mode(event_id, drop_data, current_user)
 
 @app.get("/student-council/dashboard")
 async def get_student_council_dashboard_endpoint(current_user = Depends(auth.get_current_user)):
@@ -6453,6 +7122,117 @@ async def search_users_endpoint(
     """Search users with filters (Admin only)"""
     return await search_users(current_user, query, role, limit)
 
+@app.get("/autocomplete")
+async def autocomplete_endpoint(
+    q: str,
+    types: Optional[str] = None,
+    role: Optional[str] = None,
+    limit: int = 8,
+    current_user = Depends(auth.get_current_user)
+):
+    """Typeahead suggestions for users, rooms, clubs and campus places.
+
+    ``types`` is a comma separated subset of users, rooms, clubs, places; ``role``
+    narrows user suggestions only.
+    """
+    kinds = [t.strip() for t in types.split(",") if t.strip()] if types else list(autocomplete.KINDS)
+    unknown = [k for k in kinds if k not in autocomplete.KINDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown type: {', '.join(unknown)}")
+    is_admin = current_user.get("role") == "admin"
+    college_id = current_user.get("college_id")
+    if college_id is None:
+        # Users and clubs are per college; without one nothing tenant-scoped may be suggested
+        raise HTTPException(status_code=403, detail="Autocomplete needs an account linked to a college")
+    
+    try:
+        connection = get_mysql_connection()
+        cursor = connection.cursor(dictionary=True)
+        suggestions = autocomplete_service.complete(
+            cursor, q, kinds, college_id=college_id, groups={"users": role}, limit=limit
+        )
+    except mysql.connector.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'connection' in locals():
+            connection.close()
+    
+    results = {}
+    for kind, items in suggestions.items():
+        results[kind] = [item.to_dict() for item in items]
+        if not is_admin:
+            for item in results[kind]:
+                item.pop("email", None)
+    return {"query": q, "suggestions": results}
+
+@app.get("/search")
+async def unified_search(
+    q: str,
+    entity: Optional[str] = None,
+    category: Optional[str] = None,
+    role: Optional[str] = None,
+    type: Optional[str] = None,
+    limit: int = 20,
+    current_user = Depends(auth.get_current_user)
+):
+    """Ranked prefix search across users, clubs, lost & found items and learning resources.
+
+    ``entity`` is a comma separated subset of users, clubs, lost_found, resources.
+    """
+    entities = [e.strip() for e in entity.split(",") if e.strip()] if entity else list(search_index.ENTITIES)
+    unknown = [e for e in entities if e not in search_index.ENTITIES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown entity: {', '.join(unknown)}")
+    is_admin = current_user.get("role") == "admin"
+    college_id = current_user.get("college_id")
+    if college_id is None:
+        # Results are scoped to the caller's college; without one there is nothing safe to show
+        raise HTTPException(status_code=403, detail="Search needs an account linked to a college")
+    
+    started = time_module.perf_counter()
+    try:
+        connection = get_mysql_connection()
+        cursor = connection.cursor(dictionary=True)
+
+        def query():
+            # Loading an entity builds its index; keep that and the scoring off the event loop
+            return search_service.search(
+                cursor, q, entities,
+                college_id=college_id,
+                filters={"category": category, "role": role, "type": type},
+                include_inactive=is_admin,
+                limit=max(1, min(limit, 100)),
+            )
+
+        hits = await asyncio.get_running_loop().run_in_executor(None, query)
+    except mysql.connector.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'connection' in locals():
+            connection.close()
+    
+    results = []
+    for hit in hits:
+        item = {"entity": hit.doc.entity, "id": hit.doc.id, "title": hit.doc.title, "score": round(hit.score, 3)}
+        item.update(hit.doc.payload)
+        if hit.doc.entity == "users" and not is_admin:
+            item.pop("email", None)
+        results.append(item)
+    
+    counts = {}
+    for item in results:
+        counts[item["entity"]] = counts.get(item["entity"], 0) + 1
+    return {
+        "query": q,
+        "results": results,
+        "counts": counts,
+        "took_ms": round((time_module.perf_counter() - started) * 1000, 2),
+    }
+
 # ============================================================================
 # CLUB EVENTS CALENDAR ENDPOINTS
 # ============================================================================
@@ -6462,11 +7242,257 @@ async def create_club_calendar_event_endpoint(club_id: int, event_data: dict, cu
     """Create a club event with calendar integration"""
     return await create_club_event_calendar(club_id, event_data, current_user)
 
+@app.put("/clubs/{club_id}/calendar/events/{event_id}/occurrences/{occurrence_date}")
+async def set_event_occurrence_override_endpoint(
+    club_id: int,
+    event_id: int,
+    occurrence_date: str,
+    override_data: dict,
+    current_user = Depends(auth.get_current_user)
+):
+    """Cancel (``{"cancelled": true}``), move or retime one occurrence of a recurring event"""
+    return await set_event_occurrence_override(club_id, event_id, occurrence_date, override_data, current_user)
+
+@app.delete("/clubs/{club_id}/calendar/events/{event_id}/occurrences/{occurrence_date}")
+async def clear_event_occurrence_override_endpoint(
+    club_id: int,
+    event_id: int,
+    occurrence_date: str,
+    current_user = Depends(auth.get_current_user)
+):
+    """Restore one occurrence of a recurring event to the series defaults"""
+    return await clear_event_occurrence_override(club_id, event_id, occurrence_date, current_user)
+
 @app.get("/clubs/{club_id}/calendar/{year}/{month}")
 async def get_club_calendar_endpoint(club_id: int, year: int, month: int, current_user = Depends(auth.get_current_user)):
     """Get club calendar for a specific month"""
     return await get_club_calendar(club_id, year, month, current_user)
 
+def _stream_user(request: Request, token: Optional[str]):
+    """Caller of an SSE stream: ``?token=`` (EventSource cannot send headers) or the bearer header; None if anonymous"""
+    header = request.headers.get("authorization") or ""
+    raw = token or (header.split(" ", 1)[1] if header.lower().startswith("bearer ") else None)
+    if not raw:
+        return None
+    return auth.get_current_user(HTTPAuthorizationCredentials(scheme="Bearer", credentials=raw))
+
+def _calendar_feed_user(cursor, request: Request, token: Optional[str], kind: str, club_id: int):
+    """Caller of a feed URL: a feed token from ``?token=`` (calendar apps) or the bearer header; None if anonymous.
+
+    Session JWTs are not accepted in the URL: they expire within the hour and would end up in proxy logs.
+    """
+    header = request.headers.get("authorization") or ""
+    if header.lower().startswith("bearer "):
+        return auth.get_current_user(HTTPAuthorizationCredentials(scheme="Bearer", credentials=header.split(" ", 1)[1]))
+    if not token:
+        return None
+    calendar_feed.ensure_tables(cursor)
+    user_id = calendar_feed.resolve_feed_token(cursor, token, kind, club_id)
+    if user_id is not None:
+        cursor.execute("SELECT * FROM users WHERE id = %s", (user_id,))
+        user = cursor.fetchone()
+        if user:
+            return user
+    raise HTTPException(status_code=401, detail="Invalid or revoked calendar feed token")
+
+def _is_calendar_member(cursor, club_id: int, user) -> bool:
+    """Approved members, admins and faculty see a club's private (is_public = FALSE) events"""
+    if user is None:
+        return False
+    if user.get("role") in ["admin", "faculty"]:
+        return True
+    cursor.execute(
+        "SELECT id FROM club_memberships WHERE club_id = %s AND user_id = %s AND status = 'approved'",
+        (club_id, user["id"])
+    )
+    return cursor.fetchone() is not None
+
+def _check_calendar_access(cursor, club_id: int, user):
+    """Public calendars are open; private ones need a member, admin or faculty"""
+    club = calendar_index.club(cursor, club_id)
+    if not club or not club.is_active:
+        raise HTTPException(status_code=404, detail="Club not found")
+    if club.calendar_public:
+        return club
+    if user is None:
+        raise HTTPException(status_code=401, detail="Authentication required for this calendar")
+    if not _is_calendar_member(cursor, club_id, user):
+        raise HTTPException(status_code=403, detail="Access denied to this club's calendar")
+    return club
+
+def _subscription_targets(cursor, club_id: int):
+    """(club ids, ids limited to public events) for a club's combined feed"""
+    cursor.execute(
+        """
+        SELECT target_club_id, subscription_type FROM calendar_subscriptions
+        WHERE subscriber_club_id = %s AND is_active = TRUE
+        """,
+        (club_id,)
+    )
+    rows = cursor.fetchall()
+    clubs = calendar_index.clubs(cursor, [row["target_club_id"] for row in rows])
+    targets = [
+        row for row in rows
+        if row["target_club_id"] in clubs and clubs[row["target_club_id"]].is_active and clubs[row["target_club_id"]].calendar_public
+    ]
+    club_ids = [club_id] + [row["target_club_id"] for row in targets]
+    public_only = [row["target_club_id"] for row in targets if row["subscription_type"] != "all_events"]
+    return club_ids, public_only
+
+def _calendar_feed_response(request: Request, feed, filename: str):
+    """text/calendar response with ETag / Last-Modified and 304 handling"""
+    from email.utils import formatdate, parsedate_to_datetime
+    from fastapi.responses import Response
+
+    headers = {
+        "ETag": feed.etag,
+        "Cache-Control": "private, no-cache",
+        "Content-Disposition": _inline_disposition(filename),
+    }
+    last_modified_ts = int(feed.last_modified.timestamp()) if feed.last_modified else None
+    if last_modified_ts is not None:
+        headers["Last-Modified"] = formatdate(last_modified_ts, usegmt=True)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        if feed.etag in [t.strip() for t in if_none_match.split(",")] or if_none_match.strip() == "*":
+            return Response(status_code=304, headers=headers)
+    elif last_modified_ts is not None and request.headers.get("if-modified-since"):
+        try:
+            since = parsedate_to_datetime(request.headers["if-modified-since"]).timestamp()
+            if last_modified_ts <= since:
+                return Response(status_code=304, headers=headers)
+        except (TypeError, ValueError):
+            pass
+    return Response(content=feed.body, media_type="text/calendar; charset=utf-8", headers=headers)
+
+@app.get("/calendar/{club_id}.ics")
+async def club_calendar_ics(club_id: int, request: Request, token: Optional[str] = None):
+    """iCalendar feed of a club's approved events (subscribe from Google/Apple/Outlook)"""
+    try:
+        connection = get_mysql_connection()
+        cursor = connection.cursor(dictionary=True)
+        user = _calendar_feed_user(cursor, request, token, "club", club_id)
+        club = _check_calendar_access(cursor, club_id, user)
+        # Non-members get the public events only; the two variants are cached separately
+        if _is_calendar_member(cursor, club_id, user):
+            feed = calendar_feed.get_feed(cursor, ("club", club_id, "members"), club.name, [club_id])
+        else:
+            feed = calendar_feed.get_feed(cursor, ("club", club_id, "public"), club.name, [club_id], [club_id])
+        return _calendar_feed_response(request, feed, f"club-{club_id}.ics")
+    except mysql.connector.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'connection' in locals():
+            connection.close()
+
+@app.get("/calendar/subscriptions/{club_id}.ics")
+async def club_subscriptions_calendar_ics(club_id: int, request: Request, token: Optional[str] = None):
+    """Combined iCalendar feed: the club's events plus the calendars it subscribes to"""
+    try:
+        connection = get_mysql_connection()
+        cursor = connection.cursor(dictionary=True)
+        user = _calendar_feed_user(cursor, request, token, "subscriptions", club_id)
+        club = _check_calendar_access(cursor, club_id, user)
+        club_ids, public_only = _subscription_targets(cursor, club_id)
+        visibility = "members" if _is_calendar_member(cursor, club_id, user) else "public"
+        if visibility == "public":
+            public_only.append(club_id)
+        feed = calendar_feed.get_feed(
+            cursor, ("subscriptions", club_id, visibility), f"{club.name} + subscriptions", club_ids, public_only
+        )
+        return _calendar_feed_response(request, feed, f"club-{club_id}-subscriptions.ics")
+    except mysql.connector.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'connection' in locals():
+            connection.close()
+
+@app.post("/calendar/{club_id}/feed-tokens")
+async def create_calendar_feed_token(club_id: int, kind: str = "club", current_user = Depends(auth.get_current_user)):
+    """Long-lived, revocable token for subscribing to one private feed from a calendar app"""
+    if kind not in calendar_feed.FEED_KINDS:
+        raise HTTPException(status_code=400, detail=f"kind must be one of {list(calendar_feed.FEED_KINDS)}")
+    try:
+        connection = get_mysql_connection()
+        cursor = connection.cursor(dictionary=True)
+        _check_calendar_access(cursor, club_id, current_user)
+        calendar_feed.ensure_tables(cursor)
+        token_id, token = calendar_feed.issue_feed_token(cursor, current_user["id"], kind, club_id)
+        connection.commit()
+        path = f"/calendar/{club_id}.ics" if kind == "club" else f"/calendar/subscriptions/{club_id}.ics"
+        return {"id": token_id, "token": token, "feed_url": f"{path}?token={token}", "kind": kind, "club_id": club_id}
+    except mysql.connector.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'connection' in locals():
+            connection.close()
+
+@app.get("/calendar/feed-tokens")
+async def list_calendar_feed_tokens(current_user = Depends(auth.get_current_user)):
+    """The caller's active feed tokens (without the secrets)"""
+    try:
+        connection = get_mysql_connection()
+        cursor = connection.cursor(dictionary=True)
+        calendar_feed.ensure_tables(cursor)
+        return {"tokens": calendar_feed.list_feed_tokens(cursor, current_user["id"])}
+    except mysql.connector.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'connection' in locals():
+            connection.close()
+
+@app.delete("/calendar/feed-tokens/{token_id}")
+async def revoke_calendar_feed_token(token_id: int, current_user = Depends(auth.get_current_user)):
+    """Revoke one of the caller's feed tokens; calendar apps using it get 401 from then on"""
+    try:
+        connection = get_mysql_connection()
+        cursor = connection.cursor(dictionary=True)
+        calendar_feed.ensure_tables(cursor)
+        if not calendar_feed.revoke_feed_token(cursor, token_id, current_user["id"]):
+            raise HTTPException(status_code=404, detail="Feed token not found")
+        connection.commit()
+        return {"success": True, "id": token_id}
+    except mysql.connector.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'connection' in locals():
+            connection.close()
+
+@app.get("/calendar/{club_id}/changes")
+async def club_calendar_changes(
+    club_id: int,
+    sync_token: Optional[str] = None,
+    include_subscriptions: bool = False,
+    current_user = Depends(auth.get_current_user)
+):
+    """Events changed since ``sync_token``; pass the returned token on the next call"""
+    try:
+        connection = get_mysql_connection()
+        cursor = connection.cursor(dictionary=True)
+        _check_calendar_access(cursor, club_id, current_user)
+        club_ids, public_only = _subscription_targets(cursor, club_id) if include_subscriptions else ([club_id], [])
+        if not _is_calendar_member(cursor, club_id, current_user):
+            public_only.append(club_id)
+        return calendar_feed.changes_since(cursor, club_ids, sync_token, public_only)
+    except mysql.connector.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'connection' in locals():
+            connection.close()
+
 @app.get("/calendar/{year}/{month}")
 async def get_all_clubs_calendar_endpoint(
     year: int, 
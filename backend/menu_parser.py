@@ -8,14 +8,6 @@ import re
 from dataclasses import dataclass
 from typing import Iterable, List, Optional
 
-from PIL import Image
-
-# Attempt to import pdfplumber lazily
-try:  # pragma: no cover - optional dependency pattern
-    import pdfplumber  # type: ignore
-except Exception:  # pragma: no cover
-    pdfplumber = None  # type: ignore
-
 # Optional pytesseract import is handled via existing ocr_fallback helper
 try:  # pragma: no cover
     from ocr_fallback import ocr_image_to_text
@@ -61,7 +53,9 @@ def extract_text_from_pdf_bytes(data: bytes) -> str:
     if not data:
         return ""
 
-    if pdfplumber is None:  # pragma: no cover - dependency missing at runtime
+    try:  # pragma: no cover - optional dependency, imported on first use
+        import pdfplumber  # type: ignore
+    except Exception:  # pragma: no cover - dependency missing at runtime
         raise RuntimeError(
             "pdfplumber is not installed. Please ensure pdfplumber is available to extract PDF text."
         )
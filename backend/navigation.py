@@ -1,8 +1,10 @@
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
+from array import array
 import heapq
 import re
+import time
 
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -19,14 +21,22 @@ app.add_middleware(
 
 # === Campus Graph Definition ===
 graph: Dict[str, List[tuple]] = {}
+# Same edges as `graph`, tagged with how they are traversed: walk, lift or stairs
+typed_graph: Dict[str, List[Tuple[str, float, str]]] = {}
 
-def add_edge(frm: str, to: str, dist: float):
+def add_edge(frm: str, to: str, dist: float, kind: str = "walk"):
     if frm not in graph:
         graph[frm] = []
     if to not in graph:
         graph[to] = []
     graph[frm].append((to, dist))
     graph[to].append((frm, dist))  # bidirectional
+    add_typed_edge(frm, to, dist, kind)
+
+def add_typed_edge(frm: str, to: str, dist: float, kind: str):
+    # Edges only the profile-aware router sees; `graph` (and the default profile) stays step-free
+    typed_graph.setdefault(frm, []).append((to, dist, kind))
+    typed_graph.setdefault(to, []).append((frm, dist, kind))
 
 # --- Ground Floor ---
 add_edge("Entry/Exit North", "6-Lift Area G", 20)
@@ -80,7 +90,12 @@ lift_pairs = [
 ]
 
 for up, down in lift_pairs:
-    add_edge(up, down, 30)  # 30m equivalent for lift time
+    add_edge(up, down, 30, kind="lift")  # 30m equivalent for lift time
+
+# --- Inter-floor Stairs ---
+# Stairwells sit beside both lift cores, so they share the lift lobby nodes
+for up, down in lift_pairs:
+    add_typed_edge(up, down, 20, "stairs")  # one flight ~20m walking equivalent
 
 # === Node Coordinates (Percent-based) ===
 node_coords = {
@@ -124,6 +139,20 @@ node_coords = {
 }
 
 # === Room Mapping Logic ===
+# (prefix, first number, last number, graph node)
+ROOM_RANGES = [
+    ("C", 1, 9, "Classrooms C001-C009"),
+    ("C", 10, 10, "Classroom C010"),
+    ("C", 101, 101, "Classroom C101"),
+    ("C", 201, 212, "Classrooms C201-C212"),
+    ("C", 301, 306, "C301-C306"),
+    ("L", 101, 108, "Labs L101-L108"),
+    ("L", 109, 110, "Labs L109-L110"),
+    ("L", 111, 111, "Lab L111"),
+    ("L", 201, 208, "Labs L201-L208"),
+    ("L", 209, 210, "BI Labs L209-L210"),
+]
+
 def resolve_room(room_query: str) -> Optional[str]:
     """
     Try to resolve a room code (e.g. C005, L103) to its parent group node.
@@ -143,21 +172,7 @@ def resolve_room(room_query: str) -> Optional[str]:
     prefix, num_str = match.groups()
     num = int(num_str)
 
-    # Define room ranges
-    ranges = [
-        ("C", 1, 9, "Classrooms C001-C009"),
-        ("C", 10, 10, "Classroom C010"),
-        ("C", 101, 101, "Classroom C101"),
-        ("C", 201, 212, "Classrooms C201-C212"),
-        ("C", 301, 306, "C301-C306"),
-        ("L", 101, 108, "Labs L101-L108"),
-        ("L", 109, 110, "Labs L109-L110"),
-        ("L", 111, 111, "Lab L111"),
-        ("L", 201, 208, "Labs L201-L208"),
-        ("L", 209, 210, "BI Labs L209-L210"),
-    ]
-
-    for p, low, high, node_name in ranges:
+    for p, low, high, node_name in ROOM_RANGES:
         if prefix.upper() == p.upper() and low <= num <= high:
             return node_name
 
@@ -203,82 +218,381 @@ def dijkstra(start: str, end: str) -> Optional[List[str]]:
     path.reverse()
     return path if path[0] == start else None
 
+# === Precomputed Route Table ===
+_NO_HOP = 0xFFFF
+_ROOM_CODE_RE = re.compile(r"^([A-Z]+)(\d+)$")
+
+class RouteTable:
+    """All-pairs shortest paths over the static campus graph.
+
+    Built once at import: one Dijkstra per node fills a flat next-hop matrix
+    (``array('H')``) and distance matrix (``array('f')``), so a route is read
+    back in O(path length) without searching. Room codes and node names are
+    resolved through a prebuilt dictionary instead of regex + range scans.
+    """
+
+    def __init__(self, adjacency: Dict[str, List[tuple]]):
+        self.nodes: List[str] = list(adjacency)
+        self.index: Dict[str, int] = {name: i for i, name in enumerate(self.nodes)}
+        n = len(self.nodes)
+        self.size = n
+        self.next_hop = array("H", [_NO_HOP]) * (n * n)
+        self.dist = array("f", [float("inf")]) * (n * n)
+        neighbours = [
+            [(self.index[v], w) for v, w in adjacency[name]] for name in self.nodes
+        ]
+        for target in range(n):
+            self._fill_towards(target, neighbours)
+        self.lookup = self._build_lookup()
+
+    def _fill_towards(self, target: int, neighbours: List[List[Tuple[int, float]]]) -> None:
+        # The graph is undirected, so the shortest-path tree rooted at `target`
+        # gives, for every node, its next hop towards `target`.
+        n = self.size
+        best = {target: 0.0}
+        heap = [(0.0, target)]
+        self.next_hop[target * n + target] = target
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > best[u]:
+                continue
+            self.dist[u * n + target] = d
+            for v, w in neighbours[u]:
+                nd = d + w
+                if nd < best.get(v, float("inf")):
+                    best[v] = nd
+                    self.next_hop[v * n + target] = u
+                    heapq.heappush(heap, (nd, v))
+
+    def _build_lookup(self) -> Dict[str, str]:
+        lookup: Dict[str, str] = {}
+        for name in self.nodes:
+            lookup[name.upper()] = name
+        for prefix, low, high, node_name in ROOM_RANGES:
+            for num in range(low, high + 1):
+                # Accept both zero-padded (C005) and plain (C5) codes
+                lookup.setdefault(f"{prefix}{num:03d}", node_name)
+                lookup.setdefault(f"{prefix}{num}", node_name)
+        return lookup
+
+    def resolve(self, query: str) -> Optional[str]:
+        """Exact node name or room code via the lookup table, then substring match."""
+        key = query.strip().upper()
+        if not key:
+            return None
+        node = self.lookup.get(key)
+        if node:
+            return node
+        match = _ROOM_CODE_RE.match(key)
+        if match:
+            node = self.lookup.get(f"{match.group(1)}{int(match.group(2))}")
+            if node:
+                return node
+        lowered = key.lower()
+        return next((n for n in self.nodes if lowered in n.lower()), None)
+
+    def path(self, start: str, end: str) -> Optional[List[str]]:
+        if start not in self.index or end not in self.index:
+            return None
+        n = self.size
+        target = self.index[end]
+        current = self.index[start]
+        if self.next_hop[current * n + target] == _NO_HOP:
+            return None
+        path = [start]
+        while current != target:
+            current = self.next_hop[current * n + target]
+            path.append(self.nodes[current])
+        return path
+
+    def distance(self, start: str, end: str) -> Optional[float]:
+        if start not in self.index or end not in self.index:
+            return None
+        d = self.dist[self.index[start] * self.size + self.index[end]]
+        return None if d == float("inf") else float(d)
+
+route_table = RouteTable(graph)
+
+
+def benchmark(iterations: int = 20) -> Dict[str, float]:
+    """Compare per-request Dijkstra with the precomputed table over all node pairs."""
+    pairs = [(a, b) for a in route_table.nodes for b in route_table.nodes]
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for a, b in pairs:
+            dijkstra(a, b)
+    dijkstra_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for a, b in pairs:
+            route_table.path(a, b)
+    table_s = time.perf_counter() - started
+
+    queries = iterations * len(pairs)
+    return {
+        "nodes": route_table.size,
+        "queries": queries,
+        "dijkstra_us_per_query": round(dijkstra_s / queries * 1e6, 3),
+        "table_us_per_query": round(table_s / queries * 1e6, 3),
+        "speedup": round(dijkstra_s / table_s, 1) if table_s else float("inf"),
+        "table_bytes": route_table.next_hop.itemsize * len(route_table.next_hop)
+        + route_table.dist.itemsize * len(route_table.dist),
+    }
+
+# === Node Positions ===
+FLOOR_LEVELS = {"ground": 0, "first": 1, "second": 2, "third": 3}
+
+def _infer_floor(node: str) -> str:
+    """Floor of a node without coordinates: follow walk edges to a node that has one."""
+    seen = {node}
+    frontier = [node]
+    while frontier:
+        current = frontier.pop()
+        if current in node_coords:
+            return node_coords[current]["floor"]
+        for neighbor, _, kind in typed_graph.get(current, []):
+            if kind == "walk" and neighbor not in seen:
+                seen.add(neighbor)
+                frontier.append(neighbor)
+    lowered = node.lower()
+    if "first" in lowered: return "first"
+    if "second" in lowered: return "second"
+    if "third" in lowered: return "third"
+    return "ground"
+
+def _approximate_position(node: str, floor: str) -> dict:
+    # Approximate position based on area
+    lowered = node.lower()
+    base_x, base_y = 50, 50
+    if "lift" in lowered:
+        base_x = 70 if "6-" in node else 30
+        base_y = 70
+    elif "class" in lowered:
+        base_x, base_y = 25, 50
+    elif "lab" in lowered:
+        base_x, base_y = 75, 50
+    elif "auditorium" in lowered:
+        base_x, base_y = 70, 40
+    return {"floor": floor, "x": base_x, "y": base_y}
+
+node_positions: Dict[str, dict] = {
+    node: node_coords.get(node) or _approximate_position(node, _infer_floor(node))
+    for node in graph
+}
+
+# === Routing Profiles & A* ===
+class RouteProfile:
+    """How edges are costed for one kind of traveller.
+
+    ``allowed_kinds`` filters edges (e.g. no stairs for lift-only users),
+    ``multipliers`` scales edge cost per kind, and ``floor_change_cost`` is
+    added for every floor crossed on a lift or stairs edge.
+    """
+
+    def __init__(self, name: str, allowed_kinds: Tuple[str, ...], multipliers: Optional[Dict[str, float]] = None,
+                 floor_change_cost: float = 0.0):
+        self.name = name
+        self.allowed_kinds = frozenset(allowed_kinds)
+        self.multipliers = multipliers or {}
+        self.floor_change_cost = floor_change_cost
+        self._bounds: Optional[Tuple[float, float]] = None
+
+    def edge_cost(self, u: str, v: str, dist: float, kind: str) -> Optional[float]:
+        if kind not in self.allowed_kinds:
+            return None
+        cost = dist * self.multipliers.get(kind, 1.0)
+        floors = abs(FLOOR_LEVELS[node_positions[u]["floor"]] - FLOOR_LEVELS[node_positions[v]["floor"]])
+        return cost + floors * self.floor_change_cost
+
+    def heuristic_bounds(self) -> Tuple[float, float]:
+        """Per-unit planar and per-floor lower bounds that keep the A* heuristic consistent.
+
+        Every allowed edge satisfies ``cost >= floor_lb * floors + planar_lb * planar``,
+        so the heuristic never overestimates along any path.
+        """
+        if self._bounds is None:
+            floor_lb = float("inf")
+            for u, edges in typed_graph.items():
+                for v, dist, kind in edges:
+                    cost = self.edge_cost(u, v, dist, kind)
+                    floors = abs(FLOOR_LEVELS[node_positions[u]["floor"]] - FLOOR_LEVELS[node_positions[v]["floor"]])
+                    if cost is not None and floors:
+                        floor_lb = min(floor_lb, cost / floors)
+            floor_lb = 0.0 if floor_lb == float("inf") else floor_lb
+            planar_lb = float("inf")
+            for u, edges in typed_graph.items():
+                for v, dist, kind in edges:
+                    cost = self.edge_cost(u, v, dist, kind)
+                    planar = _planar_distance(u, v)
+                    if cost is None or planar == 0:
+                        continue
+                    floors = abs(FLOOR_LEVELS[node_positions[u]["floor"]] - FLOOR_LEVELS[node_positions[v]["floor"]])
+                    planar_lb = min(planar_lb, max(0.0, cost - floor_lb * floors) / planar)
+            planar_lb = 0.0 if planar_lb == float("inf") else planar_lb
+            self._bounds = (planar_lb, floor_lb)
+        return self._bounds
+
+ROUTE_PROFILES: Dict[str, RouteProfile] = {
+    p.name: p for p in [
+        # Served from route_table, which is built over the step-free `graph`
+        RouteProfile("default", ("walk", "lift")),
+        # Accessibility: never route over stairs
+        RouteProfile("lift_only", ("walk", "lift")),
+        # Lifts out of service / fire drill
+        RouteProfile("stairs_only", ("walk", "stairs")),
+        # Heavily penalise changing floors, e.g. when carrying equipment
+        RouteProfile("fewest_floor_changes", ("walk", "lift", "stairs"), floor_change_cost=100.0),
+    ]
+}
+
+def _planar_distance(u: str, v: str) -> float:
+    a, b = node_positions[u], node_positions[v]
+    return ((a["x"] - b["x"]) ** 2 + (a["y"] - b["y"]) ** 2) ** 0.5
+
+def astar(start: str, end: str, profile: RouteProfile) -> Optional[Tuple[List[str], float]]:
+    """A* over ``typed_graph`` using planar distance + floor difference as heuristic.
+
+    Returns ``(path, cost)`` where cost is in profile units, or None if the
+    profile leaves the two nodes disconnected.
+    """
+    if start not in typed_graph or end not in typed_graph:
+        return None
+    planar_lb, floor_lb = profile.heuristic_bounds()
+    goal_floor = FLOOR_LEVELS[node_positions[end]["floor"]]
+
+    def h(node: str) -> float:
+        floors = abs(FLOOR_LEVELS[node_positions[node]["floor"]] - goal_floor)
+        return planar_lb * _planar_distance(node, end) + floor_lb * floors
+
+    best = {start: 0.0}
+    came_from: Dict[str, Optional[str]] = {start: None}
+    heap = [(h(start), 0.0, start)]
+    while heap:
+        _, g, current = heapq.heappop(heap)
+        if current == end:
+            path = []
+            step: Optional[str] = end
+            while step is not None:
+                path.append(step)
+                step = came_from[step]
+            path.reverse()
+            return path, g
+        if g > best[current]:
+            continue
+        for neighbor, dist, kind in typed_graph[current]:
+            cost = profile.edge_cost(current, neighbor, dist, kind)
+            if cost is None:
+                continue
+            ng = g + cost
+            if ng < best.get(neighbor, float("inf")):
+                best[neighbor] = ng
+                came_from[neighbor] = current
+                heapq.heappush(heap, (ng + h(neighbor), ng, neighbor))
+    return None
+
+def path_distance(path: List[str], profile: Optional[RouteProfile] = None) -> float:
+    """Physical length of a path, using the cheapest edge the profile allows between each hop."""
+    total = 0.0
+    for u, v in zip(path, path[1:]):
+        options = [
+            dist for neighbor, dist, kind in typed_graph[u]
+            if neighbor == v and (profile is None or kind in profile.allowed_kinds)
+        ]
+        total += min(options) if options else 0.0
+    return total
+
 # === API Model ===
 class RouteRequest(BaseModel):
     start: str
     end: str
+    profile: Optional[str] = None  # default, lift_only, stairs_only, fewest_floor_changes
 
 class RouteResponse(BaseModel):
     path: List[str]
     coordinates: List[dict]
     total_distance: float  # Add total distance
 
-@app.post("/route", response_model=RouteResponse)
-async def get_route(request: RouteRequest):
-    start_raw = request.start.strip()
-    end_raw = request.end.strip()
+class RoutePair(BaseModel):
+    start: str
+    end: str
+
+class BatchRouteRequest(BaseModel):
+    pairs: List[RoutePair]
+    profile: Optional[str] = None
 
+MAX_BATCH_PAIRS = 200
+
+def _get_profile(name: Optional[str]) -> RouteProfile:
+    profile = ROUTE_PROFILES.get(name or "default")
+    if profile is None:
+        raise HTTPException(status_code=400, detail=f"Unknown profile '{name}'. Options: {', '.join(ROUTE_PROFILES)}")
+    return profile
+
+def _find_route(start_raw: str, end_raw: str, profile: RouteProfile) -> dict:
+    """Resolve both endpoints and compute a route. Raises HTTPException(404) on failure."""
     # Resolve start point
-    start_node = resolve_room(start_raw)
-    if not start_node:
-        start_node = next((n for n in graph.keys() if start_raw.lower() in n.lower()), None)
+    start_node = route_table.resolve(start_raw)
     if not start_node:
         raise HTTPException(status_code=404, detail=f"Start location '{start_raw}' not found.")
 
     # Resolve end point
-    end_node = resolve_room(end_raw)
-    if not end_node:
-        end_node = next((n for n in graph.keys() if end_raw.lower() in n.lower()), None)
+    end_node = route_table.resolve(end_raw)
     if not end_node:
         raise HTTPException(status_code=404, detail=f"End location '{end_raw}' not found.")
 
-    # Find shortest path
-    path = dijkstra(start_node, end_node)
+    if profile.name == "default":
+        # Read shortest path from the precomputed table
+        path = route_table.path(start_node, end_node)
+        total_distance = route_table.distance(start_node, end_node) or 0.0
+    else:
+        found = astar(start_node, end_node, profile)
+        path = found[0] if found else None
+        total_distance = path_distance(path, profile) if path else 0.0
     if not path:
         raise HTTPException(status_code=404, detail="No path found between locations.")
 
-    # Calculate total distance
-    total_distance = 0.0
-    for i in range(len(path) - 1):
-        u, v = path[i], path[i+1]
-        for neighbor, weight in graph[u]:
-            if neighbor == v:
-                total_distance += weight
-                break
-
-    # Generate coordinates
-    coords = []
-    for node in path:
-        coord = node_coords.get(node)
-        if coord:
-            coords.append({**coord, "node": node})
-        else:
-            # Infer floor from name
-            inferred_floor = "ground"
-            if "first" in node.lower(): inferred_floor = "first"
-            elif "second" in node.lower(): inferred_floor = "second"
-            elif "third" in node.lower(): inferred_floor = "third"
-            # Approximate position based on area
-            base_x, base_y = 50, 50
-            if "lift" in node.lower():
-                base_x = 70 if "6-" in node else 30
-                base_y = 70
-            elif "class" in node.lower():
-                base_x, base_y = 25, 50
-            elif "lab" in node.lower():
-                base_x, base_y = 75, 50
-            elif "auditorium" in node.lower():
-                base_x, base_y = 70, 40
-
-            coords.append({
-                "node": node,
-                "floor": inferred_floor,
-                "x": base_x,
-                "y": base_y
-            })
-
+    coords = [{**node_positions[node], "node": node} for node in path]
     return {
         "path": path,
         "coordinates": coords,
         "total_distance": round(total_distance, 2)
-    }
\ No newline at end of file
+    }
+
+@app.post("/route", response_model=RouteResponse)
+async def get_route(request: RouteRequest):
+    profile = _get_profile(request.profile)
+    return _find_route(request.start.strip(), request.end.strip(), profile)
+
+@app.post("/route/batch")
+async def get_routes_batch(request: BatchRouteRequest):
+    """Answer many (start, end) pairs in one call, e.g. routes between consecutive classes.
+    Each result carries either the route or the per-pair error."""
+    if len(request.pairs) > MAX_BATCH_PAIRS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_PAIRS} pairs per batch")
+    profile = _get_profile(request.profile)
+    results = []
+    memo: Dict[Tuple[str, str], dict] = {}
+    for pair in request.pairs:
+        key = (pair.start.strip(), pair.end.strip())
+        if key not in memo:
+            try:
+                memo[key] = {"ok": True, **_find_route(key[0], key[1], profile)}
+            except HTTPException as e:
+                memo[key] = {"ok": False, "error": e.detail}
+        results.append({"start": key[0], "end": key[1], **memo[key]})
+    return {"profile": profile.name, "results": results}
+
+@app.get("/route/profiles")
+async def list_route_profiles():
+    return {
+        "profiles": [
+            {"name": p.name, "allowed": sorted(p.allowed_kinds), "floor_change_cost": p.floor_change_cost}
+            for p in ROUTE_PROFILES.values()
+        ]
+    }
+
+
+if __name__ == "__main__":
+    print(benchmark())
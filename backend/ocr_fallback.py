@@ -2,13 +2,22 @@ import os
 import io
 import re
 from typing import List, Dict
-from PIL import Image
 
-# Optional import: keep runtime safe if not installed
-try:
-    import pytesseract
-except Exception:  # pragma: no cover
-    pytesseract = None  # type: ignore
+# PIL and pytesseract are imported on first OCR call to keep API startup fast
+pytesseract = None  # type: ignore
+_tesseract_checked = False
+
+
+def _load_tesseract():
+    global pytesseract, _tesseract_checked
+    if not _tesseract_checked:
+        _tesseract_checked = True
+        try:
+            import pytesseract as _pytesseract
+            pytesseract = _pytesseract
+        except Exception:  # pragma: no cover
+            pytesseract = None  # type: ignore
+    return pytesseract
 
 DAY_NAMES = [
     "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"
@@ -22,13 +31,15 @@ def ocr_image_to_text(image_bytes: bytes, mime_type: str | None = None) -> str:
     """Run OCR locally using Tesseract, if available. Returns recognized text.
     Raises RuntimeError if pytesseract or tesseract binary is not available.
     """
-    if pytesseract is None:
+    if _load_tesseract() is None:
         raise RuntimeError("pytesseract not installed. Please add pytesseract to requirements and install Tesseract OCR.")
 
     t_cmd = os.getenv("TESSERACT_CMD") or os.getenv("TESSERACT_PATH")
     if t_cmd:
         pytesseract.pytesseract.tesseract_cmd = t_cmd  # type: ignore[attr-defined]
 
+    from PIL import Image
+
     try:
         img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
     except Exception as e:  # pragma: no cover
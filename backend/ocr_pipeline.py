@@ -0,0 +1,272 @@
+"""Tiered OCR pipeline for timetable and canteen menu uploads.
+
+Documents are first read with local Tesseract/pdfplumber and parsed with the
+existing heuristic parsers. The parse is scored for confidence and only
+low-confidence documents are escalated to Gemini. Per-tier hit rates and
+latency are recorded in-process so the cost/latency trade-off can be tuned.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from ocr_fallback import DAY_NAMES, TIME_RE, parse_timetable_text
+
+try:  # pragma: no cover - optional dependency pattern
+    from ocr_fallback import ocr_image_to_text
+except Exception:  # pragma: no cover
+    ocr_image_to_text = None  # type: ignore
+
+try:  # pragma: no cover
+    from menu_parser import extract_text_from_pdf_bytes, parse_menu_text_to_items
+except Exception:  # pragma: no cover
+    extract_text_from_pdf_bytes = None  # type: ignore
+    parse_menu_text_to_items = None  # type: ignore
+
+LOGGER = logging.getLogger(__name__)
+
+TIER_CACHE = "cache"
+TIER_LOCAL = "local"
+TIER_GEMINI = "gemini"
+
+# Documents scoring below this are escalated to Gemini
+CONFIDENCE_THRESHOLD = float(os.getenv("OCR_LOCAL_CONFIDENCE_THRESHOLD", "0.6"))
+
+# A weekly timetable / a menu with fewer entries than this is treated as a partial read
+MIN_EXPECTED_ROWS = 5
+
+MAX_REASONABLE_PRICE = 2000.0
+
+_LETTER_RE = re.compile(r"[A-Za-z]{2,}")
+
+
+@dataclass
+class OcrResult:
+    rows: List[Dict]
+    tier: str
+    confidence: float
+    latency_ms: float
+    text: str = ""
+
+
+@dataclass
+class _TierCounter:
+    attempts: int = 0
+    accepted: int = 0
+    errors: int = 0
+    total_latency_ms: float = 0.0
+
+    def as_dict(self) -> Dict:
+        return {
+            "attempts": self.attempts,
+            "accepted": self.accepted,
+            "errors": self.errors,
+            "hit_rate": round(self.accepted / self.attempts, 4) if self.attempts else 0.0,
+            "avg_latency_ms": round(self.total_latency_ms / self.attempts, 2) if self.attempts else 0.0,
+        }
+
+
+@dataclass
+class OcrPipelineStats:
+    """Thread-safe per-document-kind, per-tier counters."""
+
+    _counters: Dict[Tuple[str, str], _TierCounter] = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def record(self, kind: str, tier: str, latency_ms: float, accepted: bool, error: bool = False) -> None:
+        with self._lock:
+            counter = self._counters.setdefault((kind, tier), _TierCounter())
+            counter.attempts += 1
+            counter.total_latency_ms += latency_ms
+            if accepted:
+                counter.accepted += 1
+            if error:
+                counter.errors += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            out: Dict[str, Dict] = {}
+            for (kind, tier), counter in self._counters.items():
+                out.setdefault(kind, {})[tier] = counter.as_dict()
+            return out
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+
+
+pipeline_stats = OcrPipelineStats()
+
+
+# === Local text extraction ===
+
+def extract_text_local(data: bytes, mime_type: Optional[str]) -> str:
+    """Extract text with local tooling only (pdfplumber for PDFs, Tesseract for images)."""
+    mime = (mime_type or "").lower()
+    if "pdf" in mime:
+        if extract_text_from_pdf_bytes is None:
+            raise RuntimeError("pdfplumber is not available for local PDF extraction")
+        return extract_text_from_pdf_bytes(data)
+    if ocr_image_to_text is None:
+        raise RuntimeError("Local OCR is not configured")
+    return ocr_image_to_text(data, mime_type)
+
+
+# === Confidence scoring ===
+
+def _hhmm_to_minutes(value: str) -> Optional[int]:
+    try:
+        hours, minutes = value.split(":")[:2]
+        return int(hours) * 60 + int(minutes)
+    except (ValueError, AttributeError):
+        return None
+
+
+def _weighted_score(valid: int, total: int, coverage: float) -> float:
+    if total == 0:
+        return 0.0
+    validity = valid / total
+    volume = min(1.0, total / MIN_EXPECTED_ROWS)
+    return round(0.5 * validity + 0.3 * min(1.0, coverage) + 0.2 * volume, 4)
+
+
+def score_timetable_rows(rows: List[Dict], text: str) -> float:
+    """Score a heuristic timetable parse between 0 and 1.
+
+    Combines the fraction of plausible rows (known weekday, start before end,
+    within teaching hours, real subject text), how many time-range lines in the
+    text were turned into rows, and whether enough rows were found overall.
+    """
+    if not rows:
+        return 0.0
+
+    valid = 0
+    for row in rows:
+        start = _hhmm_to_minutes(row.get("start_time", ""))
+        end = _hhmm_to_minutes(row.get("end_time", ""))
+        if (
+            row.get("day_of_week") in DAY_NAMES
+            and start is not None and end is not None
+            and 7 * 60 <= start < end <= 21 * 60
+            and _LETTER_RE.search(row.get("subject") or "")
+        ):
+            valid += 1
+
+    time_lines = sum(1 for ln in (text or "").splitlines() if TIME_RE.search(ln))
+    coverage = len(rows) / time_lines if time_lines else 0.0
+    return _weighted_score(valid, len(rows), coverage)
+
+
+def score_menu_items(items: List[Dict], text: str) -> float:
+    """Score a heuristic menu parse between 0 and 1 (same weighting as timetables)."""
+    if not items:
+        return 0.0
+
+    valid = sum(
+        1 for it in items
+        if 0 < float(it.get("price") or 0) <= MAX_REASONABLE_PRICE and _LETTER_RE.search(it.get("name") or "")
+    )
+    candidate_lines = sum(
+        1 for ln in (text or "").splitlines() if ln.strip() and any(ch.isdigit() for ch in ln)
+    )
+    coverage = len(items) / candidate_lines if candidate_lines else 0.0
+    return _weighted_score(valid, len(items), coverage)
+
+
+# === Local parsers ===
+
+def _local_timetable(data: bytes, mime_type: Optional[str]) -> Tuple[List[Dict], str]:
+    text = extract_text_local(data, mime_type)
+    return parse_timetable_text(text), text
+
+
+def _local_menu(data: bytes, mime_type: Optional[str]) -> Tuple[List[Dict], str]:
+    if parse_menu_text_to_items is None:
+        raise RuntimeError("Menu parser is not available")
+    text = extract_text_local(data, mime_type)
+    items = [
+        {
+            "name": it.name,
+            "price": it.price,
+            "category": it.category,
+            "is_vegetarian": it.is_vegetarian,
+            "description": it.description,
+        }
+        for it in parse_menu_text_to_items(text)
+    ]
+    return items, text
+
+
+# === Pipeline ===
+
+def run_tiered(
+    kind: str,
+    data: bytes,
+    mime_type: Optional[str],
+    local_parse: Callable[[bytes, Optional[str]], Tuple[List[Dict], str]],
+    scorer: Callable[[List[Dict], str], float],
+    remote_parse: Optional[Callable[[bytes, Optional[str]], List[Dict]]] = None,
+    threshold: Optional[float] = None,
+) -> OcrResult:
+    """Run the local tier and escalate to ``remote_parse`` only when confidence is low.
+
+    If the remote tier is unavailable or fails, a non-empty local parse is
+    returned as a best effort; otherwise the remote error is re-raised.
+    """
+    threshold = CONFIDENCE_THRESHOLD if threshold is None else threshold
+
+    local_rows: List[Dict] = []
+    local_text = ""
+    confidence = 0.0
+    started = time.perf_counter()
+    try:
+        local_rows, local_text = local_parse(data, mime_type)
+        confidence = scorer(local_rows, local_text)
+        local_error = False
+    except Exception as exc:
+        LOGGER.info("Local %s OCR unavailable or failed: %s", kind, exc)
+        local_error = True
+    local_ms = (time.perf_counter() - started) * 1000
+    accepted = not local_error and confidence >= threshold
+    pipeline_stats.record(kind, TIER_LOCAL, local_ms, accepted=accepted, error=local_error)
+
+    if accepted or remote_parse is None:
+        return OcrResult(local_rows, TIER_LOCAL, confidence, round(local_ms, 2), local_text)
+
+    LOGGER.info("Escalating %s to Gemini (local confidence %.2f < %.2f)", kind, confidence, threshold)
+    started = time.perf_counter()
+    try:
+        remote_rows = remote_parse(data, mime_type)
+    except Exception:
+        remote_ms = (time.perf_counter() - started) * 1000
+        pipeline_stats.record(kind, TIER_GEMINI, remote_ms, accepted=False, error=True)
+        if local_rows:
+            return OcrResult(local_rows, TIER_LOCAL, confidence, round(local_ms + remote_ms, 2), local_text)
+        raise
+    remote_ms = (time.perf_counter() - started) * 1000
+    pipeline_stats.record(kind, TIER_GEMINI, remote_ms, accepted=bool(remote_rows))
+    return OcrResult(remote_rows, TIER_GEMINI, 1.0 if remote_rows else 0.0, round(local_ms + remote_ms, 2))
+
+
+def run_timetable_pipeline(
+    data: bytes,
+    mime_type: Optional[str],
+    remote_parse: Optional[Callable[[bytes, Optional[str]], List[Dict]]] = None,
+) -> OcrResult:
+    """Parse a timetable upload, escalating to ``remote_parse`` for low-confidence reads."""
+    return run_tiered("timetable", data, mime_type, _local_timetable, score_timetable_rows, remote_parse)
+
+
+def run_menu_pipeline(
+    data: bytes,
+    mime_type: Optional[str],
+    remote_parse: Optional[Callable[[bytes, Optional[str]], List[Dict]]] = None,
+) -> OcrResult:
+    """Parse a canteen menu upload, escalating to ``remote_parse`` for low-confidence reads."""
+    return run_tiered("menu", data, mime_type, _local_menu, score_menu_items, remote_parse)
@@ -0,0 +1,414 @@
+"""Sparse "people you may know" index for networking recommendations.
+
+Each student is embedded as a sparse vector of weighted features: course,
+department, skills (``student_skills``), interests (``users.interests_json``
+and ``user_interest_categories``) and approved club memberships. Features
+are IDF-weighted per college so rare overlaps (a niche skill, a small club)
+count more than everyone sharing the same department, and rows are
+L2-normalised so a single sparse matrix-vector product yields cosine scores
+for the whole college.
+
+Students are only compared within their college, so the index is split into
+per-college partitions. A profile change re-reads that one student and bumps
+their partition's version. The partition is re-vectorised on a background
+thread in O(non-zeros), about 100 ms for a 20,000-student college. Until the
+rebuild is done, queries keep using the previous matrix together with the
+profiles it was built from. Only a college's first query builds its
+partition inline, and callers run queries off the event loop.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import math
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+LOGGER = logging.getLogger(__name__)
+
+FIELD_WEIGHTS = {
+    "course": 1.0,
+    "department": 0.6,
+    "skill": 1.0,
+    "interest": 1.0,
+    "club": 1.5,
+}
+
+DEFAULT_TOP_K = 10
+
+# Full reload interval, to pick up profile edits made outside the hooked endpoints
+MAX_INDEX_AGE_SECONDS = float(os.getenv("PEER_INDEX_MAX_AGE_SECONDS", str(6 * 3600)))
+
+
+@dataclass
+class PeerProfile:
+    user_id: int
+    college_id: Optional[int]
+    summary: Dict
+    features: Dict[str, str] = field(default_factory=dict)  # "skill:python" -> display label
+
+
+@dataclass
+class _Partition:
+    user_ids: List[int] = field(default_factory=list)
+    positions: Dict[int, int] = field(default_factory=dict)
+    matrix: object = None  # scipy.sparse.csr_matrix, rows L2-normalised
+    profiles: Dict[int, PeerProfile] = field(default_factory=dict)  # the members the matrix was built from
+    version: int = 0
+
+
+def _norm(value) -> str:
+    return str(value).strip().lower()
+
+
+def _add(features: Dict[str, str], kind: str, value, label: Optional[str] = None) -> None:
+    if value is None or not str(value).strip():
+        return
+    features[f"{kind}:{_norm(value)}"] = label or str(value).strip()
+
+
+def _json_list(raw) -> List:
+    try:
+        value = json.loads(raw or "[]")
+    except (TypeError, ValueError):
+        return []
+    if isinstance(value, dict):
+        return list(value.keys())
+    return value if isinstance(value, list) else []
+
+
+def load_profiles(cursor, user_id: Optional[int] = None) -> List[PeerProfile]:
+    """Read student features from MySQL (all students, or just ``user_id``)."""
+    user_filter = " AND id = %s" if user_id is not None else ""
+    params = (user_id,) if user_id is not None else ()
+    try:
+        cursor.execute(
+            "SELECT id, college_id, full_name, username, course, department, bio, interests_json, skills_json "
+            f"FROM users WHERE role = 'student'{user_filter}",
+            params,
+        )
+    except Exception:
+        cursor.execute(
+            "SELECT id, college_id, full_name, username, course, department, bio "
+            f"FROM users WHERE role = 'student'{user_filter}",
+            params,
+        )
+    profiles: Dict[int, PeerProfile] = {}
+    for row in cursor.fetchall():
+        profile = PeerProfile(
+            user_id=row["id"],
+            college_id=row.get("college_id"),
+            summary={k: row.get(k) for k in ("id", "full_name", "username", "course", "department", "bio")},
+        )
+        _add(profile.features, "course", row.get("course"))
+        _add(profile.features, "department", row.get("department"))
+        for interest in _json_list(row.get("interests_json")):
+            _add(profile.features, "interest", interest)
+        for skill in _json_list(row.get("skills_json")):
+            _add(profile.features, "skill", skill)
+        profiles[row["id"]] = profile
+
+    if not profiles:
+        return []
+
+    def attach(sql: str, filter_column: str, kind: str, value_key: str, label_key: Optional[str] = None) -> None:
+        try:
+            cursor.execute(sql + (f" AND {filter_column} = %s" if user_id is not None else ""), params)
+        except Exception as exc:
+            LOGGER.debug("Skipping %s features: %s", kind, exc)
+            return
+        for r in cursor.fetchall():
+            profile = profiles.get(r["user_id"])
+            if profile is not None:
+                _add(profile.features, kind, r[value_key], r.get(label_key) if label_key else None)
+
+    attach(
+        "SELECT ss.student_id AS user_id, s.name FROM student_skills ss JOIN skills s ON ss.skill_id = s.id WHERE 1 = 1",
+        "ss.student_id", "skill", "name",
+    )
+    attach("SELECT user_id, category FROM user_interest_categories WHERE 1 = 1", "user_id", "interest", "category")
+    attach(
+        "SELECT cm.user_id, cm.club_id, c.name FROM club_memberships cm JOIN clubs c ON c.id = cm.club_id "
+        "WHERE cm.status = 'approved'",
+        "cm.user_id", "club", "club_id", "name",
+    )
+    return list(profiles.values())
+
+
+class PeerIndex:
+    """Per-college sparse similarity index over student profiles."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._profiles: Dict[int, PeerProfile] = {}
+        self._partitions: Dict[Optional[int], _Partition] = {}
+        # college -> version of its member profiles; a partition built from an older one is stale
+        self._versions: Dict[Optional[int], int] = {}
+        self._seq = 0
+        self._rebuilding: set = set()
+        self.built_at = 0.0
+
+    # === Loading ===
+
+    def load(self, profiles: Sequence[PeerProfile]) -> None:
+        """Replace the whole index; partitions are rebuilt on their next query."""
+        with self._lock:
+            self._profiles = {p.user_id: p for p in profiles}
+            self._partitions = {}
+            self._seq += 1
+            self._versions = {p.college_id: self._seq for p in profiles}
+            self.built_at = time.time()
+
+    def load_from_db(self, cursor) -> None:
+        started = time.perf_counter()
+        profiles = load_profiles(cursor)
+        self.load(profiles)
+        LOGGER.info("Peer index loaded %d students in %.1f ms", len(profiles), (time.perf_counter() - started) * 1000)
+
+    def is_stale(self) -> bool:
+        return not self.built_at or time.time() - self.built_at > MAX_INDEX_AGE_SECONDS
+
+    def _touch(self, college_id: Optional[int]) -> None:
+        self._seq += 1
+        self._versions[college_id] = self._seq
+        if college_id in self._partitions:
+            self._schedule_rebuild(college_id)
+
+    def upsert(self, profile: PeerProfile) -> None:
+        with self._lock:
+            previous = self._profiles.get(profile.user_id)
+            self._profiles[profile.user_id] = profile
+            if previous is not None and previous.college_id != profile.college_id:
+                self._touch(previous.college_id)
+            self._touch(profile.college_id)
+
+    def remove(self, user_id: int) -> None:
+        with self._lock:
+            previous = self._profiles.pop(user_id, None)
+            if previous is not None:
+                self._touch(previous.college_id)
+
+    def refresh_user(self, cursor, user_id: int) -> None:
+        """Re-read one student after their profile, skills, interests or clubs changed."""
+        if not self.built_at:
+            return  # Nothing loaded yet; the first query does a full load
+        profiles = load_profiles(cursor, user_id)
+        if profiles:
+            self.upsert(profiles[0])
+        else:
+            self.remove(user_id)
+
+    # === Vectorisation ===
+
+    def _build_partition(self, college_id: Optional[int]) -> _Partition:
+        """Vectorise a copy of the college's members outside the lock, then install it unless a newer one won."""
+        import numpy as np
+        import scipy.sparse as sp
+
+        with self._lock:
+            members = [p for p in self._profiles.values() if p.college_id == college_id]
+            version = self._versions.get(college_id, 0)
+        columns: Dict[str, int] = {}
+        doc_freq: List[int] = []
+        rows, cols = [], []
+        for i, profile in enumerate(members):
+            for key in profile.features:
+                col = columns.get(key)
+                if col is None:
+                    col = columns[key] = len(doc_freq)
+                    doc_freq.append(0)
+                doc_freq[col] += 1
+                rows.append(i)
+                cols.append(col)
+
+        n = len(members)
+        weights = np.array(
+            [
+                FIELD_WEIGHTS.get(key.split(":", 1)[0], 1.0) * (math.log((1 + n) / (1 + doc_freq[col])) + 1.0)
+                for key, col in columns.items()
+            ],
+            dtype=np.float32,
+        )
+        cols_arr = np.array(cols, dtype=np.int32)
+        data = weights[cols_arr] if len(cols_arr) else np.zeros(0, dtype=np.float32)
+        matrix = sp.csr_matrix((data, (np.array(rows, dtype=np.int32), cols_arr)), shape=(n, len(columns)))
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        matrix = sp.diags(1.0 / norms) @ matrix
+
+        partition = _Partition(
+            user_ids=[p.user_id for p in members],
+            positions={p.user_id: i for i, p in enumerate(members)},
+            matrix=matrix.tocsr(),
+            profiles={p.user_id: p for p in members},
+            version=version,
+        )
+        with self._lock:
+            current = self._partitions.get(college_id)
+            if current is None or current.version <= version:
+                self._partitions[college_id] = partition
+            return self._partitions[college_id]
+
+    def _schedule_rebuild(self, college_id: Optional[int]) -> None:
+        with self._lock:
+            if college_id in self._rebuilding:
+                return
+            self._rebuilding.add(college_id)
+        threading.Thread(target=self._rebuild, args=(college_id,), name=f"peer-index-{college_id}", daemon=True).start()
+
+    def _rebuild(self, college_id: Optional[int]) -> None:
+        try:
+            while True:
+                partition = self._build_partition(college_id)
+                with self._lock:
+                    if partition.version >= self._versions.get(college_id, 0):
+                        return
+        except Exception as e:
+            LOGGER.error("Peer index rebuild for college %s failed: %s", college_id, e)
+        finally:
+            with self._lock:
+                self._rebuilding.discard(college_id)
+
+    def _partition_for(self, college_id: Optional[int]) -> _Partition:
+        """The college's partition; a stale one is served while a background rebuild runs."""
+        with self._lock:
+            partition = self._partitions.get(college_id)
+            stale = partition is not None and partition.version < self._versions.get(college_id, 0)
+        if partition is None:
+            return self._build_partition(college_id)
+        if stale:
+            self._schedule_rebuild(college_id)
+        return partition
+
+    # === Queries ===
+
+    def recommend(self, user_id: int, top_k: int = DEFAULT_TOP_K) -> List[Dict]:
+        """Top-k most similar students in the same college, with the features they share.
+
+        Blocking (the first query of a college builds its partition); call it off the event loop.
+        """
+        import numpy as np
+
+        with self._lock:
+            profile = self._profiles.get(user_id)
+        if profile is None:
+            return []
+        partition = self._partition_for(profile.college_id)
+        # Profiles come from the partition's own snapshot so they always match its rows
+        profile = partition.profiles.get(user_id)
+        pos = partition.positions.get(user_id)
+        if profile is None or pos is None or len(partition.user_ids) <= 1:
+            return []
+
+        scores = (partition.matrix @ partition.matrix[pos].T).toarray().ravel()
+        scores[pos] = -1.0
+        k = min(top_k, len(scores) - 1)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+
+        results = []
+        for idx in top:
+            peer = partition.profiles[partition.user_ids[idx]]
+            shared = [label for key, label in _shared_features(profile, peer)]
+            results.append({
+                **peer.summary,
+                "similarity_score": round(float(max(scores[idx], 0.0)), 4),
+                "shared": shared[:5],
+            })
+        return results
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "students": len(self._profiles),
+                "colleges": len(self._partitions),
+                "stale_partitions": sum(
+                    1 for college_id, p in self._partitions.items() if p.version < self._versions.get(college_id, 0)
+                ),
+                "rebuilding": len(self._rebuilding),
+                "built_at": self.built_at,
+            }
+
+
+_SHARED_PREFIX = {
+    "course": "Same course",
+    "department": "Same department",
+    "skill": "Both know",
+    "interest": "Both interested in",
+    "club": "Both in",
+}
+
+
+def _shared_features(a: PeerProfile, b: PeerProfile) -> List[Tuple[str, str]]:
+    shared = []
+    for key in a.features.keys() & b.features.keys():
+        kind = key.split(":", 1)[0]
+        shared.append((key, f"{_SHARED_PREFIX.get(kind, kind)}: {b.features[key]}"))
+    # Strongest signal first (clubs, then skills/interests, then course/department)
+    shared.sort(key=lambda item: -FIELD_WEIGHTS.get(item[0].split(":", 1)[0], 1.0))
+    return shared
+
+
+peer_index = PeerIndex()
+
+
+def benchmark(n_students: int = 20000, n_queries: int = 200) -> Dict:
+    """Build a synthetic single-college index and time top-10 queries."""
+    import random
+
+    rng = random.Random(7)
+    courses = [f"course{i}" for i in range(12)]
+    departments = [f"dept{i}" for i in range(6)]
+    skills = [f"skill{i}" for i in range(300)]
+    interests = [f"interest{i}" for i in range(60)]
+    profiles = []
+    for uid in range(1, n_students + 1):
+        profile = PeerProfile(user_id=uid, college_id=1, summary={"id": uid})
+        _add(profile.features, "course", rng.choice(courses))
+        _add(profile.features, "department", rng.choice(departments))
+        for s in rng.sample(skills, 5):
+            _add(profile.features, "skill", s)
+        for s in rng.sample(interests, 4):
+            _add(profile.features, "interest", s)
+        for c in rng.sample(range(400), 2):
+            _add(profile.features, "club", c)
+        profiles.append(profile)
+
+    index = PeerIndex()
+    index.load(profiles)
+    started = time.perf_counter()
+    index._partition_for(1)
+    build_ms = (time.perf_counter() - started) * 1000
+
+    latencies = []
+    for uid in rng.sample(range(1, n_students + 1), n_queries):
+        started = time.perf_counter()
+        index.recommend(uid, DEFAULT_TOP_K)
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+
+    index.upsert(profiles[0])
+    started = time.perf_counter()
+    index.recommend(2, DEFAULT_TOP_K)
+    rebuild_query_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    while index.stats()["stale_partitions"]:
+        time.sleep(0.005)
+    background_rebuild_ms = (time.perf_counter() - started) * 1000
+
+    return {
+        "students": n_students,
+        "build_ms": round(build_ms, 2),
+        "query_p50_ms": round(latencies[len(latencies) // 2], 3),
+        "query_p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 3),
+        "query_after_profile_change_ms": round(rebuild_query_ms, 2),
+        "background_rebuild_ms": round(background_rebuild_ms, 2),
+    }
+
+
+if __name__ == "__main__":
+    print(benchmark())
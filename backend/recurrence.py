@@ -0,0 +1,240 @@
+"""RRULE-style recurrence for club events.
+
+A recurring series is stored as a single ``club_events`` row. That row
+carries a rule such as ``FREQ=WEEKLY;INTERVAL=1;BYDAY=0,2;UNTIL=2025-06-01``,
+and occurrences are expanded only for the date window being viewed.
+Per-occurrence exceptions (cancellations, moved dates, changed time, venue
+or title) live in ``club_event_exceptions`` and are applied during
+expansion.
+
+``BYDAY`` uses Python weekday numbers (Monday = 0), which matches the
+``recurrence_days`` column that the legacy materialised series used. The
+series start date (DTSTART) is always an occurrence.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+from calendar import monthrange
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+FREQUENCIES = ("daily", "weekly", "monthly", "yearly")
+
+# Hard stop for open-ended rules, mirroring the old 100-instance cap in spirit
+MAX_SERIES_YEARS = 5
+# Event listings and club stats expand series this many days past today
+LISTING_HORIZON_DAYS = int(os.getenv("RECURRENCE_LISTING_HORIZON_DAYS", "90"))
+
+
+def _parse_date(value) -> Optional[date]:
+    if value in (None, ""):
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value).replace("-", "")
+    return datetime.strptime(text[:8], "%Y%m%d").date()
+
+
+def _add_months(day: date, months: int, anchor_day: int) -> date:
+    total = day.year * 12 + day.month - 1 + months
+    year, month = divmod(total, 12)
+    return date(year, month + 1, min(anchor_day, monthrange(year, month + 1)[1]))
+
+
+@dataclass(frozen=True)
+class RecurrenceRule:
+    freq: str
+    interval: int = 1
+    by_weekday: Tuple[int, ...] = ()
+    until: Optional[date] = None
+    count: Optional[int] = None
+
+    # --- construction ---
+
+    @classmethod
+    def parse(cls, rule: str) -> "RecurrenceRule":
+        parts = dict(p.split("=", 1) for p in rule.strip().split(";") if "=" in p)
+        parts = {k.strip().upper(): v.strip() for k, v in parts.items()}
+        freq = parts.get("FREQ", "").lower()
+        if freq not in FREQUENCIES:
+            raise ValueError(f"Unsupported FREQ '{parts.get('FREQ')}'")
+        by_weekday = tuple(sorted({int(d) % 7 for d in parts.get("BYDAY", "").split(",") if d.strip()}))
+        return cls(
+            freq=freq,
+            interval=max(1, int(parts.get("INTERVAL", 1))),
+            by_weekday=by_weekday if freq == "weekly" else (),
+            until=_parse_date(parts.get("UNTIL")),
+            count=int(parts["COUNT"]) if parts.get("COUNT") else None,
+        )
+
+    @classmethod
+    def from_event_data(cls, event_data: Dict) -> Optional["RecurrenceRule"]:
+        """Rule from a create payload: ``recurrence_rule`` or the legacy type/days/end fields."""
+        if event_data.get("recurrence_rule"):
+            return cls.parse(event_data["recurrence_rule"])
+        recurrence_type = event_data.get("recurrence_type")
+        if not event_data.get("is_recurring") or recurrence_type not in FREQUENCIES:
+            return None
+        days = event_data.get("recurrence_days") or ""
+        return cls(
+            freq=recurrence_type,
+            interval=max(1, int(event_data.get("recurrence_interval") or 1)),
+            by_weekday=tuple(sorted({int(d) % 7 for d in str(days).split(",") if d.strip()})) if recurrence_type == "weekly" else (),
+            until=_parse_date(event_data.get("recurrence_end_date")),
+            count=int(event_data["recurrence_count"]) if event_data.get("recurrence_count") else None,
+        )
+
+    def to_rrule(self) -> str:
+        parts = [f"FREQ={self.freq.upper()}", f"INTERVAL={self.interval}"]
+        if self.by_weekday:
+            parts.append("BYDAY=" + ",".join(str(d) for d in self.by_weekday))
+        if self.until:
+            parts.append(f"UNTIL={self.until.isoformat()}")
+        if self.count:
+            parts.append(f"COUNT={self.count}")
+        return ";".join(parts)
+
+    # --- expansion ---
+
+    def last_possible(self, dtstart: date) -> date:
+        cap = _add_months(dtstart, 12 * MAX_SERIES_YEARS, dtstart.day)
+        return min(self.until, cap) if self.until else cap
+
+    def _iter(self, dtstart: date, from_day: date) -> Iterator[date]:
+        """Occurrences in order, starting at the first period that can reach ``from_day``."""
+        step = self.interval
+        if self.freq == "daily":
+            skip = max(0, (from_day - dtstart).days // step)
+            day = dtstart + timedelta(days=skip * step)
+            while True:
+                yield day
+                day += timedelta(days=step)
+        elif self.freq == "weekly":
+            week0 = dtstart - timedelta(days=dtstart.weekday())
+            weekdays = self.by_weekday or (dtstart.weekday(),)
+            skip = max(0, (from_day - week0).days // 7 // step)
+            week = week0 + timedelta(weeks=skip * step)
+            while True:
+                candidates = {week + timedelta(days=d) for d in weekdays}
+                if week == week0:
+                    candidates.add(dtstart)
+                for day in sorted(candidates):
+                    if day >= dtstart:
+                        yield day
+                week += timedelta(weeks=step)
+        elif self.freq == "monthly":
+            months = (from_day.year - dtstart.year) * 12 + from_day.month - dtstart.month
+            n = max(0, months // step)
+            while True:
+                yield _add_months(dtstart, n * step, dtstart.day)
+                n += 1
+        else:  # yearly
+            n = max(0, (from_day.year - dtstart.year) // step)
+            while True:
+                year = dtstart.year + n * step
+                yield date(year, dtstart.month, min(dtstart.day, monthrange(year, dtstart.month)[1]))
+                n += 1
+
+    def between(self, dtstart: date, start: date, end: date) -> List[date]:
+        """Occurrence dates of the series within ``[start, end]``."""
+        last = min(end, self.last_possible(dtstart))
+        if last < dtstart or last < start:
+            return []
+        found = []
+        # COUNT is positional, so expand from the series start; otherwise skip to the window
+        for index, day in enumerate(self._iter(dtstart, dtstart if self.count else start)):
+            if self.count and index >= self.count:
+                break
+            if day > last:
+                break
+            if day >= start:
+                found.append(day)
+        return found
+
+    def occurs_on(self, dtstart: date, day: date) -> bool:
+        return day in self.between(dtstart, day, day)
+
+
+@dataclass
+class OccurrenceOverride:
+    occurrence_date: date
+    is_cancelled: bool = False
+    override_date: Optional[date] = None
+    start_time: object = None
+    end_time: object = None
+    venue: Optional[str] = None
+    title: Optional[str] = None
+    description: Optional[str] = None
+
+    @classmethod
+    def from_row(cls, row: Dict) -> "OccurrenceOverride":
+        return cls(**{k: row.get(k) for k in cls.__dataclass_fields__})
+
+
+def expand(
+    rule: RecurrenceRule,
+    dtstart: date,
+    start: date,
+    end: date,
+    overrides: Optional[Dict[date, OccurrenceOverride]] = None,
+) -> List[Tuple[date, Optional[OccurrenceOverride]]]:
+    """``(original_date, override)`` for every occurrence whose final date falls in ``[start, end]``.
+
+    Cancelled occurrences are dropped. An occurrence moved into the window
+    from outside it is included, and one moved out of the window is not.
+    """
+    overrides = overrides or {}
+    found = []
+    for day in rule.between(dtstart, start, end):
+        override = overrides.get(day)
+        if override and override.is_cancelled:
+            continue
+        final = override.override_date if override and override.override_date else day
+        if start <= final <= end:
+            found.append((day, override))
+    for day, override in overrides.items():
+        if override.is_cancelled or not override.override_date or start <= day <= end:
+            continue
+        if start <= override.override_date <= end and rule.occurs_on(dtstart, day):
+            found.append((day, override))
+    return found
+
+
+def benchmark(n_series: int = 2000, windows: int = 200) -> Dict:
+    """Expand weekly/daily series over month windows, versus materialising 100 rows each."""
+    import random
+    import statistics
+
+    rng = random.Random(5)
+    base = date.today().replace(day=1)
+    series = []
+    for _ in range(n_series):
+        freq = rng.choice(FREQUENCIES)
+        rule = RecurrenceRule(freq, by_weekday=tuple(sorted(rng.sample(range(7), 2))) if freq == "weekly" else (),
+                              until=base + timedelta(days=365))
+        series.append((rule, base + timedelta(days=rng.randrange(60))))
+    timings = []
+    occurrences = 0
+    for w in range(windows):
+        start = _add_months(base, w % 12, 1)
+        end = _add_months(start, 1, 1) - timedelta(days=1)
+        t0 = time.perf_counter()
+        for rule, dtstart in series:
+            occurrences += len(expand(rule, dtstart, start, end))
+        timings.append((time.perf_counter() - t0) * 1000)
+    return {
+        "series": n_series,
+        "month_window_all_series_p50_ms": round(statistics.median(timings), 2),
+        "per_series_us": round(statistics.median(timings) * 1000 / n_series, 2),
+        "avg_occurrences_per_window": round(occurrences / windows),
+        "rows_saved_vs_materialised": n_series * 100 - n_series,
+    }
+
+
+if __name__ == "__main__":
+    print(benchmark())
@@ -0,0 +1,492 @@
+"""Incremental room utilization patterns.
+
+``ai_room_patterns`` holds one row per (room, weekday, hour). It backs
+``get_smart_room_suggestions`` and the insights dashboard. The rows used
+to be rebuilt by the ``UpdateRoomPatterns`` stored procedure, called
+synchronously from ``/ai/models/update-patterns``. This pipeline keeps
+them up to date incrementally instead:
+
+* ``room_bookings`` gets an ``updated_at`` column. Every run reads only
+  the bookings inserted or changed since the stored watermark
+  ``(updated_at, id)``. Rows newer than ``LAG_SECONDS`` are left for the
+  next run so a second is never half-consumed.
+* Each booking's per-hour contribution (minutes and one booking per hour
+  it touches) is kept in ``ai_room_pattern_contributions``. A changed
+  booking first retracts its old contribution and then adds its new one.
+  Cancelling or rejecting a booking therefore removes it from the
+  statistics.
+* Deltas are upserted into ``ai_room_patterns`` in place, one
+  transaction per ``BATCH_ROWS`` bookings, with the watermark advanced in
+  the same transaction.
+* ``utilization_score`` (average share of the hour booked),
+  ``booking_frequency`` (bookings per month) and ``pattern_confidence``
+  (weeks of history, saturating at ``CONFIDENT_WEEKS``) are re-derived
+  from the running sums in one UPDATE. This runs when something changed
+  or a new week of history has accrued.
+
+``run()`` is scheduled by the API every ``INTERVAL_SECONDS`` and reports
+the rows processed per second.
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+LOGGER = logging.getLogger(__name__)
+
+BATCH_ROWS = int(os.getenv("ROOM_PATTERNS_BATCH_ROWS", "5000"))
+INTERVAL_SECONDS = float(os.getenv("ROOM_PATTERNS_INTERVAL_SECONDS", "300"))
+LAG_SECONDS = int(os.getenv("ROOM_PATTERNS_LAG_SECONDS", "5"))
+CONFIDENT_WEEKS = int(os.getenv("ROOM_PATTERNS_CONFIDENT_WEEKS", "12"))
+
+DAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+EXCLUDED_STATUSES = ("rejected", "cancelled")
+WATERMARK_NAME = "room_patterns"
+_EPOCH = datetime(1970, 1, 2)
+
+_WATERMARK_SQL = """
+    SELECT last_updated_at, last_id, first_date, last_date
+    FROM ai_pipeline_watermarks WHERE name = %s FOR UPDATE
+"""
+_CHANGED_SQL = """
+    SELECT id, room_id, booking_date, start_time, end_time, status, updated_at
+    FROM room_bookings
+    WHERE (updated_at > %s OR (updated_at = %s AND id > %s))
+      AND updated_at < NOW() - INTERVAL %s SECOND
+    ORDER BY updated_at, id
+    LIMIT %s
+"""
+_LEDGER_SQL = """
+    SELECT booking_id, room_id, day_of_week, hour_of_day, minutes
+    FROM ai_room_pattern_contributions WHERE booking_id IN ({ids})
+"""
+_LEDGER_DELETE_SQL = "DELETE FROM ai_room_pattern_contributions WHERE booking_id IN ({ids})"
+_LEDGER_INSERT_SQL = """
+    INSERT INTO ai_room_pattern_contributions (booking_id, hour_of_day, room_id, day_of_week, minutes)
+    VALUES (%s, %s, %s, %s, %s)
+"""
+_UPSERT_SQL = """
+    INSERT INTO ai_room_patterns (room_id, day_of_week, hour_of_day, booked_minutes, booking_count)
+    VALUES (%s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        booked_minutes = booked_minutes + VALUES(booked_minutes),
+        booking_count = booking_count + VALUES(booking_count)
+"""
+_ADVANCE_SQL = """
+    UPDATE ai_pipeline_watermarks
+    SET last_updated_at = %s, last_id = %s, first_date = %s, last_date = %s,
+        rows_processed = rows_processed + %s
+    WHERE name = %s
+"""
+_PRUNE_SQL = "DELETE FROM ai_room_patterns WHERE booking_count <= 0"
+
+
+def _default_connect():
+    from database import get_mysql_connection
+
+    return get_mysql_connection()
+
+
+Slot = Tuple[int, str, int]  # (room_id, day_of_week, hour_of_day)
+
+
+def _minutes(value) -> Optional[int]:
+    """Minutes since midnight for a TIME column (mysql.connector returns timedelta)."""
+    if value is None:
+        return None
+    if isinstance(value, timedelta):
+        return int(value.total_seconds() // 60)
+    return value.hour * 60 + value.minute
+
+
+def contributions(booking: Dict) -> List[Tuple[Slot, int]]:
+    """``((room_id, day, hour), minutes)`` for every hour the booking touches; empty if it does not count."""
+    if booking.get("status") in EXCLUDED_STATUSES or booking.get("booking_date") is None:
+        return []
+    start, end = _minutes(booking.get("start_time")), _minutes(booking.get("end_time"))
+    if start is None or end is None or end <= start:
+        return []
+    day = DAYS[booking["booking_date"].weekday()]
+    slots = []
+    for hour in range(start // 60, math.ceil(end / 60)):
+        minutes = min(end, (hour + 1) * 60) - max(start, hour * 60)
+        if minutes > 0:
+            slots.append(((int(booking["room_id"]), day, hour), minutes))
+    return slots
+
+
+def aggregate_deltas(changed: Iterable[Dict], previous: Iterable[Dict]) -> Dict[Slot, List[int]]:
+    """Net ``[minutes, bookings]`` per slot: retract ``previous`` ledger rows, add the new contributions."""
+    deltas: Dict[Slot, List[int]] = defaultdict(lambda: [0, 0])
+    for row in previous:
+        delta = deltas[(int(row["room_id"]), row["day_of_week"], int(row["hour_of_day"]))]
+        delta[0] -= int(row["minutes"])
+        delta[1] -= 1
+    for booking in changed:
+        for slot, minutes in contributions(booking):
+            delta = deltas[slot]
+            delta[0] += minutes
+            delta[1] += 1
+    return {slot: delta for slot, delta in deltas.items() if delta[0] or delta[1]}
+
+
+def weeks_observed(first: date, last: date) -> Dict[str, int]:
+    """How many of each weekday fall in ``first``..``last`` inclusive."""
+    days = (last - first).days + 1
+    if days <= 0:
+        return {day: 0 for day in DAYS}
+    full, rest = divmod(days, 7)
+    counts = {day: full for day in DAYS}
+    for offset in range(rest):
+        counts[DAYS[(first.weekday() + offset) % 7]] += 1
+    return counts
+
+
+def _score_sql(weeks: Dict[str, int]) -> str:
+    # The week counts are ints computed here, so they are inlined rather than repeated as parameters
+    case = "CASE day_of_week " + " ".join(f"WHEN '{day}' THEN {max(weeks[day], 1)}" for day in DAYS) + " ELSE 1 END"
+    return f"""
+        UPDATE ai_room_patterns SET
+            utilization_score = ROUND(LEAST(100, booked_minutes * 100 / (60 * {case})), 2),
+            booking_frequency = ROUND(booking_count * 4.345 / {case}),
+            pattern_confidence = ROUND(LEAST(1, {case} / {CONFIDENT_WEEKS}), 3)
+    """
+
+
+def ensure_tables(cursor) -> None:
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS ai_room_patterns (
+          id INT AUTO_INCREMENT PRIMARY KEY,
+          room_id INT NOT NULL,
+          day_of_week VARCHAR(10) NOT NULL,
+          hour_of_day TINYINT NOT NULL,
+          booked_minutes INT NOT NULL DEFAULT 0,
+          booking_count INT NOT NULL DEFAULT 0,
+          utilization_score DECIMAL(5,2) NOT NULL DEFAULT 0,
+          booking_frequency INT NOT NULL DEFAULT 0,
+          pattern_confidence DECIMAL(4,3) NOT NULL DEFAULT 0,
+          updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+          UNIQUE KEY uq_room_slot (room_id, day_of_week, hour_of_day)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS ai_room_pattern_contributions (
+          booking_id INT NOT NULL,
+          hour_of_day TINYINT NOT NULL,
+          room_id INT NOT NULL,
+          day_of_week VARCHAR(10) NOT NULL,
+          minutes SMALLINT NOT NULL,
+          PRIMARY KEY (booking_id, hour_of_day)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS ai_pipeline_watermarks (
+          name VARCHAR(64) PRIMARY KEY,
+          last_updated_at DATETIME NOT NULL,
+          last_id INT NOT NULL DEFAULT 0,
+          first_date DATE NULL,
+          last_date DATE NULL,
+          rows_processed BIGINT NOT NULL DEFAULT 0,
+          updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        """
+    )
+    # Tables created by the old stored procedure lack the running sums
+    for statement in (
+        "ALTER TABLE ai_room_patterns ADD COLUMN booked_minutes INT NOT NULL DEFAULT 0",
+        "ALTER TABLE ai_room_patterns ADD COLUMN booking_count INT NOT NULL DEFAULT 0",
+        "ALTER TABLE ai_room_patterns ADD UNIQUE KEY uq_room_slot (room_id, day_of_week, hour_of_day)",
+        "ALTER TABLE room_bookings ADD COLUMN updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP",
+        "ALTER TABLE room_bookings ADD INDEX idx_updated_at (updated_at)",
+    ):
+        try:
+            cursor.execute(statement)
+        except Exception:
+            pass
+    cursor.execute("SELECT name FROM ai_pipeline_watermarks WHERE name = %s", (WATERMARK_NAME,))
+    if cursor.fetchone() is None:
+        # First run: whatever the stored procedure left cannot be retracted, so rebuild from scratch
+        cursor.execute("DELETE FROM ai_room_patterns")
+        cursor.execute("DELETE FROM ai_room_pattern_contributions")
+        cursor.execute(
+            "INSERT INTO ai_pipeline_watermarks (name, last_updated_at, last_id) VALUES (%s, %s, 0)",
+            (WATERMARK_NAME, _EPOCH),
+        )
+
+
+class RoomPatternPipeline:
+    def __init__(self, connect: Callable = _default_connect):
+        self._connect = connect
+        self._run_lock = threading.Lock()
+        self._tables_ready = False
+        self._scored_weeks: Optional[Dict[str, int]] = None
+        self.last_run: Optional[Dict] = None
+
+    def run(self, connection=None) -> Dict:
+        """Consume bookings changed since the watermark; returns run statistics."""
+        if not self._run_lock.acquire(blocking=False):
+            return {"status": "already_running", "last_run": self.last_run}
+        own = connection is None
+        try:
+            if own:
+                connection = self._connect()
+            return self._run(connection)
+        finally:
+            if own and connection is not None:
+                connection.close()
+            self._run_lock.release()
+
+    def _run(self, connection) -> Dict:
+        started = time.perf_counter()
+        cursor = connection.cursor(dictionary=True)
+        rows = batches = slots = 0
+        try:
+            if not self._tables_ready:
+                ensure_tables(cursor)
+                self._tables_ready = True
+            first = last = None
+            while True:
+                processed, touched, first, last = self._batch(connection, cursor)
+                if not processed:
+                    break
+                rows += processed
+                slots += touched
+                batches += 1
+                if processed < BATCH_ROWS:
+                    break
+            scored = self._score(cursor, first, last, force=rows > 0)
+        finally:
+            cursor.close()
+        elapsed = time.perf_counter() - started
+        self.last_run = {
+            "status": "ok",
+            "rows": rows,
+            "batches": batches,
+            "slots_updated": slots,
+            "scored_rows": scored,
+            "seconds": round(elapsed, 3),
+            "rows_per_second": round(rows / elapsed, 1) if elapsed > 0 else None,
+            "finished_at": datetime.now().isoformat(),
+        }
+        if rows:
+            LOGGER.info("Room patterns: %s bookings in %s batches, %.0f rows/s", rows, batches,
+                        self.last_run["rows_per_second"] or 0)
+        return self.last_run
+
+    def _batch(self, connection, cursor) -> Tuple[int, int, Optional[date], Optional[date]]:
+        connection.start_transaction()
+        try:
+            cursor.execute(_WATERMARK_SQL, (WATERMARK_NAME,))
+            mark = cursor.fetchone()
+            first, last = mark["first_date"], mark["last_date"]
+            cursor.execute(_CHANGED_SQL, (mark["last_updated_at"], mark["last_updated_at"], mark["last_id"],
+                                          LAG_SECONDS, BATCH_ROWS))
+            changed = cursor.fetchall()
+            if not changed:
+                connection.rollback()
+                return 0, 0, first, last
+            ids = [row["id"] for row in changed]
+            placeholders = ", ".join(["%s"] * len(ids))
+            cursor.execute(_LEDGER_SQL.format(ids=placeholders), ids)
+            deltas = aggregate_deltas(changed, cursor.fetchall())
+            if deltas:
+                cursor.executemany(_UPSERT_SQL, [(*slot, minutes, count) for slot, (minutes, count) in deltas.items()])
+            cursor.execute(_LEDGER_DELETE_SQL.format(ids=placeholders), ids)
+            ledger = [(booking["id"], slot[2], slot[0], slot[1], minutes)
+                      for booking in changed for slot, minutes in contributions(booking)]
+            if ledger:
+                cursor.executemany(_LEDGER_INSERT_SQL, ledger)
+            dates = [row["booking_date"] for row in changed if row["booking_date"] is not None]
+            if dates:
+                first = min([first, *dates]) if first else min(dates)
+                last = max([last, *dates]) if last else max(dates)
+            tail = changed[-1]
+            cursor.execute(_ADVANCE_SQL, (tail["updated_at"], tail["id"], first, last, len(changed), WATERMARK_NAME))
+            connection.commit()
+            return len(changed), len(deltas), first, last
+        except Exception:
+            connection.rollback()
+            raise
+
+    def _score(self, cursor, first: Optional[date], last: Optional[date], force: bool) -> int:
+        if first is None:
+            return 0
+        weeks = weeks_observed(first, max(last or first, date.today()))
+        if not force and weeks == self._scored_weeks:
+            return 0
+        cursor.execute(_PRUNE_SQL)
+        cursor.execute(_score_sql(weeks))
+        scored = cursor.rowcount
+        self._scored_weeks = weeks
+        return scored
+
+
+room_pattern_pipeline = RoomPatternPipeline()
+
+
+# --- benchmark ---
+
+class _FakeDatabase:
+    """Just enough of MySQL for the pipeline's statements, keyed on the SQL constants above."""
+
+    def __init__(self, rtt: float):
+        self.rtt = rtt
+        self.round_trips = 0
+        self.bookings: Dict[int, Dict] = {}
+        self.ledger: Dict[int, List[Tuple]] = {}
+        self.patterns: Dict[Slot, List[int]] = {}
+        self.mark = {"last_updated_at": _EPOCH, "last_id": 0, "first_date": None, "last_date": None}
+        self.clock = 0
+
+    def touch(self, booking: Dict) -> None:
+        self.clock += 1
+        booking["updated_at"] = _EPOCH + timedelta(seconds=self.clock)
+        self.bookings[booking["id"]] = booking
+
+
+class _FakeCursor:
+    def __init__(self, db: _FakeDatabase):
+        self.db = db
+        self.result: List[Dict] = []
+        self.rowcount = 0
+
+    def _trip(self):
+        self.db.round_trips += 1
+        if self.db.rtt:
+            time.sleep(self.db.rtt)
+
+    def execute(self, sql, params=()):
+        self._trip()
+        db = self.db
+        if sql is _WATERMARK_SQL:
+            self.result = [dict(db.mark)]
+        elif sql is _CHANGED_SQL:
+            stamp, _, last_id, _, limit = params
+            rows = sorted((b for b in db.bookings.values() if (b["updated_at"], b["id"]) > (stamp, last_id)),
+                          key=lambda b: (b["updated_at"], b["id"]))
+            self.result = [dict(b) for b in rows[:limit]]
+        elif sql.startswith(_LEDGER_SQL.split("{")[0]):
+            self.result = [{"booking_id": i, "hour_of_day": h, "room_id": r, "day_of_week": d, "minutes": m}
+                           for i in params for (i, h, r, d, m) in db.ledger.get(i, [])]
+        elif sql.startswith(_LEDGER_DELETE_SQL.split("{")[0]):
+            for booking_id in params:
+                db.ledger.pop(booking_id, None)
+        elif sql is _ADVANCE_SQL:
+            db.mark.update(last_updated_at=params[0], last_id=params[1], first_date=params[2], last_date=params[3])
+        elif sql is _PRUNE_SQL:
+            db.patterns = {slot: v for slot, v in db.patterns.items() if v[1] > 0}
+        self.rowcount = len(db.patterns)
+
+    def executemany(self, sql, rows):
+        self._trip()
+        if sql is _UPSERT_SQL:
+            for room_id, day, hour, minutes, count in rows:
+                slot = self.db.patterns.setdefault((room_id, day, hour), [0, 0])
+                slot[0] += minutes
+                slot[1] += count
+        elif sql is _LEDGER_INSERT_SQL:
+            for row in rows:
+                self.db.ledger.setdefault(row[0], []).append(row)
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+    def fetchall(self):
+        return self.result
+
+    def close(self):
+        pass
+
+
+class _FakeConnection:
+    def __init__(self, db: _FakeDatabase):
+        self.db = db
+
+    def cursor(self, dictionary=True):
+        return _FakeCursor(self.db)
+
+    def start_transaction(self):
+        self.db.round_trips += 1
+
+    def commit(self):
+        self.db.round_trips += 1
+
+    def rollback(self):
+        self.db.round_trips += 1
+
+    def close(self):
+        pass
+
+
+def benchmark(history: int = 100000, changes: int = 2000, rooms: int = 60, rtt_ms: float = 0.5) -> Dict:
+    """Backfill ``history`` bookings, then apply ``changes`` new or cancelled ones incrementally.
+
+    After each run the sums are checked against a from-scratch aggregation.
+    A full rebuild reads every booking again; the incremental run reads
+    only the changes.
+    """
+    import random
+
+    rng = random.Random(11)
+    db = _FakeDatabase(rtt_ms / 1000)
+    start_day = date.today() - timedelta(days=180)
+
+    def booking(booking_id):
+        start = rng.randrange(8 * 60, 18 * 60, 30)
+        return {"id": booking_id, "room_id": rng.randrange(1, rooms + 1),
+                "booking_date": start_day + timedelta(days=rng.randrange(190)),
+                "start_time": timedelta(minutes=start), "end_time": timedelta(minutes=start + rng.choice((50, 90, 120))),
+                "status": rng.choice(("approved", "approved", "approved", "pending", "completed", "cancelled"))}
+
+    for booking_id in range(1, history + 1):
+        db.touch(booking(booking_id))
+
+    def check() -> bool:
+        expected = aggregate_deltas(db.bookings.values(), [])
+        actual = {slot: v for slot, v in db.patterns.items() if v[0] or v[1]}
+        return {s: list(v) for s, v in expected.items()} == actual
+
+    pipeline = RoomPatternPipeline()
+    pipeline._tables_ready = True
+    backfill = pipeline.run(_FakeConnection(db))
+    backfill_ok = check()
+
+    next_id = history + 1
+    for _ in range(changes):
+        if rng.random() < 0.6:
+            db.touch(booking(next_id))
+            next_id += 1
+        else:
+            changed = dict(db.bookings[rng.randrange(1, next_id)])
+            changed["status"] = "cancelled"
+            db.touch(changed)
+    trips_before = db.round_trips
+    incremental = pipeline.run(_FakeConnection(db))
+    return {
+        "backfill_rows": backfill["rows"],
+        "backfill_rows_per_second": backfill["rows_per_second"],
+        "backfill_matches_full_aggregation": backfill_ok,
+        "incremental_rows": incremental["rows"],
+        "incremental_rows_per_second": incremental["rows_per_second"],
+        "incremental_seconds": incremental["seconds"],
+        "incremental_round_trips": db.round_trips - trips_before,
+        "incremental_matches_full_aggregation": check(),
+        "full_rebuild_rows_read": len(db.bookings),
+        "pattern_rows": len(db.patterns),
+    }
+
+
+if __name__ == "__main__":
+    print(benchmark())
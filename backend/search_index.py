@@ -0,0 +1,478 @@
+"""Unified text search over users, clubs, lost-and-found items and learning resources.
+
+Searches are answered from an in-process inverted index: every document is
+tokenized into lowercase terms (title terms weigh more than body terms), and
+a query matches documents containing all of its terms, with the last term
+treated as a prefix so results update while the user is still typing.
+Matches are ranked by the sum of IDF-weighted term weights.
+
+Each entity has its own index, loaded from MySQL on first use and kept
+current by ``touch`` calls from the write paths; bulk writes call
+``invalidate`` and the entity is reloaded on the next query. A reload builds
+a new index off to the side and swaps it in, so searches keep reading the
+old one until then, and touches that land during the build are replayed
+onto the new one. When the index cannot be used, callers fall back to MySQL
+FULLTEXT indexes (``MATCH ... AGAINST`` in boolean mode) created by
+``ensure_fulltext_indexes``.
+"""
+
+from __future__ import annotations
+
+import bisect
+import heapq
+import logging
+import math
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+LOGGER = logging.getLogger(__name__)
+
+ENTITIES = ("users", "clubs", "lost_found", "resources")
+
+TITLE_WEIGHT = 2.0
+BODY_WEIGHT = 1.0
+# Prefix terms match many tokens; cap the expansion (keeping the rarest, highest-IDF
+# terms) and discount partial matches
+MAX_PREFIX_EXPANSION = 200
+PREFIX_DISCOUNT = 0.8
+
+MAX_INDEX_AGE_SECONDS = float(os.getenv("SEARCH_INDEX_MAX_AGE_SECONDS", str(6 * 3600)))
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return _TOKEN_RE.findall((text or "").lower())
+
+
+@dataclass
+class SearchDoc:
+    entity: str
+    id: int
+    title: str
+    body: str = ""
+    college_id: Optional[int] = None
+    attrs: Dict = field(default_factory=dict)  # filterable fields, e.g. role, category, type
+    payload: Dict = field(default_factory=dict)  # returned to the client
+
+
+@dataclass
+class SearchHit:
+    doc: SearchDoc
+    score: float
+
+
+class InvertedIndex:
+    """Term -> {doc key: weight} postings with a sorted vocabulary for prefix lookups."""
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[int, float]] = {}
+        self._docs: Dict[int, SearchDoc] = {}
+        self._keys: Dict[Tuple[str, int], int] = {}
+        self._vocab: List[str] = []
+        self._vocab_dirty = False
+        self._next_key = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    @staticmethod
+    def _weights(doc: SearchDoc) -> Dict[str, float]:
+        weights: Dict[str, float] = {}
+        for token in tokenize(doc.body):
+            weights[token] = max(weights.get(token, 0.0), BODY_WEIGHT)
+        for token in tokenize(doc.title):
+            weights[token] = TITLE_WEIGHT
+        return weights
+
+    def add(self, doc: SearchDoc, bulk: bool = False) -> None:
+        """Insert or replace a document. ``bulk`` defers the vocabulary sort to the next query."""
+        with self._lock:
+            self.remove(doc.entity, doc.id)
+            key = self._next_key
+            self._next_key += 1
+            self._docs[key] = doc
+            self._keys[(doc.entity, doc.id)] = key
+            for token, weight in self._weights(doc).items():
+                postings = self._postings.get(token)
+                if postings is None:
+                    postings = self._postings[token] = {}
+                    if bulk or self._vocab_dirty:
+                        self._vocab_dirty = True
+                    else:
+                        bisect.insort(self._vocab, token)
+                postings[key] = weight
+
+    def remove(self, entity: str, doc_id: int) -> None:
+        with self._lock:
+            key = self._keys.pop((entity, doc_id), None)
+            if key is None:
+                return
+            doc = self._docs.pop(key)
+            for token in self._weights(doc):
+                postings = self._postings.get(token)
+                if postings is None:
+                    continue
+                postings.pop(key, None)
+                if not postings:
+                    del self._postings[token]
+                    self._vocab_dirty = True
+
+    def _sorted_vocab(self) -> List[str]:
+        if self._vocab_dirty:
+            self._vocab = sorted(self._postings)
+            self._vocab_dirty = False
+        return self._vocab
+
+    def _prefix_terms(self, prefix: str) -> List[str]:
+        """Vocabulary terms starting with ``prefix``, capped at ``MAX_PREFIX_EXPANSION``.
+
+        Over the cap, the exact term is kept along with the terms in the
+        fewest documents. Those have the highest IDF and so score the
+        highest matches. Cutting the list alphabetically would instead drop
+        whichever terms happen to sort last.
+        """
+        vocab = self._sorted_vocab()
+        start = bisect.bisect_left(vocab, prefix)
+        end = bisect.bisect_left(vocab, prefix + "\uffff", start)
+        terms = vocab[start:end]
+        if len(terms) <= MAX_PREFIX_EXPANSION:
+            return terms
+        postings = self._postings
+        ranked = heapq.nsmallest(MAX_PREFIX_EXPANSION, terms, key=lambda t: (t != prefix, len(postings[t]), t))
+        LOGGER.debug("Prefix '%s' matches %d terms; expanding the %d rarest", prefix, len(terms), len(ranked))
+        return ranked
+
+    def _term_scores(self, term: str, prefix: bool) -> Dict[int, float]:
+        n = max(len(self._docs), 1)
+        scores: Dict[int, float] = {}
+        candidates = self._prefix_terms(term) if prefix else ([term] if term in self._postings else [])
+        for candidate in candidates:
+            postings = self._postings[candidate]
+            idf = math.log(1 + n / len(postings))
+            factor = idf * (1.0 if candidate == term else PREFIX_DISCOUNT)
+            for key, weight in postings.items():
+                score = weight * factor
+                if score > scores.get(key, 0.0):
+                    scores[key] = score
+        return scores
+
+    def search(
+        self,
+        query: str,
+        limit: int = 20,
+        predicate: Optional[Callable[[SearchDoc], bool]] = None,
+    ) -> List[SearchHit]:
+        """All query terms must match; the last term also matches as a prefix."""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        with self._lock:
+            per_term = [self._term_scores(t, prefix=(i == len(terms) - 1)) for i, t in enumerate(terms)]
+            per_term.sort(key=len)
+            if not per_term[0]:
+                return []
+            totals = dict(per_term[0])
+            for scores in per_term[1:]:
+                totals = {k: v + scores[k] for k, v in totals.items() if k in scores}
+                if not totals:
+                    return []
+            docs = self._docs
+            if predicate is not None:
+                totals = {k: v for k, v in totals.items() if predicate(docs[k])}
+            best = heapq.nlargest(limit, totals.items(), key=lambda item: (item[1], -item[0]))
+            return [SearchHit(docs[k], round(score, 4)) for k, score in best]
+
+
+# === Loading from MySQL ===
+
+def _user_doc(r: Dict) -> SearchDoc:
+    return SearchDoc(
+        entity="users",
+        id=r["id"],
+        title=r.get("full_name") or r.get("username") or "",
+        # Email is not indexed: matching on it would tell anyone whether an address is registered
+        body=" ".join(str(r.get(k) or "") for k in ("username", "department", "course")),
+        college_id=r.get("college_id"),
+        attrs={"role": r.get("role"), "is_active": bool(r.get("is_active", True))},
+        payload={k: r.get(k) for k in ("id", "full_name", "username", "email", "role", "department", "course")},
+    )
+
+
+def _club_doc(r: Dict) -> SearchDoc:
+    return SearchDoc(
+        entity="clubs",
+        id=r["id"],
+        title=r.get("name") or "",
+        body=" ".join(str(r.get(k) or "") for k in ("description", "category")),
+        college_id=r.get("college_id"),
+        attrs={"category": r.get("category"), "is_active": bool(r.get("is_active", True))},
+        payload={k: r.get(k) for k in ("id", "name", "category", "description")},
+    )
+
+
+def _lost_found_doc(r: Dict) -> SearchDoc:
+    return SearchDoc(
+        entity="lost_found",
+        id=r["id"],
+        title=r.get("item_name") or "",
+        body=" ".join(str(r.get(k) or "") for k in ("description", "category", "location_found")),
+        college_id=r.get("college_id"),
+        attrs={"type": r.get("type"), "category": r.get("category"), "is_active": r.get("status") == "active"},
+        payload={k: r.get(k) for k in ("id", "type", "item_name", "category", "location_found", "status")},
+    )
+
+
+def _resource_doc(r: Dict) -> SearchDoc:
+    return SearchDoc(
+        entity="resources",
+        id=r["id"],
+        title=r.get("title") or "",
+        body=" ".join(str(r.get(k) or "") for k in ("description", "resource_type", "target_course")),
+        college_id=None,
+        attrs={"type": r.get("resource_type"), "is_active": bool(r.get("is_active", True))},
+        payload={k: r.get(k) for k in ("id", "title", "resource_type", "target_course", "target_semester")},
+    )
+
+
+_SOURCES: Dict[str, Tuple[str, str, Callable[[Dict], SearchDoc]]] = {
+    "users": (
+        "SELECT id, college_id, full_name, username, email, role, department, course, is_active FROM users",
+        "id",
+        _user_doc,
+    ),
+    "clubs": (
+        "SELECT id, college_id, name, description, category, is_active FROM clubs",
+        "id",
+        _club_doc,
+    ),
+    "lost_found": (
+        "SELECT lf.id, lf.type, lf.item_name, lf.description, lf.category, lf.location_found, lf.status, "
+        "u.college_id FROM lost_found lf LEFT JOIN users u ON u.id = lf.user_id",
+        "lf.id",
+        _lost_found_doc,
+    ),
+    "resources": (
+        "SELECT id, title, description, resource_type, target_course, target_semester, is_active "
+        "FROM learning_resources",
+        "id",
+        _resource_doc,
+    ),
+}
+
+
+class SearchService:
+    """Owns one index per entity and tracks which entities are loaded and fresh."""
+
+    def __init__(self):
+        self._indexes: Dict[str, InvertedIndex] = {}
+        self._loaded_at: Dict[str, float] = {}
+        # Touches seen while an entity is being rebuilt, replayed onto the new index
+        self._replay: Dict[str, List[Tuple[int, Optional[SearchDoc]]]] = {}
+        self._lock = threading.Lock()  # serializes loads
+        self._swap_lock = threading.Lock()  # guards _indexes and _replay
+
+    def index(self, entity: str) -> InvertedIndex:
+        return self._indexes.get(entity) or InvertedIndex()
+
+    def _ensure_loaded(self, cursor, entities: Iterable[str]) -> None:
+        for entity in entities:
+            loaded_at = self._loaded_at.get(entity)
+            if loaded_at and time.time() - loaded_at < MAX_INDEX_AGE_SECONDS:
+                continue
+            with self._lock:
+                loaded_at = self._loaded_at.get(entity)
+                if loaded_at and time.time() - loaded_at < MAX_INDEX_AGE_SECONDS:
+                    continue
+                self.load_entity(cursor, entity)
+
+    def load_entity(self, cursor, entity: str) -> int:
+        sql, _, to_doc = _SOURCES[entity]
+        started = time.perf_counter()
+        with self._swap_lock:
+            self._replay.setdefault(entity, [])  # before the read, so no write slips between
+        try:
+            cursor.execute(sql)
+            rows = cursor.fetchall()
+        except Exception as exc:
+            # Missing optional tables (e.g. lost_found) simply index nothing
+            LOGGER.warning("Search index could not load %s: %s", entity, exc)
+            rows = []
+        self.load_docs(entity, (to_doc(r) for r in rows))
+        LOGGER.info("Search index loaded %d %s in %.1f ms", len(rows), entity, (time.perf_counter() - started) * 1000)
+        return len(rows)
+
+    def load_docs(self, entity: str, docs: Iterable[SearchDoc]) -> None:
+        """Build a new index for ``entity`` and swap it in; searches read the old one meanwhile."""
+        with self._swap_lock:
+            self._replay.setdefault(entity, [])
+        index = InvertedIndex()
+        for doc in docs:
+            index.add(doc, bulk=True)
+        index._sorted_vocab()
+        with self._swap_lock:
+            for doc_id, doc in self._replay.pop(entity, []):
+                if doc is not None:
+                    index.add(doc)
+                else:
+                    index.remove(entity, doc_id)
+            self._indexes[entity] = index
+            self._loaded_at[entity] = time.time()
+
+    def _apply(self, entity: str, doc_id: int, doc: Optional[SearchDoc]) -> None:
+        with self._swap_lock:
+            replay = self._replay.get(entity)
+            if replay is not None:
+                replay.append((doc_id, doc))
+            index = self._indexes.get(entity)
+            if index is None:
+                return
+            if doc is not None:
+                index.add(doc)
+            else:
+                index.remove(entity, doc_id)
+
+    def touch(self, cursor, entity: str, doc_id: Optional[int]) -> None:
+        """Re-read one row after a write. Never fails the surrounding request."""
+        if doc_id is None or (entity not in self._loaded_at and entity not in self._replay):
+            return  # Not loaded yet; the first search loads current data
+        try:
+            sql, id_column, to_doc = _SOURCES[entity]
+            joiner = " AND " if " WHERE " in sql else " WHERE "
+            cursor.execute(f"{sql}{joiner}{id_column} = %s", (doc_id,))
+            row = cursor.fetchone()
+            self._apply(entity, doc_id, to_doc(row) if row else None)
+        except Exception as exc:
+            LOGGER.warning("Search index refresh failed for %s %s: %s", entity, doc_id, exc)
+
+    def invalidate(self, entity: str) -> None:
+        """Force a reload of ``entity`` on the next search (after bulk writes)."""
+        self._loaded_at.pop(entity, None)
+
+    def search(
+        self,
+        cursor,
+        query: str,
+        entities: Sequence[str] = ENTITIES,
+        *,
+        college_id: int,
+        filters: Optional[Dict[str, str]] = None,
+        include_inactive: bool = False,
+        limit: int = 20,
+    ) -> List[SearchHit]:
+        """Hits visible to ``college_id``: its own documents plus college-less ones (users excepted)."""
+        if college_id is None:
+            raise ValueError("search needs a college scope")
+        entities = [e for e in entities if e in _SOURCES]
+        self._ensure_loaded(cursor, entities)
+        filters = {k: v for k, v in (filters or {}).items() if v}
+
+        def predicate(doc: SearchDoc) -> bool:
+            if doc.college_id != college_id and (doc.college_id is not None or doc.entity == "users"):
+                return False
+            if not include_inactive and not doc.attrs.get("is_active", True):
+                return False
+            return all(str(doc.attrs.get(k) or "") == str(v) for k, v in filters.items())
+
+        hits: List[SearchHit] = []
+        for entity in entities:
+            hits.extend(self.index(entity).search(query, limit=limit, predicate=predicate))
+        if len(entities) == 1:
+            return hits
+        return heapq.nlargest(limit, hits, key=lambda hit: hit.score)
+
+    def search_ids(self, cursor, entity: str, query: str, college_id: int, limit: int = 200, **kwargs) -> List[int]:
+        return [hit.doc.id for hit in self.search(cursor, query, [entity], college_id=college_id, limit=limit, **kwargs)]
+
+
+search_service = SearchService()
+
+
+# === MySQL FULLTEXT fallback ===
+
+FULLTEXT_INDEXES = {
+    "users": ("ft_users_search", "full_name, email"),
+    "clubs": ("ft_clubs_search", "name, description"),
+    "lost_found": ("ft_lost_found_search", "item_name, description"),
+    "learning_resources": ("ft_resources_search", "title, description"),
+}
+
+
+def ensure_fulltext_indexes(cursor) -> None:
+    for table, (name, columns) in FULLTEXT_INDEXES.items():
+        try:
+            cursor.execute(f"ALTER TABLE {table} ADD FULLTEXT INDEX {name} ({columns})")
+        except Exception:
+            pass  # Index already exists or table missing
+
+
+def boolean_query(query: str) -> str:
+    """``MATCH ... AGAINST`` boolean-mode query requiring every term, last one as a prefix."""
+    terms = tokenize(query)
+    return " ".join(f"+{t}*" if i == len(terms) - 1 else f"+{t}" for i, t in enumerate(terms))
+
+
+def benchmark(n_users: int = 100_000, n_queries: int = 500) -> Dict:
+    """Build an index over synthetic users and compare it with a substring scan (LIKE '%q%')."""
+    import random
+    import tracemalloc
+
+    rng = random.Random(11)
+    first = ["aarav", "vivaan", "aditya", "vihaan", "arjun", "sai", "reyansh", "ananya", "diya", "isha",
+             "kavya", "meera", "riya", "saanvi", "tara", "rohan", "karan", "neha", "pooja", "rahul"]
+    last = ["sharma", "verma", "patel", "iyer", "nair", "reddy", "gupta", "mehta", "joshi", "kapoor",
+            "desai", "rao", "singh", "das", "bose", "kulkarni", "menon", "pillai", "shah", "jain"]
+    departments = ["computer science", "mechanical", "electrical", "civil", "management", "design"]
+    rows = []
+    for uid in range(1, n_users + 1):
+        name = f"{rng.choice(first)} {rng.choice(last)} {uid:05d}"
+        rows.append({
+            "id": uid, "college_id": 1 + uid % 3, "full_name": name, "username": name.replace(" ", "."),
+            "email": f"{name.replace(' ', '.')}@campus.edu", "role": rng.choice(["student", "faculty"]),
+            "department": rng.choice(departments), "course": "btech", "is_active": True,
+        })
+
+    started = time.perf_counter()
+    service = SearchService()
+    service.load_docs("users", (_user_doc(r) for r in rows))
+    build_ms = (time.perf_counter() - started) * 1000
+
+    # Separate build for memory, since tracing slows allocation-heavy code down
+    tracemalloc.start()
+    SearchService().load_docs("users", (_user_doc(r) for r in rows))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    queries = [f"{rng.choice(first)} {rng.choice(last)[:3]}" for _ in range(n_queries)]
+    latencies = []
+    for q in queries:
+        started = time.perf_counter()
+        service.index("users").search(q, limit=20, predicate=lambda d: d.college_id == 1)
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+
+    scan = []
+    for q in queries[:50]:
+        started = time.perf_counter()
+        needle = q.lower()
+        [r for r in rows if r["college_id"] == 1 and (needle in r["full_name"].lower() or needle in r["username"].lower())][:20]
+        scan.append((time.perf_counter() - started) * 1000)
+    scan.sort()
+
+    return {
+        "users": n_users,
+        "build_ms": round(build_ms, 1),
+        "peak_memory_mb": round(peak / 1e6, 1),
+        "query_p50_ms": round(latencies[len(latencies) // 2], 3),
+        "query_p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 3),
+        "substring_scan_p50_ms": round(scan[len(scan) // 2], 3),
+    }
+
+
+if __name__ == "__main__":
+    print(benchmark())
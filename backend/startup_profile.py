@@ -0,0 +1,107 @@
+"""Cold-start import profile for the API.
+
+Runs ``python -X importtime -c "import main"`` in a fresh interpreter (the same
+thing Render/Railway pay on every cold start) and summarises the report: total
+import time, the slowest top-level packages and the modules with the largest
+self time. ``benchmark()`` repeats the cold import a few times so changes to
+eager imports can be compared before and after.
+
+    python startup_profile.py            # profile + benchmark for main
+    python startup_profile.py ai_api 5   # another module, 5 runs
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, List
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+
+@dataclass
+class ImportEntry:
+    module: str
+    self_ms: float
+    cumulative_ms: float
+    depth: int
+
+
+def _run_import(target: str, importtime: bool) -> subprocess.CompletedProcess:
+    args = [sys.executable]
+    if importtime:
+        args += ["-X", "importtime"]
+    args += ["-c", f"import {target}"]
+    return subprocess.run(args, cwd=BACKEND_DIR, capture_output=True, text=True, timeout=300)
+
+
+def parse_importtime(stderr: str) -> List[ImportEntry]:
+    """Parse ``-X importtime`` output into entries (depth 0 = imported directly by the target)."""
+    entries = []
+    for line in stderr.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, module = match.groups()
+        entries.append(ImportEntry(
+            module=module,
+            self_ms=int(self_us) / 1000,
+            cumulative_ms=int(cumulative_us) / 1000,
+            depth=(len(indent) - 1) // 2,
+        ))
+    return entries
+
+
+def profile_imports(target: str = "main", top: int = 15) -> Dict:
+    """Import ``target`` once in a fresh interpreter and report where the time went."""
+    started = time.perf_counter()
+    proc = _run_import(target, importtime=True)
+    wall_ms = (time.perf_counter() - started) * 1000
+    entries = parse_importtime(proc.stderr)
+    target_entry = next((e for e in reversed(entries) if e.module == target), None)
+    # Direct imports of the target are one level below it in the report
+    base_depth = target_entry.depth + 1 if target_entry else 0
+    direct = [e for e in entries if e.depth == base_depth]
+    return {
+        "target": target,
+        "ok": proc.returncode == 0,
+        "error": proc.stderr.strip().splitlines()[-1] if proc.returncode else None,
+        "wall_ms": round(wall_ms, 1),
+        "import_ms": round(target_entry.cumulative_ms, 1) if target_entry else None,
+        "modules_imported": len(entries),
+        "slowest_packages": [asdict(e) for e in sorted(direct, key=lambda e: e.cumulative_ms, reverse=True)[:top]],
+        "slowest_self": [asdict(e) for e in sorted(entries, key=lambda e: e.self_ms, reverse=True)[:top]],
+    }
+
+
+def benchmark(target: str = "main", runs: int = 3) -> Dict:
+    """Wall-clock time of a cold ``import target`` over several fresh interpreters."""
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        proc = _run_import(target, importtime=False)
+        timings.append((time.perf_counter() - started) * 1000)
+        if proc.returncode:
+            return {"target": target, "ok": False, "error": proc.stderr.strip().splitlines()[-1]}
+    return {
+        "target": target,
+        "ok": True,
+        "runs": runs,
+        "min_ms": round(min(timings), 1),
+        "median_ms": round(statistics.median(timings), 1),
+        "max_ms": round(max(timings), 1),
+    }
+
+
+if __name__ == "__main__":
+    module = sys.argv[1] if len(sys.argv) > 1 else "main"
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    print(json.dumps({"profile": profile_imports(module), "benchmark": benchmark(module, count)}, indent=2))